@@ -4,10 +4,10 @@ block_cipher = None
 
 # 只排除确实不需要的大型第三方库
 excludes = [
-    'tkinter', 'matplotlib', 'numpy', 'pandas', 'scipy', 'PIL', 'cv2',
+    'tkinter', 'matplotlib', 'pandas', 'scipy', 'PIL', 'cv2',
     'tensorflow', 'torch', 'sklearn', 'jupyter', 'notebook', 'IPython',
     'sphinx', 'pytest', 'unittest', 'doctest', 'pdb', 'profile',
-    'multiprocessing', 'concurrent.futures', 'asyncio', 'threading',
+    'asyncio',
     'distutils', 'setuptools', 'pip', 'wheel', 'pkg_resources'
 ]
 
@@ -28,7 +28,7 @@ a = Analysis(
 )
 
 # 过滤掉不需要的模块
-a.binaries = [x for x in a.binaries if not any(exclude in x[0].lower() for exclude in ['tk', 'matplotlib', 'numpy', 'pandas', 'scipy', 'pil', 'cv2'])]
+a.binaries = [x for x in a.binaries if not any(exclude in x[0].lower() for exclude in ['tk', 'matplotlib', 'pandas', 'scipy', 'pil', 'cv2'])]
 
 pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
 
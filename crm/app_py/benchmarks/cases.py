@@ -0,0 +1,384 @@
+import gc
+import math
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import closing, contextmanager
+
+from PyQt5.QtWidgets import QApplication, QMessageBox
+from PyQt5.QtCore import Qt, QObject, QEvent, QEventLoop, QThreadPool, QTimer
+
+from database.comparison import get_merchant_comparison
+from database.db_manager import Database, default_db_path
+from database.repositories import TYPE_INBOUND
+from database.sync import HttpSession, SyncEngine
+from database.sync_mock_server import MockSyncServer
+from database.synthetic_data import product_rows
+from database.transaction_store import TransactionStore
+
+
+# 启动用例中由父进程传入的启动时刻（time.time()），用于计入解释器启动和导入耗时
+LAUNCHED_AT_ENV = "MINICRM_BENCH_LAUNCHED_AT"
+
+SEARCH_QUERY = "新疆苹果特级"
+
+
+def process_memory():
+    """返回 (当前常驻内存 KB, 峰值常驻内存 KB)，无法获取的项为 None"""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = Counters()
+        counters.cb = ctypes.sizeof(Counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize // 1024, counters.PeakWorkingSetSize // 1024
+        return None, None
+    try:
+        with open("/proc/self/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["VmRSS"].split()[0]), int(fields["VmHWM"].split()[0])
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return None, peak // 1024 if sys.platform == "darwin" else peak
+    except ImportError:
+        return None, None
+
+
+class Recorder:
+    """收集一个用例的耗时样本（毫秒）和内存增量（KB）"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.memory = {}
+
+    @contextmanager
+    def measure(self, name):
+        gc.collect()
+        before = process_memory()[0]
+        start = time.perf_counter()
+        yield
+        elapsed = (time.perf_counter() - start) * 1000
+        self.add(name, elapsed)
+        after = process_memory()[0]
+        if before is not None and after is not None:
+            self.memory[name] = max(self.memory.get(name, 0), after - before)
+
+    def add(self, name, elapsed_ms, memory_kb=None):
+        self.metrics.setdefault(name, []).append(elapsed_ms)
+        if memory_kb is not None:
+            self.memory[name] = max(self.memory.get(name, 0), memory_kb)
+
+    def result(self):
+        return {"metrics": self.metrics, "memory_kb": self.memory,
+                "peak_rss_kb": process_memory()[1]}
+
+
+_app = None
+
+
+def _application():
+    """创建 QApplication（设置与 main.py 一致），进程内只创建一次"""
+    global _app
+    if _app is None:
+        QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
+        QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
+        _app = QApplication([sys.argv[0]])
+        _app.setStyle('Fusion')
+    return _app
+
+
+def _settle():
+    """处理完已排队的事件（含布局和绘制）"""
+    app = QApplication.instance()
+    app.processEvents()
+    app.sendPostedEvents()
+    app.processEvents()
+
+
+def _wait(condition, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    app = QApplication.instance()
+    while not condition() and time.monotonic() < deadline:
+        app.processEvents(QEventLoop.AllEvents, 50)
+
+
+def _main_window(all_pages=False):
+    from main_window import MainWindow
+    window = MainWindow(prewarm=False)
+    window.show()
+    if all_pages:
+        for index in range(len(MainWindow.PAGES)):
+            window.ensure_page(index)
+        # 等待出入库页的后台记录查询和流水读入内存完成
+        loader = window.inventory_module.records_loader
+        _wait(lambda: not loader.is_running())
+        QThreadPool.globalInstance().waitForDone()
+    _settle()
+    return window
+
+
+class _FirstPaint(QObject):
+    """窗口第一次绘制完成后退出等待循环"""
+
+    def __init__(self, loop):
+        super().__init__()
+        self.loop = loop
+        self.painted_at = None
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and self.painted_at is None:
+            # 零延时定时器在本轮绘制全部完成后才触发
+            QTimer.singleShot(0, self._done)
+        return False
+
+    def _done(self):
+        if self.painted_at is None:
+            self.painted_at = time.time()
+            self.loop.quit()
+
+
+def case_startup(recorder, options):
+    """启动到首屏绘制：运行真正的 main.main()，以首次绘制完成代替进入事件循环"""
+    launched_at = float(os.environ.get(LAUNCHED_AT_ENV, time.time()))
+    main_started = time.time()
+
+    def exec_until_painted():
+        from main_window import MainWindow
+        window = next(w for w in QApplication.topLevelWidgets() if isinstance(w, MainWindow))
+        loop = QEventLoop()
+        watcher = _FirstPaint(loop)
+        window.installEventFilter(watcher)
+        QTimer.singleShot(30000, loop.quit)
+        loop.exec_()
+        # 首页指标等后台任务完成后再退出，避免窗口销毁时任务仍在发出信号
+        QThreadPool.globalInstance().waitForDone()
+        if watcher.painted_at is not None:
+            rss = process_memory()[0]
+            recorder.add("startup.first_paint", (watcher.painted_at - launched_at) * 1000, rss)
+            recorder.add("startup.main_to_paint", (watcher.painted_at - main_started) * 1000)
+        return 0
+
+    import main
+    QApplication.exec_ = staticmethod(exec_until_painted)
+    try:
+        main.main()
+    except SystemExit:
+        pass
+
+
+def case_page(recorder, options):
+    """主窗口和各页面的首次创建（含模块导入）及首帧绘制"""
+    from main_window import MainWindow
+    _application()
+    with recorder.measure("page.main_window"):
+        window = MainWindow(prewarm=False)
+        window.show()
+        _settle()
+    for index, (name, _) in enumerate(MainWindow.PAGES[1:], 1):
+        with recorder.measure(f"page.{name}"):
+            window.show_page(index)
+            _settle()
+    QThreadPool.globalInstance().waitForDone()
+
+
+def _size_label(count):
+    if count >= 1000000 and count % 1000000 == 0:
+        return f"{count // 1000000}m"
+    if count >= 1000 and count % 1000 == 0:
+        return f"{count // 1000}k"
+    return str(count)
+
+
+def case_table(recorder, options):
+    """货品表格整体填充 N 行（列式模型 + 视图首帧）"""
+    _application()
+    window = _main_window()
+    window.show_products()
+    module = window.products_module
+    model = module.products_model
+    view = module.products_table.viewport()
+    for count in options["rows"]:
+        model.set_rows([])
+        rows = product_rows(count)
+        with recorder.measure(f"table.populate.{_size_label(count)}"):
+            model.set_rows(rows)
+            view.repaint()
+        del rows
+
+
+def case_search(recorder, options):
+    """搜索框逐字输入再逐字删除，每次按键的过滤和重绘耗时"""
+    _application()
+    window = _main_window()
+    window.show_products()
+    module = window.products_module
+    view = module.products_table.viewport()
+    rows = product_rows(options["search_rows"])
+    module.products_model.set_rows(rows)
+    with recorder.measure("search.index_build"):
+        module.search.rebuild(rows)
+        module.search.ensure_built()
+    prefixes = [SEARCH_QUERY[:i] for i in range(1, len(SEARCH_QUERY) + 1)]
+    for text in prefixes + prefixes[-2::-1]:
+        module.search_input.setText(text)
+        with recorder.measure("search.keystroke"):
+            module.search.apply_filter()
+            view.repaint()
+
+
+def case_records(recorder, options):
+    """出入库记录：全部流水读入内存，之后按条件筛选并重绘表格"""
+    _application()
+    window = _main_window()
+    window.show_inventory()
+    module = window.inventory_module
+    QThreadPool.globalInstance().waitForDone()
+    _settle()
+    store = TransactionStore(module.store.db)
+    with recorder.measure("records.store_load"):
+        store.refresh()
+    module.start_date.setDate(module.start_date.date().addYears(-10))
+    view = module.records_table.viewport()
+    filters = [(combo, index) for combo in (module.filter_type_combo, module.filter_merchant_combo,
+                                            module.filter_product_combo) for index in (1, 0)]
+    for combo, index in filters * options["toggles"]:
+        combo.setCurrentIndex(index)
+        with recorder.measure("records.filter"):
+            module.populate_records_table()
+            view.repaint()
+        QThreadPool.globalInstance().waitForDone()
+        _settle()
+
+
+def case_theme(recorder, options):
+    """所有页面都已创建时切换主题（含重新计算样式和可见区域重绘）"""
+    _application()
+    window = _main_window(all_pages=True)
+    window.show_products()
+    _settle()
+    for _ in range(options["toggles"]):
+        with recorder.measure("theme.toggle"):
+            window.toggle_theme()
+            _settle()
+
+
+def case_analysis(recorder, options):
+    """销售分析：读入流水和拟合预测、单个商家报告（月度汇总、统计卡片、折线图）和全部商家报告"""
+    _application()
+    window = _main_window()
+    window.show_analysis()
+    module = window.analysis_module
+    _settle()
+    # 报告完成后的提示框是模态的，基准测试中跳过
+    QMessageBox.information = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+    QMessageBox.warning = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+    # 首次需读入全部出库流水并拟合全部序列的需求预测，之后报告只做向量化汇总
+    with recorder.measure("analysis.engine_load"):
+        module.engine.refresh()
+    with recorder.measure("analysis.forecast_fit"):
+        module.forecaster.update()
+    merchants = min(module.merchant_combo.count() - 1, options["reports"])
+    for index in range(1, merchants + 1):
+        module.merchant_combo.setCurrentIndex(index)
+        with recorder.measure("analysis.report"):
+            module.generate_analysis()
+            _settle()
+    # 数据未变化时再次查看同样的商家，报告、预测叠加和绘制好的折线图来自缓存
+    for index in range(1, merchants + 1):
+        module.merchant_combo.setCurrentIndex(index)
+        with recorder.measure("analysis.report.cached"):
+            module.generate_analysis()
+            _settle()
+    QThreadPool.globalInstance().waitForDone()
+    for _ in range(options["reports"]):
+        with recorder.measure("analysis.company_report"):
+            module.show_company_report(module.year_combo.currentText())
+            _settle()
+    # 全部商家对比（总行数达到阈值且有多个 CPU 时分段交给进程池）
+    comparison = get_merchant_comparison()
+    merchant_ids = [module.merchant_combo.itemData(i) for i in range(1, module.merchant_combo.count())]
+    for _ in range(options["reports"]):
+        with recorder.measure("analysis.compare"):
+            comparison.compare(merchant_ids, module.year_combo.currentText())
+
+
+def case_chart(recorder, options):
+    """折线图：数据变化后的完整绘制和缓存命中时的重绘"""
+    from modules.analysis_module import LineChartWidget
+    _application()
+    chart = LineChartWidget()
+    chart.resize(1000, 450)
+    chart.show()
+    _settle()
+    for points in options["chart_points"]:
+        data = {f"第{i + 1}天": int(500 + 300 * math.sin(i / 20) + (i * 7919) % 97)
+                for i in range(points)}
+        for _ in range(options["chart_repeats"]):
+            chart.set_data("基准测试", data)
+            with recorder.measure(f"chart.render.{_size_label(points)}"):
+                chart.repaint()
+        for _ in range(options["chart_repeats"]):
+            with recorder.measure("chart.paint.cached"):
+                chart.repaint()
+
+
+def case_sync(recorder, options):
+    """增量同步：全部推送到本地模拟服务器、空库全量拉取，以及网站端少量变化后的增量同步"""
+    with tempfile.TemporaryDirectory() as tmp, MockSyncServer() as server:
+        # 在测试数据库的副本上同步，不改动复用的测试数据库
+        path = os.path.join(tmp, "source.db")
+        with closing(sqlite3.connect(default_db_path())) as fixture, \
+                closing(sqlite3.connect(path)) as copy:
+            fixture.backup(copy)
+        databases = [Database(path), Database(os.path.join(tmp, "target.db"))]
+        try:
+            source, target = [SyncEngine(db, HttpSession(server.url)) for db in databases]
+            with recorder.measure("sync.push_all"):
+                source.sync()
+            with recorder.measure("sync.pull_all"):
+                target.sync()
+            product_ids = [item["id"] for item in server.items("products")]
+            for round_index in range(options["toggles"]):
+                server.put("transactions", [
+                    {"productId": product_ids[(round_index * 7919 + i * 104729) % len(product_ids)],
+                     "type": TYPE_INBOUND, "quantity": 1 + i % 9, "date": "2025-06-01T00:00:00.000Z"}
+                    for i in range(options["sync_changes"])])
+                with recorder.measure("sync.delta"):
+                    target.sync()
+        finally:
+            for db in databases:
+                db.close()
+
+
+CASES = {
+    "startup": case_startup,
+    "page": case_page,
+    "table": case_table,
+    "search": case_search,
+    "records": case_records,
+    "theme": case_theme,
+    "analysis": case_analysis,
+    "chart": case_chart,
+    "sync": case_sync,
+}
+
+
+def run_case(name, options):
+    """在当前（子）进程中运行一个用例，返回可写成 JSON 的结果"""
+    recorder = Recorder()
+    CASES[name](recorder, options)
+    return recorder.result()
@@ -0,0 +1,29 @@
+import os
+from datetime import date
+
+from database.synthetic_data import generate
+
+
+FIXTURE_START = date(2024, 1, 1)
+FIXTURE_YEARS = 2
+
+
+def fixture_path(directory, products, merchants, transactions):
+    return os.path.join(directory, f"bench_{products}_{merchants}_{transactions}.db")
+
+
+def build_fixture(path, products=10000, merchants=200, transactions=200000, seed=1):
+    """生成基准测试用数据库（已存在则直接复用）
+
+    数据由 database.synthetic_data 按固定种子生成，覆盖 FIXTURE_START 起的两年。
+    先写入临时文件，完成后再改名，中断时不会留下不完整的数据库。
+    """
+    if os.path.exists(path):
+        return path
+    tmp_path = path + ".tmp"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(tmp_path + suffix):
+            os.remove(tmp_path + suffix)
+    generate(tmp_path, products, merchants, transactions, FIXTURE_START, FIXTURE_YEARS, seed)
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+无界面性能基准测试
+
+在 QT_QPA_PLATFORM=offscreen 下运行，每个用例每轮在独立的子进程中执行，
+互不影响，页面创建和启动耗时都是冷启动数据。结果写成 JSON，并与保存的
+基线比较，超出容差即视为性能回退，退出码为 1。
+
+    python benchmarks/run_benchmarks.py                  # 运行全部用例并与基线比较
+    python benchmarks/run_benchmarks.py --cases theme,search --repeats 3
+    python benchmarks/run_benchmarks.py --save-baseline  # 把本次结果保存为基线
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+from benchmarks.fixtures import build_fixture, fixture_path
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+CASE_NAMES = ["startup", "page", "table", "search", "records", "theme", "analysis", "chart", "sync"]
+CHILD_TIMEOUT = 900
+
+# 差值小于该值时不算回退（避免毫秒以下的抖动误报）
+MIN_DELTA_MS = 2.0
+MIN_DELTA_KB = 2048
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="MiniCRM 无界面性能基准测试")
+    parser.add_argument("--cases", default=",".join(CASE_NAMES),
+                        help="逗号分隔的用例：" + ",".join(CASE_NAMES))
+    parser.add_argument("--repeats", type=int, default=5, help="每个用例运行的进程数")
+    parser.add_argument("--rows", default="10000,100000,1000000", help="表格填充的行数")
+    parser.add_argument("--search-rows", type=int, default=100000, help="搜索用例的表格行数")
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--merchants", type=int, default=200)
+    parser.add_argument("--transactions", type=int, default=200000)
+    parser.add_argument("--fixture-dir", default=os.path.join(tempfile.gettempdir(), "minicrm_bench"),
+                        help="测试数据库所在目录（同样规模的数据库会被复用）")
+    parser.add_argument("--output", default="benchmark_results.json", help="结果 JSON 文件")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线 JSON 文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="允许的相对变慢/内存增长比例（默认 0.25 即 25%%）")
+    # 内部使用：在子进程中运行单个用例
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    parser.add_argument("--options", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def case_options(args):
+    return {
+        "rows": [int(n) for n in args.rows.split(",") if n],
+        "search_rows": args.search_rows,
+        "toggles": 6,
+        "reports": 10,
+        "chart_points": [12, 365, 3650],
+        "chart_repeats": 5,
+        "sync_changes": 100,
+    }
+
+
+def run_child(args):
+    from benchmarks.cases import run_case
+    result = run_case(args.child, json.loads(args.options))
+    with open(args.result_file, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+def run_case_process(name, db_path, options):
+    """在新的子进程中运行一轮用例，返回其结果；失败时返回 None 并打印输出"""
+    from benchmarks.cases import LAUNCHED_AT_ENV
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    env["MINICRM_DB"] = db_path
+    env.pop("MINICRM_TRACE", None)
+    fd, result_file = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    command = [sys.executable, os.path.abspath(__file__), "--child", name,
+               "--result-file", result_file, "--options", json.dumps(options)]
+    try:
+        env[LAUNCHED_AT_ENV] = repr(time.time())
+        completed = subprocess.run(command, cwd=APP_DIR, env=env, capture_output=True,
+                                   text=True, encoding="utf-8", errors="replace",
+                                   timeout=CHILD_TIMEOUT)
+        if completed.returncode != 0:
+            print(f"  用例 {name} 失败（退出码 {completed.returncode}）:")
+            print(completed.stderr[-2000:])
+            return None
+        with open(result_file, encoding="utf-8") as f:
+            return json.load(f)
+    except subprocess.TimeoutExpired:
+        print(f"  用例 {name} 超时（{CHILD_TIMEOUT} 秒）")
+        return None
+    finally:
+        os.remove(result_file)
+
+
+def summarize(runs):
+    """合并多轮子进程的样本：耗时取中位数/最小/最大，内存取各轮最大值"""
+    samples = {}
+    memory = {}
+    peak = {}
+    for run in runs:
+        for name, values in run["metrics"].items():
+            samples.setdefault(name, []).extend(values)
+            if run["peak_rss_kb"] is not None:
+                peak[name] = max(peak.get(name, 0), run["peak_rss_kb"])
+        for name, kb in run["memory_kb"].items():
+            memory[name] = max(memory.get(name, 0), kb)
+    metrics = {}
+    for name, values in sorted(samples.items()):
+        metrics[name] = {
+            "median_ms": round(statistics.median(values), 3),
+            "min_ms": round(min(values), 3),
+            "max_ms": round(max(values), 3),
+            "samples": len(values),
+            "memory_kb": memory.get(name),
+            "peak_rss_kb": peak.get(name),
+        }
+    return metrics
+
+
+def compare(metrics, baseline, tolerance, cases=CASE_NAMES):
+    """与基线逐项比较，返回 (报告行, 回退项名称列表)
+
+    指标名以所属用例名开头（如 theme.toggle）；本次运行了该用例、
+    基线中却没有得到的指标会标为"缺失"。
+    """
+    lines = []
+    regressions = []
+    header = f"{'指标':<34}{'中位数ms':>11}{'基线ms':>11}{'变化':>9}{'内存KB':>11}  状态"
+    lines.append(header)
+    lines.append("-" * 84)
+    for name, current in metrics.items():
+        base = baseline.get(name)
+        median = current["median_ms"]
+        memory = current["memory_kb"]
+        if base is None:
+            lines.append(f"{name:<36}{median:>11.2f}{'-':>11}{'-':>9}{_kb(memory):>11}  新增")
+            continue
+        base_median = base["median_ms"]
+        change = (median - base_median) / base_median if base_median else 0.0
+        status = "正常"
+        if median > base_median * (1 + tolerance) and median - base_median > MIN_DELTA_MS:
+            status = "变慢"
+        base_memory = base.get("memory_kb")
+        if (memory is not None and base_memory is not None
+                and memory > base_memory * (1 + tolerance) and memory - base_memory > MIN_DELTA_KB):
+            status = "内存增长" if status == "正常" else status + "+内存增长"
+        if status != "正常":
+            regressions.append(name)
+        lines.append(f"{name:<36}{median:>11.2f}{base_median:>11.2f}{change:>+9.0%}"
+                     f"{_kb(memory):>11}  {status}")
+    for name in baseline:
+        if name not in metrics and name.split(".", 1)[0] in cases:
+            regressions.append(name)
+            lines.append(f"{name:<36}{'-':>11}{baseline[name]['median_ms']:>11.2f}{'-':>9}{'-':>11}  缺失")
+    return lines, regressions
+
+
+def _kb(value):
+    return "-" if value is None else str(value)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.child:
+        run_child(args)
+        return 0
+
+    cases = [name for name in args.cases.split(",") if name]
+    unknown = [name for name in cases if name not in CASE_NAMES]
+    if unknown:
+        print(f"未知用例: {', '.join(unknown)}")
+        return 2
+
+    os.makedirs(args.fixture_dir, exist_ok=True)
+    db_path = fixture_path(args.fixture_dir, args.products, args.merchants, args.transactions)
+    if not os.path.exists(db_path):
+        print(f"生成测试数据库 {db_path} ...")
+        build_fixture(db_path, args.products, args.merchants, args.transactions)
+
+    options = case_options(args)
+    runs = []
+    failed = []
+    for name in cases:
+        print(f"运行 {name} ({args.repeats} 轮)...")
+        case_runs = [run_case_process(name, db_path, options) for _ in range(args.repeats)]
+        if any(run is None for run in case_runs):
+            failed.append(name)
+        runs.extend(run for run in case_runs if run is not None)
+
+    metrics = summarize(runs)
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "qt": _qt_version(),
+            "repeats": args.repeats,
+            "fixture": {"products": args.products, "merchants": args.merchants,
+                        "transactions": args.transactions},
+            "options": options,
+        },
+        "metrics": metrics,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if (baseline["meta"].get("fixture") != report["meta"]["fixture"]
+                or baseline["meta"].get("options") != report["meta"]["options"]):
+            print("警告: 基线使用的数据规模或用例参数与本次不同，比较结果仅供参考")
+        lines, regressions = compare(metrics, baseline["metrics"], args.tolerance, cases)
+        print("\n".join(lines))
+    else:
+        lines, _ = compare(metrics, {}, args.tolerance)
+        print("\n".join(lines))
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存到 {args.baseline}")
+
+    if failed:
+        print(f"失败的用例: {', '.join(failed)}")
+    if regressions:
+        print(f"性能回退: {', '.join(regressions)}")
+    return 1 if failed or regressions else 0
+
+
+def _qt_version():
+    from PyQt5.QtCore import QT_VERSION_STR, PYQT_VERSION_STR
+    return f"Qt {QT_VERSION_STR} / PyQt {PYQT_VERSION_STR}"
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,76 @@
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QFrame
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QFrame, QPushButton
+from PyQt5.QtCore import Qt, QTimer, QObject, QRunnable, QThreadPool, pyqtSignal
 from PyQt5.QtGui import QFont
 
+from database.db_manager import get_database, LOW_STOCK_THRESHOLD
+from database.repositories import DashboardRepository
+from database.stock_alerts import LEVEL_LABELS, get_stock_alerts
+from dialogs.stock_alert_dialog import StockAlertDialog, format_days
+
+
+# 本月出库排行显示的商家数
+TOP_MERCHANTS = 5
+
+# 库存预警显示的货品数（可售天数最少的几个）
+TOP_ALERTS = 5
+
+
+class _KpiSignals(QObject):
+    done = pyqtSignal(object, object, str)  # Kpis，(最紧急的预警, 预警总数)，错误信息（成功时为空）
+
+
+class _KpiJob(QRunnable):
+    """在线程池中读取首页指标和库存预警（首次打开数据库时可能需要执行迁移）"""
+
+    def __init__(self, signals):
+        super().__init__()
+        self.signals = signals
+
+    def run(self):
+        kpis = None
+        alerts = None
+        error = ""
+        try:
+            kpis = DashboardRepository(get_database()).kpis(top=TOP_MERCHANTS)
+            # 只重新评估上次之后变动过的货品
+            engine = get_stock_alerts()
+            engine.refresh()
+            alerts = (engine.alerts(TOP_ALERTS), engine.count())
+        except Exception as e:
+            error = str(e)
+        self.signals.done.emit(kpis, alerts, error)
+
 
 class DashboardWidget(QWidget):
+    """系统首页：实时指标和功能入口
+
+    指标读自随写入增量维护的计数表（DashboardRepository），只是几次主键
+    查找；库存预警只重新评估变动过的货品（StockAlertEngine）。界面出入库
+    提交后立即刷新；导入、同步等其它写入由显示期间的定时刷新反映。
+    """
+    
+    # 显示期间定时刷新的间隔（毫秒）
+    REFRESH_INTERVAL_MS = 3000
+    
+    # 出入库提交通知（从写入线程发出，在界面线程处理）
+    data_changed = pyqtSignal()
+    
     def __init__(self):
         super().__init__()
+        self._loading = False
+        self._reload = False
+        self._listening = False
+        self._signals = _KpiSignals()
+        self._signals.done.connect(self.on_kpis_loaded)
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(self.REFRESH_INTERVAL_MS)
+        self.refresh_timer.timeout.connect(self.refresh)
+        # 连续提交时合并为一次刷新
+        self.change_timer = QTimer(self)
+        self.change_timer.setSingleShot(True)
+        self.change_timer.setInterval(100)
+        self.change_timer.timeout.connect(self.refresh)
+        self.data_changed.connect(self.change_timer.start)
         self.init_ui()
     
     def init_ui(self):
@@ -25,6 +90,75 @@ class DashboardWidget(QWidget):
         welcome_label.setStyleSheet("padding: 20px;")
         layout.addWidget(welcome_label)
         
+        # 实时指标卡片
+        kpi_layout = QHBoxLayout()
+        self.kpi_labels = {}
+        for key, title, color in (("products", "货品总数", "#007bff"),
+                                  ("stock", "库存总量", "#17a2b8"),
+                                  ("inbound", "今日入库", "#28a745"),
+                                  ("outbound", "今日出库", "#fd7e14"),
+                                  ("low_stock", "低于补货点货品", "#dc3545")):
+            card, value_label, detail_label = self.create_kpi_card(title, color)
+            self.kpi_labels[key] = (value_label, detail_label)
+            kpi_layout.addWidget(card)
+        self.kpi_labels["low_stock"][1].setText(f"默认补货点 {LOW_STOCK_THRESHOLD}")
+        layout.addLayout(kpi_layout)
+        
+        # 读取失败时的提示（下次刷新成功后隐藏）
+        self.error_label = QLabel()
+        self.error_label.setFont(QFont("Microsoft YaHei", 10))
+        self.error_label.setStyleSheet("color: #dc3545;")
+        self.error_label.setAlignment(Qt.AlignCenter)
+        self.error_label.setWordWrap(True)
+        self.error_label.hide()
+        layout.addWidget(self.error_label)
+        
+        lists_layout = QHBoxLayout()
+        
+        # 本月出库排行
+        ranking_card = QWidget()
+        ranking_card.setObjectName("stat_card")  # 卡片样式由主题的 stat_cards 按对象名称设置
+        ranking_layout = QVBoxLayout()
+        ranking_card.setLayout(ranking_layout)
+        ranking_title = QLabel("本月出库商家排行")
+        ranking_title.setFont(QFont("Microsoft YaHei", 11, QFont.Bold))
+        ranking_layout.addWidget(ranking_title)
+        self.ranking_labels = []
+        for _ in range(TOP_MERCHANTS):
+            label = QLabel()
+            label.setFont(QFont("Microsoft YaHei", 10))
+            ranking_layout.addWidget(label)
+            self.ranking_labels.append(label)
+        ranking_layout.addStretch()
+        lists_layout.addWidget(ranking_card)
+        self.show_ranking([])
+        
+        # 库存预警：可售天数最少的货品
+        alert_card = QWidget()
+        alert_card.setObjectName("stat_card")
+        alert_layout = QVBoxLayout()
+        alert_card.setLayout(alert_layout)
+        alert_title_layout = QHBoxLayout()
+        self.alert_title = QLabel("库存预警")
+        self.alert_title.setFont(QFont("Microsoft YaHei", 11, QFont.Bold))
+        alert_title_layout.addWidget(self.alert_title)
+        alert_title_layout.addStretch()
+        alert_btn = QPushButton("查看全部")
+        alert_btn.clicked.connect(self.show_stock_alert_dialog)
+        alert_title_layout.addWidget(alert_btn)
+        alert_layout.addLayout(alert_title_layout)
+        self.alert_labels = []
+        for _ in range(TOP_ALERTS):
+            label = QLabel()
+            label.setFont(QFont("Microsoft YaHei", 10))
+            alert_layout.addWidget(label)
+            self.alert_labels.append(label)
+        alert_layout.addStretch()
+        lists_layout.addWidget(alert_card)
+        self.show_alerts([], 0)
+        
+        layout.addLayout(lists_layout)
+        
         # 功能卡片
         cards_layout = QHBoxLayout()
         
@@ -47,6 +181,112 @@ class DashboardWidget(QWidget):
         layout.addLayout(cards_layout)
         layout.addStretch()
     
+    def create_kpi_card(self, title, color):
+        """创建指标卡片，返回 (卡片, 数值标签, 说明标签)"""
+        card = QWidget()
+        card.setObjectName("stat_card")
+        
+        layout = QVBoxLayout()
+        card.setLayout(layout)
+        
+        title_label = QLabel(title)
+        title_label.setFont(QFont("Microsoft YaHei", 10))
+        title_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(title_label)
+        
+        value_label = QLabel("—")
+        value_label.setFont(QFont("Microsoft YaHei", 18, QFont.Bold))
+        value_label.setStyleSheet(f"color: {color};")
+        value_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(value_label)
+        
+        detail_label = QLabel("")
+        detail_label.setFont(QFont("Microsoft YaHei", 9))
+        detail_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(detail_label)
+        
+        return card, value_label, detail_label
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.refresh_timer.start()
+    
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.refresh_timer.stop()
+    
+    def refresh(self):
+        """在后台重新读取指标；读取中再次请求时，读完后再读一次"""
+        if self._loading:
+            self._reload = True
+            return
+        self._loading = True
+        QThreadPool.globalInstance().start(_KpiJob(self._signals))
+    
+    def on_kpis_loaded(self, kpis, alerts, error):
+        self._loading = False
+        if kpis is not None:
+            self.show_kpis(kpis)
+            if not self._listening:
+                # 首次读取后再加载写入器（连同同步模块），不拖慢启动
+                from database.transaction_writer import get_transaction_writer
+                get_transaction_writer().add_listener(lambda movements: self.data_changed.emit())
+                self._listening = True
+        if alerts is not None:
+            self.show_alerts(*alerts)
+        self.show_error(error)
+        if self._reload:
+            self._reload = False
+            self.refresh()
+    
+    def show_error(self, error):
+        """显示读取失败的原因（保留上次读到的指标），error 为空时隐藏"""
+        self.error_label.setText(f"读取首页指标失败：{error}" if error else "")
+        self.error_label.setVisible(bool(error))
+    
+    def show_kpis(self, kpis):
+        labels = self.kpi_labels
+        labels["products"][0].setText(f"{kpis.product_count:,}")
+        labels["stock"][0].setText(f"{kpis.total_stock:,}")
+        labels["inbound"][0].setText(f"{kpis.inbound:,}")
+        labels["inbound"][1].setText(f"{kpis.inbound_count:,} 笔")
+        labels["outbound"][0].setText(f"{kpis.outbound:,}")
+        labels["outbound"][1].setText(f"{kpis.outbound_count:,} 笔")
+        labels["low_stock"][0].setText(f"{kpis.low_stock:,}")
+        self.show_ranking(kpis.top_merchants)
+    
+    def show_ranking(self, merchants):
+        for i, label in enumerate(self.ranking_labels):
+            if i < len(merchants):
+                name, quantity = merchants[i]
+                label.setText(f"{i + 1}. {name}    出库 {quantity:,}")
+                label.show()
+            elif i == 0:
+                label.setText("本月暂无出库记录")
+                label.show()
+            else:
+                label.hide()
+    
+    def show_alerts(self, alerts, count):
+        self.alert_title.setText(f"库存预警（{count:,}）" if count else "库存预警")
+        for i, label in enumerate(self.alert_labels):
+            if i < len(alerts):
+                alert = alerts[i]
+                label.setText(f"{alert.name}    {LEVEL_LABELS[alert.level]} · "
+                              f"库存 {alert.stock:,} · 可售 {format_days(alert.days)}")
+                label.show()
+            elif i == 0:
+                label.setText("暂无需要补货的货品")
+                label.show()
+            else:
+                label.hide()
+    
+    def show_stock_alert_dialog(self):
+        """查看全部库存预警，关闭后刷新（可能修改了补货点）"""
+        StockAlertDialog(self).exec_()
+        self.refresh()
+    
     def create_info_card(self, title, description, icon):
         """创建信息卡片"""
         card = QFrame()
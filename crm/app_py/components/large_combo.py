@@ -0,0 +1,18 @@
+from PyQt5.QtWidgets import QComboBox, QListView
+
+
+class LargeComboBox(QComboBox):
+    """适合大量选项（成千上万个货品/商家）的下拉框
+
+    默认的 QComboBox 在计算尺寸和样式变化（如切换主题）时会逐项测量
+    全部选项的宽高并重新排布弹出列表。这里固定按内容长度估算宽度、
+    列表使用统一行高并分批排布，这些操作的耗时不再随选项数量增长。
+    """
+
+    def __init__(self, parent=None, min_contents_length=20):
+        super().__init__(parent)
+        self.setSizeAdjustPolicy(QComboBox.AdjustToMinimumContentsLengthWithIcon)
+        self.setMinimumContentsLength(min_contents_length)
+        view = self.view()
+        view.setUniformItemSizes(True)
+        view.setLayoutMode(QListView.Batched)
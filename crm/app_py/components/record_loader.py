@@ -0,0 +1,96 @@
+import threading
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class _PageJob(QRunnable):
+    """在线程池中逐页读取一次查询的结果"""
+
+    def __init__(self, loader, pages, max_pending_pages):
+        super().__init__()
+        self.setAutoDelete(False)  # 生命周期由加载器管理，运行结束后才释放
+        self.loader = loader
+        self.pages = pages
+        self.cancelled = threading.Event()
+        # 已发出但界面尚未处理的页数上限，避免结果远快于界面时积压大量事件
+        self.pending = threading.Semaphore(max_pending_pages)
+
+    def cancel(self):
+        self.cancelled.set()
+        self.pending.release()  # 唤醒可能在等待的读取线程
+
+    def run(self):
+        total = 0
+        error = ""
+        try:
+            for page in self.pages:
+                while not self.pending.acquire(timeout=0.1):
+                    if self.cancelled.is_set():
+                        return
+                if self.cancelled.is_set():
+                    return
+                total += len(page)
+                self.loader._page_ready.emit(self, page)
+        except Exception as e:
+            error = str(e)
+        finally:
+            close = getattr(self.pages, "close", None)
+            if close is not None:
+                close()
+            # 无论完成、出错还是取消都要通知，加载器据此释放任务对象
+            self.loader._job_done.emit(self, total, error)
+
+
+class RecordQueryLoader(QObject):
+    """后台分页查询：在线程池中读取页迭代器，把结果逐页送回界面线程
+
+    同一时刻只有一个有效查询；start() 会取消正在进行的查询，已取消查询
+    尚在途中的页会被丢弃。
+    """
+
+    page_loaded = pyqtSignal(object)  # 一页行数据
+    finished = pyqtSignal(int)        # 查询完成，参数为总行数
+    failed = pyqtSignal(str)
+
+    # 工作线程 -> 界面线程（跨线程信号自动排队）
+    _page_ready = pyqtSignal(object, object)
+    _job_done = pyqtSignal(object, int, str)
+
+    def __init__(self, parent=None, max_pending_pages=4):
+        super().__init__(parent)
+        self.max_pending_pages = max_pending_pages
+        self._pool = QThreadPool.globalInstance()
+        self._current = None
+        self._jobs = set()  # 仍在线程池中运行的任务（含已取消的）
+        self._page_ready.connect(self._on_page_ready)
+        self._job_done.connect(self._on_job_done)
+
+    def start(self, pages):
+        """取消当前查询并在后台开始读取 pages（产生行列表的迭代器）"""
+        self.cancel()
+        self._current = _PageJob(self, pages, self.max_pending_pages)
+        self._jobs.add(self._current)
+        self._pool.start(self._current)
+
+    def cancel(self):
+        if self._current is not None:
+            self._current.cancel()
+            self._current = None
+
+    def is_running(self):
+        return self._current is not None
+
+    def _on_page_ready(self, job, page):
+        job.pending.release()
+        if job is self._current:
+            self.page_loaded.emit(page)
+
+    def _on_job_done(self, job, total, error):
+        self._jobs.discard(job)
+        if job is not self._current:
+            return
+        self._current = None
+        if error:
+            self.failed.emit(error)
+        else:
+            self.finished.emit(total)
@@ -0,0 +1,79 @@
+from PyQt5.QtCore import QObject, QTimer
+
+from utils.search_index import NGramIndex
+from utils.tracing import span
+
+
+class TableSearchController(QObject):
+    """把搜索框、列式表格模型和 n-gram 索引连接起来
+
+    - 输入防抖：停止输入 delay_ms 毫秒后才执行查询
+    - 索引在界面空闲时分块建立，查询到来时若未建完则先补齐
+    - 新增/修改行时增量更新索引，不重建
+    """
+
+    def __init__(self, line_edit, model, fields, parent=None, delay_ms=150):
+        super().__init__(parent)
+        self.line_edit = line_edit
+        self.model = model
+        self.fields = fields  # 源数据行值 -> 参与搜索的字段序列
+        self.index = NGramIndex()
+        self._builder = None
+
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(delay_ms)
+        self._debounce.timeout.connect(self.apply_filter)
+
+        self._build_timer = QTimer(self)
+        self._build_timer.setInterval(0)
+        self._build_timer.timeout.connect(self._build_step)
+
+        line_edit.textChanged.connect(self._debounce.start)
+
+    def rebuild(self, rows):
+        """模型数据整体替换为 rows 后重建索引（空闲时分块进行）"""
+        fields = self.fields
+        items = ((i, fields(values)) for i, values in enumerate(rows))
+        self._builder = self.index.build_incrementally(items)
+        self._build_timer.start()
+        if self.line_edit.text():
+            self._debounce.start()
+
+    def row_changed(self, source_row):
+        """某行被新增或修改后增量更新索引"""
+        self.ensure_built()
+        self.index.add(source_row, self.fields(self.model.source_values(source_row)))
+        self._refresh()
+
+    def ensure_built(self):
+        """把尚未完成的分块建索引一次性做完"""
+        if self._builder is None:
+            return
+        for _ in self._builder:
+            pass
+        self._builder = None
+        self._build_timer.stop()
+
+    def apply_filter(self):
+        text = self.line_edit.text().strip()
+        if not text:
+            self.model.set_row_filter(None)
+            return
+        with span("search.filter") as s:
+            self.ensure_built()
+            rows = self.index.search(text)
+            rows.sort()  # 修改过的行在索引中排在后面，恢复表格顺序
+            self.model.set_row_filter(rows)
+            s.set(matches=len(rows))
+
+    def _refresh(self):
+        if self.line_edit.text().strip():
+            self.apply_filter()
+
+    def _build_step(self):
+        try:
+            next(self._builder)
+        except StopIteration:
+            self._builder = None
+            self._build_timer.stop()
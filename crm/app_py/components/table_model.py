@@ -0,0 +1,299 @@
+from array import array
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant
+
+
+class ObjectColumn:
+    """普通列：按行保存 Python 对象"""
+
+    def __init__(self, formatter=None):
+        self.values = []
+        self.formatter = formatter
+
+    def extend(self, values):
+        self.values.extend(values)
+
+    def set(self, row, value):
+        self.values[row] = value
+
+    def clear(self):
+        self.values = []
+
+    def __getitem__(self, row):
+        return self.values[row]
+
+    def __len__(self):
+        return len(self.values)
+
+    def text(self, row):
+        value = self[row]
+        if self.formatter is not None:
+            return self.formatter(value)
+        return "" if value is None else str(value)
+
+
+class IntColumn(ObjectColumn):
+    """整数列：保存在紧凑的 array 中，每行 8 字节"""
+
+    def __init__(self, formatter=None):
+        super().__init__(formatter)
+        self.values = array("q")
+
+    def clear(self):
+        self.values = array("q")
+
+
+class DictColumn(ObjectColumn):
+    """字典编码列：重复出现的值（名称、日期、类型）只保存一份，每行仅存 4 字节编码"""
+
+    def __init__(self, formatter=None):
+        super().__init__(formatter)
+        self.codes = array("i")
+        self.values = []
+        self._lookup = {}
+        self._texts = []
+
+    def extend(self, values):
+        lookup = self._lookup
+        codes = self.codes
+        for value in values:
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(self.values)
+                self.values.append(value)
+                self._texts.append(None)
+            codes.append(code)
+
+    def set(self, row, value):
+        code = self._lookup.get(value)
+        if code is None:
+            code = self._lookup[value] = len(self.values)
+            self.values.append(value)
+            self._texts.append(None)
+        self.codes[row] = code
+
+    def clear(self):
+        self.codes = array("i")
+        self.values = []
+        self._lookup = {}
+        self._texts = []
+
+    def __getitem__(self, row):
+        return self.values[self.codes[row]]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def text(self, row):
+        # 显示文本按字典项缓存，相同值只格式化一次
+        code = self.codes[row]
+        text = self._texts[code]
+        if text is None:
+            value = self.values[code]
+            if self.formatter is not None:
+                text = self.formatter(value)
+            else:
+                text = "" if value is None else str(value)
+            self._texts[code] = text
+        return text
+
+
+class ConstantColumn:
+    """常量列：每行显示相同文本（如"操作"列），不占用按行存储"""
+
+    def __init__(self, text):
+        self._text = text
+
+    def text(self, row):
+        return self._text
+
+
+class ColumnarTableModel(QAbstractTableModel):
+    """列式存储的表格模型
+
+    数据按列保存，视图只为可见区域调用 data()，不再为每个单元格创建
+    QTableWidgetItem。可通过 set_page_source 按需分页加载大结果集，
+    通过 set_row_filter 只显示指定的源数据行（用于搜索过滤）。
+    """
+
+    def __init__(self, headers, columns, parent=None):
+        super().__init__(parent)
+        self._headers = list(headers)
+        self._columns = list(columns)
+        # 需要写入数据的列（常量列不接收行数据）
+        self._data_columns = [c for c in self._columns if not isinstance(c, ConstantColumn)]
+        self._row_count = 0
+        self._pages = None
+        self._row_filter = None  # 可见行 -> 源数据行
+
+    # ---- Qt 接口 ----
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        if self._row_filter is not None:
+            return len(self._row_filter)
+        return self._row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            return self._columns[index.column()].text(self.source_row(index.row()))
+        return QVariant()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self._headers[section]
+        return super().headerData(section, orientation, role)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._pages is not None and self._row_filter is None
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._pages is None:
+            return
+        try:
+            page = next(self._pages)
+        except StopIteration:
+            self._pages = None
+            return
+        self.append_rows(page)
+
+    # ---- 数据操作 ----
+
+    def set_rows(self, rows):
+        """替换全部数据，rows 为按行的元组序列"""
+        self.beginResetModel()
+        self._pages = None
+        self._row_filter = None
+        self._clear()
+        self._extend(rows)
+        self.endResetModel()
+
+    def set_page_source(self, pages):
+        """设置分页数据源（产生行列表的迭代器），视图滚动到底部时按需加载"""
+        self.beginResetModel()
+        self._row_filter = None
+        self._clear()
+        self._pages = iter(pages)
+        self.endResetModel()
+        self.fetchMore()
+
+    def append_rows(self, rows):
+        """在末尾追加行（过滤状态下新行暂不显示，直到重新设置过滤）"""
+        if not rows:
+            return
+        if self._row_filter is not None:
+            self._extend(rows)
+            return
+        first = self._row_count
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._extend(rows)
+        self.endInsertRows()
+
+    def update_row(self, source_row, values):
+        """原地修改一行源数据"""
+        for column, value in zip(self._data_columns, values):
+            column.set(source_row, value)
+        if self._row_filter is None:
+            first = self.index(source_row, 0)
+            last = self.index(source_row, len(self._columns) - 1)
+        else:
+            first = self.index(0, 0)
+            last = self.index(self.rowCount() - 1, len(self._columns) - 1)
+        self.dataChanged.emit(first, last)
+
+    def set_row_filter(self, source_rows):
+        """只显示给定的源数据行（升序序列）；None 表示显示全部"""
+        self.beginResetModel()
+        self._row_filter = None if source_rows is None else array("i", source_rows)
+        self.endResetModel()
+
+    def source_row(self, row):
+        """可见行号 -> 源数据行号"""
+        if self._row_filter is not None:
+            return self._row_filter[row]
+        return row
+
+    def source_row_count(self):
+        return self._row_count
+
+    def source_values(self, source_row):
+        """返回某个源数据行的原始值（不含常量列）"""
+        return tuple(column[source_row] for column in self._data_columns)
+
+    def row_values(self, row):
+        """返回某个可见行的原始值（不含常量列）"""
+        return self.source_values(self.source_row(row))
+
+    def row_texts(self, row):
+        """返回某个可见行所有列的显示文本"""
+        row = self.source_row(row)
+        return [column.text(row) for column in self._columns]
+
+    def _clear(self):
+        for column in self._data_columns:
+            column.clear()
+        self._row_count = 0
+
+    def _extend(self, rows):
+        if not rows:
+            return
+        for column, values in zip(self._data_columns, zip(*rows)):
+            column.extend(values)
+        self._row_count = len(self._data_columns[0])
+
+
+class RowViewTableModel(QAbstractTableModel):
+    """按行号显示外部列式数据源的表格模型（不复制数据）
+
+    数据源提供 row(行号) 返回行视图，columns 为每列的 行视图 -> 显示文本
+    函数；set_source 设置数据源和要显示的行号序列（如 NumPy 数组）。
+    """
+
+    def __init__(self, headers, columns, parent=None):
+        super().__init__(parent)
+        self._headers = list(headers)
+        self._columns = list(columns)
+        self._source = None
+        self._rows = ()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            return self._columns[index.column()](self.row_view(index.row()))
+        return QVariant()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self._headers[section]
+        return super().headerData(section, orientation, role)
+
+    def set_source(self, source, rows):
+        """显示 source 中行号为 rows 的各行"""
+        self.beginResetModel()
+        self._source = source
+        self._rows = rows
+        self.endResetModel()
+
+    def row_view(self, row):
+        """某个可见行的行视图"""
+        return self._source.row(int(self._rows[row]))
+
+    def row_texts(self, row):
+        """返回某个可见行所有列的显示文本"""
+        view = self.row_view(row)
+        return [column(view) for column in self._columns]
@@ -0,0 +1,216 @@
+"""
+出库流水的列式分析引擎（NumPy）
+
+出库流水一次性读入四列 NumPy 数组（商家序号、货品序号、月份序号、数量），
+之后任意年份的"全部商家 × 12 个月"或"全部货品 × 12 个月"汇总都由一次
+np.bincount 分组求和得到，统计量（合计、月均、最高月、高峰月、大量进货
+月份）对整张矩阵按行向量化计算，不再逐个商家查询、逐月循环。
+
+流水从流水日志（transaction_log.py）的 mmap 视图中按列取出，不经过 sqlite3
+逐行读取。数据变化后调用 refresh()：日志只在末尾追加了记录时增量读取新增
+部分；日志因删除或修改流水而重建时整体重新读取。
+"""
+
+import threading
+
+import numpy as np
+
+from database.db_manager import get_database
+from database.repositories import TYPE_OUTBOUND
+from database.transaction_log import TYPE_CODES, transaction_log
+from utils.tracing import span
+
+
+# 月份超过该年月均值的倍数时视为"大量进货需求"月份
+HIGH_DEMAND_RATIO = 1.5
+
+MONTHS = 12
+
+OUTBOUND_CODE = TYPE_CODES.index(TYPE_OUTBOUND)
+
+
+def month_index(days):
+    """天数（自 1970-01-01 起）-> 月份序号（年 * 12 + 月 - 1），按天查表"""
+    if not len(days):
+        return np.zeros(0, dtype=np.int32)
+    first = int(days.min())
+    table = np.arange(first, int(days.max()) + 1).astype("datetime64[D]")
+    table = table.astype("datetime64[M]").astype(np.int32) + 1970 * MONTHS
+    return table[days - first]
+
+
+class MonthlyReport:
+    """一组对象（商家或货品）某年的 12 个月汇总及统计，均为按行对齐的数组
+
+    - ids：对象 id 列表，与各数组的行一一对应
+    - monthly：形状 (n, 12) 的各月数量
+    - total / average / peak：合计、月均、最高月数量
+    - peak_month：最高月的月份下标（0~11）
+    - high_demand：形状 (n, 12) 的布尔矩阵，标记远超月均值的月份
+    """
+
+    def __init__(self, ids, monthly):
+        self.ids = ids
+        self.monthly = monthly
+        self.total = monthly.sum(axis=1)
+        self.average = self.total / MONTHS
+        self.peak = monthly.max(axis=1) if len(ids) else np.zeros(0, dtype=np.int64)
+        self.peak_month = monthly.argmax(axis=1) if len(ids) else np.zeros(0, dtype=np.int64)
+        self.high_demand = (monthly > self.average[:, None] * HIGH_DEMAND_RATIO) & (monthly > 0)
+        self._row_of_id = None
+
+    def row(self, item_id):
+        """某个对象所在的行号，不存在时为 None"""
+        if self._row_of_id is None:
+            self._row_of_id = {item_id: i for i, item_id in enumerate(self.ids)}
+        return self._row_of_id.get(item_id)
+
+    @property
+    def nbytes(self):
+        """各数组占用的字节数（用于缓存的内存上限）"""
+        return sum(array.nbytes for array in (self.monthly, self.total, self.average, self.peak,
+                                              self.peak_month, self.high_demand))
+
+    def order_by_total(self):
+        """按合计从大到小排列的行号"""
+        return np.argsort(-self.total, kind="stable")
+
+
+class _Ledger:
+    """某一时刻读入的列式出库流水（读入后不再修改，可在线程间共享）
+
+    商家/货品序号即流水日志中的序号（按首次出现的顺序分配），没有商家的
+    出库记录商家序号为 -1。
+    """
+
+    def __init__(self, previous=None):
+        # 增量读取得到的快照与前一个快照 origin 相同（只在末尾追加了行）
+        self.origin = object() if previous is None else previous.origin
+        if previous is None:
+            self.merchant_ids = []
+            self.product_ids = []
+            self.merchant_index = {}
+            self.product_index = {}
+            self.merchant = np.zeros(0, dtype=np.int32)
+            self.product = np.zeros(0, dtype=np.int32)
+            self.month = np.zeros(0, dtype=np.int32)
+            self.quantity = np.zeros(0, dtype=np.int64)
+        else:
+            # 增量读取：在副本上追加，读取期间旧快照仍可使用
+            self.merchant_ids = list(previous.merchant_ids)
+            self.product_ids = list(previous.product_ids)
+            self.merchant_index = dict(previous.merchant_index)
+            self.product_index = dict(previous.product_index)
+            self.merchant = previous.merchant
+            self.product = previous.product
+            self.month = previous.month
+            self.quantity = previous.quantity
+
+    def load(self, view, start):
+        """从日志视图追加第 start 条之后的出库记录，返回追加的行数"""
+        for ids, index, source in ((self.merchant_ids, self.merchant_index, view.merchant_ids),
+                                   (self.product_ids, self.product_index, view.product_ids)):
+            for code in range(len(ids), len(source)):
+                index[source[code]] = code
+                ids.append(source[code])
+        records = view.records(start)
+        outbound = records["type"] == OUTBOUND_CODE
+        columns = (records["merchant"][outbound], records["product"][outbound],
+                   month_index(records["day"][outbound]),
+                   records["quantity"][outbound].astype(np.int64))
+        count = len(columns[0])
+        if count and len(self.month):
+            columns = [np.concatenate(parts) for parts in
+                       zip((self.merchant, self.product, self.month, self.quantity), columns)]
+        if count:
+            self.merchant, self.product, self.month, self.quantity = columns
+        return count
+
+    def monthly(self, keys, count, year, mask=None):
+        """按 keys 分组的某年 12 个月合计，形状 (count, 12)"""
+        first = int(year) * MONTHS
+        selected = (self.month >= first) & (self.month < first + MONTHS)
+        if mask is not None:
+            selected &= mask
+        bins = keys[selected].astype(np.int64) * MONTHS + (self.month[selected] - first)
+        totals = np.bincount(bins, weights=self.quantity[selected], minlength=count * MONTHS)
+        return totals.astype(np.int64).reshape(count, MONTHS)
+
+
+class AnalyticsEngine:
+    """列式出库流水及其分组汇总
+
+    refresh() 可在后台线程中调用，读完后整体替换快照；报表方法使用调用时的
+    快照，不会看到读取到一半的数据。没有商家的出库记录只计入货品汇总。
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.log = transaction_log(db)
+        self._lock = threading.Lock()  # 同一时刻只进行一次 refresh
+        self._state = None  # 上次读取时日志的 (epoch, 记录数)
+        self._ledger = _Ledger()
+
+    @property
+    def loaded(self):
+        return self._state is not None
+
+    def snapshot(self):
+        """当前的列式流水快照（只读）"""
+        return self._ledger
+
+    def refresh(self):
+        """与数据库同步，返回是否有变化"""
+        with self._lock:
+            with self.log.view() as view:
+                state = (view.epoch, view.count)
+                previous = self._state
+                if state == previous:
+                    return False
+                # 日志只在末尾追加时增量读取，重建过则整体重新读取
+                appended = previous is not None and previous[0] is view.epoch
+                ledger = _Ledger(self._ledger if appended else None)
+                with span("analytics.load", incremental=appended) as s:
+                    s.set(rows=ledger.load(view, previous[1] if appended else 0))
+            self._ledger = ledger
+            self._state = state
+            return True
+
+    def years(self):
+        """有出库记录的年份（降序）"""
+        month = self._ledger.month
+        if not len(month):
+            return []
+        first, last = int(month.min()) // MONTHS, int(month.max()) // MONTHS
+        return [str(year) for year in range(last, first - 1, -1)]
+
+    def merchant_report(self, year):
+        """全部商家某年的月度汇总与统计"""
+        ledger = self._ledger
+        with span("analytics.merchant_report", year=year):
+            monthly = ledger.monthly(ledger.merchant, len(ledger.merchant_ids), year,
+                                     mask=ledger.merchant >= 0)
+            return MonthlyReport(ledger.merchant_ids[:], monthly)
+
+    def product_report(self, year, merchant_id=None):
+        """全部货品某年的月度汇总与统计，可只统计某个商家"""
+        ledger = self._ledger
+        with span("analytics.product_report", year=year):
+            mask = None
+            if merchant_id is not None:
+                mask = ledger.merchant == ledger.merchant_index.get(merchant_id, -2)
+            monthly = ledger.monthly(ledger.product, len(ledger.product_ids), year, mask=mask)
+            return MonthlyReport(ledger.product_ids[:], monthly)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_analytics_engine():
+    """获取全局分析引擎（首次使用前需 refresh()）"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AnalyticsEngine(get_database())
+        return _engine
@@ -0,0 +1,216 @@
+"""
+多商家对比报告：所选商家某年 12 个月趋势的汇总、统计与排名
+
+在分析引擎的列式出库流水上，对所选商家一次分组求出今年和上一年的各月
+合计，再按矩阵计算合计、月均、最高月、同比增长和趋势斜率，按所选指标
+排名。
+
+流水行数很多且有多个 CPU 时，分组求和按行分段交给进程池：各列放入共享
+内存（每个流水快照只复制一次），子进程直接映射共享内存按自己的行段
+np.bincount，主进程把各段结果相加；行数不多时在本进程内计算，省去进程
+间调度的开销。
+"""
+
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from database.analytics import MONTHS, MonthlyReport, get_analytics_engine
+from utils.tracing import span
+
+
+# 流水行数达到该值且有多个 CPU 时才使用进程池
+PARALLEL_MIN_ROWS = 2_000_000
+
+# 每个进程分到的行段数（略多于进程数，各段耗时不均时负载更均衡）
+CHUNKS_PER_WORKER = 2
+
+# 排名指标：键 -> (显示名称, ComparisonReport 上的属性)
+RANK_METRICS = {
+    "total": ("总采购量", "total"),
+    "growth": ("同比增长", "growth"),
+    "trend": ("月度趋势", "slope"),
+    "peak": ("最高月采购", "peak"),
+}
+
+# 共享内存中的流水列
+_SHARED_COLUMNS = (("merchant", np.int32), ("month", np.int32), ("quantity", np.int64))
+
+
+class ComparisonReport(MonthlyReport):
+    """所选商家某年的月度汇总及对比指标（在 MonthlyReport 的基础上）
+
+    - previous_total：上一年合计
+    - growth：同比增长比例，上一年没有出库时为 nan
+    - slope：12 个月的线性趋势（每月增减的箱数，最小二乘）
+    """
+
+    def __init__(self, ids, monthly, previous_total):
+        super().__init__(ids, monthly)
+        self.previous_total = previous_total
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.growth = np.where(previous_total > 0,
+                                   (self.total - previous_total) / previous_total, np.nan)
+        x = np.arange(MONTHS) - (MONTHS - 1) / 2
+        self.slope = monthly @ x / (x @ x)
+
+    def order_by(self, metric):
+        """按指标从大到小排列的行号（没有同比数据的排在最后）"""
+        values = getattr(self, RANK_METRICS[metric][1]).astype(np.float64)
+        return np.argsort(-np.nan_to_num(values, nan=-np.inf), kind="stable")
+
+
+def _partial_monthly(columns, start, end, lookup, first, count):
+    """流水第 start~end 行中所选商家在 [first, first + 24) 各月的合计，形状 (count, 24)
+
+    lookup 为商家序号 -> 所选商家中的位置（未选中为 -1）。
+    """
+    merchant = columns["merchant"][start:end]
+    month = columns["month"][start:end] - first
+    selected = (merchant >= 0) & (month >= 0) & (month < 2 * MONTHS)
+    slot = lookup[merchant[selected]]
+    keep = slot >= 0
+    bins = slot[keep].astype(np.int64) * (2 * MONTHS) + month[selected][keep]
+    totals = np.bincount(bins, weights=columns["quantity"][start:end][selected][keep],
+                         minlength=count * 2 * MONTHS)
+    return totals.reshape(count, 2 * MONTHS)
+
+
+# ---- 子进程 ----
+
+_attached = {}  # 共享内存名称 -> ([SharedMemory], {列名: 数组})
+
+
+def _worker_partial(names, rows, start, end, lookup, first, count):
+    """子进程入口：映射共享内存中的流水列（同一快照只映射一次）后分组求和"""
+    key = tuple(names)
+    columns = _attached.get(key)
+    if columns is None:
+        for blocks, _ in _attached.values():
+            for block in blocks:
+                block.close()
+        _attached.clear()
+        blocks = [shared_memory.SharedMemory(name=name) for name in names]
+        columns = (blocks, {column: np.ndarray(rows, dtype=dtype, buffer=block.buf)
+                            for (column, dtype), block in zip(_SHARED_COLUMNS, blocks)})
+        _attached[key] = columns
+    return _partial_monthly(columns[1], start, end, lookup, first, count)
+
+
+# ---- 主进程 ----
+
+class _SharedLedger:
+    """一个流水快照的各列在共享内存中的副本"""
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+        self.rows = len(ledger.month)
+        self.blocks = []
+        try:
+            for column, dtype in _SHARED_COLUMNS:
+                source = getattr(ledger, column)
+                block = shared_memory.SharedMemory(create=True,
+                                                   size=max(source.nbytes, 1))
+                self.blocks.append(block)
+                np.ndarray(self.rows, dtype=dtype, buffer=block.buf)[:] = source
+        except BaseException:
+            self.release()
+            raise
+
+    @property
+    def names(self):
+        return [block.name for block in self.blocks]
+
+    def release(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+class MerchantComparison:
+    """多商家对比（使用分析引擎的流水快照，调用前需 engine.refresh()）
+
+    workers 为进程数，默认取 CPU 数；为 1 时总在本进程内计算。
+    """
+
+    def __init__(self, engine, workers=None, parallel_min_rows=PARALLEL_MIN_ROWS):
+        self.engine = engine
+        self.workers = workers or os.cpu_count() or 1
+        self.parallel_min_rows = parallel_min_rows
+        self._lock = threading.Lock()
+        self._pool = None
+        self._shared = None
+
+    def compare(self, merchant_ids, year):
+        """所选商家某年的对比报告，商家顺序与 merchant_ids 一致"""
+        ledger = self.engine.snapshot()
+        year = int(year)
+        index = ledger.merchant_index
+        lookup = np.full(len(ledger.merchant_ids), -1, dtype=np.int64)
+        for slot, merchant_id in enumerate(merchant_ids):
+            code = index.get(merchant_id)
+            if code is not None:
+                lookup[code] = slot
+        count = len(merchant_ids)
+        first = (year - 1) * MONTHS  # 上一年 1 月起的 24 个月
+        rows = len(ledger.month)
+        parallel = self.workers > 1 and rows >= self.parallel_min_rows
+        with span("analysis.compare", merchants=count, parallel=parallel):
+            if parallel:
+                totals = self._parallel(ledger, lookup, first, count)
+            else:
+                columns = {column: getattr(ledger, column) for column, _ in _SHARED_COLUMNS}
+                totals = _partial_monthly(columns, 0, rows, lookup, first, count)
+            totals = totals.astype(np.int64)
+            return ComparisonReport(list(merchant_ids), totals[:, MONTHS:],
+                                    totals[:, :MONTHS].sum(axis=1))
+
+    def _parallel(self, ledger, lookup, first, count):
+        with self._lock:
+            if self._shared is None or self._shared.ledger is not ledger:
+                if self._shared is not None:
+                    self._shared.release()
+                self._shared = _SharedLedger(ledger)
+            if self._pool is None:
+                # 界面进程中有多个线程，子进程用 spawn 启动而不是 fork（与 Windows 一致）
+                self._pool = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn"))
+            shared = self._shared
+            pool = self._pool
+            bounds = np.linspace(0, shared.rows, self.workers * CHUNKS_PER_WORKER + 1).astype(int)
+            futures = [pool.submit(_worker_partial, shared.names, shared.rows, int(start), int(end),
+                                   lookup, first, count)
+                       for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+            # 共享内存在各段完成前不能释放，因此在锁内等待
+            return sum((future.result() for future in futures),
+                       np.zeros((count, 2 * MONTHS)))
+
+    def close(self):
+        """关闭进程池并释放共享内存"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+            if self._shared is not None:
+                self._shared.release()
+                self._shared = None
+
+
+_comparison = None
+_comparison_lock = threading.Lock()
+
+
+def get_merchant_comparison():
+    """获取全局多商家对比（使用全局分析引擎），程序退出时关闭进程池"""
+    global _comparison
+    with _comparison_lock:
+        if _comparison is None:
+            _comparison = MerchantComparison(get_analytics_engine())
+            atexit.register(_comparison.close)
+        return _comparison
@@ -0,0 +1,550 @@
+import itertools
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+
+# 与 crm/website/prisma/migrations 中的表结构保持一致
+# products.sku 为桌面端扩展字段（网站端以 specification 表示规格）
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS "products" (
+    "id" TEXT NOT NULL PRIMARY KEY,
+    "name" TEXT NOT NULL,
+    "specification" TEXT,
+    "unit" TEXT NOT NULL DEFAULT '个',
+    "currentStock" INTEGER NOT NULL DEFAULT 0,
+    "imageUrl" TEXT,
+    "createdAt" DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updatedAt" DATETIME NOT NULL,
+    "sku" TEXT
+);
+
+CREATE TABLE IF NOT EXISTS "merchants" (
+    "id" TEXT NOT NULL PRIMARY KEY,
+    "name" TEXT NOT NULL,
+    "contact" TEXT,
+    "phone" TEXT,
+    "address" TEXT,
+    "createdAt" DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updatedAt" DATETIME NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS "transactions" (
+    "id" TEXT NOT NULL PRIMARY KEY,
+    "productId" TEXT NOT NULL,
+    "merchantId" TEXT,
+    "type" TEXT NOT NULL,
+    "quantity" INTEGER NOT NULL,
+    "date" DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "notes" TEXT,
+    "createdAt" DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT "transactions_productId_fkey" FOREIGN KEY ("productId") REFERENCES "products" ("id") ON DELETE CASCADE ON UPDATE CASCADE,
+    CONSTRAINT "transactions_merchantId_fkey" FOREIGN KEY ("merchantId") REFERENCES "merchants" ("id") ON DELETE SET NULL ON UPDATE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS "transactions_date_id_idx" ON "transactions"("date", "id");
+CREATE INDEX IF NOT EXISTS "transactions_productId_date_idx" ON "transactions"("productId", "date");
+CREATE INDEX IF NOT EXISTS "transactions_merchantId_date_idx" ON "transactions"("merchantId", "date");
+CREATE INDEX IF NOT EXISTS "products_name_idx" ON "products"("name");
+CREATE INDEX IF NOT EXISTS "merchants_name_idx" ON "merchants"("name");
+"""
+
+# 由出库记录汇总的商家×月份×货品出库量，随每次出库在同一事务中增量更新。
+# 主键以 (商家, 年月) 开头，按年份查询只扫描该年的汇总行，与流水总量无关。
+FILL_OUTBOUND_ROLLUP_SQL = """
+INSERT INTO "merchant_monthly_outbound" ("merchantId", "yearMonth", "productId", "quantity")
+SELECT "merchantId", substr("date", 1, 7), "productId", SUM("quantity")
+FROM "transactions"
+WHERE "type" = 'OUTBOUND' AND "merchantId" IS NOT NULL
+GROUP BY "merchantId", substr("date", 1, 7), "productId"
+"""
+
+ROLLUP_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS "merchant_monthly_outbound" (
+    "merchantId" TEXT NOT NULL,
+    "yearMonth" TEXT NOT NULL,
+    "productId" TEXT NOT NULL,
+    "quantity" INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY ("merchantId", "yearMonth", "productId")
+) WITHOUT ROWID;
+""" + FILL_OUTBOUND_ROLLUP_SQL + ";"
+
+# 记录查询按货品/商家筛选时同样以 (date, id) 排序分页，索引带上 id 后
+# 可直接按索引顺序读取，无需对整个日期范围的结果排序
+RECORD_FILTER_INDEX_SQL = """
+DROP INDEX IF EXISTS "transactions_productId_date_idx";
+DROP INDEX IF EXISTS "transactions_merchantId_date_idx";
+CREATE INDEX IF NOT EXISTS "transactions_productId_date_id_idx" ON "transactions"("productId", "date", "id");
+CREATE INDEX IF NOT EXISTS "transactions_merchantId_date_id_idx" ON "transactions"("merchantId", "date", "id");
+"""
+
+# 大批量写入前暂时删除的索引定义，写完（或异常退出后下次打开数据库时）据此重建
+DEFERRED_INDEXES_SQL = """
+CREATE TABLE IF NOT EXISTS "deferred_indexes" (
+    "name" TEXT NOT NULL PRIMARY KEY,
+    "sql" TEXT NOT NULL
+);
+"""
+
+# 每个货品每月月初（该月第一笔流水之前）的库存快照，及已生成快照的月份。
+# 快照由 StockHistory.checkpoint() 按月补齐；补记的历史流水在同一事务中
+# 修正其后各月的快照，查询某日库存只需从最近的快照重放之后的流水。
+STOCK_SNAPSHOT_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS "stock_snapshots" (
+    "productId" TEXT NOT NULL,
+    "month" TEXT NOT NULL,
+    "stock" INTEGER NOT NULL,
+    PRIMARY KEY ("productId", "month")
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS "stock_checkpoints" (
+    "month" TEXT NOT NULL PRIMARY KEY,
+    "createdAt" DATETIME NOT NULL
+);
+"""
+
+# 流水日志（transaction_log.py）的版本：流水被删除或修改时加一，日志据此重建。
+# 删除货品级联删除流水、删除商家清空流水的商家，同样会触发
+TRANSACTION_LOG_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS "transaction_log_state" (
+    "id" INTEGER NOT NULL PRIMARY KEY CHECK ("id" = 0),
+    "generation" INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO "transaction_log_state" ("id", "generation") VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS "transactions_log_delete" AFTER DELETE ON "transactions"
+BEGIN
+    UPDATE "transaction_log_state" SET "generation" = "generation" + 1 WHERE "id" = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS "transactions_log_update" AFTER UPDATE ON "transactions"
+BEGIN
+    UPDATE "transaction_log_state" SET "generation" = "generation" + 1 WHERE "id" = 0;
+END;
+"""
+
+# 与网站增量同步（sync.py）的状态：每个远端、每种数据拉取和推送的高水位，
+# 以及拉取写入的行（推送时跳过，不回传给远端）。按修改时间读取变化的行
+# 需要 (时间, id) 索引。
+SYNC_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS "sync_state" (
+    "remote" TEXT NOT NULL,
+    "entity" TEXT NOT NULL,
+    "direction" TEXT NOT NULL,
+    "stamp" TEXT NOT NULL,
+    "lastId" TEXT NOT NULL,
+    "updatedAt" DATETIME NOT NULL,
+    PRIMARY KEY ("remote", "entity", "direction")
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS "sync_pulled" (
+    "remote" TEXT NOT NULL,
+    "entity" TEXT NOT NULL,
+    "id" TEXT NOT NULL,
+    "stamp" TEXT NOT NULL,
+    "opening" TEXT,
+    PRIMARY KEY ("remote", "entity", "id")
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS "products_updatedAt_id_idx" ON "products"("updatedAt", "id");
+CREATE INDEX IF NOT EXISTS "merchants_updatedAt_id_idx" ON "merchants"("updatedAt", "id");
+CREATE INDEX IF NOT EXISTS "transactions_createdAt_id_idx" ON "transactions"("createdAt", "id");
+"""
+
+# 离线发件箱（outbox.py）：界面上的修改与本地写入在同一事务中记入，由后台
+# 按写入顺序（seq）补发到同步服务器，发送成功后删除。key 为幂等键
+OUTBOX_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS "sync_outbox" (
+    "seq" INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    "key" TEXT NOT NULL UNIQUE,
+    "entity" TEXT NOT NULL,
+    "entityId" TEXT NOT NULL,
+    "createdAt" DATETIME NOT NULL
+);
+"""
+
+# 默认补货点：货品未单独设置补货点（reorder_points）时，库存不高于该值计为低库存
+LOW_STOCK_THRESHOLD = 10
+
+# 首页指标的计数表，读取只需主键查找，与流水总量无关：
+# - inventory_totals：货品数、总库存、低库存货品数，由 products 上的触发器维护
+#   （每次出入库只更新一行货品，触发器的开销可以忽略）
+# - daily_totals：每天入库、出库的数量和笔数
+# - merchant_month_totals：商家每月出库量
+# 后两者与月度汇总一样在写入流水的同一事务中累加（逐行触发器会使批量导入
+# 慢一倍），成批生成数据后逐条执行 FILL_DASHBOARD_TOTALS 重新汇总
+FILL_DASHBOARD_TOTALS = (
+    'DELETE FROM "daily_totals"',
+    'INSERT INTO "daily_totals" ("day", "type", "quantity", "count") '
+    'SELECT substr("date", 1, 10), "type", SUM("quantity"), COUNT(*) '
+    'FROM "transactions" GROUP BY substr("date", 1, 10), "type"',
+    'DELETE FROM "merchant_month_totals"',
+    'INSERT INTO "merchant_month_totals" ("yearMonth", "merchantId", "quantity") '
+    'SELECT "yearMonth", "merchantId", SUM("quantity") '
+    'FROM "merchant_monthly_outbound" GROUP BY "yearMonth", "merchantId"',
+)
+
+DASHBOARD_SCHEMA_SQL = f"""
+CREATE TABLE IF NOT EXISTS "inventory_totals" (
+    "id" INTEGER NOT NULL PRIMARY KEY CHECK ("id" = 0),
+    "productCount" INTEGER NOT NULL,
+    "totalStock" INTEGER NOT NULL,
+    "lowStockCount" INTEGER NOT NULL
+);
+INSERT OR REPLACE INTO "inventory_totals" ("id", "productCount", "totalStock", "lowStockCount")
+SELECT 0, COUNT(*), IFNULL(SUM("currentStock"), 0),
+       IFNULL(SUM("currentStock" <= {LOW_STOCK_THRESHOLD}), 0)
+FROM "products";
+CREATE TRIGGER IF NOT EXISTS "products_totals_insert" AFTER INSERT ON "products"
+BEGIN
+    UPDATE "inventory_totals" SET "productCount" = "productCount" + 1,
+        "totalStock" = "totalStock" + NEW."currentStock",
+        "lowStockCount" = "lowStockCount" + (NEW."currentStock" <= {LOW_STOCK_THRESHOLD})
+    WHERE "id" = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS "products_totals_delete" AFTER DELETE ON "products"
+BEGIN
+    UPDATE "inventory_totals" SET "productCount" = "productCount" - 1,
+        "totalStock" = "totalStock" - OLD."currentStock",
+        "lowStockCount" = "lowStockCount" - (OLD."currentStock" <= {LOW_STOCK_THRESHOLD})
+    WHERE "id" = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS "products_totals_update" AFTER UPDATE OF "currentStock" ON "products"
+BEGIN
+    UPDATE "inventory_totals" SET
+        "totalStock" = "totalStock" + NEW."currentStock" - OLD."currentStock",
+        "lowStockCount" = "lowStockCount" + (NEW."currentStock" <= {LOW_STOCK_THRESHOLD})
+                                          - (OLD."currentStock" <= {LOW_STOCK_THRESHOLD})
+    WHERE "id" = 0;
+END;
+CREATE TABLE IF NOT EXISTS "daily_totals" (
+    "day" TEXT NOT NULL,
+    "type" TEXT NOT NULL,
+    "quantity" INTEGER NOT NULL,
+    "count" INTEGER NOT NULL,
+    PRIMARY KEY ("day", "type")
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS "merchant_month_totals" (
+    "yearMonth" TEXT NOT NULL,
+    "merchantId" TEXT NOT NULL,
+    "quantity" INTEGER NOT NULL,
+    PRIMARY KEY ("yearMonth", "merchantId")
+) WITHOUT ROWID;
+""" + ";\n".join(FILL_DASHBOARD_TOTALS) + ";"
+
+
+def _reorder_point(row):
+    """触发器中某行货品的补货点（row 为 NEW 或 OLD）"""
+    return (f'IFNULL((SELECT "reorderPoint" FROM "reorder_points" '
+            f'WHERE "productId" = {row}."id"), {LOW_STOCK_THRESHOLD})')
+
+
+# 各货品的补货点（库存预警 stock_alerts.py）。低库存货品数改为按各自的补货点
+# 统计：货品表的触发器查找补货点，修改补货点时同样调整计数；删除货品时
+# 一并删除其补货点（此时货品已不存在，补货点表的触发器不再调整计数）
+REORDER_POINT_SCHEMA_SQL = f"""
+CREATE TABLE IF NOT EXISTS "reorder_points" (
+    "productId" TEXT NOT NULL PRIMARY KEY,
+    "reorderPoint" INTEGER NOT NULL,
+    "updatedAt" DATETIME NOT NULL
+) WITHOUT ROWID;
+DROP TRIGGER IF EXISTS "products_totals_insert";
+DROP TRIGGER IF EXISTS "products_totals_delete";
+DROP TRIGGER IF EXISTS "products_totals_update";
+CREATE TRIGGER "products_totals_insert" AFTER INSERT ON "products"
+BEGIN
+    UPDATE "inventory_totals" SET "productCount" = "productCount" + 1,
+        "totalStock" = "totalStock" + NEW."currentStock",
+        "lowStockCount" = "lowStockCount" + (NEW."currentStock" <= {_reorder_point("NEW")})
+    WHERE "id" = 0;
+END;
+CREATE TRIGGER "products_totals_delete" AFTER DELETE ON "products"
+BEGIN
+    UPDATE "inventory_totals" SET "productCount" = "productCount" - 1,
+        "totalStock" = "totalStock" - OLD."currentStock",
+        "lowStockCount" = "lowStockCount" - (OLD."currentStock" <= {_reorder_point("OLD")})
+    WHERE "id" = 0;
+    DELETE FROM "reorder_points" WHERE "productId" = OLD."id";
+END;
+CREATE TRIGGER "products_totals_update" AFTER UPDATE OF "currentStock" ON "products"
+BEGIN
+    UPDATE "inventory_totals" SET
+        "totalStock" = "totalStock" + NEW."currentStock" - OLD."currentStock",
+        "lowStockCount" = "lowStockCount" + (NEW."currentStock" <= {_reorder_point("NEW")})
+                                          - (OLD."currentStock" <= {_reorder_point("OLD")})
+    WHERE "id" = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS "reorder_points_insert" AFTER INSERT ON "reorder_points"
+BEGIN
+    UPDATE "inventory_totals" SET "lowStockCount" = "lowStockCount" + IFNULL((
+        SELECT ("currentStock" <= NEW."reorderPoint") - ("currentStock" <= {LOW_STOCK_THRESHOLD})
+        FROM "products" WHERE "id" = NEW."productId"), 0)
+    WHERE "id" = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS "reorder_points_update" AFTER UPDATE OF "reorderPoint" ON "reorder_points"
+BEGIN
+    UPDATE "inventory_totals" SET "lowStockCount" = "lowStockCount" + IFNULL((
+        SELECT ("currentStock" <= NEW."reorderPoint") - ("currentStock" <= OLD."reorderPoint")
+        FROM "products" WHERE "id" = NEW."productId"), 0)
+    WHERE "id" = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS "reorder_points_delete" AFTER DELETE ON "reorder_points"
+BEGIN
+    UPDATE "inventory_totals" SET "lowStockCount" = "lowStockCount" + IFNULL((
+        SELECT ("currentStock" <= {LOW_STOCK_THRESHOLD}) - ("currentStock" <= OLD."reorderPoint")
+        FROM "products" WHERE "id" = OLD."productId"), 0)
+    WHERE "id" = 0;
+END;
+"""
+
+# 增量迁移：(版本号, SQL)，按 PRAGMA user_version 依次执行
+MIGRATIONS = [
+    (1, SCHEMA_SQL),
+    (2, ROLLUP_SCHEMA_SQL),
+    (3, RECORD_FILTER_INDEX_SQL),
+    (4, DEFERRED_INDEXES_SQL),
+    (5, STOCK_SNAPSHOT_SCHEMA_SQL),
+    (6, TRANSACTION_LOG_SCHEMA_SQL),
+    (7, SYNC_SCHEMA_SQL),
+    (8, OUTBOX_SCHEMA_SQL),
+    (9, DASHBOARD_SCHEMA_SQL),
+    (10, REORDER_POINT_SCHEMA_SQL),
+]
+
+# 每个连接缓存的预编译语句数量
+STATEMENT_CACHE_SIZE = 256
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def new_id():
+    """生成与 cuid 等长的主键"""
+    return "c" + uuid.uuid4().hex[:24]
+
+
+def new_id_sequence():
+    """批量写入用的主键序列：毫秒时间 + 随机数前缀，后接递增计数，与 new_id 等长
+
+    同一序列生成的主键按顺序递增，大批量插入时主键索引只在一处追加，
+    不像随机主键那样分散写入整个索引。
+    """
+    prefix = f"c{int(time.time() * 1000):011x}{random.getrandbits(16):04x}"
+    return (f"{prefix}{i:09x}" for i in itertools.count())
+
+
+def now_str():
+    """当前时间字符串（与数据库中的 DATETIME 格式一致）"""
+    return datetime.now().strftime(DATE_FORMAT)
+
+
+def default_db_path():
+    """默认数据库文件路径，可通过 MINICRM_DB 环境变量覆盖"""
+    path = os.environ.get("MINICRM_DB")
+    if path:
+        return path
+    return os.path.join(os.path.expanduser("~"), ".minicrm", "minicrm.db")
+
+
+class Database:
+    """SQLite 数据库管理器
+
+    使用 WAL 模式：一个写连接（由锁串行化）加一个只读连接池，
+    UI 线程上的读取不会被后台写入阻塞。
+    """
+
+    def __init__(self, path, pool_size=4):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._write_lock = threading.RLock()
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        # 写连接每次提交都同步落盘，开销由 TransactionWriter 的组提交摊薄
+        self._writer.execute("PRAGMA synchronous=FULL")
+        self._migrate()
+        self.restore_indexes()
+
+        self._pool_size = pool_size
+        self._readers = queue.LifoQueue()
+        self._reader_count = 0
+        self._pool_lock = threading.Lock()
+        self._closed = False
+
+    def _migrate(self):
+        """执行尚未应用的迁移，每个版本在一个事务中完成"""
+        version = self._writer.execute("PRAGMA user_version").fetchone()[0]
+        for target, sql in MIGRATIONS:
+            if version < target:
+                self._writer.executescript(
+                    f"BEGIN IMMEDIATE;\n{sql}\nPRAGMA user_version = {target};\nCOMMIT;")
+
+    def drop_indexes(self, table):
+        """暂时删除 table 的二级索引，用于大批量写入，返回删除的个数
+
+        索引定义与删除在同一事务中记入 deferred_indexes，写完后调用
+        restore_indexes() 一次性重建（排序建索引比逐行维护快得多）；
+        若中途异常退出，下次打开数据库时自动重建。
+        """
+        with self.transaction() as conn:
+            indexes = conn.execute(
+                "SELECT name, sql FROM sqlite_master "
+                "WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)).fetchall()
+            for name, sql in indexes:
+                conn.execute('INSERT OR REPLACE INTO "deferred_indexes" ("name", "sql") VALUES (?, ?)',
+                             (name, sql))
+                conn.execute(f'DROP INDEX "{name}"')
+        return len(indexes)
+
+    def restore_indexes(self):
+        """重建 drop_indexes() 删除的索引"""
+        with self._write_lock:
+            if not self._writer.execute('SELECT 1 FROM "deferred_indexes" LIMIT 1').fetchone():
+                return
+        with self.transaction() as conn:
+            for name, sql in conn.execute('SELECT "name", "sql" FROM "deferred_indexes"').fetchall():
+                exists = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone()
+                if not exists:
+                    conn.execute(sql)
+            conn.execute('DELETE FROM "deferred_indexes"')
+
+    def _connect(self, readonly=False):
+        """创建并配置一个连接"""
+        conn = sqlite3.connect(
+            self.path,
+            isolation_level=None,  # 手动控制事务
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-16000")
+        if readonly:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def _acquire_reader(self):
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            if self._reader_count < self._pool_size:
+                self._reader_count += 1
+                return self._connect(readonly=True)
+        # 连接池已满，等待归还
+        return self._readers.get()
+
+    @contextmanager
+    def reader(self):
+        """从连接池借出一个只读连接"""
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        """在写连接上开启一个立即事务，正常退出时提交，异常或提交失败时回滚"""
+        with self._write_lock:
+            conn = self._writer
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                # 提交失败（如 SQLITE_BUSY、磁盘错误）时同样回滚，写连接不留在事务中
+                conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        """关闭所有连接"""
+        if self._closed:
+            return
+        self._closed = True
+        with self._write_lock:
+            self._writer.close()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def get_database():
+    """获取全局数据库实例（首次创建时写入示例数据）"""
+    global _database
+    with _database_lock:
+        if _database is None:
+            _database = Database(default_db_path())
+            seed_sample_data(_database)
+        return _database
+
+
+def seed_sample_data(db):
+    """空库时写入与原界面一致的示例数据"""
+    with db.reader() as conn:
+        if conn.execute('SELECT 1 FROM "products" LIMIT 1').fetchone():
+            return
+
+    now = now_str()
+    products = [
+        ("苹果", "APP001", 100, "箱"),
+        ("香蕉", "BAN001", 50, "箱"),
+        ("橙子", "ORA001", 80, "箱"),
+        ("葡萄", "GRA001", 30, "箱"),
+        ("草莓", "STR001", 20, "盒"),
+    ]
+    merchants = [
+        ("超市A", "张三", "13800138001"),
+        ("超市B", "李四", "13800138002"),
+        ("超市C", "王五", "13800138003"),
+        ("便利店D", "赵六", "13800138004"),
+        ("商场E", "钱七", "13800138005"),
+    ]
+    transactions = [
+        ("2024-01-15", "苹果", "OUTBOUND", 10, "超市A", "正常销售"),
+        ("2024-01-14", "香蕉", "INBOUND", 20, None, "新到货"),
+        ("2024-01-13", "橙子", "OUTBOUND", 5, "超市B", "促销活动"),
+        ("2024-01-12", "葡萄", "INBOUND", 15, None, "补货"),
+        ("2024-01-11", "草莓", "OUTBOUND", 3, "便利店D", "日常销售"),
+    ]
+
+    product_ids = {name: new_id() for name, _, _, _ in products}
+    merchant_ids = {name: new_id() for name, _, _ in merchants}
+
+    with db.transaction() as conn:
+        conn.executemany(
+            'INSERT INTO "products" ("id", "name", "sku", "currentStock", "unit", "createdAt", "updatedAt") '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(product_ids[name], name, sku, stock, unit, now, now)
+             for name, sku, stock, unit in products],
+        )
+        conn.executemany(
+            'INSERT INTO "merchants" ("id", "name", "contact", "phone", "createdAt", "updatedAt") '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [(merchant_ids[name], name, contact, phone, now, now)
+             for name, contact, phone in merchants],
+        )
+        conn.executemany(
+            'INSERT INTO "transactions" ("id", "productId", "merchantId", "type", "quantity", "date", "notes", "createdAt") '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(new_id(), product_ids[product], merchant_ids.get(merchant), tx_type, quantity,
+              f"{date} 00:00:00", notes, now)
+             for date, product, tx_type, quantity, merchant, notes in transactions],
+        )
+        conn.execute(FILL_OUTBOUND_ROLLUP_SQL)
+        for sql in FILL_DASHBOARD_TOTALS:
+            conn.execute(sql)
@@ -0,0 +1,123 @@
+"""
+流式导出：把出入库记录查询结果写成 CSV / XLSX
+
+- 按 (date, id) 键集分页从数据库逐页读出，每页写完即丢弃，内存占用与
+  导出行数无关；不经过界面表格
+- CSV 使用带 BOM 的 UTF-8，Excel 可直接打开；表头与导入格式一致，
+  导出的文件可以再导入
+- XLSX 需要 openpyxl，以只写模式逐行写出；超过单个工作表的行数上限时
+  自动续写到下一个工作表
+- 先写入临时文件，完成后再改名；取消或出错时删除临时文件，不留下
+  不完整的导出文件
+"""
+
+import csv
+import os
+from datetime import date
+
+from database.repositories import TransactionRepository, TYPE_LABELS
+
+try:
+    import openpyxl
+    OPENPYXL_AVAILABLE = True
+except ImportError:
+    openpyxl = None
+    OPENPYXL_AVAILABLE = False
+
+
+HEADER = ["日期", "货品", "类型", "数量", "商家", "备注"]
+
+# 每页读取的记录数
+PAGE_SIZE = 5000
+
+# Excel 单个工作表最多 1048576 行（含表头）
+XLSX_MAX_ROWS = 1048575
+
+
+class ExportCancelled(Exception):
+    """导出被取消"""
+
+
+class RecordExporter:
+    """出入库记录导出器，可在后台线程中运行
+
+    progress(已导出行数, 完成比例 0~1) 每写完一页调用一次（在导出线程中），
+    完成比例按已导出到的日期估算（记录按日期倒序读出），不额外执行 COUNT；
+    cancelled() 返回 True 时停止导出并抛出 ExportCancelled。
+    """
+
+    def __init__(self, db, progress=None, cancelled=None):
+        self.transactions = TransactionRepository(db)
+        self.progress = progress
+        self.cancelled = cancelled
+
+    def export(self, path, start_date, end_date, product_id=None, merchant_id=None,
+               tx_type=None):
+        """导出 start_date ~ end_date（yyyy-MM-dd，含结束当天）的记录，返回导出行数"""
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".xlsx":
+            if not OPENPYXL_AVAILABLE:
+                raise RuntimeError("导出 XLSX 需要安装 openpyxl（pip install openpyxl），或导出为 CSV")
+            write = _write_xlsx
+        else:
+            write = _write_csv
+        pages = self.transactions.iter_pages(start_date, end_date, page_size=PAGE_SIZE,
+                                             product_id=product_id, merchant_id=merchant_id,
+                                             tx_type=tx_type)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            count = write(tmp_path, self._rows(pages, start_date, end_date))
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return count
+
+    def _rows(self, pages, start_date, end_date):
+        """逐页产出导出用的行，每页之后报告进度并检查是否取消"""
+        first = date.fromisoformat(start_date).toordinal()
+        span_days = date.fromisoformat(end_date).toordinal() - first + 1
+        labels = TYPE_LABELS
+        count = 0
+        for page in pages:
+            for tx_date, product, tx_type, quantity, merchant, notes in page:
+                yield (tx_date, product, labels.get(tx_type, tx_type), quantity,
+                       merchant or "", notes or "")
+            count += len(page)
+            if self.cancelled is not None and self.cancelled():
+                raise ExportCancelled()
+            if self.progress is not None:
+                reached = date.fromisoformat(page[-1][0][:10]).toordinal()
+                self.progress(count, min(max(1 - (reached - first) / span_days, 0.0), 1.0))
+
+
+def _write_csv(path, rows):
+    count = 0
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def _write_xlsx(path, rows):
+    # 只写模式：行在写出时即序列化到临时文件，不在内存中保留单元格对象
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = None
+    sheet_rows = XLSX_MAX_ROWS
+    count = 0
+    for row in rows:
+        if sheet_rows >= XLSX_MAX_ROWS:
+            title = "出入库记录" if sheet is None else f"出入库记录{len(workbook.worksheets) + 1}"
+            sheet = workbook.create_sheet(title)
+            sheet.append(HEADER)
+            sheet_rows = 0
+        sheet.append(row)
+        sheet_rows += 1
+        count += 1
+    if sheet is None:
+        workbook.create_sheet("出入库记录").append(HEADER)
+    workbook.save(path)
+    return count
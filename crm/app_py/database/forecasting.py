@@ -0,0 +1,320 @@
+"""
+出库需求预测：按商家×货品的月度序列批量拟合
+
+对每个商家×货品（以及每个商家的合计）的月度出库序列同时拟合：
+
+- 季节性朴素法：下个月 = 去年同月
+- 阻尼趋势的加法 Holt-Winters（指数平滑，周期 12 个月），在一组
+  (alpha, beta, gamma) 参数上同时运行
+
+所有序列和参数组合排成二维数组，时间上逐月推进一次即完成全部拟合；
+每个序列选一步预测误差最小的方法和参数，给出未来 HORIZON 个月的预测
+及区间，并找出"下一次预计大量进货"的月份。
+
+预测结果缓存到该序列出现新的出库记录为止：update() 只重新拟合新增
+流水涉及的序列，其余序列沿用之前的预测。
+"""
+
+import threading
+
+import numpy as np
+
+from database.analytics import MONTHS, HIGH_DEMAND_RATIO, get_analytics_engine
+from utils.tracing import span
+
+
+# 预测的月数
+HORIZON = 6
+
+# 商家×货品序列至少有这么多个月有出库才做预测（零星出库的序列没有规律可言）
+MIN_ACTIVE_MONTHS = 4
+
+# Holt-Winters 的趋势阻尼系数和参数网格 (alpha, beta, gamma)
+DAMPING = 0.9
+PARAMETER_GRID = [(alpha, beta, gamma)
+                  for alpha in (0.2, 0.5, 0.8)
+                  for beta in (0.05, 0.2)
+                  for gamma in (0.1, 0.3)]
+
+# 预测区间：预测值 ± Z × 一步预测误差的标准差 × √h（约 80% 区间）
+INTERVAL_Z = 1.28
+
+# 序列键：商家序号 << 32 | 货品序号；商家合计序列的货品位为 TOTAL
+TOTAL = 0xFFFFFFFF
+
+# 序列码空间不超过行数的 DENSE_RATIO 倍、且不超过 DENSE_LIMIT 时用查找表定位序列
+# （int64，不超过 8MB）；码空间远大于行数时排序查找，开销只与行数有关
+DENSE_RATIO = 4
+DENSE_LIMIT = 1 << 20
+
+
+def month_label(index):
+    """月份序号（年 × 12 + 月 - 1）-> "2025年3月" """
+    return f"{index // MONTHS}年{index % MONTHS + 1}月"
+
+
+def fit_forecast(history, horizon=HORIZON):
+    """批量拟合月度序列并预测
+
+    history 为形状 (n, T) 的各月数量，返回 (预测 (n, horizon), 一步预测误差的
+    标准差 (n,))。T 不足一年时用均值，不足两年时用季节性朴素法，否则在季节性
+    朴素法和各组参数的 Holt-Winters 中按序列选误差最小的。
+    """
+    history = np.asarray(history, dtype=np.float64)
+    n, length = history.shape
+    steps = np.arange(horizon)
+    if length <= MONTHS:
+        mean = history.mean(axis=1)
+        sigma = history.std(axis=1)
+        return np.repeat(mean[:, None], horizon, axis=1), sigma
+
+    # 季节性朴素法：预测 = 去年同月
+    naive_mse = ((history[:, MONTHS:] - history[:, :-MONTHS]) ** 2).mean(axis=1)
+    forecast = history[:, length - MONTHS + steps % MONTHS]
+    mse = naive_mse
+    if length >= 2 * MONTHS:
+        hw_forecast, hw_mse = _holt_winters(history, horizon)
+        better = hw_mse < mse
+        forecast = np.where(better[:, None], hw_forecast, forecast)
+        mse = np.where(better, hw_mse, mse)
+    return np.maximum(forecast, 0.0), np.sqrt(mse)
+
+
+def _holt_winters(history, horizon):
+    """在 PARAMETER_GRID 的每组参数上同时运行阻尼趋势加法 Holt-Winters，
+    每个序列取一步预测均方误差最小的一组，返回 (预测, 均方误差)"""
+    n, length = history.shape
+    grid = np.array(PARAMETER_GRID)
+    alpha, beta, gamma = (grid[:, i, None] for i in range(3))  # (K, 1)
+    count = len(grid)
+
+    # 用第一年初始化水平和季节项，前两年的均值差初始化趋势
+    first_year = history[:, :MONTHS].mean(axis=1)
+    level = np.repeat(first_year[None], count, axis=0)                     # (K, n)
+    trend = np.repeat(((history[:, MONTHS:2 * MONTHS].mean(axis=1) - first_year) / MONTHS)[None],
+                      count, axis=0)
+    season = np.repeat((history[:, :MONTHS] - first_year[:, None])[None], count, axis=0)  # (K, n, 12)
+    sse = np.zeros((count, n))
+
+    for t in range(MONTHS, length):
+        j = t % MONTHS
+        y = history[:, t]
+        s = season[:, :, j]
+        damped = DAMPING * trend
+        error = y - (level + damped + s)
+        sse += error * error
+        new_level = alpha * (y - s) + (1 - alpha) * (level + damped)
+        trend = beta * (new_level - level) + (1 - beta) * damped
+        season[:, :, j] = gamma * (y - new_level) + (1 - gamma) * s
+        level = new_level
+
+    best = sse.argmin(axis=0)                   # 每个序列最好的一组参数
+    columns = np.arange(n)
+    level = level[best, columns]
+    trend = trend[best, columns]
+    season = season[best, columns]              # (n, 12)
+    steps = np.arange(1, horizon + 1)
+    damping_sum = np.cumsum(DAMPING ** steps)   # φ + φ² + ... + φ^h
+    forecast = (level[:, None] + damping_sum[None] * trend[:, None]
+                + season[:, (length - 1 + steps) % MONTHS])
+    return forecast, sse[best, columns] / (length - MONTHS)
+
+
+def _series_index(codes, space, start):
+    """找出第 start 行之后出现过的序列码（codes 中 -1 表示不属于任何序列）
+
+    返回 (序列码升序数组, 每行所属序列在其中的序号，不需要的行为 -1)。序列码
+    空间与行数相当时用查找表，否则排序查找。
+    """
+    recent = codes[start:]
+    recent = recent[recent >= 0]
+    if space <= min(DENSE_LIMIT, DENSE_RATIO * len(codes)):
+        lookup = np.full(space + 1, -1, dtype=np.int64)  # 最后一格对应 -1
+        lookup[recent] = 0
+        wanted = np.flatnonzero(lookup[:space] == 0)
+        lookup[wanted] = np.arange(len(wanted))
+        return wanted, lookup[codes]
+    wanted = np.unique(recent)
+    index = np.searchsorted(wanted, codes).clip(max=max(len(wanted) - 1, 0))
+    if not len(wanted):
+        return wanted, np.full(len(codes), -1, dtype=np.int64)
+    return wanted, np.where(wanted[index] == codes, index, -1)
+
+
+class _Forecasts:
+    """一批序列的预测结果（按 keys 排序，生成后不再修改）"""
+
+    def __init__(self, keys, origin, forecast, sigma, average, ledger):
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.origin = origin[order]        # 第一个预测月的月份序号
+        self.forecast = forecast[order]    # (n, HORIZON)
+        self.sigma = sigma[order]
+        self.average = average[order]      # 历史月均
+        self.ledger = ledger
+        horizon = self.forecast.shape[1]
+        spread = INTERVAL_Z * self.sigma[:, None] * np.sqrt(np.arange(1, horizon + 1))[None]
+        self.lower = np.maximum(self.forecast - spread, 0.0)
+        self.upper = self.forecast + spread
+        # 下一次大量进货：第一个预测值超过历史月均 HIGH_DEMAND_RATIO 倍的月份
+        bulk = (self.forecast > self.average[:, None] * HIGH_DEMAND_RATIO) & (self.forecast >= 1)
+        has_bulk = bulk.any(axis=1)
+        first = bulk.argmax(axis=1)
+        self.bulk_month = np.where(has_bulk, self.origin + first, -1)
+        self.bulk_quantity = np.where(has_bulk, self.forecast[np.arange(len(first)), first], 0.0)
+
+    @classmethod
+    def empty(cls, horizon, ledger=None):
+        return cls(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                   np.zeros((0, horizon)), np.zeros(0), np.zeros(0), ledger)
+
+    def merge(self, other):
+        """用 other 中的序列替换或补充本批结果，返回新的结果"""
+        keep = ~np.isin(self.keys, other.keys)
+        return _Forecasts(np.concatenate([self.keys[keep], other.keys]),
+                          np.concatenate([self.origin[keep], other.origin]),
+                          np.concatenate([self.forecast[keep], other.forecast]),
+                          np.concatenate([self.sigma[keep], other.sigma]),
+                          np.concatenate([self.average[keep], other.average]),
+                          other.ledger)
+
+    def row(self, key):
+        i = int(np.searchsorted(self.keys, key))
+        return i if i < len(self.keys) and self.keys[i] == key else None
+
+
+class DemandForecaster:
+    """出库需求预测，结果按序列缓存
+
+    update() 在分析引擎 refresh() 之后调用（可在后台线程中）；查询方法
+    使用调用时的结果快照。
+    """
+
+    def __init__(self, engine, horizon=HORIZON):
+        self.engine = engine
+        self.horizon = horizon
+        self._lock = threading.Lock()
+        self._origin = None    # 已处理的流水快照
+        self._rows_seen = 0    # 已处理的流水行数
+        self._results = _Forecasts.empty(horizon)
+
+    @property
+    def ready(self):
+        return self._origin is not None
+
+    @property
+    def results(self):
+        """当前的预测结果（只读），重新拟合后换成新的对象，可用 is 判断预测是否变化"""
+        return self._results
+
+    def update(self):
+        """为新增流水涉及的序列重新拟合，返回重新拟合的序列数"""
+        with self._lock:
+            ledger = self.engine.snapshot()
+            rows = len(ledger.month)
+            incremental = ledger.origin is self._origin
+            if incremental and rows == self._rows_seen:
+                return 0
+            with span("forecast.update", incremental=incremental) as s:
+                start = self._rows_seen if incremental else 0
+                results = self._fit(ledger, start)
+                count = len(results.keys)
+                self._results = self._results.merge(results) if incremental else results
+                s.set(series=count)
+            self._origin = ledger.origin
+            self._rows_seen = rows
+            return count
+
+    def _fit(self, ledger, start):
+        """拟合流水第 start 行之后出现过的全部序列（start 为 0 时即全部序列）"""
+        if not len(ledger.month):
+            return _Forecasts.empty(self.horizon, ledger)
+        first = int(ledger.month.min())
+        length = int(ledger.month.max()) - first + 1
+        offset = ledger.month - first
+        has_merchant = ledger.merchant >= 0
+        merchant = ledger.merchant.astype(np.int64)
+        products = len(ledger.product_ids)
+        # 序列码：商家×货品为 商家序号 × 货品数 + 货品序号，商家合计为商家序号
+        pair_codes = np.where(has_merchant, merchant * products + ledger.product, -1)
+        total_codes = np.where(has_merchant, merchant, -1)
+
+        keys, history = [], []
+        for codes, space in ((pair_codes, len(ledger.merchant_ids) * products),
+                             (total_codes, len(ledger.merchant_ids))):
+            wanted, index = _series_index(codes, space, start)
+            selected = index >= 0
+            bins = index[selected] * length + offset[selected]
+            matrix = np.bincount(bins, weights=ledger.quantity[selected],
+                                 minlength=len(wanted) * length).reshape(len(wanted), length)
+            if codes is pair_codes:
+                # 只预测有出库的月份足够多的商家×货品序列
+                enough = np.count_nonzero(matrix, axis=1) >= MIN_ACTIVE_MONTHS
+                wanted, matrix = wanted[enough], matrix[enough]
+                keys.append(((wanted // products) << 32) | (wanted % products))
+            else:
+                keys.append((wanted << 32) | TOTAL)
+            history.append(matrix)
+        keys = np.concatenate(keys)
+        history = np.concatenate(history)
+
+        forecast, sigma = fit_forecast(history, self.horizon)
+        origin = np.full(len(keys), first + length, dtype=np.int64)
+        return _Forecasts(keys, origin, forecast, sigma, history.mean(axis=1), ledger)
+
+    def _key(self, merchant_id, product_id=None):
+        ledger = self._results.ledger
+        if ledger is None:
+            return None
+        merchant = ledger.merchant_index.get(merchant_id)
+        if merchant is None:
+            return None
+        if product_id is None:
+            return (merchant << 32) | TOTAL
+        product = ledger.product_index.get(product_id)
+        return None if product is None else (merchant << 32) | product
+
+    def series(self, merchant_id, product_id=None):
+        """某商家（或商家×货品）的预测：(第一个预测月序号, 预测, 下限, 上限)，没有时为 None"""
+        results = self._results
+        key = self._key(merchant_id, product_id)
+        row = None if key is None else results.row(key)
+        if row is None:
+            return None
+        return (int(results.origin[row]), results.forecast[row].tolist(),
+                results.lower[row].tolist(), results.upper[row].tolist())
+
+    def bulk_orders(self, merchant_id=None, limit=200):
+        """预计的下一次大量进货，按月份先后、数量从大到小排列
+
+        返回 [(商家 id, 货品 id, 月份序号, 预计数量)]，merchant_id 为 None 时为全部商家。
+        """
+        results = self._results
+        selected = (results.bulk_month >= 0) & ((results.keys & TOTAL) != TOTAL)
+        if merchant_id is not None:
+            key = self._key(merchant_id)
+            if key is None:
+                return []
+            selected &= (results.keys >> 32) == (key >> 32)
+        rows = np.flatnonzero(selected)
+        order = np.lexsort((-results.bulk_quantity[rows], results.bulk_month[rows]))[:limit]
+        ledger = results.ledger
+        orders = []
+        for row in rows[order].tolist():
+            key = int(results.keys[row])
+            orders.append((ledger.merchant_ids[key >> 32], ledger.product_ids[key & TOTAL],
+                           int(results.bulk_month[row]), round(float(results.bulk_quantity[row]))))
+        return orders
+
+
+_forecaster = None
+_forecaster_lock = threading.Lock()
+
+
+def get_demand_forecaster():
+    """获取全局需求预测（使用全局分析引擎）"""
+    global _forecaster
+    with _forecaster_lock:
+        if _forecaster is None:
+            _forecaster = DemandForecaster(get_analytics_engine())
+        return _forecaster
@@ -0,0 +1,605 @@
+"""
+批量导入：从 CSV / XLSX 导入货品、商家和出入库流水
+
+- 流式解析：CSV 逐行读取，XLSX 以只读模式逐行读取，内存占用与文件大小无关
+- 货品/商家名称通过内存中的维度缓存解析为 id，不逐行查库
+- 校验失败的行跳过并记录行号和原因，不影响其它行
+- 每 batch_size 行在一个写事务中用 executemany 写入；出入库同时按批
+  累加库存变化和月度出库汇总
+- 出库按内存中的库存校验；写入时在同一事务中核对实际库存，导入期间界面
+  已有出入库的货品按实际库存重新校验该批流水，库存不足的出库仍被拒绝
+- 写入在单独的线程中进行（sqlite 执行期间释放 GIL），解析校验下一批
+  与写入当前批同时进行；同一次导入的主键按顺序生成，插入时主键索引
+  只在末尾追加
+"""
+
+import csv
+import io
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from operator import itemgetter
+
+from database.db_manager import new_id_sequence, now_str, DATE_FORMAT
+from database.repositories import (SQL_INSERT_PRODUCT, SQL_INSERT_MERCHANT,
+                                   SQL_INSERT_TRANSACTION, SQL_INCREASE_STOCK,
+                                   SQL_ADD_OUTBOUND_ROLLUP, SQL_SHIFT_STOCK_SNAPSHOTS,
+                                   TYPE_INBOUND, TYPE_OUTBOUND, LABEL_TYPES,
+                                   add_movement_totals)
+
+try:
+    import openpyxl
+    OPENPYXL_AVAILABLE = True
+except ImportError:
+    openpyxl = None
+    OPENPYXL_AVAILABLE = False
+
+
+KIND_PRODUCTS = "products"
+KIND_MERCHANTS = "merchants"
+KIND_TRANSACTIONS = "transactions"
+KIND_LABELS = {KIND_PRODUCTS: "货品", KIND_MERCHANTS: "商家", KIND_TRANSACTIONS: "出入库记录"}
+
+# 每种数据的列：(字段, 可识别的表头, 是否必填)
+COLUMNS = {
+    KIND_PRODUCTS: [
+        ("name", ("货品名称", "名称", "name"), True),
+        ("sku", ("SKU", "sku", "编码"), False),
+        ("specification", ("规格", "specification"), False),
+        ("unit", ("单位", "unit"), False),
+        ("stock", ("当前库存", "库存", "stock", "currentStock"), False),
+    ],
+    KIND_MERCHANTS: [
+        ("name", ("商家名称", "名称", "name"), True),
+        ("contact", ("联系人", "contact"), False),
+        ("phone", ("电话", "联系电话", "phone"), False),
+        ("address", ("地址", "address"), False),
+    ],
+    KIND_TRANSACTIONS: [
+        ("date", ("日期", "时间", "date"), True),
+        ("product", ("货品", "货品名称", "product"), True),
+        ("type", ("类型", "type"), True),
+        ("quantity", ("数量", "quantity"), True),
+        ("merchant", ("商家", "商家名称", "merchant"), False),
+        ("notes", ("备注", "notes"), False),
+    ],
+}
+
+# 类型列可写中文或英文
+_TYPE_VALUES = dict(LABEL_TYPES)
+_TYPE_VALUES.update({TYPE_INBOUND: TYPE_INBOUND, TYPE_OUTBOUND: TYPE_OUTBOUND,
+                     "inbound": TYPE_INBOUND, "outbound": TYPE_OUTBOUND})
+_DATE_FORMATS = ("%Y/%m/%d", "%Y/%m/%d %H:%M:%S", "%Y/%m/%d %H:%M", "%Y-%m-%d %H:%M",
+                 "%Y.%m.%d", "%Y%m%d")
+
+# 最多保留的出错行明细
+MAX_ERRORS = 200
+
+# 估计导入的流水不少于该行数、且不少于表中已有行数时，先删除流水表的
+# 二级索引，导入完成后再重建
+DEFER_INDEX_MIN_ROWS = 200000
+
+SQL_PRODUCT_DIMENSION = 'SELECT "id", "name", "sku", "currentStock" FROM "products"'
+SQL_MERCHANT_DIMENSION = 'SELECT "id", "name" FROM "merchants"'
+SQL_COUNT_TRANSACTIONS = 'SELECT COUNT(*) FROM "transactions"'
+SQL_PRODUCT_STOCKS = 'SELECT "id", "currentStock" FROM "products" WHERE "id" IN ({marks})'
+
+# 按 id 查询库存时每条语句的 id 个数
+LOOKUP_CHUNK = 500
+
+
+class ImportFileError(Exception):
+    """文件无法导入（格式不支持、缺少必需列等）"""
+
+
+class ImportResult:
+    """一次导入的统计"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []  # (行号, 原因)，最多 MAX_ERRORS 条
+        self.cancelled = False
+        self.elapsed = 0.0
+        self._lock = threading.Lock()  # 解析线程和写入线程都会记录出错行
+
+    def add_error(self, line, message):
+        with self._lock:
+            self.skipped += 1
+            if len(self.errors) < MAX_ERRORS:
+                self.errors.append((line, message))
+
+    @property
+    def rows_per_second(self):
+        total = self.imported + self.skipped
+        return total / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        text = f"成功导入 {self.imported} 条{KIND_LABELS[self.kind]}"
+        if self.skipped:
+            text += f"，跳过 {self.skipped} 行"
+        if self.cancelled:
+            text += "（已取消，之前的批次已保存）"
+        return text
+
+
+class _RowSource:
+    """打开的数据文件：rows 为行迭代器（字符串列表，第一行为表头），
+    position() 返回读取进度（0~1），estimated 为估计的总行数"""
+
+    def __init__(self, rows, position, estimated, close):
+        self.rows = rows
+        self.position = position
+        self.estimated = estimated
+        self.close = close
+
+
+def _open_rows(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".xlsx", ".xlsm"):
+        return _open_xlsx(path)
+    if extension in (".csv", ".txt"):
+        return _open_csv(path)
+    raise ImportFileError(f"不支持的文件格式：{extension}（支持 CSV 和 XLSX）")
+
+
+def _open_csv(path):
+    raw = open(path, "rb")
+    size = os.fstat(raw.fileno()).st_size or 1
+    # 从 ERP 导出的文件常为 GBK 编码，先按 UTF-8 试读文件开头
+    head = raw.read(65536)
+    raw.seek(0)
+    encoding = "utf-8-sig"
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        if e.start < len(head) - 4:  # 末尾截断的多字节字符不算
+            encoding = "gb18030"
+    text = io.TextIOWrapper(raw, encoding=encoding, newline="")
+    # 按文件开头的平均行长估计总行数
+    estimated = round(size * head.count(b"\n") / len(head)) if head else 0
+    return _RowSource(csv.reader(text),
+                      lambda: raw.tell() / size if not raw.closed else 1.0,
+                      estimated, text.close)
+
+
+def _open_xlsx(path):
+    if not OPENPYXL_AVAILABLE:
+        raise ImportFileError("导入 XLSX 需要安装 openpyxl（pip install openpyxl），或先另存为 CSV")
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    sheet = workbook.active
+    total = sheet.max_row or 1
+    position = [0]
+
+    def rows():
+        for values in sheet.iter_rows(values_only=True):
+            position[0] += 1
+            yield [_cell_text(value) for value in values]
+
+    return _RowSource(rows(), lambda: position[0] / total, total, workbook.close)
+
+
+def _cell_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime(DATE_FORMAT)
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))  # 电话、数量等被 Excel 存成浮点数
+    return str(value).strip()
+
+
+def _normalize_date(text):
+    """把常见日期写法规范为 yyyy-MM-dd HH:mm:ss，无法识别时返回 None"""
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        for date_format in _DATE_FORMATS:
+            try:
+                return datetime.strptime(text, date_format).strftime(DATE_FORMAT)
+            except ValueError:
+                continue
+        return None
+    if len(text) == 19 and text[10] == " ":
+        return text  # 已是标准格式
+    return parsed.strftime(DATE_FORMAT)
+
+
+class _BatchWriter:
+    """写入线程：依次执行已校验好的批次，队列最多积压 depth 批
+
+    write(batch) 在写入线程中调用；出错后不再写入后续批次，
+    错误在下一次 put() 或 close() 时抛给导入线程。
+    """
+
+    def __init__(self, write, depth=2):
+        self._write = write
+        self._queue = queue.Queue(depth)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="BulkImportWriter", daemon=True)
+        self._thread.start()
+
+    def put(self, batch):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(batch)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            if self._error is not None:
+                continue  # 已出错：丢弃剩余批次，等待结束
+            try:
+                self._write(batch)
+            except BaseException as e:
+                self._error = e
+
+
+class BulkImporter:
+    """批量导入器，可在后台线程中运行
+
+    progress(已处理行数, 完成比例 0~1) 在每批写入提交后调用（在写入线程中）；
+    cancelled() 返回 True 时不再读取后续批次，已提交的批次保留。
+    给出与 db 对应的 report_cache（ReportCache）、alerts（StockAlertEngine）时，
+    每批提交后使涉及的商家年度报告失效、记下涉及的货品。
+    """
+
+    def __init__(self, db, batch_size=50000, progress=None, cancelled=None,
+                 report_cache=None, alerts=None):
+        self.db = db
+        self.batch_size = batch_size
+        self.progress = progress
+        self.cancelled = cancelled
+        self.report_cache = report_cache
+        self.alerts = alerts
+
+    def import_file(self, kind, path):
+        if kind not in COLUMNS:
+            raise ValueError(f"未知的导入类型：{kind}")
+        started = time.perf_counter()
+        result = ImportResult(kind)
+        source = _open_rows(path)
+        position = source.position
+        deferred = False
+        try:
+            header = next(source.rows, None)
+            if header is None:
+                raise ImportFileError("文件为空")
+            batches = self._batches(source.rows, self._map_columns(kind, header), result)
+            prepare, write = getattr(self, f"_{kind}_steps")()
+            if kind == KIND_TRANSACTIONS and self._should_defer_indexes(source.estimated):
+                deferred = self.db.drop_indexes("transactions") > 0
+
+            handled = [0]  # 已写入批次的有效行数（含写入时被拒绝的行）
+
+            def write_batch(item):
+                records, skipped = item[0], item[-1]
+                result.imported += write(result, *item[:-1])
+                handled[0] += len(records)
+                if self.progress is not None:
+                    self.progress(handled[0] + skipped, min(position(), 1.0))
+
+            writer = _BatchWriter(write_batch)
+            try:
+                for batch in batches:
+                    item = prepare(batch, result)
+                    writer.put(item + (result.skipped,))
+            finally:
+                writer.close()
+        finally:
+            source.close()
+            if deferred:
+                self.db.restore_indexes()
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    def _should_defer_indexes(self, estimated):
+        if estimated < DEFER_INDEX_MIN_ROWS:
+            return False
+        with self.db.reader() as conn:
+            existing = conn.execute(SQL_COUNT_TRANSACTIONS).fetchone()[0]
+        return estimated >= existing
+
+    def _map_columns(self, kind, header):
+        """表头 -> 各字段所在列号（缺失的可选列为 None）"""
+        positions = {name.strip(): i for i, name in enumerate(header)}
+        columns = []
+        missing = []
+        for field, names, required in COLUMNS[kind]:
+            index = next((positions[name] for name in names if name in positions), None)
+            if index is None and required:
+                missing.append(names[0])
+            columns.append(index)
+        if missing:
+            raise ImportFileError(f"缺少必需的列：{'、'.join(missing)}")
+        return columns
+
+    def _batches(self, rows, columns, result):
+        """把数据行按 batch_size 分批，每行为 (行号, 字段元组)"""
+        # 缺失的可选列指向每行末尾补上的空串
+        width = max(i for i in columns if i is not None) + 1
+        fields = itemgetter(*[width if i is None else i for i in columns])
+        padding = [""] * (width + 1)
+        batch = []
+        line = 1
+        for values in rows:
+            line += 1
+            if not values:
+                continue  # 空行
+            if len(values) == width:
+                values.append("")
+            else:
+                values = (values + padding)[:width + 1]
+            batch.append((line, fields(values)))
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+                if self.cancelled is not None and self.cancelled():
+                    result.cancelled = True
+                    return
+        if batch:
+            yield batch
+
+    # ---- 货品 ----
+
+    def _products_steps(self):
+        with self.db.reader() as conn:
+            names = {row[1] for row in conn.execute(SQL_PRODUCT_DIMENSION)}
+        next_id = new_id_sequence().__next__
+
+        def prepare(batch, result):
+            now = now_str()
+            records = []
+            for line, (name, sku, specification, unit, stock) in batch:
+                name = name.strip()
+                if not name:
+                    if any((sku, specification, unit, stock)):
+                        result.add_error(line, "货品名称为空")
+                    continue
+                if name in names:
+                    result.add_error(line, f"货品已存在：{name}")
+                    continue
+                try:
+                    stock = int(stock) if stock else 0
+                except ValueError:
+                    result.add_error(line, f"库存不是整数：{stock}")
+                    continue
+                if stock < 0:
+                    result.add_error(line, "库存不能为负数")
+                    continue
+                names.add(name)
+                records.append((next_id(), name, sku or None, specification or None, stock,
+                                unit or "个", now, now))
+            return (records,)
+
+        def write(result, records):
+            with self.db.transaction() as conn:
+                conn.executemany(SQL_INSERT_PRODUCT, records)
+            if self.alerts is not None:
+                self.alerts.touch(record[0] for record in records)
+            return len(records)
+
+        return prepare, write
+
+    # ---- 商家 ----
+
+    def _merchants_steps(self):
+        with self.db.reader() as conn:
+            names = {row[1] for row in conn.execute(SQL_MERCHANT_DIMENSION)}
+        next_id = new_id_sequence().__next__
+
+        def prepare(batch, result):
+            now = now_str()
+            records = []
+            for line, (name, contact, phone, address) in batch:
+                name = name.strip()
+                if not name:
+                    if any((contact, phone, address)):
+                        result.add_error(line, "商家名称为空")
+                    continue
+                if name in names:
+                    result.add_error(line, f"商家已存在：{name}")
+                    continue
+                names.add(name)
+                records.append((next_id(), name, contact or None, phone or None,
+                                address or None, now, now))
+            return (records,)
+
+        def write(result, records):
+            with self.db.transaction() as conn:
+                conn.executemany(SQL_INSERT_MERCHANT, records)
+            return len(records)
+
+        return prepare, write
+
+    # ---- 出入库 ----
+
+    def _transactions_steps(self):
+        # 维度缓存：货品名称/SKU -> [id, 当前库存, 本批开始时的库存]，商家名称 -> id
+        products = {}
+        with self.db.reader() as conn:
+            for product_id, name, sku, stock in conn.execute(SQL_PRODUCT_DIMENSION):
+                entry = [product_id, stock, stock]
+                products.setdefault(name, entry)
+                if sku:
+                    products.setdefault(sku, entry)
+            merchants = {name: merchant_id
+                         for merchant_id, name in conn.execute(SQL_MERCHANT_DIMENSION)}
+        next_id = new_id_sequence().__next__
+        types = _TYPE_VALUES
+        dates = {}  # 其他日期写法 -> 规范写法
+        # 标准写法的时间各不相同，分别记下校验过的日期部分和时间部分
+        standard_days = set()
+        standard_times = set()
+
+        def prepare(batch, result):
+            now = now_str()
+            records = []
+            lines = []    # 与 records 对应的行号
+            touched = {}  # 本批中库存有变动的货品
+            rollup = {}
+            shifts = {}   # (货品, 月份) -> 库存净变化，用于修正之后月份的库存快照
+            daily = {}    # (日期, 类型) -> [数量, 笔数]，首页指标
+            for line, (tx_date, product, tx_type, quantity, merchant, notes) in batch:
+                entry = products.get(product) or products.get(product.strip())
+                if entry is None:
+                    if product or any((tx_date, tx_type, quantity, merchant, notes)):
+                        result.add_error(line, f"货品不存在：{product}")
+                    continue
+                tx_type = types.get(tx_type) or types.get(tx_type.strip())
+                if tx_type is None:
+                    result.add_error(line, "类型应为 入库/出库")
+                    continue
+                try:
+                    quantity = int(quantity)
+                except ValueError:
+                    result.add_error(line, f"数量不是整数：{quantity}")
+                    continue
+                if quantity <= 0:
+                    result.add_error(line, "数量必须大于 0")
+                    continue
+                if tx_date[:10] in standard_days and tx_date[10:] in standard_times:
+                    day = tx_date
+                else:
+                    day = dates.get(tx_date)
+                    if day is None:
+                        day = _normalize_date(tx_date.strip())
+                        if day is None:
+                            result.add_error(line, f"无法识别的日期：{tx_date}")
+                            continue
+                        if day == tx_date:
+                            standard_days.add(day[:10])
+                            standard_times.add(day[10:])
+                        elif len(dates) < 100000:
+                            dates[tx_date] = day
+                merchant_id = None
+                if merchant:
+                    merchant_id = merchants.get(merchant) or merchants.get(merchant.strip())
+                    if merchant_id is None:
+                        result.add_error(line, f"商家不存在：{merchant}")
+                        continue
+
+                product_id = entry[0]
+                if product_id not in touched:
+                    touched[product_id] = entry
+                    entry[2] = entry[1]
+                if tx_type == TYPE_OUTBOUND:
+                    # 与界面出库相同的规则：库存不足的出库被拒绝
+                    if entry[1] < quantity:
+                        result.add_error(line, f"库存不足（当前库存 {entry[1]}，需要 {quantity}）")
+                        continue
+                    entry[1] -= quantity
+                    change = -quantity
+                    if merchant_id:
+                        key = (merchant_id, day[:7], product_id)
+                        rollup[key] = rollup.get(key, 0) + quantity
+                else:
+                    entry[1] += quantity
+                    change = quantity
+                key = (product_id, day[:7])
+                shifts[key] = shifts.get(key, 0) + change
+                totals = daily.get((day[:10], tx_type))
+                if totals is None:
+                    totals = daily[(day[:10], tx_type)] = [0, 0]
+                totals[0] += quantity
+                totals[1] += 1
+                records.append((next_id(), product_id, merchant_id, tx_type, quantity,
+                                day, notes or None, now))
+                lines.append(line)
+            # 货品的 (本批开始时的库存, 本批的库存变化)
+            stock_changes = {product_id: (entry[2], entry[1] - entry[2])
+                             for product_id, entry in touched.items()}
+            return records, lines, stock_changes, rollup, shifts, daily
+
+        def write(result, records, lines, stock_changes, rollup, shifts, daily):
+            now = now_str()
+            with self.db.transaction() as conn:
+                current = _current_stocks(conn, list(stock_changes))
+                moved = {product_id for product_id, (start, _) in stock_changes.items()
+                         if current.get(product_id) != start}
+                if moved:
+                    # 导入期间库存被其他写入修改过：这些货品按实际库存重新校验
+                    records = _recheck_stock(result, records, lines, moved, current,
+                                             stock_changes, rollup, shifts, daily)
+                conn.executemany(SQL_INSERT_TRANSACTION, records)
+                conn.executemany(SQL_INCREASE_STOCK, [
+                    (change, now, product_id)
+                    for product_id, (_, change) in stock_changes.items() if change])
+                conn.executemany(SQL_ADD_OUTBOUND_ROLLUP,
+                                 [key + (quantity,) for key, quantity in rollup.items()])
+                conn.executemany(SQL_SHIFT_STOCK_SNAPSHOTS,
+                                 [(change,) + key for key, change in shifts.items() if change])
+                add_movement_totals(conn, daily, rollup)
+            # 提交后使涉及的商家年度报告失效，重新评估涉及货品的库存预警
+            if self.alerts is not None:
+                self.alerts.touch(stock_changes)
+            if rollup and self.report_cache is not None:
+                self.report_cache.invalidate({(merchant_id, month[:4])
+                                              for merchant_id, month, _ in rollup})
+            return len(records)
+
+        return prepare, write
+
+
+def _current_stocks(conn, product_ids):
+    """货品 id -> 数据库中的当前库存（已删除的货品不在其中）"""
+    stocks = {}
+    for i in range(0, len(product_ids), LOOKUP_CHUNK):
+        chunk = product_ids[i:i + LOOKUP_CHUNK]
+        marks = ", ".join("?" * len(chunk))
+        stocks.update(conn.execute(SQL_PRODUCT_STOCKS.format(marks=marks), chunk))
+    return stocks
+
+
+def _recheck_stock(result, records, lines, moved, current, stock_changes, rollup, shifts, daily):
+    """按实际库存 current 重新校验 moved 中货品的流水
+
+    库存不足的出库（及货品已删除的流水）记为出错行，从 records 中去掉并从
+    各项汇总中扣除；stock_changes、rollup、shifts、daily 就地修改。
+    返回保留的流水。
+    """
+    stock = {product_id: current.get(product_id) for product_id in moved}
+    kept = []
+    for record, line in zip(records, lines):
+        _, product_id, merchant_id, tx_type, quantity, day = record[:6]
+        if product_id not in moved:
+            kept.append(record)
+            continue
+        if stock[product_id] is None:
+            result.add_error(line, "货品已被删除")
+        elif tx_type == TYPE_OUTBOUND and stock[product_id] < quantity:
+            result.add_error(line, f"库存不足（当前库存 {stock[product_id]}，需要 {quantity}）")
+        else:
+            stock[product_id] += -quantity if tx_type == TYPE_OUTBOUND else quantity
+            kept.append(record)
+            continue
+        # 被拒绝：从本批的汇总中扣除
+        change = -quantity if tx_type == TYPE_OUTBOUND else quantity
+        if tx_type == TYPE_OUTBOUND and merchant_id:
+            key = (merchant_id, day[:7], product_id)
+            rollup[key] -= quantity
+            if not rollup[key]:
+                del rollup[key]
+        shifts[(product_id, day[:7])] -= change
+        totals = daily[(day[:10], tx_type)]
+        totals[0] -= quantity
+        totals[1] -= 1
+        if not totals[1]:
+            del daily[(day[:10], tx_type)]
+    for product_id in moved:
+        if stock[product_id] is None:
+            del stock_changes[product_id]
+        else:
+            stock_changes[product_id] = (current[product_id], stock[product_id] - current[product_id])
+    return kept
@@ -0,0 +1,202 @@
+"""
+离线发件箱：界面上的修改先写本地，再由后台补发到同步服务器
+
+出入库、新建货品和商家时，在写本地库的同一个事务中向 sync_outbox 记入
+一条记录，提交即持久，录入不等待网络；程序退出或断电后，未发出的记录
+下次启动时继续补发。每条记录有一个幂等键，随行一起发送，远端不重复处理
+同一个键：请求已生效但响应丢失时重发是安全的。
+
+后台的 OutboxReplayer 按写入顺序一次取出一大批记录，按外键依赖的顺序
+（货品、商家、流水）每种数据发一个请求，全部成功后在一个事务中删除这批
+记录。发送的是行的当前内容，同一行的多次修改只发送一次；本地已删除的行
+不再发送。网络不通时按指数退避（带随机抖动）重试，恢复后积压的记录连续
+以大批次发出，一天的积压只需几个请求。
+"""
+
+import random
+import threading
+import traceback
+
+from database.db_manager import get_database, new_id, now_str
+from database.sync import (SYNC_PATH, ENTITIES, FIELDS, SyncError, to_wire_items,
+                           get_sync_engine)
+from utils.tracing import span
+
+
+# 每批取出的记录数
+REPLAY_BATCH_SIZE = 5000
+
+# 发送失败后的重试间隔（秒）：从 BACKOFF_BASE 起每次加倍，最多 BACKOFF_MAX
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 300.0
+
+# 没有新记录通知时也定期检查一次（秒）
+POLL_INTERVAL = 60.0
+
+SQL_ENQUEUE = (
+    'INSERT INTO "sync_outbox" ("key", "entity", "entityId", "createdAt") VALUES (?, ?, ?, ?)'
+)
+SQL_PENDING = 'SELECT COUNT(*) FROM "sync_outbox"'
+SQL_TAKE = 'SELECT "seq", "key", "entity", "entityId" FROM "sync_outbox" ORDER BY "seq" LIMIT ?'
+SQL_REMOVE = 'DELETE FROM "sync_outbox" WHERE "seq" <= ?'
+
+
+def _rows_sql(entity):
+    """某批记录涉及的行的当前内容（按 FIELDS 的列顺序）"""
+    columns = ", ".join(f'"{name}"' for name in FIELDS[entity])
+    return (f'SELECT {columns} FROM "{entity}" WHERE "id" IN '
+            f'(SELECT "entityId" FROM "sync_outbox" WHERE "entity" = ? AND "seq" <= ?)')
+
+
+SQL_OUTBOX_ROWS = {entity: _rows_sql(entity) for entity in ENTITIES}
+
+
+class Outbox:
+    """一个数据库的发件箱
+
+    enqueue() 在调用方已开启的写事务中记入一行，提交后调用 notify() 唤醒
+    补发线程。种类即表名（products / merchants / transactions）。
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._changed = threading.Event()
+
+    def enqueue(self, conn, entity, entity_id):
+        conn.execute(SQL_ENQUEUE, (new_id(), entity, entity_id, now_str()))
+
+    def notify(self):
+        self._changed.set()
+
+    def wait(self, timeout):
+        """等到有新记录的通知或超时"""
+        self._changed.wait(timeout)
+        self._changed.clear()
+
+    def pending(self):
+        """尚未发出的记录数"""
+        with self.db.reader() as conn:
+            return conn.execute(SQL_PENDING).fetchone()[0]
+
+
+class OutboxReplayer:
+    """把发件箱补发到同步服务器的后台线程
+
+    start() 后在后台运行，close() 停止；也可直接调用 drain() 同步补发。
+    sent 为已发出的行数，failures / last_error 为连续失败的次数和最近的错误。
+    """
+
+    def __init__(self, outbox, engine, batch_size=REPLAY_BATCH_SIZE):
+        self.outbox = outbox
+        self.engine = engine
+        self.batch_size = batch_size
+        self.sent = 0
+        self.failures = 0
+        self.last_error = None
+        self._lock = threading.Lock()  # 同一时刻只进行一次 drain
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="OutboxReplayer", daemon=True)
+            self._thread.start()
+
+    def close(self, timeout=None):
+        """停止后台线程（未发出的记录保留在发件箱中）"""
+        self._stop.set()
+        self.outbox.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def drain(self):
+        """发出发件箱中的全部记录，返回发出的行数
+
+        失败时抛出 SyncError，已确认的批次已删除，其余下次连同原幂等键重发。
+        """
+        with self._lock:
+            total = 0
+            while True:
+                sent, taken = self._replay_batch()
+                total += sent
+                if taken < self.batch_size:
+                    return total
+
+    def _replay_batch(self):
+        """发出最早的一批记录，返回 (发出的行数, 取出的记录数)"""
+        db = self.outbox.db
+        with db.reader() as conn:
+            entries = conn.execute(SQL_TAKE, (self.batch_size,)).fetchall()
+            if not entries:
+                return 0, 0
+            last = entries[-1][0]
+            # 同一行的多次修改只发送一次，带最后一条记录的幂等键
+            keys = {entity: {} for entity in ENTITIES}
+            for _, key, entity, entity_id in entries:
+                keys[entity][entity_id] = key
+            batches = {entity: conn.execute(SQL_OUTBOX_ROWS[entity], (entity, last)).fetchall()
+                       for entity in ENTITIES if keys[entity]}
+        sent = 0
+        for entity, rows in batches.items():
+            if not rows:
+                continue  # 本地已删除
+            items = to_wire_items(entity, rows)
+            for item in items:
+                item["key"] = keys[entity][item["id"]]
+            with span("outbox.replay", entity=entity, rows=len(items)):
+                self.engine.session.post(SYNC_PATH + entity,
+                                         {"client": self.engine.client_id, "items": items})
+            sent += len(items)
+        with db.transaction() as conn:
+            conn.execute(SQL_REMOVE, (last,))
+        self.sent += sent
+        return sent, len(entries)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.drain()
+            except Exception as e:
+                if not isinstance(e, SyncError):
+                    traceback.print_exc()
+                self.failures += 1
+                self.last_error = str(e)
+                # 指数退避：期间的新记录不提前唤醒，连接恢复后一次补发
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (self.failures - 1))
+                self._stop.wait(delay * random.uniform(0.5, 1.0))
+                continue
+            self.failures = 0
+            self.last_error = None
+            self.outbox.wait(POLL_INTERVAL)
+
+
+_outbox = None
+_replayer = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox():
+    """获取全局发件箱；未设置同步服务器地址时返回 None（修改不需要补发）"""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None and get_sync_engine() is not None:
+            _outbox = Outbox(get_database())
+        return _outbox
+
+
+def get_outbox_replayer():
+    """获取全局补发线程（需调用 start()）；未设置同步服务器地址时返回 None"""
+    global _replayer
+    outbox = get_outbox()
+    with _outbox_lock:
+        if _replayer is None and outbox is not None:
+            _replayer = OutboxReplayer(outbox, get_sync_engine())
+        return _replayer
+
+
+def close_outbox_replayer():
+    """程序退出前停止补发线程"""
+    with _outbox_lock:
+        if _replayer is not None:
+            # 不等待正在进行的请求：未确认的批次下次启动时连同原幂等键重发
+            _replayer.close(timeout=2.0)
@@ -0,0 +1,115 @@
+"""
+销售分析报告缓存
+
+按 (商家, 年份) 缓存单个商家的年度报告（销售分析页存入的是整个视图：报告、
+叠加的预测和绘制好的折线图），每项带有生成时的数据版本：
+
+- 每个 (商家, 年份) 有一个版本号，该商家在该年的出库提交后加一。出入库
+  写入器提交后回调 on_movements()，批量导入每批提交后调用 invalidate()；
+  入库、没有商家的出库不影响商家报告，不会使缓存失效
+- 读取时版本号不一致的项视为过期并丢弃，因此计算报告前先取版本号，
+  计算期间有新的提交时，存入的结果下次读取即失效，不会返回旧数据
+- 按最近最少使用淘汰，同时限制条目数和占用内存（按存入时报告的 nbytes 估算）
+"""
+
+import threading
+from collections import OrderedDict
+
+from database.repositories import TYPE_OUTBOUND
+
+
+# 缓存上限：条目数和估算的内存占用（字节，一幅折线图约 1-2MB）
+MAX_ENTRIES = 512
+MAX_BYTES = 32 * 1024 * 1024
+
+# 每项除数组外的固定开销估算（字典项、键、报告对象等）
+ENTRY_OVERHEAD = 1024
+
+
+class ReportCache:
+    """(商家, 年份, 数据版本) -> 报告 的 LRU 缓存，可在多个线程中使用"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (商家, 年份) -> (版本, 报告, 估算字节数)
+        self._versions = {}            # (商家, 年份) -> 版本号
+        self._generation = 0           # 全部失效时加一
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, merchant_id, year):
+        """当前数据版本，在读取数据库计算报告之前获取，随报告一起 put()"""
+        key = (merchant_id, str(year))
+        with self._lock:
+            return self._generation, self._versions.get(key, 0)
+
+    def get(self, merchant_id, year):
+        """返回缓存的报告；不存在或数据已变化时返回 None"""
+        key = (merchant_id, str(year))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == (self._generation, self._versions.get(key, 0)):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, merchant_id, year, version, report):
+        """存入用 version 时的数据计算出的报告"""
+        key = (merchant_id, str(year))
+        size = getattr(report, "nbytes", 0) + ENTRY_OVERHEAD
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (version, report, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, keys=None):
+        """使 keys 中的 (商家, 年份) 失效，keys 为 None 时全部失效"""
+        with self._lock:
+            if keys is None:
+                self._generation += 1
+                self._versions.clear()
+                self._entries.clear()
+                self._bytes = 0
+                return
+            for merchant_id, year in keys:
+                key = (merchant_id, str(year))
+                self._versions[key] = self._versions.get(key, 0) + 1
+                if key in self._entries:
+                    self._remove(key)
+
+    def on_movements(self, movements):
+        """出入库写入器的提交回调：有商家的出库使该商家当年的报告失效"""
+        keys = {(movement.merchant_id, movement.date[:4]) for movement in movements
+                if movement.type == TYPE_OUTBOUND and movement.merchant_id}
+        if keys:
+            self.invalidate(keys)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        self._bytes -= self._entries.pop(key)[2]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_report_cache():
+    """获取全局报告缓存（全局出入库写入器创建时注册其提交回调）"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ReportCache()
+        return _cache
@@ -0,0 +1,508 @@
+from collections import namedtuple
+from datetime import date, timedelta
+
+from database.db_manager import new_id, now_str
+from utils.tracing import span
+
+
+# 交易类型与界面文字的对应关系
+TYPE_INBOUND = "INBOUND"
+TYPE_OUTBOUND = "OUTBOUND"
+TYPE_LABELS = {TYPE_INBOUND: "入库", TYPE_OUTBOUND: "出库"}
+LABEL_TYPES = {label: tx_type for tx_type, label in TYPE_LABELS.items()}
+
+
+class StockError(Exception):
+    """出入库无法执行：货品不存在或库存不足"""
+
+
+# 一条出入库变动，字段顺序与 transactions 表的插入列一致
+StockMovement = namedtuple(
+    "StockMovement",
+    "id product_id merchant_id type quantity date notes created_at",
+)
+
+
+# 预编译语句：SQL 文本保持不变，由连接上的语句缓存复用
+SQL_LIST_PRODUCTS = (
+    'SELECT "id", "name", "sku", "currentStock", "unit" FROM "products" '
+    'ORDER BY "createdAt", "id"'
+)
+SQL_PRODUCT_LIST_ROW = (
+    'SELECT "id", "name", "sku", "currentStock", "unit" FROM "products" WHERE "id" = ?'
+)
+SQL_GET_PRODUCT = (
+    'SELECT "id", "name", "sku", "specification", "currentStock", "unit" '
+    'FROM "products" WHERE "id" = ?'
+)
+SQL_PRODUCT_NAMES = 'SELECT "id", "name" FROM "products" ORDER BY "name"'
+SQL_PRODUCT_NAMES_BY_ID = 'SELECT "id", "name" FROM "products" WHERE "id" IN ({marks})'
+SQL_INSERT_PRODUCT = (
+    'INSERT INTO "products" ("id", "name", "sku", "specification", "currentStock", "unit", "createdAt", "updatedAt") '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+)
+SQL_UPDATE_PRODUCT = (
+    'UPDATE "products" SET "name" = ?, "sku" = ?, "specification" = ?, "unit" = ?, "updatedAt" = ? '
+    'WHERE "id" = ?'
+)
+SQL_DELETE_PRODUCT = 'DELETE FROM "products" WHERE "id" = ?'
+SQL_DELETE_PRODUCT_ROLLUP = 'DELETE FROM "merchant_monthly_outbound" WHERE "productId" = ?'
+SQL_DELETE_PRODUCT_SNAPSHOTS = 'DELETE FROM "stock_snapshots" WHERE "productId" = ?'
+
+SQL_LIST_MERCHANTS = (
+    'SELECT "id", "name", "contact", "phone" FROM "merchants" '
+    'ORDER BY "createdAt", "id"'
+)
+SQL_MERCHANT_LIST_ROW = (
+    'SELECT "id", "name", "contact", "phone" FROM "merchants" WHERE "id" = ?'
+)
+SQL_GET_MERCHANT = (
+    'SELECT "id", "name", "contact", "phone", "address" FROM "merchants" WHERE "id" = ?'
+)
+SQL_MERCHANT_NAMES = 'SELECT "id", "name" FROM "merchants" ORDER BY "name"'
+SQL_INSERT_MERCHANT = (
+    'INSERT INTO "merchants" ("id", "name", "contact", "phone", "address", "createdAt", "updatedAt") '
+    'VALUES (?, ?, ?, ?, ?, ?, ?)'
+)
+SQL_UPDATE_MERCHANT = (
+    'UPDATE "merchants" SET "name" = ?, "contact" = ?, "phone" = ?, "address" = ?, "updatedAt" = ? '
+    'WHERE "id" = ?'
+)
+SQL_DELETE_MERCHANT = 'DELETE FROM "merchants" WHERE "id" = ?'
+SQL_DELETE_MERCHANT_ROLLUP = 'DELETE FROM "merchant_monthly_outbound" WHERE "merchantId" = ?'
+
+SQL_INSERT_TRANSACTION = (
+    'INSERT INTO "transactions" ("id", "productId", "merchantId", "type", "quantity", "date", "notes", "createdAt") '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+)
+SQL_INCREASE_STOCK = (
+    'UPDATE "products" SET "currentStock" = "currentStock" + ?, "updatedAt" = ? WHERE "id" = ?'
+)
+# 条件更新：库存不足时不修改任何行，防止负库存
+SQL_DECREASE_STOCK = (
+    'UPDATE "products" SET "currentStock" = "currentStock" - ?, "updatedAt" = ? '
+    'WHERE "id" = ? AND "currentStock" >= ?'
+)
+SQL_CURRENT_STOCK = 'SELECT "currentStock" FROM "products" WHERE "id" = ?'
+SQL_ADD_OUTBOUND_ROLLUP = (
+    'INSERT INTO "merchant_monthly_outbound" ("merchantId", "yearMonth", "productId", "quantity") '
+    'VALUES (?, ?, ?, ?) '
+    'ON CONFLICT ("merchantId", "yearMonth", "productId") '
+    'DO UPDATE SET "quantity" = "quantity" + excluded."quantity"'
+)
+# 首页指标的计数（见 db_manager.DASHBOARD_SCHEMA_SQL）
+SQL_ADD_DAILY_TOTAL = (
+    'INSERT INTO "daily_totals" ("day", "type", "quantity", "count") VALUES (?, ?, ?, ?) '
+    'ON CONFLICT ("day", "type") '
+    'DO UPDATE SET "quantity" = "quantity" + excluded."quantity", "count" = "count" + excluded."count"'
+)
+SQL_ADD_MERCHANT_MONTH_TOTAL = (
+    'INSERT INTO "merchant_month_totals" ("yearMonth", "merchantId", "quantity") VALUES (?, ?, ?) '
+    'ON CONFLICT ("yearMonth", "merchantId") '
+    'DO UPDATE SET "quantity" = "quantity" + excluded."quantity"'
+)
+# 删除货品前扣除其流水的计数
+SQL_PRODUCT_DAILY_TOTALS = (
+    'SELECT substr("date", 1, 10), "type", -SUM("quantity"), -COUNT(*) FROM "transactions" '
+    'WHERE "productId" = ? GROUP BY substr("date", 1, 10), "type"'
+)
+SQL_PRODUCT_MERCHANT_TOTALS = (
+    'SELECT "yearMonth", "merchantId", -"quantity" FROM "merchant_monthly_outbound" '
+    'WHERE "productId" = ?'
+)
+SQL_DELETE_MERCHANT_TOTALS = 'DELETE FROM "merchant_month_totals" WHERE "merchantId" = ?'
+# 删除商家时其报告随之失效的年份
+SQL_MERCHANT_ROLLUP_YEARS = (
+    'SELECT DISTINCT substr("yearMonth", 1, 4) FROM "merchant_monthly_outbound" WHERE "merchantId" = ?'
+)
+SQL_INVENTORY_TOTALS = (
+    'SELECT "productCount", "totalStock", "lowStockCount" FROM "inventory_totals" WHERE "id" = 0'
+)
+SQL_DAY_TOTALS = 'SELECT "type", "quantity", "count" FROM "daily_totals" WHERE "day" = ?'
+SQL_TOP_MERCHANTS = (
+    'SELECT m."name", t."quantity" FROM "merchant_month_totals" AS t '
+    'JOIN "merchants" AS m ON m."id" = t."merchantId" '
+    'WHERE t."yearMonth" = ? AND t."quantity" > 0 ORDER BY t."quantity" DESC LIMIT ?'
+)
+# 补记历史流水时修正其后各月月初的库存快照；当月的流水不涉及任何快照行
+SQL_SHIFT_STOCK_SNAPSHOTS = (
+    'UPDATE "stock_snapshots" SET "stock" = "stock" + ? WHERE "productId" = ? AND "month" > ?'
+)
+SQL_MONTHLY_OUTBOUND = (
+    'SELECT "yearMonth", SUM("quantity") FROM "merchant_monthly_outbound" '
+    'WHERE "merchantId" = ? AND "yearMonth" >= ? AND "yearMonth" <= ? '
+    'GROUP BY "yearMonth"'
+)
+SQL_DATE_BOUNDS = 'SELECT MIN("date"), MAX("date") FROM "transactions"'
+_SQL_RECORDS_SELECT = (
+    'SELECT t."date", p."name", t."type", t."quantity", m."name", t."notes", t."id" '
+    'FROM "transactions" t '
+    'JOIN "products" p ON p."id" = t."productId" '
+    'LEFT JOIN "merchants" m ON m."id" = t."merchantId" '
+)
+# 可选的筛选条件：参数名 -> WHERE 子句
+_RECORD_FILTERS = (
+    ("product_id", 't."productId" = ?'),
+    ("merchant_id", 't."merchantId" = ?'),
+    ("tx_type", 't."type" = ?'),
+)
+_records_sql_cache = {}
+
+# 记录行中用于显示的列数，其后为分页用的 id
+RECORD_COLUMNS = 6
+
+# 按 id 查询时每条语句的 id 个数（低于旧版 SQLite 的参数个数上限）
+LOOKUP_CHUNK = 500
+
+
+def _records_sql(filters, after):
+    """按启用的筛选条件组合生成记录查询语句
+
+    同一组合总是得到同一段 SQL 文本，可被连接上的语句缓存复用。
+    参数顺序为：开始日期、(after 为假时) 结束日期、筛选值、(after 为真时)
+    上一页最后一条的 date 和 id、LIMIT。
+
+    after 为真时生成键集分页语句：从上一页最后一条的 (date, id) 之后继续，
+    避免 OFFSET 扫描。此时 (date, id) 上界已隐含结束日期，不能再写
+    date < ?，否则 SQLite 会以它作为索引范围上界，每页都从范围末尾重新扫描。
+    """
+    key = (filters, after)
+    sql = _records_sql_cache.get(key)
+    if sql is None:
+        conditions = ['t."date" >= ?']
+        if not after:
+            conditions.append('t."date" < ?')
+        conditions.extend(clause for name, clause in _RECORD_FILTERS if name in filters)
+        if after:
+            conditions.append('(t."date", t."id") < (?, ?)')
+        sql = _records_sql_cache[key] = (
+            _SQL_RECORDS_SELECT +
+            "WHERE " + " AND ".join(conditions) + " "
+            'ORDER BY t."date" DESC, t."id" DESC LIMIT ?'
+        )
+    return sql
+
+
+class ProductRepository:
+    """货品数据访问
+
+    给出 outbox（离线发件箱）时，新建和修改在同一事务中记入发件箱；给出
+    report_cache（报告缓存）时，删除后使涉及的商家年度报告失效；给出
+    alerts（库存预警）时，删除后记下该货品，下次刷新时移出预警。
+    """
+
+    def __init__(self, db, outbox=None, report_cache=None, alerts=None):
+        self.db = db
+        self.outbox = outbox
+        self.report_cache = report_cache
+        self.alerts = alerts
+
+    def list_all(self):
+        """返回 (id, 名称, SKU, 当前库存, 单位) 列表"""
+        with self.db.reader() as conn:
+            return conn.execute(SQL_LIST_PRODUCTS).fetchall()
+
+    def list_row(self, product_id):
+        """返回单个货品的列表行，字段与 list_all 一致"""
+        with self.db.reader() as conn:
+            return conn.execute(SQL_PRODUCT_LIST_ROW, (product_id,)).fetchone()
+
+    def get(self, product_id):
+        with self.db.reader() as conn:
+            return conn.execute(SQL_GET_PRODUCT, (product_id,)).fetchone()
+
+    def list_names(self):
+        """返回 (id, 名称) 列表，用于下拉框"""
+        with self.db.reader() as conn:
+            return conn.execute(SQL_PRODUCT_NAMES).fetchall()
+
+    def names(self, product_ids):
+        """返回给出的货品的 {id: 名称}（已删除的货品不在其中），只查询这些货品"""
+        product_ids = list(product_ids)
+        names = {}
+        with self.db.reader() as conn:
+            for i in range(0, len(product_ids), LOOKUP_CHUNK):
+                chunk = product_ids[i:i + LOOKUP_CHUNK]
+                marks = ", ".join("?" * len(chunk))
+                names.update(conn.execute(SQL_PRODUCT_NAMES_BY_ID.format(marks=marks), chunk))
+        return names
+
+    def create(self, name, sku="", specification="", stock=0, unit="个"):
+        product_id = new_id()
+        now = now_str()
+        with self.db.transaction() as conn:
+            conn.execute(SQL_INSERT_PRODUCT,
+                         (product_id, name, sku or None, specification or None,
+                          stock, unit or "个", now, now))
+            self._enqueue(conn, product_id)
+        self._notify()
+        return product_id
+
+    def update(self, product_id, name, sku="", specification="", unit="个"):
+        """修改货品基础信息（库存只能通过出入库修改）"""
+        with self.db.transaction() as conn:
+            conn.execute(SQL_UPDATE_PRODUCT,
+                         (name, sku or None, specification or None, unit or "个",
+                          now_str(), product_id))
+            self._enqueue(conn, product_id)
+        self._notify()
+
+    def delete(self, product_id):
+        with self.db.transaction() as conn:
+            # 级联删除的流水不再计入首页指标
+            conn.executemany(SQL_ADD_DAILY_TOTAL,
+                             conn.execute(SQL_PRODUCT_DAILY_TOTALS, (product_id,)).fetchall())
+            totals = conn.execute(SQL_PRODUCT_MERCHANT_TOTALS, (product_id,)).fetchall()
+            conn.executemany(SQL_ADD_MERCHANT_MONTH_TOTAL, totals)
+            conn.execute(SQL_DELETE_PRODUCT_ROLLUP, (product_id,))
+            conn.execute(SQL_DELETE_PRODUCT_SNAPSHOTS, (product_id,))
+            conn.execute(SQL_DELETE_PRODUCT, (product_id,))
+        # 提交后使该货品出库涉及的商家年度报告失效
+        if totals and self.report_cache is not None:
+            self.report_cache.invalidate({(merchant_id, month[:4]) for month, merchant_id, _ in totals})
+        if self.alerts is not None:
+            self.alerts.touch([product_id])
+
+    def _enqueue(self, conn, item_id):
+        if self.outbox is not None:
+            self.outbox.enqueue(conn, "products", item_id)
+
+    def _notify(self):
+        if self.outbox is not None:
+            self.outbox.notify()
+
+
+class MerchantRepository:
+    """商家数据访问
+
+    给出 outbox（离线发件箱）时，新建和修改在同一事务中记入发件箱；给出
+    report_cache（报告缓存）时，删除后使该商家的年度报告失效。
+    """
+
+    def __init__(self, db, outbox=None, report_cache=None):
+        self.db = db
+        self.outbox = outbox
+        self.report_cache = report_cache
+
+    def list_all(self):
+        """返回 (id, 名称, 联系人, 电话) 列表"""
+        with self.db.reader() as conn:
+            return conn.execute(SQL_LIST_MERCHANTS).fetchall()
+
+    def list_row(self, merchant_id):
+        """返回单个商家的列表行，字段与 list_all 一致"""
+        with self.db.reader() as conn:
+            return conn.execute(SQL_MERCHANT_LIST_ROW, (merchant_id,)).fetchone()
+
+    def get(self, merchant_id):
+        with self.db.reader() as conn:
+            return conn.execute(SQL_GET_MERCHANT, (merchant_id,)).fetchone()
+
+    def list_names(self):
+        """返回 (id, 名称) 列表，用于下拉框"""
+        with self.db.reader() as conn:
+            return conn.execute(SQL_MERCHANT_NAMES).fetchall()
+
+    def create(self, name, contact="", phone="", address=""):
+        merchant_id = new_id()
+        now = now_str()
+        with self.db.transaction() as conn:
+            conn.execute(SQL_INSERT_MERCHANT,
+                         (merchant_id, name, contact or None, phone or None,
+                          address or None, now, now))
+            self._enqueue(conn, merchant_id)
+        self._notify()
+        return merchant_id
+
+    def update(self, merchant_id, name, contact="", phone="", address=""):
+        with self.db.transaction() as conn:
+            conn.execute(SQL_UPDATE_MERCHANT,
+                         (name, contact or None, phone or None, address or None,
+                          now_str(), merchant_id))
+            self._enqueue(conn, merchant_id)
+        self._notify()
+
+    def delete(self, merchant_id):
+        with self.db.transaction() as conn:
+            years = [row[0] for row in conn.execute(SQL_MERCHANT_ROLLUP_YEARS, (merchant_id,))]
+            conn.execute(SQL_DELETE_MERCHANT_ROLLUP, (merchant_id,))
+            conn.execute(SQL_DELETE_MERCHANT_TOTALS, (merchant_id,))
+            conn.execute(SQL_DELETE_MERCHANT, (merchant_id,))
+        if years and self.report_cache is not None:
+            self.report_cache.invalidate({(merchant_id, year) for year in years})
+
+    def _enqueue(self, conn, item_id):
+        if self.outbox is not None:
+            self.outbox.enqueue(conn, "merchants", item_id)
+
+    def _notify(self):
+        if self.outbox is not None:
+            self.outbox.notify()
+
+
+def new_movement(product_id, tx_type, quantity, merchant_id=None, tx_date=None, notes=""):
+    """构造一条待写入的出入库变动"""
+    now = now_str()
+    return StockMovement(new_id(), product_id, merchant_id or None, tx_type, quantity,
+                         tx_date or now, notes or None, now)
+
+
+def apply_movement(conn, movement):
+    """在已开启的写事务中执行一条出入库：
+    条件更新库存 -> 写入流水 -> 修正之后月份的库存快照 -> 出库时累加月度汇总
+    -> 累加首页指标的计数。失败时抛出 StockError。
+    """
+    product_id = movement.product_id
+    quantity = movement.quantity
+    if movement.type == TYPE_OUTBOUND:
+        cursor = conn.execute(SQL_DECREASE_STOCK,
+                              (quantity, movement.created_at, product_id, quantity))
+    else:
+        cursor = conn.execute(SQL_INCREASE_STOCK,
+                              (quantity, movement.created_at, product_id))
+    if cursor.rowcount == 0:
+        row = conn.execute(SQL_CURRENT_STOCK, (product_id,)).fetchone()
+        if row is None:
+            raise StockError("货品不存在")
+        raise StockError(f"库存不足（当前库存 {row[0]}，需要 {quantity}）")
+
+    conn.execute(SQL_INSERT_TRANSACTION, movement)
+    change = -quantity if movement.type == TYPE_OUTBOUND else quantity
+    conn.execute(SQL_SHIFT_STOCK_SNAPSHOTS, (change, product_id, movement.date[:7]))
+    if movement.type == TYPE_OUTBOUND and movement.merchant_id:
+        conn.execute(SQL_ADD_OUTBOUND_ROLLUP,
+                     (movement.merchant_id, movement.date[:7], product_id, quantity))
+        conn.execute(SQL_ADD_MERCHANT_MONTH_TOTAL,
+                     (movement.date[:7], movement.merchant_id, quantity))
+    conn.execute(SQL_ADD_DAILY_TOTAL, (movement.date[:10], movement.type, quantity, 1))
+
+
+def add_movement_totals(conn, daily, rollup):
+    """成批写入流水时累加首页指标的计数
+
+    daily 为 {(yyyy-MM-dd, 类型): [数量, 笔数]}，rollup 为同批累加到月度汇总的
+    {(商家, 年月, 货品): 出库量}。
+    """
+    conn.executemany(SQL_ADD_DAILY_TOTAL, [key + tuple(value) for key, value in daily.items()])
+    merchants = {}
+    for (merchant_id, month, _), quantity in rollup.items():
+        key = (month, merchant_id)
+        merchants[key] = merchants.get(key, 0) + quantity
+    conn.executemany(SQL_ADD_MERCHANT_MONTH_TOTAL,
+                     [key + (quantity,) for key, quantity in merchants.items()])
+
+
+class TransactionRepository:
+    """出入库记录数据访问"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def record(self, product_id, tx_type, quantity, merchant_id=None, tx_date=None, notes=""):
+        """同步写入一条出入库记录（单独提交）；界面提交请使用 TransactionWriter"""
+        movement = new_movement(product_id, tx_type, quantity, merchant_id, tx_date, notes)
+        with self.db.transaction() as conn:
+            apply_movement(conn, movement)
+        return movement.id
+
+    def query_range(self, start_date, end_date, limit=1000, **filters):
+        """按日期范围查询记录，返回 (日期, 货品, 类型, 数量, 商家, 备注)
+
+        start_date / end_date 为 yyyy-MM-dd 字符串，包含结束当天；
+        filters 可选 product_id、merchant_id、tx_type，值为 None 表示不限。
+        """
+        for page in self.iter_pages(start_date, end_date, page_size=limit, **filters):
+            return page
+        return []
+
+    def iter_pages(self, start_date, end_date, page_size=500, first_page_size=None,
+                   product_id=None, merchant_id=None, tx_type=None):
+        """按 (date, id) 键集分页遍历符合条件的记录，每次产出一页
+
+        first_page_size 可让首页更小以便尽快显示。每页单独借用一个只读连接，
+        未读完的迭代器不会长期占用连接池。
+        """
+        names = []
+        values = []
+        for name, value in (("product_id", product_id), ("merchant_id", merchant_id),
+                            ("tx_type", tx_type)):
+            if value is not None:
+                names.append(name)
+                values.append(value)
+        filters = tuple(names)
+        sql_first = _records_sql(filters, after=False)
+        sql_after = _records_sql(filters, after=True)
+
+        limit = first_page_size or page_size
+        with span("db.records_page", first=True), self.db.reader() as conn:
+            rows = conn.execute(sql_first, (start_date, _next_day(end_date), *values,
+                                            limit)).fetchall()
+        while rows:
+            yield [row[:RECORD_COLUMNS] for row in rows]
+            if len(rows) < limit:
+                return
+            last = rows[-1]
+            limit = page_size
+            with span("db.records_page"), self.db.reader() as conn:
+                rows = conn.execute(sql_after, (start_date, *values, last[0], last[6],
+                                                limit)).fetchall()
+
+
+class AnalysisRepository:
+    """销售分析数据访问（读取出库汇总表，不扫描流水）"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def monthly_outbound(self, merchant_id, year):
+        """返回某商家某年 1~12 月的出库总量列表"""
+        year = str(year)
+        totals = [0] * 12
+        with self.db.reader() as conn:
+            rows = conn.execute(SQL_MONTHLY_OUTBOUND,
+                                (merchant_id, f"{year}-01", f"{year}-12")).fetchall()
+        for year_month, quantity in rows:
+            totals[int(year_month[5:7]) - 1] = quantity
+        return totals
+
+    def years(self):
+        """流水覆盖的年份（降序），MIN/MAX 走日期索引，不扫描全表"""
+        with self.db.reader() as conn:
+            first, last = conn.execute(SQL_DATE_BOUNDS).fetchone()
+        if first is None:
+            return []
+        return [str(year) for year in range(int(last[:4]), int(first[:4]) - 1, -1)]
+
+
+# 首页指标：货品数、总库存、低库存货品数、当天入库/出库（数量和笔数）、
+# 本月出库量最多的商家 [(名称, 出库量)]
+Kpis = namedtuple(
+    "Kpis",
+    "product_count total_stock low_stock inbound inbound_count outbound outbound_count "
+    "top_merchants",
+)
+
+
+class DashboardRepository:
+    """首页指标（读取计数表，不扫描流水和货品）"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def kpis(self, day=None, top=5):
+        """day（yyyy-MM-dd，默认今天）的指标，排行取该日所在月份的前 top 个商家"""
+        day = day or date.today().isoformat()
+        with self.db.reader() as conn:
+            product_count, total_stock, low_stock = conn.execute(SQL_INVENTORY_TOTALS).fetchone()
+            totals = {tx_type: (quantity, count)
+                      for tx_type, quantity, count in conn.execute(SQL_DAY_TOTALS, (day,))}
+            top_merchants = conn.execute(SQL_TOP_MERCHANTS, (day[:7], top)).fetchall()
+        inbound = totals.get(TYPE_INBOUND, (0, 0))
+        outbound = totals.get(TYPE_OUTBOUND, (0, 0))
+        return Kpis(product_count, total_stock, low_stock, inbound[0], inbound[1],
+                    outbound[0], outbound[1], top_merchants)
+
+
+def _next_day(day):
+    """yyyy-MM-dd 的下一天，用作开区间上界"""
+    return (date.fromisoformat(day) + timedelta(days=1)).isoformat()
@@ -0,0 +1,238 @@
+"""
+库存预警：缺货、低于补货点、按出库速度预计即将缺货的货品
+
+每个货品的补货点保存在 reorder_points，未设置时为 LOW_STOCK_THRESHOLD；
+出库速度为最近 VELOCITY_DAYS 天的日均出库量，可售天数 = 当前库存 / 出库速度
+（没有出库时为无穷大）。满足以下任一条件的货品进入预警：
+
+- 缺货：库存不大于 0
+- 低于补货点：库存不高于补货点
+- 即将缺货：可售天数少于 COVER_DAYS
+
+预警中的货品放在按可售天数排序的最小堆里，最紧急的在堆顶。货品重新评估
+后旧的堆项作废（懒删除），取出时跳过，堆中作废的项过多时整体重建。
+
+出入库提交、导入和同步后调用 touch() 记下涉及的货品，refresh() 只重新评估
+这些货品：按 id 分段批量查询库存、补货点和出库量（出库量走 (货品, 日期)
+索引，只读这些货品窗口内的流水），与货品总数无关。首次使用和日期变化
+（统计窗口移动）时整体评估一次。
+"""
+
+import heapq
+import itertools
+import math
+import threading
+from collections import namedtuple
+from datetime import date, timedelta
+
+from database.db_manager import get_database, now_str, LOW_STOCK_THRESHOLD
+from database.repositories import TYPE_OUTBOUND
+from utils.tracing import span
+
+
+# 出库速度的统计窗口（天，含当天）
+VELOCITY_DAYS = 30
+
+# 可售天数少于该值时预警
+COVER_DAYS = 14
+
+# 按 id 查询时每条语句的 id 个数
+LOOKUP_CHUNK = 500
+
+LEVEL_OUT_OF_STOCK = "out_of_stock"
+LEVEL_REORDER = "reorder"
+LEVEL_LOW_COVER = "low_cover"
+LEVEL_LABELS = {LEVEL_OUT_OF_STOCK: "缺货", LEVEL_REORDER: "低于补货点", LEVEL_LOW_COVER: "即将缺货"}
+
+# 一个货品的预警：velocity 为日均出库量，days 为预计可售天数
+StockAlert = namedtuple(
+    "StockAlert",
+    "product_id name stock reorder_point velocity days level",
+)
+
+_SQL_PRODUCTS = (
+    'SELECT p."id", p."name", p."currentStock", IFNULL(r."reorderPoint", ?) '
+    'FROM "products" AS p LEFT JOIN "reorder_points" AS r ON r."productId" = p."id"'
+)
+SQL_ALL_PRODUCTS = _SQL_PRODUCTS
+SQL_PRODUCTS_BY_ID = _SQL_PRODUCTS + ' WHERE p."id" IN ({marks})'
+SQL_ALL_OUTBOUND = (
+    'SELECT "productId", SUM("quantity") FROM "transactions" '
+    'WHERE "date" >= ? AND "type" = ? GROUP BY "productId"'
+)
+SQL_OUTBOUND_BY_ID = (
+    'SELECT "productId", SUM("quantity") FROM "transactions" '
+    'WHERE "productId" IN ({marks}) AND "date" >= ? AND "type" = ? GROUP BY "productId"'
+)
+SQL_REORDER_POINT = 'SELECT "reorderPoint" FROM "reorder_points" WHERE "productId" = ?'
+SQL_SET_REORDER_POINT = (
+    'INSERT INTO "reorder_points" ("productId", "reorderPoint", "updatedAt") VALUES (?, ?, ?) '
+    'ON CONFLICT ("productId") '
+    'DO UPDATE SET "reorderPoint" = excluded."reorderPoint", "updatedAt" = excluded."updatedAt"'
+)
+SQL_CLEAR_REORDER_POINT = 'DELETE FROM "reorder_points" WHERE "productId" = ?'
+
+
+def evaluate(product_id, name, stock, reorder_point, outbound):
+    """按库存、补货点和窗口内出库量评估一个货品，不需要预警时返回 None"""
+    velocity = outbound / VELOCITY_DAYS
+    if stock <= 0:
+        days = 0.0
+    else:
+        days = stock / velocity if velocity > 0 else math.inf
+    if stock <= 0:
+        level = LEVEL_OUT_OF_STOCK
+    elif stock <= reorder_point:
+        level = LEVEL_REORDER
+    elif days < COVER_DAYS:
+        level = LEVEL_LOW_COVER
+    else:
+        return None
+    return StockAlert(product_id, name, stock, reorder_point, velocity, days, level)
+
+
+class StockAlertEngine:
+    """预警货品的优先队列（按可售天数从少到多）
+
+    touch() 可在任意线程（如写入线程的提交回调）中调用，只记下货品 id；
+    refresh() 可在后台线程中调用，alerts() 返回调用时的预警列表。
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.Lock()        # 评估和读取预警
+        self._dirty_lock = threading.Lock()  # 待评估的货品
+        self._dirty = set()
+        self._day = None     # 上次整体评估的日期
+        self._alerts = {}    # 货品 id -> 当前有效的 StockAlert
+        self._heap = []      # (可售天数, 序号, StockAlert)，含作废的项
+        self._sequence = itertools.count()
+        self.evaluated = 0   # 累计增量评估的货品数
+
+    @property
+    def loaded(self):
+        return self._day is not None
+
+    def touch(self, product_ids):
+        """记下库存、补货点或出库量可能变化的货品，下次 refresh() 时重新评估"""
+        with self._dirty_lock:
+            self._dirty.update(product_ids)
+
+    def on_movements(self, movements):
+        """TransactionWriter 提交回调"""
+        self.touch(movement.product_id for movement in movements)
+
+    def refresh(self):
+        """重新评估 touch() 记下的货品（首次和日期变化时评估全部），返回预警是否有变化"""
+        with self._lock:
+            today = date.today()
+            with self._dirty_lock:
+                dirty, self._dirty = self._dirty, set()
+            since = (today - timedelta(days=VELOCITY_DAYS - 1)).isoformat()
+            if self._day != today:
+                with span("alerts.evaluate_all") as s:
+                    alerts = self._evaluate_all(since)
+                    s.set(alerts=len(alerts))
+                self._alerts = {alert.product_id: alert for alert in alerts}
+                self._heap = [(alert.days, next(self._sequence), alert) for alert in alerts]
+                heapq.heapify(self._heap)
+                self._day = today
+                return True
+            if not dirty:
+                return False
+            with span("alerts.evaluate", products=len(dirty)):
+                evaluated = self._evaluate_ids(list(dirty), since)
+            self.evaluated += len(dirty)
+            changed = False
+            for product_id in dirty:
+                alert = evaluated.get(product_id)
+                current = self._alerts.get(product_id)
+                if alert == current:
+                    continue
+                changed = True
+                if alert is None:
+                    del self._alerts[product_id]  # 堆中的旧项作废
+                else:
+                    self._alerts[product_id] = alert
+                    heapq.heappush(self._heap, (alert.days, next(self._sequence), alert))
+            if len(self._heap) > 2 * len(self._alerts) + 64:
+                self._heap = [(alert.days, next(self._sequence), alert)
+                              for alert in self._alerts.values()]
+                heapq.heapify(self._heap)
+            return changed
+
+    def alerts(self, limit=None):
+        """最紧急的 limit 个预警（None 为全部），按可售天数从少到多"""
+        with self._lock:
+            heap = self._heap
+            result = []
+            kept = []
+            while heap and (limit is None or len(result) < limit):
+                entry = heapq.heappop(heap)
+                alert = entry[2]
+                if self._alerts.get(alert.product_id) is alert:
+                    result.append(alert)
+                    kept.append(entry)
+                # 作废的项不再放回
+            for entry in kept:
+                heapq.heappush(heap, entry)
+            return result
+
+    def count(self):
+        """预警中的货品数"""
+        return len(self._alerts)
+
+    # ---- 补货点 ----
+
+    def reorder_point(self, product_id):
+        """货品的补货点，未单独设置时为 None（按 LOW_STOCK_THRESHOLD）"""
+        with self.db.reader() as conn:
+            row = conn.execute(SQL_REORDER_POINT, (product_id,)).fetchone()
+        return row[0] if row else None
+
+    def set_reorder_point(self, product_id, value):
+        """设置货品的补货点，value 为 None 时恢复默认"""
+        with self.db.transaction() as conn:
+            if value is None:
+                conn.execute(SQL_CLEAR_REORDER_POINT, (product_id,))
+            else:
+                conn.execute(SQL_SET_REORDER_POINT, (product_id, int(value), now_str()))
+        self.touch([product_id])
+
+    # ---- 内部 ----
+
+    def _evaluate_all(self, since):
+        with self.db.reader() as conn:
+            outbound = dict(conn.execute(SQL_ALL_OUTBOUND, (since, TYPE_OUTBOUND)))
+            rows = conn.execute(SQL_ALL_PRODUCTS, (LOW_STOCK_THRESHOLD,)).fetchall()
+        alerts = (evaluate(*row, outbound.get(row[0], 0)) for row in rows)
+        return [alert for alert in alerts if alert is not None]
+
+    def _evaluate_ids(self, product_ids, since):
+        """评估一组货品，返回 {货品 id: StockAlert}（不需要预警或已删除的货品不在其中）"""
+        evaluated = {}
+        with self.db.reader() as conn:
+            for i in range(0, len(product_ids), LOOKUP_CHUNK):
+                chunk = product_ids[i:i + LOOKUP_CHUNK]
+                marks = ", ".join("?" * len(chunk))
+                outbound = dict(conn.execute(SQL_OUTBOUND_BY_ID.format(marks=marks),
+                                             (*chunk, since, TYPE_OUTBOUND)))
+                for row in conn.execute(SQL_PRODUCTS_BY_ID.format(marks=marks),
+                                        (LOW_STOCK_THRESHOLD, *chunk)):
+                    alert = evaluate(*row, outbound.get(row[0], 0))
+                    if alert is not None:
+                        evaluated[row[0]] = alert
+        return evaluated
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_stock_alerts():
+    """获取全局库存预警（首次使用前需 refresh()）"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = StockAlertEngine(get_database())
+        return _engine
@@ -0,0 +1,214 @@
+"""
+库存快照：按月的期初库存检查点，历史库存查询只重放快照之后的流水
+
+stock_snapshots 记录每个货品每月月初（该月第一笔流水之前）的库存：
+
+- checkpoint() 补齐到本月为止缺少的月份。从 currentStock 往回减去各月的
+  净变动得到各月月初库存，只需读取最早缺少的月份之后的流水；首次生成时
+  读一遍全部流水，之后每月只读上个月的流水
+- 补记历史流水（界面选择过去的日期、导入历史记录）时，apply_movement 和
+  导入器在同一事务中修正其后各月的快照，快照始终与流水一致
+- 查询某日库存 = 最近的快照 ± 快照与该日之间的流水，代价与流水总量无关
+"""
+
+from datetime import date, timedelta
+
+from database.db_manager import now_str
+from database.repositories import TYPE_INBOUND
+from utils.tracing import span
+
+
+SQL_SNAPSHOT_AT_OR_BEFORE = (
+    'SELECT "month", "stock" FROM "stock_snapshots" '
+    'WHERE "productId" = ? AND "month" <= ? ORDER BY "month" DESC LIMIT 1'
+)
+SQL_SNAPSHOT_AFTER = (
+    'SELECT "month", "stock" FROM "stock_snapshots" '
+    'WHERE "productId" = ? AND "month" > ? ORDER BY "month" LIMIT 1'
+)
+SQL_SNAPSHOT_RANGE = (
+    'SELECT "month", "stock" FROM "stock_snapshots" '
+    'WHERE "productId" = ? AND "month" >= ? AND "month" <= ? ORDER BY "month"'
+)
+# 某货品 [开始, 结束) 之间的库存净变化，走 (productId, date, id) 索引
+_SIGNED_QUANTITY = 'CASE "type" WHEN ? THEN "quantity" ELSE -"quantity" END'
+SQL_PRODUCT_NET_BETWEEN = (
+    f'SELECT IFNULL(SUM({_SIGNED_QUANTITY}), 0) FROM "transactions" '
+    'WHERE "productId" = ? AND "date" >= ? AND "date" < ?'
+)
+SQL_PRODUCT_NET_SINCE = (
+    f'SELECT IFNULL(SUM({_SIGNED_QUANTITY}), 0) FROM "transactions" '
+    'WHERE "productId" = ? AND "date" >= ?'
+)
+# 全部货品：按日期索引读出范围内的流水再在 Python 中分组（GROUP BY 货品会让
+# SQLite 改走货品索引，逐行回表随机读，反而慢得多）
+SQL_CHANGES_SINCE = (
+    f'SELECT "productId", substr("date", 1, 7), {_SIGNED_QUANTITY} FROM "transactions" '
+    'WHERE "date" >= ?'
+)
+SQL_PRODUCT_MONTHLY_NET_SINCE = (
+    f'SELECT substr("date", 1, 7), SUM({_SIGNED_QUANTITY}) FROM "transactions" '
+    'WHERE "productId" = ? AND "date" >= ? GROUP BY substr("date", 1, 7)'
+)
+SQL_CURRENT_STOCKS = 'SELECT "id", "currentStock" FROM "products"'
+SQL_CURRENT_STOCK = 'SELECT "currentStock" FROM "products" WHERE "id" = ?'
+SQL_FIRST_TRANSACTION_DATE = 'SELECT MIN("date") FROM "transactions"'
+SQL_CHECKPOINT_MONTHS = 'SELECT "month" FROM "stock_checkpoints" ORDER BY "month"'
+SQL_INSERT_CHECKPOINT = 'INSERT OR IGNORE INTO "stock_checkpoints" ("month", "createdAt") VALUES (?, ?)'
+SQL_INSERT_SNAPSHOT = (
+    'INSERT OR REPLACE INTO "stock_snapshots" ("productId", "month", "stock") VALUES (?, ?, ?)'
+)
+# 在已有检查点月份中缺少快照的货品（之后新建的货品）
+SQL_PRODUCTS_WITHOUT_SNAPSHOT = (
+    'SELECT "id", "currentStock" FROM "products" p WHERE NOT EXISTS ('
+    'SELECT 1 FROM "stock_snapshots" s WHERE s."productId" = p."id" AND s."month" = ?)'
+)
+# 各货品的 (当前库存, 最近一次检查点的快照 + 之后的净变化)
+SQL_RECONCILE = (
+    'SELECT p."id", p."currentStock", s."stock" + IFNULL(('
+    '  SELECT SUM(CASE t."type" WHEN ? THEN t."quantity" ELSE -t."quantity" END) '
+    '  FROM "transactions" t WHERE t."productId" = p."id" AND t."date" >= ?), 0) '
+    'FROM "products" p JOIN "stock_snapshots" s ON s."productId" = p."id" AND s."month" = ?'
+)
+SQL_SET_STOCK = 'UPDATE "products" SET "currentStock" = ?, "updatedAt" = ? WHERE "id" = ?'
+
+
+def month_range(first, last):
+    """'yyyy-MM' 形式的月份序列，包含首尾"""
+    year, month = int(first[:4]), int(first[5:7])
+    months = []
+    while f"{year:04d}-{month:02d}" <= last:
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+class StockHistory:
+    """历史库存查询、月度快照检查点和库存核对"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def checkpoint(self, today=None):
+        """补齐从第一笔流水所在月到本月的月初库存快照，返回写入的快照行数
+
+        在写事务中进行，与并发的出入库互斥，快照与 currentStock 一致。
+        """
+        current = (today or date.today()).strftime("%Y-%m")
+        with span("stock.checkpoint") as s, self.db.transaction() as conn:
+            first = conn.execute(SQL_FIRST_TRANSACTION_DATE).fetchone()[0]
+            if first is None:
+                return 0
+            done = [month for (month,) in conn.execute(SQL_CHECKPOINT_MONTHS)]
+            existing = set(done)
+            wanted = [month for month in month_range(first[:7], current) if month not in existing]
+            written = 0
+            if wanted:
+                written += _fill(conn, wanted, conn.execute(SQL_CURRENT_STOCKS).fetchall())
+            if done:
+                # 已有检查点之后新建的货品：补上这些月份的快照（只读这些货品的流水）
+                missing = conn.execute(SQL_PRODUCTS_WITHOUT_SNAPSHOT, (done[-1],)).fetchall()
+                if missing:
+                    written += _fill(conn, done, missing)
+            created = now_str()
+            conn.executemany(SQL_INSERT_CHECKPOINT, [(month, created) for month in wanted])
+            s.set(months=len(wanted), rows=written)
+        return written
+
+    def stock_before(self, product_id, day):
+        """某货品在 day（yyyy-MM-dd）当天第一笔流水之前的库存"""
+        with self.db.reader() as conn:
+            return _stock_before(conn, product_id, day)
+
+    def stock_on(self, product_id, day):
+        """某货品在 day（yyyy-MM-dd）当天结束时的库存"""
+        with self.db.reader() as conn:
+            return _stock_before(conn, product_id, _next_day(day))
+
+    def monthly_levels(self, product_id, first_month, last_month):
+        """某货品各月月初的库存 [(yyyy-MM, 库存)]，用于库存走势图
+
+        已生成快照的月份直接读取，其余月份从最近的快照重放。
+        """
+        months = month_range(first_month, last_month)
+        with self.db.reader() as conn:
+            stored = dict(conn.execute(SQL_SNAPSHOT_RANGE, (product_id, first_month, last_month)))
+            return [(month, stored[month] if month in stored
+                     else _stock_before(conn, product_id, f"{month}-01"))
+                    for month in months]
+
+    def reconcile(self, repair=False):
+        """核对 currentStock 与"最近快照 + 之后的流水"，返回不一致的 [(货品 id, 当前库存, 流水推算库存)]
+
+        只读取最近一次检查点之后的流水。repair 为真时按流水推算值修正 currentStock。
+        """
+        with span("stock.reconcile") as s, self.db.transaction() as conn:
+            done = conn.execute(SQL_CHECKPOINT_MONTHS).fetchall()
+            if not done:
+                return []
+            month = done[-1][0]
+            mismatched = [row for row in conn.execute(SQL_RECONCILE, (TYPE_INBOUND, f"{month}-01", month))
+                          if row[1] != row[2]]
+            if repair and mismatched:
+                updated = now_str()
+                conn.executemany(SQL_SET_STOCK, [(expected, updated, product_id)
+                                                 for product_id, _, expected in mismatched])
+            s.set(mismatched=len(mismatched))
+        return mismatched
+
+
+def _fill(conn, months, stocks):
+    """为 stocks 中的货品 [(id, 当前库存)] 写入 months（升序）各月的月初快照
+
+    各月月初库存 = 当前库存 - 该月及以后的净变化，只读取 months[0] 之后的流水。
+    """
+    since = f"{months[0]}-01"
+    changes = {}
+    if len(stocks) > 100:
+        monthly = {}
+        for key in conn.execute(SQL_CHANGES_SINCE, (TYPE_INBOUND, since)):
+            monthly[key[:2]] = monthly.get(key[:2], 0) + key[2]
+        for (product_id, month), net in monthly.items():
+            changes.setdefault(product_id, []).append((month, net))
+    else:
+        for product_id, _ in stocks:
+            changes[product_id] = conn.execute(SQL_PRODUCT_MONTHLY_NET_SINCE,
+                                               (TYPE_INBOUND, product_id, since)).fetchall()
+    descending = months[::-1]
+    rows = []
+    for product_id, stock in sorted(stocks):
+        later = sorted(changes.get(product_id, ()), reverse=True)
+        levels = []
+        i = 0
+        for month in descending:
+            while i < len(later) and later[i][0] >= month:
+                stock -= later[i][1]
+                i += 1
+            levels.append((product_id, month, stock))
+        rows.extend(reversed(levels))  # 按主键顺序写入
+    conn.executemany(SQL_INSERT_SNAPSHOT, rows)
+    return len(rows)
+
+
+def _stock_before(conn, product_id, boundary):
+    """某货品在 boundary（yyyy-MM-dd）之前的库存：最近的快照 ± 与 boundary 之间的流水"""
+    month = boundary[:7]
+    row = conn.execute(SQL_SNAPSHOT_AT_OR_BEFORE, (product_id, month)).fetchone()
+    if row is not None:
+        return row[1] + conn.execute(SQL_PRODUCT_NET_BETWEEN,
+                                     (TYPE_INBOUND, product_id, f"{row[0]}-01", boundary)).fetchone()[0]
+    # 早于第一个快照：从之后最近的快照（没有时为当前库存）往回减
+    row = conn.execute(SQL_SNAPSHOT_AFTER, (product_id, month)).fetchone()
+    if row is not None:
+        return row[1] - conn.execute(SQL_PRODUCT_NET_BETWEEN,
+                                     (TYPE_INBOUND, product_id, boundary, f"{row[0]}-01")).fetchone()[0]
+    current = conn.execute(SQL_CURRENT_STOCK, (product_id,)).fetchone()
+    if current is None:
+        return None
+    return current[0] - conn.execute(SQL_PRODUCT_NET_SINCE,
+                                     (TYPE_INBOUND, product_id, boundary)).fetchone()[0]
+
+
+def _next_day(day):
+    """yyyy-MM-dd 的下一天"""
+    return (date.fromisoformat(day) + timedelta(days=1)).isoformat()
@@ -0,0 +1,592 @@
+"""
+与网站（crm/website）的增量同步
+
+桌面端和网站管理同样的货品、商家和出入库流水。同步只传输上次同步之后
+变化的行，不重新下载整个目录：
+
+- 拉取：远端按变化顺序返回行和游标，本地记下游标，下次从其后继续。每页
+  与游标在同一个写事务中提交，中途断开下次从断点继续；应用当前页的同时
+  已在后台请求下一页
+- 推送：本地按 (修改时间, id) 读取高水位之后的行，按批提交。货品、商家
+  用 updatedAt，流水（写入后不再修改）用 createdAt
+- 拉取写入的行记入 sync_pulled，推送时跳过；请求带上本地的客户端 id，
+  远端也不把本端推送的行再返回，两个方向都不回传
+- 货品、商家按修改时间较新的一方为准（出入库也会更新货品的修改时间，
+  与网站端一致）；流水按 id 去重
+- 库存以流水为准：拉取的流水按数量调整本地库存。拉取时新建的货品，期初
+  库存取远端的 currentStock，其中已包含修改时间之前的流水，这些流水不再
+  调整库存（推送时远端按同样的规则处理）
+- 删除不同步
+
+界面上的修改另由离线发件箱（outbox.py）在后台及时补发；这里的高水位推送
+仍覆盖全部本地变化（包括导入的数据），已补发过的行远端按 id 和修改时间去重。
+
+HTTP 使用保持连接的连接池（http.client），请求和响应都用 gzip 压缩。
+sync_mock_server.py 为协议的本地实现，用于测试和基准测试。
+"""
+
+import gzip
+import http.client
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+from urllib.parse import urlencode, urlsplit
+
+from database.db_manager import get_database, new_id, now_str, DATE_FORMAT
+from database.report_cache import get_report_cache
+from database.stock_alerts import get_stock_alerts
+from database.repositories import (SQL_INSERT_TRANSACTION,
+                                   SQL_ADD_OUTBOUND_ROLLUP, SQL_SHIFT_STOCK_SNAPSHOTS,
+                                   TYPE_OUTBOUND, TYPE_LABELS, add_movement_totals)
+from utils.tracing import span
+
+
+# 同步服务器地址和认证令牌（未设置地址时不同步）
+SYNC_URL_ENV = "MINICRM_SYNC_URL"
+SYNC_TOKEN_ENV = "MINICRM_SYNC_TOKEN"
+
+# 协议（JSON，响应格式与网站 API 一致：{"success", "message", "data"}）：
+#   GET  /api/sync/<种类>?cursor=<游标>&limit=<行数>&client=<客户端 id>
+#        -> data: {"items": [...], "cursor": 下一页的游标, "hasMore": 是否还有}
+#   POST /api/sync/<种类>  {"client": 客户端 id, "items": [...]}
+#        -> data: {"applied": 写入的行数}
+# 推送的行可带幂等键 "key"（离线发件箱补发时），远端对处理过的键不再重复写入
+# 字段名与 prisma/schema.prisma 一致，时间为 ISO 8601 UTC（与 Prisma 的 JSON 输出一致）
+SYNC_PATH = "/api/sync/"
+
+ENTITY_PRODUCTS = "products"
+ENTITY_MERCHANTS = "merchants"
+ENTITY_TRANSACTIONS = "transactions"
+# 按外键依赖的顺序同步
+ENTITIES = (ENTITY_PRODUCTS, ENTITY_MERCHANTS, ENTITY_TRANSACTIONS)
+ENTITY_LABELS = {ENTITY_PRODUCTS: "货品", ENTITY_MERCHANTS: "商家", ENTITY_TRANSACTIONS: "出入库记录"}
+
+# 各种数据传输的字段（与本地表的列同名，sku 为桌面端扩展字段）
+FIELDS = {
+    ENTITY_PRODUCTS: ("id", "name", "specification", "unit", "currentStock", "imageUrl",
+                      "createdAt", "updatedAt", "sku"),
+    ENTITY_MERCHANTS: ("id", "name", "contact", "phone", "address", "createdAt", "updatedAt"),
+    ENTITY_TRANSACTIONS: ("id", "productId", "merchantId", "type", "quantity", "date", "notes",
+                          "createdAt"),
+}
+# 推送的高水位所用的修改时间
+STAMP_FIELDS = {ENTITY_PRODUCTS: "updatedAt", ENTITY_MERCHANTS: "updatedAt",
+                ENTITY_TRANSACTIONS: "createdAt"}
+TIME_FIELDS = frozenset(("date", "createdAt", "updatedAt"))
+DEFAULTS = {"unit": "个", "currentStock": 0}
+
+DIRECTION_PULL = "pull"
+DIRECTION_PUSH = "push"
+DIRECTION_CLIENT = "client"  # 本端的客户端 id 也保存在 sync_state 中（种类为空）
+
+# 每次拉取、推送的行数
+PAGE_SIZE = 2000
+PUSH_BATCH_SIZE = 2000
+
+# 请求体达到该大小时用 gzip 压缩
+GZIP_MIN_BYTES = 1024
+
+# 连接池中保留的空闲连接数；请求超时（秒）
+POOL_SIZE = 4
+TIMEOUT = 30
+
+# 按 id 查询本地行时每条语句的 id 个数（低于旧版 SQLite 的参数个数上限）
+LOOKUP_CHUNK = 500
+
+WIRE_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.000Z"
+
+SQL_SYNC_STATE = (
+    'SELECT "stamp", "lastId" FROM "sync_state" WHERE "remote" = ? AND "entity" = ? AND "direction" = ?'
+)
+SQL_SAVE_SYNC_STATE = (
+    'INSERT INTO "sync_state" ("remote", "entity", "direction", "stamp", "lastId", "updatedAt") '
+    'VALUES (?, ?, ?, ?, ?, ?) '
+    'ON CONFLICT ("remote", "entity", "direction") '
+    'DO UPDATE SET "stamp" = excluded."stamp", "lastId" = excluded."lastId", "updatedAt" = excluded."updatedAt"'
+)
+SQL_MARK_PULLED = (
+    'INSERT INTO "sync_pulled" ("remote", "entity", "id", "stamp", "opening") VALUES (?, ?, ?, ?, ?) '
+    'ON CONFLICT ("remote", "entity", "id") '
+    'DO UPDATE SET "stamp" = excluded."stamp", "opening" = IFNULL("opening", excluded."opening")'
+)
+SQL_CLEAR_PULLED = 'DELETE FROM "sync_pulled" WHERE "remote" = ? AND "entity" = ? AND "stamp" < ?'
+
+SQL_PULL_INSERT_PRODUCT = (
+    'INSERT INTO "products" ("id", "name", "specification", "unit", "currentStock", "imageUrl", '
+    '"createdAt", "updatedAt", "sku") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+SQL_PULL_UPDATE_PRODUCT = (
+    'UPDATE "products" SET "name" = ?, "specification" = ?, "unit" = ?, "imageUrl" = ?, '
+    '"updatedAt" = ?, "sku" = IFNULL(?, "sku") WHERE "id" = ?'
+)
+SQL_PULL_INSERT_MERCHANT = (
+    'INSERT INTO "merchants" ("id", "name", "contact", "phone", "address", "createdAt", "updatedAt") '
+    'VALUES (?, ?, ?, ?, ?, ?, ?)'
+)
+SQL_PULL_UPDATE_MERCHANT = (
+    'UPDATE "merchants" SET "name" = ?, "contact" = ?, "phone" = ?, "address" = ?, "updatedAt" = ? '
+    'WHERE "id" = ?'
+)
+# 拉取的流水调整库存；修改时间取流水的写入时间，不因拉取而比远端更新
+SQL_PULL_MOVE_STOCK = (
+    'UPDATE "products" SET "currentStock" = "currentStock" + ?, "updatedAt" = MAX("updatedAt", ?) '
+    'WHERE "id" = ?'
+)
+SQL_LOOKUP_UPDATED = {entity: f'SELECT "id", "updatedAt" FROM "{entity}" WHERE "id" IN ({{marks}})'
+                      for entity in (ENTITY_PRODUCTS, ENTITY_MERCHANTS)}
+SQL_LOOKUP_TRANSACTIONS = 'SELECT "id" FROM "transactions" WHERE "id" IN ({marks})'
+SQL_LOOKUP_MERCHANTS = 'SELECT "id" FROM "merchants" WHERE "id" IN ({marks})'
+# 货品及其期初库存时间（拉取时新建的货品）
+SQL_LOOKUP_OPENING = (
+    'SELECT p."id", s."opening" FROM "products" AS p LEFT JOIN "sync_pulled" AS s '
+    'ON s."remote" = ? AND s."entity" = \'products\' AND s."id" = p."id" '
+    'WHERE p."id" IN ({marks})'
+)
+
+
+def _changed_sql(entity):
+    """高水位之后、截止时间之前本地变化的行（跳过拉取写入、之后未再修改的行）"""
+    stamp = STAMP_FIELDS[entity]
+    columns = ", ".join(f't."{name}"' for name in FIELDS[entity])
+    return (f'SELECT {columns} FROM "{entity}" AS t '
+            f'WHERE (t."{stamp}", t."id") > (?, ?) AND t."{stamp}" < ? '
+            f'AND NOT EXISTS (SELECT 1 FROM "sync_pulled" AS s WHERE s."remote" = ? '
+            f'AND s."entity" = \'{entity}\' AND s."id" = t."id" AND s."stamp" = t."{stamp}") '
+            f'ORDER BY t."{stamp}", t."id" LIMIT ?')
+
+
+SQL_CHANGED = {entity: _changed_sql(entity) for entity in ENTITIES}
+
+
+@lru_cache(maxsize=65536)
+def to_wire_time(text):
+    """本地时间（DATE_FORMAT，或只有日期）-> ISO 8601 UTC"""
+    if not text:
+        return None
+    value = datetime.strptime(text[:19] if len(text) > 10 else text + " 00:00:00", DATE_FORMAT)
+    return value.astimezone(timezone.utc).strftime(WIRE_TIME_FORMAT)
+
+
+@lru_cache(maxsize=65536)
+def from_wire_time(text):
+    """ISO 8601（没有时区时按 UTC）-> 本地时间（DATE_FORMAT）"""
+    if not text:
+        return None
+    value = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone().strftime(DATE_FORMAT)
+
+
+class SyncError(Exception):
+    """同步失败（无法连接、远端返回错误或无法解析的响应）"""
+
+
+class HttpSession:
+    """到一个同步服务器的 HTTP 连接池
+
+    连接保持打开并复用（HTTP/1.1 keep-alive），省去每个请求的 TCP/TLS
+    握手；请求体和响应都用 gzip 压缩。可在多个线程中同时使用，每个请求
+    借出一个连接，完成后归还。
+    """
+
+    def __init__(self, base_url, token=None, pool_size=POOL_SIZE, timeout=TIMEOUT):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"无效的同步服务器地址：{base_url}")
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._connection_class = (http.client.HTTPSConnection if parts.scheme == "https"
+                                  else http.client.HTTPConnection)
+        self._address = (parts.hostname, parts.port)
+        self._prefix = parts.path.rstrip("/")
+        self._idle = []
+        self._lock = threading.Lock()
+        # 统计：请求数、新建的连接数、发送和接收的字节数（压缩后）
+        self.requests = 0
+        self.connections = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def get(self, path, params=None):
+        return self.request("GET", f"{path}?{urlencode(params)}" if params else path)
+
+    def post(self, path, payload):
+        return self.request("POST", path, payload)
+
+    def request(self, method, path, payload=None):
+        """发送请求，返回响应中的 data；失败时抛出 SyncError"""
+        headers = {"Accept": "application/json", "Accept-Encoding": "gzip"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        body = None
+        if payload is not None:
+            body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            headers["Content-Type"] = "application/json; charset=utf-8"
+            if len(body) >= GZIP_MIN_BYTES:
+                body = gzip.compress(body, compresslevel=6)
+                headers["Content-Encoding"] = "gzip"
+        while True:
+            conn, reused = self._acquire()
+            try:
+                conn.request(method, self._prefix + path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (ConnectionError, http.client.BadStatusLine) as e:
+                conn.close()
+                if reused:
+                    continue  # 空闲的连接已被服务器关闭：换一个连接重试（同步请求都可重复执行）
+                raise SyncError(f"无法连接同步服务器：{e}") from e
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                raise SyncError(f"无法连接同步服务器：{e}") from e
+            break
+        self._release(conn, response)
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += len(body or b"")
+            self.bytes_received += len(data)
+        try:
+            if response.getheader("Content-Encoding", "").lower() == "gzip":
+                data = gzip.decompress(data)
+            result = json.loads(data.decode("utf-8")) if data else {}
+        except (OSError, ValueError) as e:
+            raise SyncError(f"同步服务器返回了无法解析的响应（HTTP {response.status}）") from e
+        if response.status >= 400 or not isinstance(result, dict) or not result.get("success"):
+            message = result.get("message") if isinstance(result, dict) else None
+            raise SyncError(message or f"同步服务器返回错误（HTTP {response.status}）")
+        return result.get("data")
+
+    def close(self):
+        """关闭空闲的连接"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def _acquire(self):
+        """借出一个连接，返回 (连接, 是否为复用的空闲连接)"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+            self.connections += 1
+        return self._connection_class(*self._address, timeout=self.timeout), False
+
+    def _release(self, conn, response):
+        if response.will_close:
+            conn.close()
+            return
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+
+class SyncResult:
+    """一次同步的统计"""
+
+    def __init__(self):
+        self.pulled = dict.fromkeys(ENTITIES, 0)
+        self.pushed = dict.fromkeys(ENTITIES, 0)
+        self.skipped = 0  # 货品在本地已删除而跳过的拉取流水
+        self.elapsed = 0.0
+
+    def summary(self):
+        def counts(values):
+            return "、".join(f"{ENTITY_LABELS[entity]} {values[entity]} 条" for entity in ENTITIES)
+
+        text = f"拉取 {counts(self.pulled)}；推送 {counts(self.pushed)}"
+        if self.skipped:
+            text += f"；跳过 {self.skipped} 条货品已删除的出入库记录"
+        return text
+
+
+def to_wire_items(entity, rows):
+    """本地行（按 FIELDS 的列顺序）-> 推送的行（时间换算为 ISO 8601 UTC）"""
+    fields = FIELDS[entity]
+    times = [i for i, name in enumerate(fields) if name in TIME_FIELDS]
+    items = []
+    for row in rows:
+        item = dict(zip(fields, row))
+        for i in times:
+            item[fields[i]] = to_wire_time(row[i])
+        items.append(item)
+    return items
+
+
+def _lookup(conn, sql, ids, *params):
+    """按 id 分段查询（sql 中的 {marks} 替换为占位符），返回全部结果行"""
+    rows = []
+    for i in range(0, len(ids), LOOKUP_CHUNK):
+        chunk = ids[i:i + LOOKUP_CHUNK]
+        marks = ", ".join("?" * len(chunk))
+        rows.extend(conn.execute(sql.format(marks=marks), (*params, *chunk)))
+    return rows
+
+
+class SyncEngine:
+    """本地数据库与一个同步服务器的增量同步，同一时刻只进行一次 sync()
+
+    给出与 db 对应的 report_cache（ReportCache）、alerts（StockAlertEngine）时，
+    拉取的每页提交后使涉及的商家年度报告失效、记下涉及的货品。clock 返回推送的
+    截止时间（与 now_str() 同格式）。
+    """
+
+    def __init__(self, db, session, page_size=PAGE_SIZE, batch_size=PUSH_BATCH_SIZE,
+                 report_cache=None, alerts=None, clock=now_str):
+        self.db = db
+        self.session = session
+        self.clock = clock
+        self.report_cache = report_cache
+        self.alerts = alerts
+        self.remote = session.base_url
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._client_id = None
+
+    @property
+    def client_id(self):
+        """本端在该远端的客户端 id（首次使用时生成并保存）"""
+        if self._client_id is None:
+            with self.db.transaction() as conn:
+                row = conn.execute(SQL_SYNC_STATE, (self.remote, "", DIRECTION_CLIENT)).fetchone()
+                if row is None:
+                    row = (new_id(), "")
+                    conn.execute(SQL_SAVE_SYNC_STATE,
+                                 (self.remote, "", DIRECTION_CLIENT, row[0], "", now_str()))
+            self._client_id = row[0]
+        return self._client_id
+
+    def sync(self):
+        """先拉取、再推送全部种类的变化，返回 SyncResult
+
+        失败时抛出 SyncError；已提交的页和批次不会再次传输，下次从断点继续。
+        """
+        with self._lock, span("sync.run") as s:
+            result = SyncResult()
+            start = time.perf_counter()
+            # 只推送此刻之前的修改：同一秒内稍后的修改留到下次，不会因高水位越过而遗漏
+            cutoff = self.clock()
+            for entity in ENTITIES:
+                result.pulled[entity] = self._pull(entity, result)
+            for entity in ENTITIES:
+                result.pushed[entity] = self._push(entity, cutoff)
+            result.elapsed = time.perf_counter() - start
+            s.set(pulled=sum(result.pulled.values()), pushed=sum(result.pushed.values()))
+            return result
+
+    # ---- 拉取 ----
+
+    def _pull(self, entity, result):
+        with self.db.reader() as conn:
+            cursor = self._mark(conn, entity, DIRECTION_PULL)[0]
+        apply = {ENTITY_PRODUCTS: self._apply_products, ENTITY_MERCHANTS: self._apply_merchants,
+                 ENTITY_TRANSACTIONS: self._apply_transactions}[entity]
+        total = 0
+        with ThreadPoolExecutor(1) as prefetch:
+            future = prefetch.submit(self._fetch, entity, cursor)
+            while True:
+                items, cursor, more = future.result()
+                if more:
+                    # 应用这一页的同时请求下一页
+                    future = prefetch.submit(self._fetch, entity, cursor)
+                with span("sync.pull", entity=entity, rows=len(items)):
+                    with self.db.transaction() as conn:
+                        keys = apply(conn, items, result)
+                        self._save_mark(conn, entity, DIRECTION_PULL, cursor, "")
+                if keys and self.report_cache is not None:
+                    # 提交后使涉及的商家年度报告失效
+                    self.report_cache.invalidate(keys)
+                if self.alerts is not None and entity != ENTITY_MERCHANTS:
+                    # 重新评估涉及货品的库存预警
+                    field = "id" if entity == ENTITY_PRODUCTS else "productId"
+                    self.alerts.touch(item[field] for item in items)
+                total += len(items)
+                if not more:
+                    return total
+
+    def _fetch(self, entity, cursor):
+        data = self.session.get(SYNC_PATH + entity, {"cursor": cursor, "limit": self.page_size,
+                                                     "client": self.client_id})
+        try:
+            return list(data["items"]), str(data["cursor"]), bool(data.get("hasMore"))
+        except (KeyError, TypeError) as e:
+            raise SyncError("同步服务器返回的数据格式不正确") from e
+
+    def _local_rows(self, entity, items):
+        """远端的行 -> 按本地列顺序的列表（时间换算为本地时间）"""
+        fields = FIELDS[entity]
+        defaults = [(i, DEFAULTS[name]) for i, name in enumerate(fields) if name in DEFAULTS]
+        times = [i for i, name in enumerate(fields) if name in TIME_FIELDS]
+        rows = []
+        for item in items:
+            row = list(map(item.get, fields))
+            for i, value in defaults:
+                if row[i] is None:
+                    row[i] = value
+            for i in times:
+                row[i] = from_wire_time(row[i])
+            rows.append(row)
+        if entity != ENTITY_TRANSACTIONS:
+            created, updated = fields.index("createdAt"), fields.index("updatedAt")
+            for row in rows:
+                row[created] = row[created] or row[updated]
+        return rows
+
+    def _apply_catalog(self, conn, entity, items, insert_sql, update_sql, update_values, opening):
+        """按修改时间较新的一方为准写入货品或商家，记入 sync_pulled
+
+        update_values 把一行转换为 update_sql 的参数；opening 为真时新建的行
+        记下期初库存时间。
+        """
+        rows = self._local_rows(entity, items)
+        updated = FIELDS[entity].index("updatedAt")
+        local = dict(_lookup(conn, SQL_LOOKUP_UPDATED[entity], [row[0] for row in rows]))
+        inserts = []
+        updates = []
+        pulled = []
+        for row in rows:
+            item_id, stamp = row[0], row[updated]
+            if item_id not in local:
+                inserts.append(row)
+                pulled.append((self.remote, entity, item_id, stamp, stamp if opening else None))
+            elif stamp > local[item_id]:
+                updates.append(update_values(row))
+                pulled.append((self.remote, entity, item_id, stamp, None))
+        conn.executemany(insert_sql, inserts)
+        conn.executemany(update_sql, updates)
+        conn.executemany(SQL_MARK_PULLED, pulled)
+
+    def _apply_products(self, conn, items, result):
+        # 已有的货品只更新基础信息，库存由流水调整
+        def update_values(row):
+            item_id, name, specification, unit, _, image_url, _, updated_at, sku = row
+            return name, specification, unit, image_url, updated_at, sku, item_id
+
+        self._apply_catalog(conn, ENTITY_PRODUCTS, items, SQL_PULL_INSERT_PRODUCT,
+                            SQL_PULL_UPDATE_PRODUCT, update_values, opening=True)
+
+    def _apply_merchants(self, conn, items, result):
+        def update_values(row):
+            item_id, name, contact, phone, address, _, updated_at = row
+            return name, contact, phone, address, updated_at, item_id
+
+        self._apply_catalog(conn, ENTITY_MERCHANTS, items, SQL_PULL_INSERT_MERCHANT,
+                            SQL_PULL_UPDATE_MERCHANT, update_values, opening=False)
+
+    def _apply_transactions(self, conn, items, result):
+        """写入本地没有的流水并调整库存、快照和月度汇总，返回需失效的 (商家, 年份)"""
+        rows = self._local_rows(ENTITY_TRANSACTIONS, items)
+        ids = [row[0] for row in rows]
+        existing = {row[0] for row in _lookup(conn, SQL_LOOKUP_TRANSACTIONS, ids)}
+        products = dict(_lookup(conn, SQL_LOOKUP_OPENING, list({row[1] for row in rows}),
+                                self.remote))
+        merchants = {row[0] for row in _lookup(
+            conn, SQL_LOOKUP_MERCHANTS, list({row[2] for row in rows if row[2]}))}
+        records = []
+        pulled = []
+        stock = {}
+        shifts = {}
+        rollup = {}
+        daily = {}
+        for tx_id, product_id, merchant_id, tx_type, quantity, day, notes, created_at in rows:
+            if tx_id in existing:
+                continue
+            if product_id not in products or tx_type not in TYPE_LABELS:
+                result.skipped += 1
+                continue
+            if merchant_id not in merchants:
+                merchant_id = None  # 商家在本地已删除（与删除商家时的处理一致）
+            quantity = int(quantity)
+            records.append((tx_id, product_id, merchant_id, tx_type, quantity, day, notes, created_at))
+            pulled.append((self.remote, ENTITY_TRANSACTIONS, tx_id, created_at, None))
+            totals = daily.setdefault((day[:10], tx_type), [0, 0])
+            totals[0] += quantity
+            totals[1] += 1
+            if tx_type == TYPE_OUTBOUND and merchant_id:
+                key = (merchant_id, day[:7], product_id)
+                rollup[key] = rollup.get(key, 0) + quantity
+            opening = products[product_id]
+            if opening is not None and created_at <= opening:
+                continue  # 已计入拉取货品时的期初库存
+            change = -quantity if tx_type == TYPE_OUTBOUND else quantity
+            moved = stock.setdefault(product_id, [0, created_at])
+            moved[0] += change
+            moved[1] = max(moved[1], created_at)
+            key = (product_id, day[:7])
+            shifts[key] = shifts.get(key, 0) + change
+        # 远端已记录的出库不因本地库存不足而拒绝
+        conn.executemany(SQL_INSERT_TRANSACTION, records)
+        conn.executemany(SQL_PULL_MOVE_STOCK, [(change, created_at, product_id)
+                                               for product_id, (change, created_at) in stock.items()])
+        conn.executemany(SQL_ADD_OUTBOUND_ROLLUP,
+                         [key + (quantity,) for key, quantity in rollup.items()])
+        conn.executemany(SQL_SHIFT_STOCK_SNAPSHOTS,
+                         [(change,) + key for key, change in shifts.items() if change])
+        add_movement_totals(conn, daily, rollup)
+        conn.executemany(SQL_MARK_PULLED, pulled)
+        return {(merchant_id, month[:4]) for merchant_id, month, _ in rollup}
+
+    # ---- 推送 ----
+
+    def _push(self, entity, cutoff):
+        with self.db.reader() as conn:
+            stamp, last_id = self._mark(conn, entity, DIRECTION_PUSH)
+        position = FIELDS[entity].index(STAMP_FIELDS[entity])
+        total = 0
+        while True:
+            with self.db.reader() as conn:
+                rows = conn.execute(SQL_CHANGED[entity], (stamp, last_id, cutoff, self.remote,
+                                                          self.batch_size)).fetchall()
+            if not rows:
+                break
+            items = to_wire_items(entity, rows)
+            with span("sync.push", entity=entity, rows=len(rows)):
+                self.session.post(SYNC_PATH + entity, {"client": self.client_id, "items": items})
+            stamp, last_id = rows[-1][position], rows[-1][0]
+            with self.db.transaction() as conn:
+                self._save_mark(conn, entity, DIRECTION_PUSH, stamp, last_id)
+            total += len(rows)
+            if len(rows) < self.batch_size:
+                break
+        # 截止时间之前的都已推送；拉取记录只在推送时用于跳过，随之清除
+        with self.db.transaction() as conn:
+            if cutoff > stamp:
+                self._save_mark(conn, entity, DIRECTION_PUSH, cutoff, "")
+            conn.execute(SQL_CLEAR_PULLED, (self.remote, entity, cutoff))
+        return total
+
+    # ---- 高水位 ----
+
+    def _mark(self, conn, entity, direction):
+        row = conn.execute(SQL_SYNC_STATE, (self.remote, entity, direction)).fetchone()
+        return row or ("", "")
+
+    def _save_mark(self, conn, entity, direction, stamp, last_id):
+        conn.execute(SQL_SAVE_SYNC_STATE, (self.remote, entity, direction, stamp, last_id, now_str()))
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_sync_engine():
+    """获取全局同步引擎；未设置同步服务器地址（MINICRM_SYNC_URL）时返回 None"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            url = os.environ.get(SYNC_URL_ENV)
+            if not url:
+                return None
+            session = HttpSession(url, token=os.environ.get(SYNC_TOKEN_ENV))
+            _engine = SyncEngine(get_database(), session, report_cache=get_report_cache(),
+                                 alerts=get_stock_alerts())
+        return _engine
@@ -0,0 +1,250 @@
+"""
+增量同步协议（sync.py）的本地实现，用于测试和基准测试
+
+在本进程的后台线程中运行 HTTP/1.1 服务（保持连接、gzip 压缩），数据保存
+在内存中。行为与网站端同步接口的约定一致：
+
+- 每次写入一行时分配递增的序号，拉取的游标即最后一个序号；同一行再次
+  写入后只按新序号返回一次
+- 拉取时不返回由请求方自己推送的行（按客户端 id 区分）
+- 推送的货品、商家按修改时间较新的一方为准；已有货品的库存只由流水调整
+- 推送的流水按 id 去重并调整库存，推送时新建的货品的期初库存已包含修改
+  时间之前的流水；库存变化时货品的修改时间随之更新（与网站端出入库接口
+  同时更新货品一致）
+- 推送的行带幂等键（key）时，处理过的键不再处理（重发的批次不重复写入）
+"""
+
+import bisect
+import gzip
+import json
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from database.db_manager import new_id
+from database.sync import (SYNC_PATH, ENTITIES, ENTITY_PRODUCTS, ENTITY_MERCHANTS,
+                           ENTITY_TRANSACTIONS, GZIP_MIN_BYTES)
+from database.repositories import TYPE_OUTBOUND
+
+
+def server_time():
+    """服务端当前时间（ISO 8601 UTC，毫秒）"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:23] + "Z"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # 响应头和响应体分两次写出，避免与延迟确认叠加出 40 ms 的等待
+
+    def setup(self):
+        super().setup()
+        self.server.mock.count("connections")
+
+    def do_GET(self):
+        entity = self._entity()
+        if entity is None:
+            return
+        query = parse_qs(urlsplit(self.path).query)
+        cursor = query.get("cursor", [""])[0]
+        try:
+            cursor = int(cursor or 0)
+            limit = int(query.get("limit", ["500"])[0])
+        except ValueError:
+            self._send(400, False, "参数无效")
+            return
+        items, cursor, more = self.server.mock.changes(entity, cursor, limit,
+                                                       query.get("client", [None])[0])
+        self._send(200, True, "获取变化成功", {"items": items, "cursor": str(cursor), "hasMore": more})
+
+    def do_POST(self):
+        entity = self._entity()
+        if entity is None:
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            if self.headers.get("Content-Encoding", "").lower() == "gzip":
+                body = gzip.decompress(body)
+            payload = json.loads(body.decode("utf-8"))
+            items = payload["items"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self._send(400, False, "请求数据无效")
+            return
+        applied = self.server.mock.apply(entity, items, payload.get("client"))
+        self._send(200, True, "同步成功", {"applied": applied})
+
+    def _entity(self):
+        """校验令牌和路径，返回数据种类；无效时已发送错误响应并返回 None"""
+        self.server.mock.count("requests")
+        token = self.server.mock.token
+        if token and self.headers.get("Authorization") != f"Bearer {token}":
+            self._send(401, False, "未提供认证令牌")
+            return None
+        path = urlsplit(self.path).path
+        entity = path[len(SYNC_PATH):] if path.startswith(SYNC_PATH) else None
+        if entity not in ENTITIES:
+            self._send(404, False, "接口不存在")
+            return None
+        return entity
+
+    def _send(self, status, success, message, data=None):
+        body = {"success": success, "message": message}
+        if data is not None:
+            body["data"] = data
+        body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        if len(body) >= GZIP_MIN_BYTES and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # 不输出访问日志
+
+
+class MockSyncServer:
+    """内存中的同步服务器：start() 后通过 url 访问，stop() 停止
+
+    put() 模拟在网站端直接写入，items() 返回当前数据；requests、connections
+    为收到的请求数和建立的连接数。clock 返回 put() 写入的时间（与 server_time()
+    同格式）。
+    """
+
+    def __init__(self, token=None, host="127.0.0.1", port=0, clock=server_time):
+        self.token = token
+        self.clock = clock
+        self.requests = 0
+        self.connections = 0
+        self._address = (host, port)
+        self._server = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._rows = {entity: {} for entity in ENTITIES}      # id -> 行（协议字段）
+        self._versions = {entity: {} for entity in ENTITIES}  # id -> (序号, 写入的客户端 id)
+        self._log = {entity: ([], []) for entity in ENTITIES}  # 按写入顺序的 ([序号], [id])
+        self._opening = {}  # 推送时新建的货品 -> 期初库存包含的流水的截止时间
+        self._keys = set()  # 处理过的幂等键
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._server = ThreadingHTTPServer(self._address, _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    # ---- 数据 ----
+
+    def put(self, entity, items):
+        """模拟网站端写入（新建或修改），未给出的 id 和时间由服务端生成，返回写入的行"""
+        written = []
+        with self._lock:
+            for item in items:
+                item = dict(item)
+                item.setdefault("id", new_id())
+                now = self.clock()
+                item.setdefault("createdAt", now)
+                if entity != ENTITY_TRANSACTIONS:
+                    item["updatedAt"] = now
+                if entity == ENTITY_PRODUCTS:
+                    current = self._rows[entity].get(item["id"])
+                    item.setdefault("currentStock", current["currentStock"] if current else 0)
+                elif entity == ENTITY_TRANSACTIONS and item["id"] not in self._rows[entity]:
+                    self._move_stock(self._rows[ENTITY_PRODUCTS][item["productId"]], item, None)
+                self._write(entity, item, None)
+                written.append(item)
+        return written
+
+    def items(self, entity):
+        with self._lock:
+            return [dict(item) for item in self._rows[entity].values()]
+
+    def changes(self, entity, cursor, limit, client):
+        """游标之后写入的行（不含 client 推送的），返回 (行, 新游标, 是否还有)"""
+        with self._lock:
+            sequences, ids = self._log[entity]
+            versions = self._versions[entity]
+            index = bisect.bisect_right(sequences, cursor)
+            items = []
+            while index < len(sequences) and len(items) < limit:
+                sequence, item_id = sequences[index], ids[index]
+                index += 1
+                cursor = sequence
+                version = versions[item_id]
+                if version[0] == sequence and (client is None or version[1] != client):
+                    items.append(dict(self._rows[entity][item_id]))
+            return items, cursor, index < len(sequences)
+
+    def apply(self, entity, items, client):
+        """写入推送的行，返回实际写入的行数"""
+        applied = 0
+        with self._lock:
+            rows = self._rows[entity]
+            for item in items:
+                key = item.pop("key", None)
+                if key is not None:
+                    if key in self._keys:
+                        continue
+                    self._keys.add(key)
+                current = rows.get(item["id"])
+                if entity == ENTITY_TRANSACTIONS:
+                    product = self._rows[ENTITY_PRODUCTS].get(item["productId"])
+                    if current is not None or product is None:
+                        continue
+                    if item.get("merchantId") not in self._rows[ENTITY_MERCHANTS]:
+                        item = dict(item, merchantId=None)
+                    opening = self._opening.get(product["id"])
+                    if opening is None or item["createdAt"] > opening:
+                        self._move_stock(product, item, client)
+                elif current is None:
+                    if entity == ENTITY_PRODUCTS:
+                        self._opening[item["id"]] = item["updatedAt"]
+                elif item["updatedAt"] > current["updatedAt"]:
+                    if entity == ENTITY_PRODUCTS:
+                        item = dict(item, currentStock=current["currentStock"])
+                else:
+                    continue
+                self._write(entity, dict(item), client)
+                applied += 1
+        return applied
+
+    def _write(self, entity, item, client):
+        self._sequence += 1
+        self._rows[entity][item["id"]] = item
+        self._versions[entity][item["id"]] = (self._sequence, client)
+        sequences, ids = self._log[entity]
+        sequences.append(self._sequence)
+        ids.append(item["id"])
+
+    def _move_stock(self, product, transaction, client):
+        change = transaction["quantity"]
+        product["currentStock"] += -change if transaction["type"] == TYPE_OUTBOUND else change
+        product["updatedAt"] = max(product["updatedAt"], transaction["createdAt"])
+        self._write(ENTITY_PRODUCTS, product, client)
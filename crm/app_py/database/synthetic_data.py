@@ -0,0 +1,322 @@
+"""
+合成测试数据生成器
+
+按随机数种子确定性地生成货品、商家和多年逐日出入库流水，直接写入真实的
+表结构（先执行迁移），用于在接近真实规模的数据上测量性能。
+
+- 商家按原销售分析中五家商家的月度曲线（base_values）建模，每家商家在
+  所属曲线上叠加个体差异、规模和逐年增长
+- 每天的流水条数随季节和星期变化，总条数精确等于设定值
+- 旺季批量采购的概率更高，数量为平常的数倍
+- 货品销量呈长尾分布；库存按流水推算，任何时刻都不为负
+- 流水按日期顺序成批写入，内存占用与流水总数无关；二级索引在写完后
+  统一重建，比逐行维护快得多
+
+    python -m database.synthetic_data data.db --transactions 10000000 --years 5
+"""
+
+import argparse
+import bisect
+import itertools
+import random
+import sqlite3
+import sys
+import time
+from array import array
+from datetime import date, timedelta
+
+from database.db_manager import Database, FILL_OUTBOUND_ROLLUP_SQL, FILL_DASHBOARD_TOTALS
+from database.repositories import (SQL_INSERT_PRODUCT, SQL_INSERT_MERCHANT,
+                                   SQL_INSERT_TRANSACTION, TYPE_INBOUND, TYPE_OUTBOUND)
+
+
+# 原销售分析中各商家的 12 个月采购量（箱），作为季节曲线和规模的基准
+SEASONAL_PROFILES = {
+    "超市A": [120, 95, 180, 160, 140, 110, 130, 150, 125, 135, 145, 100],
+    "超市B": [80, 70, 140, 120, 100, 90, 110, 130, 105, 115, 125, 85],
+    "超市C": [100, 85, 160, 140, 120, 100, 120, 140, 115, 125, 135, 95],
+    "便利店D": [60, 50, 100, 80, 70, 60, 80, 90, 75, 85, 95, 65],
+    "商场E": [150, 120, 200, 180, 160, 130, 150, 170, 145, 155, 165, 125],
+}
+
+# 商家类型：(名称后缀, 季节曲线, 出现权重, 单笔平均箱数)
+MERCHANT_KINDS = [
+    ("超市", "超市A", 3, 8),
+    ("生鲜超市", "超市B", 3, 6),
+    ("社区超市", "超市C", 3, 5),
+    ("便利店", "便利店D", 4, 2),
+    ("购物中心", "商场E", 1, 12),
+]
+
+# 周一 ~ 周日的流水量系数
+WEEKDAY_FACTORS = [0.9, 0.85, 0.9, 0.95, 1.1, 1.2, 1.1]
+
+ORIGINS = ["山东", "新疆", "海南", "云南", "陕西", "广西", "福建", "四川", "甘肃", "浙江"]
+KINDS = ["苹果", "香蕉", "橙子", "葡萄", "草莓", "梨", "芒果", "猕猴桃", "柚子", "桃子",
+         "樱桃", "荔枝", "火龙果", "蓝莓", "西瓜", "哈密瓜"]
+GRADES = ["特级", "一级", "二级", "精品", "礼盒"]
+PACKAGES = [("箱", "5kg/箱"), ("箱", "10kg/箱"), ("盒", "500g/盒"), ("袋", "2kg/袋"), ("个", "单个")]
+CITIES = ["北京", "上海", "广州", "深圳", "杭州", "成都", "武汉", "西安", "南京", "重庆"]
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何林罗高"
+OUTBOUND_NOTES = [None, None, None, "正常销售", "日常销售", "促销活动"]
+INBOUND_NOTES = ["补货", "新到货", None]
+BULK_NOTE = "批量采购"
+
+INBOUND_SHARE = 0.2        # 入库流水占比
+BULK_PROBABILITY = 0.02    # 季节系数为 1 时的批量采购概率，旺季按系数的三次方放大
+POPULARITY_EXPONENT = 0.9  # 货品销量的长尾程度（Zipf 指数）
+BATCH_SIZE = 50000         # 每个写事务的流水条数
+
+
+def _id_factory(rng):
+    """与 cuid 一样前缀递增：按生成顺序有序，主键索引只在末尾追加"""
+    counter = itertools.count(1)
+
+    def next_id():
+        return f"c{next(counter):012x}{rng.getrandbits(48):012x}"
+    return next_id
+
+
+def _product(i, rng):
+    """第 i 个货品的 (名称, SKU, 规格, 单位)"""
+    unit, specification = rng.choice(PACKAGES)
+    name = f"{rng.choice(ORIGINS)}{rng.choice(KINDS)}{rng.choice(GRADES)}"
+    if i >= len(ORIGINS) * len(KINDS):
+        name += f"{i:06d}"  # 组合不多，加编号区分
+    return name, f"SKU{i:07d}", specification, unit
+
+
+def product_rows(count, seed=1):
+    """生成 count 行货品列表数据（不写库），字段与 ProductRepository.list_all 一致"""
+    rng = random.Random(seed)
+    next_id = _id_factory(rng)
+    rows = []
+    for i in range(count):
+        name, sku, _, unit = _product(i, rng)
+        rows.append((next_id(), name, sku, rng.randint(0, 500), unit))
+    return rows
+
+
+class _MerchantProfile:
+    """一家商家的类型、月度曲线（均值为 1）、规模和年增长率"""
+
+    __slots__ = ("id", "kind", "season", "scale", "growth", "order_size")
+
+    def __init__(self, merchant_id, rng):
+        self.id = merchant_id
+        self.kind, profile, _, self.order_size = rng.choices(
+            MERCHANT_KINDS, weights=[kind[2] for kind in MERCHANT_KINDS])[0]
+        base = SEASONAL_PROFILES[profile]
+        mean = sum(base) / 12
+        self.season = [value / mean * rng.uniform(0.9, 1.1) for value in base]
+        self.scale = mean * rng.lognormvariate(0, 0.5)
+        self.growth = rng.uniform(-0.05, 0.15)
+
+    def weight(self, year_index, month):
+        """某月的相对采购量"""
+        return self.scale * self.season[month - 1] * (1 + self.growth) ** year_index
+
+
+def _month_starts(start, end):
+    """[start, end) 覆盖的每个月的 (年序号, 月份, 本月天数)"""
+    months = []
+    day = start
+    while day < end:
+        next_month = date(day.year + day.month // 12, day.month % 12 + 1, 1)
+        months.append((day.year - start.year, day.month, (min(next_month, end) - day).days))
+        day = next_month
+    return months
+
+
+def _daily_counts(profiles, start, end, transactions):
+    """把流水总数按季节和星期分配到每一天（累计取整，总和精确相等）"""
+    weights = []
+    day = start
+    for year_index, month, days in _month_starts(start, end):
+        month_weight = sum(p.weight(year_index, month) for p in profiles)
+        for _ in range(days):
+            weights.append(month_weight * WEEKDAY_FACTORS[day.weekday()])
+            day += timedelta(days=1)
+    total = sum(weights)
+    counts = []
+    cumulative = 0.0
+    assigned = 0
+    for weight in weights:
+        cumulative += weight
+        target = round(cumulative / total * transactions)
+        counts.append(target - assigned)
+        assigned = target
+    return counts
+
+
+def generate(path, products=1000, merchants=100, transactions=100000,
+             start=date(2023, 1, 1), years=3, seed=42, progress=None):
+    """在 path 处生成数据库（必须是新库或空库），返回各表写入的行数
+
+    progress(已写入流水数, 流水总数) 在每批提交后调用。
+    """
+    if transactions and (products < 1 or merchants < 1):
+        raise ValueError("生成流水至少需要一个货品和一个商家")
+    db = Database(path)  # 建表和迁移与应用完全一致
+    try:
+        with db.reader() as conn:
+            if conn.execute('SELECT 1 FROM "products" LIMIT 1').fetchone():
+                raise ValueError(f"{path} 中已有数据，请指定新的数据库文件")
+    finally:
+        db.close()
+
+    rng = random.Random(seed)
+    next_id = _id_factory(rng)
+    end = date(start.year + years, start.month, start.day)
+    created = (start - timedelta(days=1)).strftime("%Y-%m-%d 00:00:00")
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        # 数据由本函数保证一致：关闭外键检查，生成期间不必每次同步落盘
+        conn.execute("PRAGMA foreign_keys=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("PRAGMA cache_size=-65536")
+        indexes = conn.execute(
+            "SELECT name, sql FROM sqlite_master "
+            "WHERE type = 'index' AND tbl_name = 'transactions' AND sql IS NOT NULL").fetchall()
+
+        conn.execute("BEGIN")
+        for name, _ in indexes:
+            conn.execute(f'DROP INDEX "{name}"')
+        product_ids = []
+        product_data = []
+        for i in range(products):
+            product_id = next_id()
+            product_ids.append(product_id)
+            name, sku, specification, unit = _product(i, rng)
+            product_data.append((product_id, name, sku, specification, 0, unit, created, created))
+        conn.executemany(SQL_INSERT_PRODUCT, product_data)
+        del product_data
+
+        profiles = [_MerchantProfile(next_id(), rng) for _ in range(merchants)]
+        conn.executemany(SQL_INSERT_MERCHANT, [
+            (p.id, f"{rng.choice(CITIES)}{p.kind}{i + 1:04d}", rng.choice(SURNAMES) + "经理",
+             f"1{rng.choice('35789')}{rng.randrange(10 ** 9):09d}",
+             f"{rng.choice(CITIES)}市{rng.randrange(1, 300)}号", created, created)
+            for i, p in enumerate(profiles)])
+        conn.execute("COMMIT")
+
+        stock = _write_transactions(conn, rng, next_id, product_ids, profiles,
+                                    start, end, transactions, progress)
+
+        conn.execute("BEGIN")
+        conn.executemany('UPDATE "products" SET "currentStock" = ? WHERE "id" = ?',
+                         zip(stock, product_ids))
+        for _, sql in indexes:
+            conn.execute(sql)
+        conn.execute('DELETE FROM "merchant_monthly_outbound"')
+        conn.execute(FILL_OUTBOUND_ROLLUP_SQL)
+        for sql in FILL_DASHBOARD_TOTALS:
+            conn.execute(sql)
+        conn.execute("COMMIT")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    return {"products": products, "merchants": merchants, "transactions": transactions}
+
+
+def _write_transactions(conn, rng, next_id, product_ids, profiles, start, end,
+                        transactions, progress):
+    """按日期顺序成批写入流水，返回每个货品的最终库存"""
+    # 货品热度：随机排名后按 Zipf 分布取权重
+    ranks = list(range(1, len(product_ids) + 1))
+    rng.shuffle(ranks)
+    product_cum = list(itertools.accumulate(rank ** -POPULARITY_EXPONENT for rank in ranks))
+    product_total = product_cum[-1]
+    balance = array("q", bytes(8 * len(product_ids)))  # 相对期初的库存变化
+    lowest = array("q", bytes(8 * len(product_ids)))   # 期间库存变化的最低点
+
+    counts = _daily_counts(profiles, start, end, transactions)
+    months = _month_starts(start, end)
+    random_ = rng.random
+    batch = []
+    written = 0
+    day = start
+    for year_index, month, days in months:
+        # 本月各商家的采购量权重和批量采购概率
+        merchant_cum = list(itertools.accumulate(p.weight(year_index, month) for p in profiles))
+        merchant_total = merchant_cum[-1]
+        bulk = [min(0.5, BULK_PROBABILITY * p.season[month - 1] ** 3) for p in profiles]
+        for _ in range(days):
+            count = counts[(day - start).days]
+            prefix = day.isoformat()
+            for second in sorted(rng.randrange(8 * 3600, 20 * 3600) for _ in range(count)):
+                moment = f"{prefix} {second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}"
+                p = bisect.bisect(product_cum, random_() * product_total)
+                if random_() < INBOUND_SHARE:
+                    quantity = rng.randint(10, 40)
+                    balance[p] += quantity
+                    batch.append((next_id(), product_ids[p], None, TYPE_INBOUND, quantity,
+                                  moment, rng.choice(INBOUND_NOTES), moment))
+                    continue
+                m = bisect.bisect(merchant_cum, random_() * merchant_total)
+                profile = profiles[m]
+                quantity = 1 + int(rng.expovariate(1 / profile.order_size))
+                if random_() < bulk[m]:
+                    quantity *= rng.randint(5, 15)
+                    notes = BULK_NOTE
+                else:
+                    notes = rng.choice(OUTBOUND_NOTES)
+                value = balance[p] - quantity
+                balance[p] = value
+                if value < lowest[p]:
+                    lowest[p] = value
+                batch.append((next_id(), product_ids[p], profile.id, TYPE_OUTBOUND, quantity,
+                              moment, notes, moment))
+            if len(batch) >= BATCH_SIZE:
+                written += _flush(conn, batch)
+                if progress is not None:
+                    progress(written, transactions)
+            day += timedelta(days=1)
+    if batch:
+        written += _flush(conn, batch)
+        if progress is not None:
+            progress(written, transactions)
+
+    # 期初库存恰好覆盖期间的最低点（再留一些余量），最终库存 = 期初 + 变化
+    return [change - low + rng.randint(0, 50) for change, low in zip(balance, lowest)]
+
+
+def _flush(conn, batch):
+    conn.execute("BEGIN")
+    conn.executemany(SQL_INSERT_TRANSACTION, batch)
+    conn.execute("COMMIT")
+    count = len(batch)
+    batch.clear()
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成 MiniCRM 合成测试数据")
+    parser.add_argument("path", help="数据库文件（须为新文件或空库）")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--merchants", type=int, default=100)
+    parser.add_argument("--transactions", type=int, default=100000)
+    parser.add_argument("--start", default="2023-01-01", help="第一天（yyyy-MM-dd）")
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+
+    def report(written, total):
+        elapsed = time.perf_counter() - started
+        print(f"\r流水 {written}/{total}（{elapsed:.0f} 秒）", end="", flush=True)
+
+    try:
+        generate(args.path, args.products, args.merchants, args.transactions,
+                 date.fromisoformat(args.start), args.years, args.seed, report)
+    except ValueError as e:
+        print(e)
+        return 1
+    print(f"\n完成，用时 {time.perf_counter() - started:.1f} 秒")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
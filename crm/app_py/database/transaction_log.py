@@ -0,0 +1,316 @@
+"""
+出入库流水的只追加二进制日志（数据库文件旁的 .txlog / .txdict）
+
+分析引擎和常驻内存的流水启动时要读入全部流水，经 sqlite3 逐行读取会为
+每行创建一个元组，百万条需要数秒。日志把流水存成定长记录，启动时 mmap
+后由 np.frombuffer 直接得到各列的视图，不经过 Python 对象：
+
+- .txlog：128 字节文件头 + 每条 24 字节的记录（货品、商家、日期天数、
+  数量、备注均为 int32，类型 1 字节），按 rowid 顺序追加
+- .txdict：货品 id、商家 id、备注的字典，每行一个 JSON 字符串，行首字母
+  区分种类，序号按首次出现的顺序分配，同样只追加
+
+同步由读取方触发：sync() 把 rowid 大于文件头记录的流水追加到日志。流水
+的删除和修改（删除货品级联删除流水、删除商家清空流水的商家）由触发器
+累加数据库中的 generation，与文件头不一致时重建日志；文件头还记录最后
+一条流水的 id，数据库文件被替换时也能发现并重建。写入顺序为先记录和字典、
+落盘后再写文件头，中途退出时文件头之后多出的内容会被忽略。
+
+日志不可写（如数据库所在目录只读）时改为在内存中保存，功能不变，只是
+下次启动仍需从数据库读取。
+"""
+
+import json
+import mmap
+import os
+import struct
+import threading
+import weakref
+from contextlib import contextmanager
+
+import numpy as np
+
+from database.repositories import TYPE_INBOUND, TYPE_OUTBOUND
+from utils.tracing import span
+
+
+# 类型编码：记录中保存下标
+TYPE_CODES = (TYPE_INBOUND, TYPE_OUTBOUND)
+
+RECORD_DTYPE = np.dtype([
+    ("product", "<i4"),
+    ("merchant", "<i4"),   # 没有商家为 -1
+    ("day", "<i4"),        # 自 1970-01-01 起的天数
+    ("quantity", "<i4"),
+    ("note", "<i4"),       # 没有备注为 -1
+    ("type", "u1"),
+    ("_pad", "V3"),
+])
+
+MAGIC = b"MCRMTXL1"
+FORMAT_VERSION = 1
+# 文件头：标识、格式版本、记录长度、generation、记录数、最后一条的 rowid、
+# 字典文件的有效字节数、最后一条的 id
+HEADER = struct.Struct("<8sIIqqqq32s")
+HEADER_SIZE = 128
+
+# 字典种类（.txdict 每行的首字母）
+KIND_PRODUCT = "p"
+KIND_MERCHANT = "m"
+KIND_NOTE = "n"
+
+# 每次从游标读取的行数
+FETCH_SIZE = 65536
+
+# 日期在 SQLite 中换算为天数，读出的都是整数
+SQL_LOG_ROWS = (
+    'SELECT rowid, "productId", "merchantId", '
+    'CAST(julianday(substr("date", 1, 10)) - 2440587.5 AS INTEGER), '
+    '"type" = ?, "quantity", "notes" FROM "transactions" WHERE rowid > ? ORDER BY rowid'
+)
+SQL_LOG_GENERATION = 'SELECT "generation" FROM "transaction_log_state" WHERE "id" = 0'
+SQL_TRANSACTION_ID = 'SELECT "id" FROM "transactions" WHERE rowid = ?'
+
+
+def _id_bytes(value):
+    """文件头中保存的流水 id（最多 32 字节）"""
+    return value.encode("utf-8")[:32]
+
+
+def _encode(values, index, ids):
+    """把一列字符串编码为序号数组，新出现的值追加到 ids"""
+    codes = list(map(index.get, values))
+    if None in codes:
+        # 按首次出现的顺序为新值分配序号后重新查表
+        for value in dict.fromkeys(values):
+            if value not in index:
+                index[value] = len(ids)
+                ids.append(value)
+        codes = list(map(index.get, values))
+    return np.array(codes, dtype=np.int32)
+
+
+class LogView:
+    """日志在某一时刻的只读视图，只在 TransactionLog.view() 的 with 块内有效
+
+    - epoch：重建日志时更换，相同则之前读到的序号仍然有效，记录只在末尾追加
+    - records(start)：第 start 条之后记录的结构化数组（mmap 上的零拷贝视图）
+    - product_ids / merchant_ids / note_values：序号 -> 值（只追加，读取方需复制）
+    """
+
+    def __init__(self, log, buffer):
+        self.epoch = log._epoch
+        self.count = log._count
+        self.last_rowid = log._last_rowid
+        self.product_ids = log._product_ids
+        self.merchant_ids = log._merchant_ids
+        self.note_values = log._note_values
+        self._buffer = buffer
+
+    def records(self, start=0):
+        return np.frombuffer(self._buffer, dtype=RECORD_DTYPE, count=self.count - start,
+                             offset=HEADER_SIZE + start * RECORD_DTYPE.itemsize)
+
+
+class TransactionLog:
+    """一个数据库的流水日志，同一进程内通过 transaction_log(db) 共享"""
+
+    def __init__(self, db, path=None):
+        self.db = db
+        self.path = path or f"{db.path}.txlog"
+        self.dict_path = os.path.splitext(self.path)[0] + ".txdict"
+        self._lock = threading.RLock()
+        self._memory = None  # 不可写入文件时在内存中保存的记录
+        self._reset_state(None)
+        try:
+            self._open()
+        except (OSError, ValueError, KeyError):
+            self._reset_state(None)  # 文件损坏：下次同步时重建
+
+    # ---- 读取 ----
+
+    @contextmanager
+    def view(self):
+        """与数据库同步后返回只读视图；with 块结束后视图及其数组不得再使用"""
+        with self._lock:
+            self.sync()
+            if self._memory is not None:
+                yield LogView(self, self._memory)
+                return
+            if not self._count:
+                yield LogView(self, bytes(HEADER_SIZE))
+                return
+            with open(self.path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), HEADER_SIZE + self._count * RECORD_DTYPE.itemsize,
+                                   access=mmap.ACCESS_READ)
+            try:
+                yield LogView(self, mapped)
+            finally:
+                try:
+                    mapped.close()
+                except BufferError:
+                    pass  # 读取方仍持有视图：由垃圾回收释放
+
+    def sync(self):
+        """把数据库中的新流水追加到日志，有删除或修改时重建，返回追加的条数"""
+        with self._lock, self.db.reader() as conn:
+            conn.execute("BEGIN")  # 状态与新流水来自同一个读快照
+            generation = conn.execute(SQL_LOG_GENERATION).fetchone()[0]
+            valid = generation == self._generation
+            if valid and self._count:
+                row = conn.execute(SQL_TRANSACTION_ID, (self._last_rowid,)).fetchone()
+                valid = row is not None and _id_bytes(row[0]) == self._last_id
+            if not valid:
+                self._rebuild(generation)
+            with span("txlog.sync", rebuild=not valid) as s:
+                added = self._append(conn)
+                s.set(rows=added)
+        return added
+
+    # ---- 内部 ----
+
+    def _reset_state(self, generation):
+        self._epoch = object()
+        self._generation = generation
+        self._count = 0
+        self._last_rowid = 0
+        self._last_id = b""
+        self._dict_bytes = 0
+        self._product_ids = []
+        self._merchant_ids = []
+        self._note_values = []
+        self._product_index = {}
+        self._merchant_index = {None: -1}
+        self._note_index = {None: -1}
+
+    def _open(self):
+        """读取已有日志的文件头和字典，不存在或格式不符时保持为空（下次同步时重建）"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            header = f.read(HEADER.size)
+            size = os.fstat(f.fileno()).st_size
+        if len(header) < HEADER.size:
+            return
+        magic, version, record_size, generation, count, last_rowid, dict_bytes, last_id = \
+            HEADER.unpack(header)
+        if (magic != MAGIC or version != FORMAT_VERSION or record_size != RECORD_DTYPE.itemsize
+                or size < HEADER_SIZE + count * record_size):
+            return
+        with open(self.dict_path, "rb") as f:
+            data = f.read(dict_bytes)
+        if len(data) < dict_bytes:
+            return
+        lines = data.decode("utf-8").splitlines()
+        values = json.loads("[" + ",".join(lines) + "]")
+        self._generation = generation
+        self._count = count
+        self._last_rowid = last_rowid
+        self._last_id = last_id.rstrip(b"\0")
+        self._dict_bytes = dict_bytes
+        targets = {KIND_PRODUCT: (self._product_ids, self._product_index),
+                   KIND_MERCHANT: (self._merchant_ids, self._merchant_index),
+                   KIND_NOTE: (self._note_values, self._note_index)}
+        for value in values:
+            ids, index = targets[value[0]]
+            index[value[1:]] = len(ids)
+            ids.append(value[1:])
+
+    def _rebuild(self, generation):
+        """清空日志（文件头先写为空，中途退出时下次重新建立）"""
+        self._reset_state(generation)
+        if self._memory is not None:
+            self._memory = bytearray(HEADER_SIZE)
+            return
+        try:
+            with open(self.dict_path, "wb"):
+                pass
+            with open(self.path, "wb") as f:
+                f.write(self._header().ljust(HEADER_SIZE, b"\0"))
+        except OSError:
+            self._memory = bytearray(HEADER_SIZE)
+
+    def _header(self):
+        return HEADER.pack(MAGIC, FORMAT_VERSION, RECORD_DTYPE.itemsize, self._generation,
+                           self._count, self._last_rowid, self._dict_bytes,
+                           self._last_id)
+
+    def _append(self, conn):
+        encoders = ((KIND_PRODUCT, self._product_index, self._product_ids),
+                    (KIND_MERCHANT, self._merchant_index, self._merchant_ids),
+                    (KIND_NOTE, self._note_index, self._note_values))
+        sizes = [len(ids) for _, _, ids in encoders]
+        chunks = []
+        last_rowid = self._last_rowid
+        cursor = conn.execute(SQL_LOG_ROWS, (TYPE_OUTBOUND, last_rowid))
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            rowids, products, merchants, days, types, quantities, notes = zip(*rows)
+            chunk = np.zeros(len(rows), dtype=RECORD_DTYPE)
+            for field, values, (_, index, ids) in zip(("product", "merchant", "note"),
+                                                      (products, merchants, notes), encoders):
+                chunk[field] = _encode(values, index, ids)
+            chunk["day"] = days
+            chunk["type"] = types
+            chunk["quantity"] = quantities
+            chunks.append(chunk)
+            last_rowid = rowids[-1]
+        if not chunks:
+            return 0
+        last_id = conn.execute(SQL_TRANSACTION_ID, (last_rowid,)).fetchone()[0]
+        lines = "".join(json.dumps(kind + value, ensure_ascii=False) + "\n"
+                        for (kind, _, ids), size in zip(encoders, sizes) for value in ids[size:])
+        data = b"".join(chunk.tobytes() for chunk in chunks)
+        added = sum(len(chunk) for chunk in chunks)
+        if self._memory is None:
+            try:
+                self._write(data, lines.encode("utf-8"))
+            except OSError:
+                # 改为在内存中保存，从头重新读取
+                self._reset_state(self._generation)
+                self._memory = bytearray(HEADER_SIZE)
+                return self._append(conn)
+        else:
+            # 新建缓冲区而不是原地扩展：之前取得的视图仍引用旧缓冲区
+            self._memory = self._memory + data
+        self._count += added
+        self._last_rowid = last_rowid
+        self._last_id = _id_bytes(last_id)
+        if self._memory is None:
+            self._write_header()
+        return added
+
+    def _write(self, data, dict_data):
+        """写入新记录和字典项并落盘（文件头在之后单独更新）"""
+        with open(self.dict_path, "ab") as f:
+            f.seek(self._dict_bytes)
+            f.truncate()
+            f.write(dict_data)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.path, "r+b") as f:
+            f.seek(HEADER_SIZE + self._count * RECORD_DTYPE.itemsize)
+            f.write(data)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+        self._dict_bytes += len(dict_data)
+
+    def _write_header(self):
+        with open(self.path, "r+b") as f:
+            f.write(self._header())
+
+
+_logs = weakref.WeakKeyDictionary()
+_logs_lock = threading.Lock()
+
+
+def transaction_log(db):
+    """获取某个数据库的流水日志（同一 Database 对象共享一个）"""
+    with _logs_lock:
+        log = _logs.get(db)
+        if log is None:
+            log = _logs[db] = TransactionLog(db)
+        return log
@@ -0,0 +1,254 @@
+"""
+常驻内存的列式出入库流水
+
+全部流水读入紧凑的 NumPy 列，每条约 21 字节，百万条约 20 MB：
+
+- 货品、商家：int32 字典编码（序号 -> id），没有商家为 -1
+- 日期：int32 天数（自 1970-01-01 起），同一天内按写入顺序（rowid）排列
+- 数量：int32；类型：1 字节（0 入库、1 出库）
+- 备注：int32 字典编码（备注只有少数几种常用写法）
+
+各列按日期升序存放，日期范围筛选只需二分查找出一段，其余条件在这段上
+向量化比较，百万条流水的筛选在毫秒级完成。界面通过 __slots__ 行视图
+TransactionRow 按需取出某一行的显示值，不为每行创建元组和字符串。
+
+各列从流水日志（transaction_log.py）的 mmap 视图中取出，序号与日志一致。
+数据变化后调用 refresh()：日志只在末尾追加时增量读取并按日期归并；日志
+因删除或修改流水而重建时整体重新读取。货品、商家改名等只重新读取名称。
+"""
+
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+from database.db_manager import get_database
+from database.transaction_log import TYPE_CODES, transaction_log
+from utils.tracing import span
+
+
+EPOCH = date(1970, 1, 1)
+
+# 名称的版本：货品、商家的行数和最近修改时间
+SQL_NAMES_STATE = (
+    'SELECT (SELECT COUNT(*) FROM "products"), (SELECT MAX("updatedAt") FROM "products"), '
+    '(SELECT COUNT(*) FROM "merchants"), (SELECT MAX("updatedAt") FROM "merchants")'
+)
+SQL_PRODUCT_NAMES = 'SELECT "id", "name" FROM "products"'
+SQL_MERCHANT_NAMES = 'SELECT "id", "name" FROM "merchants"'
+
+
+def day_number(day):
+    """yyyy-MM-dd -> 天数"""
+    return (date.fromisoformat(day[:10]) - EPOCH).days
+
+
+class TransactionRow:
+    """某个快照中一行流水的只读视图（只保存快照和行号）"""
+
+    __slots__ = ("snapshot", "index")
+
+    def __init__(self, snapshot, index):
+        self.snapshot = snapshot
+        self.index = index
+
+    @property
+    def date(self):
+        """yyyy-MM-dd"""
+        return self.snapshot.date_text(int(self.snapshot.day[self.index]))
+
+    @property
+    def product_id(self):
+        return self.snapshot.product_ids[self.snapshot.product[self.index]]
+
+    @property
+    def product_name(self):
+        return self.snapshot.product_names[self.snapshot.product[self.index]]
+
+    @property
+    def merchant_id(self):
+        code = self.snapshot.merchant[self.index]
+        return self.snapshot.merchant_ids[code] if code >= 0 else None
+
+    @property
+    def merchant_name(self):
+        code = self.snapshot.merchant[self.index]
+        return self.snapshot.merchant_names[code] if code >= 0 else ""
+
+    @property
+    def type(self):
+        return TYPE_CODES[self.snapshot.type[self.index]]
+
+    @property
+    def quantity(self):
+        return int(self.snapshot.quantity[self.index])
+
+    @property
+    def notes(self):
+        code = self.snapshot.notes[self.index]
+        return self.snapshot.note_values[code] if code >= 0 else None
+
+
+class TransactionSnapshot:
+    """某一时刻读入的列式流水（读入后不再修改，可在线程间共享）"""
+
+    def __init__(self, previous=None):
+        if previous is None:
+            self.product_ids = []
+            self.merchant_ids = []
+            self.note_values = []
+            self.product_index = {}
+            self.merchant_index = {}
+            self.product = np.zeros(0, dtype=np.int32)
+            self.merchant = np.zeros(0, dtype=np.int32)
+            self.day = np.zeros(0, dtype=np.int32)
+            self.quantity = np.zeros(0, dtype=np.int32)
+            self.type = np.zeros(0, dtype=np.uint8)
+            self.notes = np.zeros(0, dtype=np.int32)
+            self.product_names = []
+            self.merchant_names = []
+        else:
+            # 增量读取：在副本上追加，读取期间旧快照仍可使用
+            self.product_ids = list(previous.product_ids)
+            self.merchant_ids = list(previous.merchant_ids)
+            self.note_values = previous.note_values
+            self.product_index = dict(previous.product_index)
+            self.merchant_index = dict(previous.merchant_index)
+            for name in ("product", "merchant", "day", "quantity", "type", "notes"):
+                setattr(self, name, getattr(previous, name))
+            self.product_names = previous.product_names
+            self.merchant_names = previous.merchant_names
+        self._dates = {}
+
+    def __len__(self):
+        return len(self.day)
+
+    @property
+    def nbytes(self):
+        """各列占用的字节数"""
+        return sum(getattr(self, name).nbytes
+                   for name in ("product", "merchant", "day", "quantity", "type", "notes"))
+
+    def load(self, view, start):
+        """从日志视图追加第 start 条之后的记录，按日期归并到各列，返回追加的行数"""
+        for ids, index, source in ((self.product_ids, self.product_index, view.product_ids),
+                                   (self.merchant_ids, self.merchant_index, view.merchant_ids)):
+            for code in range(len(ids), len(source)):
+                index[source[code]] = code
+                ids.append(source[code])
+        self.note_values = list(view.note_values)
+        records = view.records(start)
+        count = len(records)
+        if not count:
+            return 0
+        existing = len(self.day)
+        columns = {}
+        for name, field in (("product", "product"), ("merchant", "merchant"), ("day", "day"),
+                            ("quantity", "quantity"), ("type", "type"), ("notes", "note")):
+            values = records[field]
+            columns[name] = np.concatenate([getattr(self, name), values]) if existing else values.copy()
+        day = columns["day"]
+        if np.any(day[1:] < day[:-1]):
+            # 补记了更早日期的流水：按日期稳定排序，同一天内先写入的在前
+            order = np.argsort(day, kind="stable")
+            columns = {name: values[order] for name, values in columns.items()}
+        for name, values in columns.items():
+            setattr(self, name, values)
+        return count
+
+    def load_names(self, conn):
+        """重新读取货品、商家名称，与序号对齐"""
+        products = dict(conn.execute(SQL_PRODUCT_NAMES))
+        merchants = dict(conn.execute(SQL_MERCHANT_NAMES))
+        self.product_names = [products.get(item, "") for item in self.product_ids]
+        self.merchant_names = [merchants.get(item, "") for item in self.merchant_ids]
+
+    def select(self, start_date, end_date, product_id=None, merchant_id=None, tx_type=None):
+        """符合条件的行号（int32 数组），按日期从新到旧排列
+
+        start_date / end_date 为 yyyy-MM-dd，包含结束当天；其余条件为 None 表示不限。
+        """
+        day = self.day
+        first = np.searchsorted(day, day_number(start_date), "left")
+        last = np.searchsorted(day, day_number(end_date), "right")
+        mask = None
+        for value, index, column in ((product_id, self.product_index, self.product),
+                                     (merchant_id, self.merchant_index, self.merchant)):
+            if value is None:
+                continue
+            code = index.get(value)
+            if code is None:
+                return np.zeros(0, dtype=np.int32)
+            matched = column[first:last] == code
+            mask = matched if mask is None else mask & matched
+        if tx_type is not None:
+            matched = self.type[first:last] == TYPE_CODES.index(tx_type)
+            mask = matched if mask is None else mask & matched
+        if mask is None:
+            rows = np.arange(first, last, dtype=np.int32)
+        else:
+            rows = (np.flatnonzero(mask) + first).astype(np.int32)
+        return rows[::-1]
+
+    def row(self, index):
+        return TransactionRow(self, index)
+
+    def date_text(self, day):
+        """天数 -> yyyy-MM-dd（按天缓存）"""
+        text = self._dates.get(day)
+        if text is None:
+            text = self._dates[day] = (EPOCH + timedelta(days=day)).isoformat()
+        return text
+
+
+class TransactionStore:
+    """常驻内存的全部出入库流水
+
+    refresh() 可在后台线程中调用，读完后整体替换快照；snapshot() 返回的
+    快照及其行视图、筛选结果不受之后 refresh() 的影响。
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.log = transaction_log(db)
+        self._lock = threading.Lock()  # 同一时刻只进行一次 refresh
+        self._state = None  # 上次读取时日志的 (epoch, 记录数) 和名称的版本
+        self._snapshot = TransactionSnapshot()
+
+    @property
+    def loaded(self):
+        return self._state is not None
+
+    def snapshot(self):
+        return self._snapshot
+
+    def refresh(self):
+        """与数据库同步，返回是否有变化"""
+        with self._lock:
+            with self.log.view() as view, self.db.reader() as conn:
+                state = (view.epoch, view.count, conn.execute(SQL_NAMES_STATE).fetchone())
+                previous = self._state
+                if state == previous:
+                    return False
+                # 日志只在末尾追加时增量读取，重建过则整体重新读取
+                appended = previous is not None and previous[0] is view.epoch
+                snapshot = TransactionSnapshot(self._snapshot if appended else None)
+                with span("store.load", incremental=appended) as s:
+                    s.set(rows=snapshot.load(view, previous[1] if appended else 0))
+                    snapshot.load_names(conn)
+            self._snapshot = snapshot
+            self._state = state
+            return True
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_transaction_store():
+    """获取全局流水存储（首次使用前需 refresh()）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TransactionStore(get_database())
+        return _store
@@ -0,0 +1,156 @@
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+
+from database.db_manager import get_database
+from database.outbox import get_outbox
+from database.report_cache import get_report_cache
+from database.repositories import new_movement, apply_movement
+from database.stock_alerts import get_stock_alerts
+
+
+class TransactionWriter:
+    """出入库后台写入器（组提交）
+
+    各处提交的出入库变动进入队列，由单个后台线程取出：同一时刻排队的
+    多条变动合并到一个事务中一次提交，只需一次同步落盘。每条变动使用
+    SAVEPOINT 隔离，库存不足等失败只回滚自身，不影响同批其它变动。
+
+    submit() 立即返回 concurrent.futures.Future，提交成功后结果为
+    StockMovement，失败时为 StockError 等异常。给出 outbox 时每条变动在
+    同一事务中记入离线发件箱，提交后通知补发。
+    """
+
+    def __init__(self, db, max_batch=256, linger=0.002, outbox=None):
+        self.db = db
+        self.outbox = outbox
+        self.max_batch = max_batch
+        self.linger = linger  # 取到第一条后再等待同批变动的时间（秒）
+        self._queue = queue.Queue()
+        self._listeners = []
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def add_listener(self, callback):
+        """注册提交后回调 callback(movements)，在写入线程中调用"""
+        self._listeners.append(callback)
+
+    def submit(self, product_id, tx_type, quantity, merchant_id=None, tx_date=None, notes=""):
+        """排队一条出入库变动，返回 Future"""
+        movement = new_movement(product_id, tx_type, quantity, merchant_id, tx_date, notes)
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("写入器已关闭")
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="TransactionWriter", daemon=True)
+                self._thread.start()
+            self._queue.put((movement, future))
+        return future
+
+    def close(self, timeout=None):
+        """写完已排队的变动后停止后台线程"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = self._collect(batch)
+            self._write_batch(batch)
+            if stop:
+                return
+
+    def _collect(self, batch):
+        """把队列中已有（以及 linger 时间内到达）的变动并入同一批"""
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is None:
+                return True
+            batch.append(item)
+        return False
+
+    def _write_batch(self, batch):
+        results = []
+        try:
+            with self.db.transaction() as conn:
+                for movement, future in batch:
+                    conn.execute("SAVEPOINT movement")
+                    try:
+                        apply_movement(conn, movement)
+                        if self.outbox is not None:
+                            self.outbox.enqueue(conn, "transactions", movement.id)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO movement")
+                        conn.execute("RELEASE movement")
+                        results.append((future, None, e))
+                    else:
+                        conn.execute("RELEASE movement")
+                        results.append((future, movement, None))
+        except Exception as e:
+            # 提交本身失败：整批都未写入
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        committed = [movement for _, movement, error in results if error is None]
+        if committed and self.outbox is not None:
+            self.outbox.notify()
+        if committed:
+            for listener in list(self._listeners):
+                try:
+                    listener(committed)
+                except Exception:
+                    traceback.print_exc()
+        for future, movement, error in results:
+            if error is None:
+                future.set_result(movement)
+            else:
+                future.set_exception(error)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_transaction_writer():
+    """获取全局出入库写入器"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = TransactionWriter(get_database(), outbox=get_outbox())
+            # 出库提交后使对应的分析报告缓存失效
+            _writer.add_listener(get_report_cache().on_movements)
+            # 提交后重新评估涉及货品的库存预警
+            _writer.add_listener(get_stock_alerts().on_movements)
+        return _writer
+
+
+def close_transaction_writer():
+    """程序退出前调用，确保排队中的变动全部落盘"""
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
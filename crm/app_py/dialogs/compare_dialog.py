@@ -0,0 +1,299 @@
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton,
+                             QLabel, QComboBox, QListWidget, QListWidgetItem, QTableView,
+                             QHeaderView, QWidget)
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, QPointF, pyqtSignal
+from PyQt5.QtGui import QColor, QFont, QPainter, QPainterPath, QPen, QPixmap
+
+import numpy as np
+
+from components.table_model import ColumnarTableModel, ObjectColumn, IntColumn
+from database.analytics import MONTHS, get_analytics_engine
+from database.comparison import RANK_METRICS, get_merchant_comparison
+from database.db_manager import get_database
+from database.repositories import MerchantRepository
+
+
+# 图中叠加显示的商家数量（按排名取前几名）
+TOP_SERIES = 8
+
+SERIES_COLORS = ["#007bff", "#ff4444", "#28a745", "#ffc107", "#17a2b8", "#e83e8c",
+                 "#fd7e14", "#6f42c1"]
+
+MONTH_NAMES = [f"{month}月" for month in range(1, MONTHS + 1)]
+
+
+class TrendOverlayChart(QWidget):
+    """多条 12 个月趋势线叠加的折线图，整幅图缓存为 QPixmap，数据或尺寸变化时才重绘"""
+
+    MARGIN = 60
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.title = ""
+        self.series = []  # [(名称, 12 个月数值)]
+        self.setMinimumHeight(320)
+        self.title_font = QFont("Microsoft YaHei", 12, QFont.Bold)
+        self.label_font = QFont("Microsoft YaHei", 9)
+        self.background_color = QColor("#2d2d2d")
+        self.text_color = QColor("#ffffff")
+        self.grid_pen = QPen(QColor("#404040"), 1, Qt.DashLine)
+        self._frame = None
+
+    def set_series(self, title, series):
+        self.title = title
+        self.series = list(series)
+        self._frame = None
+        self.update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._frame = None
+
+    def paintEvent(self, event):
+        if self._frame is None:
+            self._frame = self._render_frame()
+        QPainter(self).drawPixmap(0, 0, self._frame)
+
+    def _render_frame(self):
+        ratio = self.devicePixelRatioF()
+        pixmap = QPixmap(self.size() * ratio)
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(self.background_color)
+        if not self.series:
+            return pixmap
+
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.Antialiasing)
+        margin = self.MARGIN
+        rect = self.rect().adjusted(margin, margin, -margin - 120, -margin)  # 右侧留给图例
+        painter.setPen(self.text_color)
+        painter.setFont(self.title_font)
+        painter.drawText(self.rect().adjusted(0, 10, 0, 0), Qt.AlignHCenter | Qt.AlignTop, self.title)
+
+        max_value = max(max(values) for _, values in self.series) or 1
+        painter.setFont(self.label_font)
+        for i in range(6):
+            y = int(rect.top() + rect.height() * i / 5)
+            painter.setPen(self.grid_pen)
+            painter.drawLine(rect.left(), y, rect.right(), y)
+            painter.setPen(self.text_color)
+            painter.drawText(rect.left() - 50, y + 5, f"{int(max_value * (5 - i) / 5)}")
+        x_scale = rect.width() / (MONTHS - 1)
+        for i, name in enumerate(MONTH_NAMES):
+            painter.drawText(int(rect.left() + i * x_scale) - 12, rect.bottom() + 20, name)
+
+        y_scale = rect.height() / max_value
+        for index, (name, values) in enumerate(self.series):
+            color = QColor(SERIES_COLORS[index % len(SERIES_COLORS)])
+            path = QPainterPath(QPointF(rect.left(), rect.bottom() - values[0] * y_scale))
+            for i in range(1, MONTHS):
+                path.lineTo(rect.left() + i * x_scale, rect.bottom() - values[i] * y_scale)
+            painter.setPen(QPen(color, 2))
+            painter.setBrush(Qt.NoBrush)
+            painter.drawPath(path)
+            # 图例
+            y = rect.top() + index * 22
+            painter.drawLine(rect.right() + 20, y, rect.right() + 40, y)
+            painter.setPen(self.text_color)
+            painter.drawText(rect.right() + 46, y + 5, name[:8])
+        painter.end()
+        return pixmap
+
+
+class _CompareSignals(QObject):
+    finished = pyqtSignal(object)  # ComparisonReport
+    failed = pyqtSignal(str)
+
+
+class _CompareJob(QRunnable):
+    """在线程池中同步分析引擎并计算对比报告（大数据量时分发到进程池）"""
+
+    def __init__(self, signals, merchant_ids, year):
+        super().__init__()
+        self.signals = signals
+        self.merchant_ids = merchant_ids
+        self.year = year
+
+    def run(self):
+        try:
+            get_analytics_engine().refresh()
+            report = get_merchant_comparison().compare(self.merchant_ids, self.year)
+        except Exception as e:
+            self.signals.failed.emit(f"对比失败：{e}")
+        else:
+            self.signals.finished.emit(report)
+
+
+class MerchantCompareDialog(QDialog):
+    """多商家对比：勾选多个（或全部）商家，叠加显示各月趋势并按指标排名
+
+    对话框由销售分析页持有并重复使用，保留上次的勾选。
+    """
+
+    def __init__(self, years, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("商家对比")
+        self.resize(1100, 760)
+        self.merchants = MerchantRepository(get_database())
+        self.report = None
+        self.names = {}
+        self.signals = _CompareSignals(self)
+        self.signals.finished.connect(self.on_finished)
+        self.signals.failed.connect(self.on_failed)
+        self.init_ui(years)
+        self.load_merchants()
+
+    def init_ui(self, years):
+        layout = QHBoxLayout()
+        self.setLayout(layout)
+
+        # 左侧：商家勾选列表
+        left = QVBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("筛选商家...")
+        self.search_input.textChanged.connect(self.filter_merchants)
+        left.addWidget(self.search_input)
+        self.merchant_list = QListWidget()
+        self.merchant_list.setUniformItemSizes(True)
+        left.addWidget(self.merchant_list)
+        select_layout = QHBoxLayout()
+        select_all_btn = QPushButton("全选")
+        select_all_btn.clicked.connect(lambda: self.set_checked(Qt.Checked))
+        select_layout.addWidget(select_all_btn)
+        clear_btn = QPushButton("清空")
+        clear_btn.clicked.connect(lambda: self.set_checked(Qt.Unchecked))
+        select_layout.addWidget(clear_btn)
+        left.addLayout(select_layout)
+        left_widget = QWidget()
+        left_widget.setLayout(left)
+        left_widget.setFixedWidth(260)
+        layout.addWidget(left_widget)
+
+        # 右侧：条件、图表和排名
+        right = QVBoxLayout()
+        condition_layout = QHBoxLayout()
+        condition_layout.addWidget(QLabel("年份:"))
+        self.year_combo = QComboBox()
+        self.year_combo.addItems(years)
+        condition_layout.addWidget(self.year_combo)
+        condition_layout.addWidget(QLabel("排名依据:"))
+        self.metric_combo = QComboBox()
+        for key, (label, _) in RANK_METRICS.items():
+            self.metric_combo.addItem(label, key)
+        self.metric_combo.currentIndexChanged.connect(self.show_report)
+        condition_layout.addWidget(self.metric_combo)
+        condition_layout.addStretch()
+        self.compare_btn = QPushButton("开始对比")
+        self.compare_btn.clicked.connect(self.start_compare)
+        condition_layout.addWidget(self.compare_btn)
+        right.addLayout(condition_layout)
+
+        self.status_label = QLabel("勾选要对比的商家后点击\"开始对比\"")
+        right.addWidget(self.status_label)
+
+        self.chart = TrendOverlayChart()
+        right.addWidget(self.chart)
+
+        self.rank_model = ColumnarTableModel(
+            ["排名", "商家", "总采购量", "上年采购量", "同比增长", "月度趋势", "最高月采购", "采购高峰月"],
+            [IntColumn(), ObjectColumn(), IntColumn(), IntColumn(),
+             ObjectColumn(lambda value: "-" if np.isnan(value) else f"{value:+.1%}"),
+             ObjectColumn(lambda value: f"{value:+.1f} 箱/月"), IntColumn(), ObjectColumn()],
+            self,
+        )
+        self.rank_table = QTableView()
+        self.rank_table.setModel(self.rank_model)
+        self.rank_table.setAlternatingRowColors(True)
+        self.rank_table.setSelectionBehavior(QTableView.SelectRows)
+        self.rank_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.rank_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.rank_table.verticalHeader().hide()
+        right.addWidget(self.rank_table)
+        layout.addLayout(right, 1)
+
+    def set_years(self, years):
+        current = self.year_combo.currentText()
+        self.year_combo.clear()
+        self.year_combo.addItems(years)
+        self.set_year(current)
+
+    def set_year(self, year):
+        index = self.year_combo.findText(year)
+        if index >= 0:
+            self.year_combo.setCurrentIndex(index)
+
+    def load_merchants(self):
+        """加载商家列表，保留已有的勾选（新商家默认勾选）"""
+        unchecked = {self.merchant_list.item(i).data(Qt.UserRole)
+                     for i in range(self.merchant_list.count())
+                     if self.merchant_list.item(i).checkState() != Qt.Checked}
+        self.merchant_list.clear()
+        self.names = {}
+        for merchant_id, name in self.merchants.list_names():
+            self.names[merchant_id] = name
+            item = QListWidgetItem(name)
+            item.setData(Qt.UserRole, merchant_id)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Unchecked if merchant_id in unchecked else Qt.Checked)
+            self.merchant_list.addItem(item)
+        self.filter_merchants(self.search_input.text())
+
+    def filter_merchants(self, text):
+        text = text.strip()
+        for i in range(self.merchant_list.count()):
+            item = self.merchant_list.item(i)
+            item.setHidden(bool(text) and text not in item.text())
+
+    def set_checked(self, state):
+        """勾选或取消勾选当前筛选出的商家"""
+        for i in range(self.merchant_list.count()):
+            item = self.merchant_list.item(i)
+            if not item.isHidden():
+                item.setCheckState(state)
+
+    def selected_ids(self):
+        return [self.merchant_list.item(i).data(Qt.UserRole)
+                for i in range(self.merchant_list.count())
+                if self.merchant_list.item(i).checkState() == Qt.Checked]
+
+    def start_compare(self):
+        merchant_ids = self.selected_ids()
+        if len(merchant_ids) < 2:
+            self.status_label.setText("请至少勾选两个商家")
+            return
+        self.compare_btn.setEnabled(False)
+        self.status_label.setText(f"正在对比 {len(merchant_ids)} 个商家...")
+        QThreadPool.globalInstance().start(
+            _CompareJob(self.signals, merchant_ids, self.year_combo.currentText()))
+
+    def on_finished(self, report):
+        self.compare_btn.setEnabled(True)
+        self.report = report
+        self.report_year = self.year_combo.currentText()
+        self.show_report()
+
+    def on_failed(self, error):
+        self.compare_btn.setEnabled(True)
+        self.status_label.setText(error)
+
+    def show_report(self):
+        """按所选指标排名，前 TOP_SERIES 名的趋势叠加显示"""
+        report = self.report
+        if report is None:
+            return
+        metric = self.metric_combo.currentData()
+        order = report.order_by(metric).tolist()
+        rows = []
+        for rank, i in enumerate(order, 1):
+            rows.append((rank, self.names.get(report.ids[i], report.ids[i]), int(report.total[i]),
+                         int(report.previous_total[i]), float(report.growth[i]),
+                         float(report.slope[i]), int(report.peak[i]),
+                         MONTH_NAMES[report.peak_month[i]] if report.total[i] else "-"))
+        self.rank_model.set_rows(rows)
+        top = order[:TOP_SERIES]
+        label = RANK_METRICS[metric][0]
+        self.chart.set_series(f"{self.report_year}年 {label}前 {len(top)} 名的月度趋势",
+                              [(self.names.get(report.ids[i], ""), report.monthly[i].tolist())
+                               for i in top])
+        self.status_label.setText(
+            f"{self.report_year}年 共对比 {len(order)} 个商家，总采购量 {int(report.total.sum())} 箱")
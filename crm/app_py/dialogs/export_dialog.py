@@ -0,0 +1,101 @@
+import threading
+
+from PyQt5.QtWidgets import QProgressDialog, QMessageBox
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
+
+from database.db_manager import get_database
+from database.exporter import RecordExporter, ExportCancelled
+
+
+class _ExportJob(QRunnable):
+    """在线程池中执行一次导出，进度和结果通过信号送回界面线程"""
+
+    def __init__(self, signals, path, query):
+        super().__init__()
+        self.setAutoDelete(False)  # 由对话框持有，运行结束后才释放
+        self.signals = signals
+        self.path = path
+        self.query = query
+        self.cancelled = threading.Event()
+
+    def run(self):
+        exporter = RecordExporter(get_database(), progress=self.signals.progress.emit,
+                                  cancelled=self.cancelled.is_set)
+        try:
+            count = exporter.export(self.path, **self.query)
+        except ExportCancelled:
+            self.signals.failed.emit("")
+        except Exception as e:
+            self.signals.failed.emit(f"导出失败：{e}")
+        else:
+            self.signals.finished.emit(count)
+
+
+class _ExportSignals(QObject):
+    progress = pyqtSignal(int, float)  # 已导出行数，完成比例
+    finished = pyqtSignal(int)         # 导出的行数
+    failed = pyqtSignal(str)           # 错误信息，取消时为空
+
+
+class ExportProgressDialog(QProgressDialog):
+    """在后台导出出入库记录并显示进度，可取消（取消后不留下文件）
+
+    query 为 RecordExporter.export() 的查询参数：start_date、end_date
+    以及可选的 product_id、merchant_id、tx_type。
+    """
+
+    def __init__(self, path, query, parent=None):
+        super().__init__("正在导出...", "取消", 0, 1000, parent)
+        self.setWindowTitle("导出记录")
+        self.setWindowModality(Qt.WindowModal)
+        self.setAutoClose(False)
+        self.setAutoReset(False)
+        self.setMinimumDuration(0)
+        self.path = path
+        self.exported = None
+        self._running = False
+        self.signals = _ExportSignals(self)
+        self.signals.progress.connect(self.on_progress)
+        self.signals.finished.connect(self.on_finished)
+        self.signals.failed.connect(self.on_failed)
+        self._job = _ExportJob(self.signals, path, query)
+        # 取消按钮默认会立即隐藏对话框；改为先请求停止，导出线程结束后再关闭
+        self.canceled.disconnect(self.cancel)
+        self.canceled.connect(self.reject)
+
+    def exec_(self):
+        self._running = True
+        QThreadPool.globalInstance().start(self._job)
+        return super().exec_()
+
+    def on_progress(self, rows, fraction):
+        self.setValue(int(fraction * 1000))
+        self.setLabelText(f"正在导出... 已导出 {rows} 条")
+
+    def on_finished(self, count):
+        self._running = False
+        self.exported = count
+        self.setValue(1000)
+        self.accept()
+        QMessageBox.information(self.parent(), "成功", f"已导出 {count} 条记录到：\n{self.path}")
+
+    def on_failed(self, error):
+        self._running = False
+        self.reject()
+        if error:
+            QMessageBox.critical(self.parent(), "错误", error)
+
+    def reject(self):
+        """导出进行中时只请求停止，由导出线程结束后关闭"""
+        if self._running:
+            self._job.cancelled.set()
+            self.setLabelText("正在停止...")
+            return
+        super().reject()
+
+    def closeEvent(self, event):
+        if self._running:
+            self.reject()
+            event.ignore()
+            return
+        super().closeEvent(event)
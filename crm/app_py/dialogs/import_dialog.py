@@ -0,0 +1,177 @@
+import threading
+
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton,
+                             QLabel, QProgressBar, QPlainTextEdit, QFileDialog, QMessageBox)
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from database.db_manager import get_database
+from database.importer import (BulkImporter, ImportFileError, COLUMNS, KIND_LABELS,
+                               OPENPYXL_AVAILABLE)
+from database.report_cache import get_report_cache
+from database.stock_alerts import get_stock_alerts
+
+
+class _ImportJob(QRunnable):
+    """在线程池中执行一次导入，进度和结果通过信号送回界面线程"""
+
+    def __init__(self, signals, kind, path):
+        super().__init__()
+        self.setAutoDelete(False)  # 由对话框持有，运行结束后才释放
+        self.signals = signals
+        self.kind = kind
+        self.path = path
+        self.cancelled = threading.Event()
+
+    def run(self):
+        importer = BulkImporter(get_database(), progress=self.signals.progress.emit,
+                                cancelled=self.cancelled.is_set,
+                                report_cache=get_report_cache(), alerts=get_stock_alerts())
+        try:
+            result = importer.import_file(self.kind, self.path)
+        except ImportFileError as e:
+            self.signals.failed.emit(str(e))
+        except Exception as e:
+            self.signals.failed.emit(f"导入失败：{e}")
+        else:
+            self.signals.finished.emit(result)
+
+
+class _ImportSignals(QObject):
+    progress = pyqtSignal(int, float)  # 已处理行数，完成比例
+    finished = pyqtSignal(object)      # ImportResult
+    failed = pyqtSignal(str)
+
+
+class ImportDialog(QDialog):
+    """从 CSV / XLSX 批量导入货品、商家或出入库记录
+
+    导入在后台线程中进行，界面显示进度并可随时取消（已写入的批次保留）。
+    有数据导入时对话框以 Accepted 关闭，调用方据此刷新表格。
+    """
+
+    def __init__(self, kind, parent=None):
+        super().__init__(parent)
+        self.kind = kind
+        self.import_result = None
+        self._job = None
+        self.setWindowTitle(f"导入{KIND_LABELS[kind]}")
+        self.setModal(True)
+        self.resize(520, 360)
+        self.signals = _ImportSignals(self)
+        self.signals.progress.connect(self.on_progress)
+        self.signals.finished.connect(self.on_finished)
+        self.signals.failed.connect(self.on_failed)
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        # 列说明：第一个可识别的表头，必填列带 *
+        columns = "、".join(names[0] + ("*" if required else "")
+                           for _, names, required in COLUMNS[self.kind])
+        hint = QLabel(f"文件第一行为表头，可包含以下列（* 为必填）：\n{columns}")
+        hint.setWordWrap(True)
+        layout.addWidget(hint)
+
+        # 文件选择
+        file_layout = QHBoxLayout()
+        self.path_input = QLineEdit()
+        self.path_input.setPlaceholderText("选择 CSV 或 XLSX 文件")
+        file_layout.addWidget(self.path_input)
+        self.browse_btn = QPushButton("选择文件...")
+        self.browse_btn.clicked.connect(self.choose_file)
+        file_layout.addWidget(self.browse_btn)
+        layout.addLayout(file_layout)
+
+        # 进度
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 1000)
+        self.progress_bar.setTextVisible(False)
+        layout.addWidget(self.progress_bar)
+        self.status_label = QLabel("")
+        layout.addWidget(self.status_label)
+
+        # 出错行明细
+        self.errors_view = QPlainTextEdit()
+        self.errors_view.setReadOnly(True)
+        self.errors_view.hide()
+        layout.addWidget(self.errors_view)
+        layout.addStretch()
+
+        # 按钮
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        self.start_btn = QPushButton("开始导入")
+        self.start_btn.clicked.connect(self.start_import)
+        button_layout.addWidget(self.start_btn)
+        self.close_btn = QPushButton("取消")
+        self.close_btn.clicked.connect(self.reject)
+        button_layout.addWidget(self.close_btn)
+        layout.addLayout(button_layout)
+
+    def choose_file(self):
+        filters = "CSV 文件 (*.csv *.txt)"
+        if OPENPYXL_AVAILABLE:
+            filters = "数据文件 (*.csv *.txt *.xlsx);;" + filters + ";;Excel 文件 (*.xlsx)"
+        path, _ = QFileDialog.getOpenFileName(self, f"导入{KIND_LABELS[self.kind]}", "", filters)
+        if path:
+            self.path_input.setText(path)
+
+    def start_import(self):
+        path = self.path_input.text().strip()
+        if not path:
+            QMessageBox.warning(self, "警告", "请选择要导入的文件！")
+            return
+        self.start_btn.setEnabled(False)
+        self.browse_btn.setEnabled(False)
+        self.path_input.setEnabled(False)
+        self.errors_view.hide()
+        self.progress_bar.setValue(0)
+        self.status_label.setText("正在导入...")
+        self.close_btn.setText("停止")
+        self._job = _ImportJob(self.signals, self.kind, path)
+        QThreadPool.globalInstance().start(self._job)
+
+    def on_progress(self, rows, fraction):
+        self.progress_bar.setValue(int(fraction * 1000))
+        self.status_label.setText(f"已处理 {rows} 行...")
+
+    def on_finished(self, result):
+        self._job = None
+        self.import_result = result
+        self.progress_bar.setValue(1000)
+        self.status_label.setText(
+            f"{result.summary()}，用时 {result.elapsed:.1f} 秒（{result.rows_per_second:.0f} 行/秒）")
+        if result.errors:
+            lines = [f"第 {line} 行：{message}" for line, message in result.errors]
+            if result.skipped > len(result.errors):
+                lines.append(f"……另有 {result.skipped - len(result.errors)} 行出错未列出")
+            self.errors_view.setPlainText("\n".join(lines))
+            self.errors_view.show()
+        self._finish()
+
+    def on_failed(self, error):
+        self._job = None
+        self.status_label.setText(error)
+        self.start_btn.setEnabled(True)
+        self.browse_btn.setEnabled(True)
+        self.path_input.setEnabled(True)
+        self.close_btn.setText("取消")
+        self.close_btn.setEnabled(True)
+
+    def _finish(self):
+        self.close_btn.setText("关闭")
+        self.close_btn.setEnabled(True)
+
+    def reject(self):
+        """导入进行中时只请求停止，等当前批次写完后再关闭"""
+        if self._job is not None:
+            self._job.cancelled.set()
+            self.close_btn.setEnabled(False)
+            self.status_label.setText("正在停止...")
+            return
+        if self.import_result is not None and self.import_result.imported:
+            self.accept()  # 有数据导入时通知调用方刷新
+            return
+        super().reject()
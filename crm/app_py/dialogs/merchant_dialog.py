@@ -1,15 +1,24 @@
+import sqlite3
+
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QFormLayout,
                              QLineEdit, QTextEdit, QPushButton, QLabel, 
                              QGroupBox, QMessageBox)
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont
 
+from database.db_manager import get_database
+from database.outbox import get_outbox
+from database.repositories import MerchantRepository
+
 
 class MerchantDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("添加商家")
         self.setModal(True)
+        # 保存只写本地库，同时记入离线发件箱，由后台补发到同步服务器
+        self.repository = MerchantRepository(get_database(), outbox=get_outbox())
+        self.saved_id = None
         self.resize(400, 250)
         self.init_ui()
     
@@ -92,7 +101,6 @@ class MerchantDialog(QDialog):
             self.name_input.setFocus()
             return
         
-        # 这里可以添加保存逻辑
         merchant_data = {
             "name": self.name_input.text().strip(),
             "contact": self.contact_input.text().strip(),
@@ -100,6 +108,16 @@ class MerchantDialog(QDialog):
             "address": self.address_input.toPlainText().strip()
         }
         
-        # 模拟保存成功
+        try:
+            self.saved_id = self.repository.create(
+                merchant_data["name"],
+                contact=merchant_data["contact"],
+                phone=merchant_data["phone"],
+                address=merchant_data["address"],
+            )
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "错误", f"保存失败：{e}")
+            return
+        
         QMessageBox.information(self, "成功", "商家添加成功！")
         self.accept()
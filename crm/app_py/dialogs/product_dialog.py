@@ -1,15 +1,24 @@
+import sqlite3
+
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QFormLayout,
                              QLineEdit, QTextEdit, QSpinBox, QPushButton, 
                              QLabel, QGroupBox, QMessageBox)
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont
 
+from database.db_manager import get_database
+from database.outbox import get_outbox
+from database.repositories import ProductRepository
+
 
 class ProductDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("添加货品")
         self.setModal(True)
+        # 保存只写本地库，同时记入离线发件箱，由后台补发到同步服务器
+        self.repository = ProductRepository(get_database(), outbox=get_outbox())
+        self.saved_id = None
         self.resize(400, 300)
         self.init_ui()
     
@@ -98,7 +107,6 @@ class ProductDialog(QDialog):
             self.name_input.setFocus()
             return
         
-        # 这里可以添加保存逻辑
         product_data = {
             "name": self.name_input.text().strip(),
             "sku": self.sku_input.text().strip(),
@@ -107,6 +115,17 @@ class ProductDialog(QDialog):
             "unit": self.unit_input.text().strip()
         }
         
-        # 模拟保存成功
+        try:
+            self.saved_id = self.repository.create(
+                product_data["name"],
+                sku=product_data["sku"],
+                specification=product_data["description"],
+                stock=product_data["stock"],
+                unit=product_data["unit"],
+            )
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "错误", f"保存失败：{e}")
+            return
+        
         QMessageBox.information(self, "成功", "货品添加成功！")
         self.accept()
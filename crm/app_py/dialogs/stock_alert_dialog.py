@@ -0,0 +1,127 @@
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
+                             QTableView, QHeaderView, QInputDialog, QMessageBox)
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from components.table_model import ColumnarTableModel, ObjectColumn, IntColumn
+from database.stock_alerts import (LEVEL_LABELS, VELOCITY_DAYS, COVER_DAYS,
+                                   get_stock_alerts)
+
+
+def format_days(days):
+    """可售天数的显示文字"""
+    if days == float("inf"):
+        return "无出库"
+    return f"{days:.1f} 天"
+
+
+class _AlertSignals(QObject):
+    finished = pyqtSignal(object)  # [StockAlert]
+    failed = pyqtSignal(str)
+
+
+class _AlertJob(QRunnable):
+    """在线程池中重新评估变动过的货品并取出全部预警"""
+
+    def __init__(self, signals):
+        super().__init__()
+        self.signals = signals
+
+    def run(self):
+        try:
+            engine = get_stock_alerts()
+            engine.refresh()
+            alerts = engine.alerts()
+        except Exception as e:
+            self.signals.failed.emit(f"加载库存预警失败：{e}")
+        else:
+            self.signals.finished.emit(alerts)
+
+
+class StockAlertDialog(QDialog):
+    """库存预警：按预计可售天数从少到多列出缺货、低于补货点和即将缺货的货品，
+    可为选中的货品设置补货点"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("库存预警")
+        self.resize(900, 600)
+        self.alerts = []
+        self.signals = _AlertSignals(self)
+        self.signals.finished.connect(self.on_loaded)
+        self.signals.failed.connect(self.on_failed)
+        self.init_ui()
+        self.load_alerts()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        self.status_label = QLabel("正在加载...")
+        layout.addWidget(self.status_label)
+
+        self.alert_model = ColumnarTableModel(
+            ["货品", "状态", "当前库存", "补货点", f"日均出库（近{VELOCITY_DAYS}天）", "可售天数"],
+            [ObjectColumn(), ObjectColumn(), IntColumn(), IntColumn(),
+             ObjectColumn(lambda value: f"{value:.1f}"), ObjectColumn(format_days)],
+            self,
+        )
+        self.alert_table = QTableView()
+        self.alert_table.setModel(self.alert_model)
+        self.alert_table.setAlternatingRowColors(True)
+        self.alert_table.setSelectionBehavior(QTableView.SelectRows)
+        self.alert_table.setSelectionMode(QTableView.SingleSelection)
+        self.alert_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.alert_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.alert_table.verticalHeader().hide()
+        self.alert_table.doubleClicked.connect(self.edit_reorder_point)
+        layout.addWidget(self.alert_table)
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(QLabel(f"可售天数少于 {COVER_DAYS} 天或库存不高于补货点时预警"))
+        button_layout.addStretch()
+        reorder_btn = QPushButton("设置补货点")
+        reorder_btn.clicked.connect(self.edit_reorder_point)
+        button_layout.addWidget(reorder_btn)
+        self.refresh_btn = QPushButton("刷新")
+        self.refresh_btn.clicked.connect(self.load_alerts)
+        button_layout.addWidget(self.refresh_btn)
+        close_btn = QPushButton("关闭")
+        close_btn.clicked.connect(self.accept)
+        button_layout.addWidget(close_btn)
+        layout.addLayout(button_layout)
+
+    def load_alerts(self):
+        self.refresh_btn.setEnabled(False)
+        QThreadPool.globalInstance().start(_AlertJob(self.signals))
+
+    def on_loaded(self, alerts):
+        self.refresh_btn.setEnabled(True)
+        self.alerts = alerts
+        self.alert_model.set_rows([
+            (alert.name, LEVEL_LABELS[alert.level], alert.stock, alert.reorder_point,
+             alert.velocity, alert.days)
+            for alert in alerts
+        ])
+        self.status_label.setText(f"共 {len(alerts)} 个货品需要补货")
+
+    def on_failed(self, message):
+        self.refresh_btn.setEnabled(True)
+        self.status_label.setText(message)
+
+    def edit_reorder_point(self):
+        """为选中的货品设置补货点，设置后重新评估"""
+        rows = self.alert_table.selectionModel().selectedRows()
+        if not rows:
+            QMessageBox.information(self, "提示", "请先选择货品")
+            return
+        alert = self.alerts[self.alert_model.source_row(rows[0].row())]
+        value, ok = QInputDialog.getInt(self, "设置补货点", f"{alert.name} 的补货点：",
+                                        alert.reorder_point, 0, 1000000000)
+        if not ok:
+            return
+        try:
+            get_stock_alerts().set_reorder_point(alert.product_id, value)
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"设置补货点失败：{e}")
+            return
+        self.load_alerts()
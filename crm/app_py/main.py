@@ -1,36 +1,51 @@
+import multiprocessing
 import sys
 from PyQt5.QtWidgets import QApplication
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 
-from main_window import MainWindow
+from utils import tracing
+from utils.tracing import span
 
 
 def main():
     try:
-        print("开始初始化应用程序...")
+        # 设置 MINICRM_TRACE=文件路径 时记录启动和交互耗时，退出时导出
+        tracing.enable_from_environment()
         
-        # 在创建QApplication之前设置Qt属性
-        QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
-        QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
-        print("Qt属性设置完成")
+        with span("startup"):
+            with span("startup.import"):
+                from main_window import MainWindow
+                from database.transaction_writer import close_transaction_writer
+                from database.outbox import get_outbox_replayer, close_outbox_replayer
+            
+            # 在创建QApplication之前设置Qt属性
+            QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
+            QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
+            
+            with span("startup.qapplication"):
+                app = QApplication(sys.argv)
+                # 退出前等待后台写入器把排队中的出入库全部落盘
+                app.aboutToQuit.connect(close_transaction_writer)
+                app.aboutToQuit.connect(close_outbox_replayer)
+                
+                # 设置应用样式
+                app.setStyle('Fusion')
+            
+            # 创建主窗口
+            with span("startup.main_window"):
+                window = MainWindow()
+            
+            with span("startup.show"):
+                window.show()
+            
+            # 设置了同步服务器时，在后台补发离线发件箱中的修改
+            replayer = get_outbox_replayer()
+            if replayer is not None:
+                replayer.start()
         
-        app = QApplication(sys.argv)
-        print("QApplication创建完成")
+        # 事件循环处理完首屏绘制后才会执行
+        QTimer.singleShot(0, lambda: tracing.instant("startup.first_idle"))
         
-        # 设置应用样式
-        app.setStyle('Fusion')
-        print("应用样式设置完成")
-        
-        # 创建主窗口
-        print("开始创建主窗口...")
-        window = MainWindow()
-        print("主窗口创建完成")
-        
-        print("显示主窗口...")
-        window.show()
-        print("主窗口显示完成")
-        
-        print("开始运行应用程序...")
         # 运行应用
         sys.exit(app.exec_())
         
@@ -42,4 +57,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # 打包后的程序中，多商家对比的进程池子进程从这里进入
+    multiprocessing.freeze_support()
     main()
@@ -2,35 +2,61 @@ import sys
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QPushButton, QLabel, QStackedWidget,
                              QFrame)
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QFont
 
-from modules.products_module import ProductsModule
-from modules.merchants_module import MerchantsModule
-from modules.inventory_module import InventoryModule
-from modules.analysis_module import AnalysisModule
-from modules.theme_manager import ThemeManager
+from modules.theme_manager import get_theme_manager
 from components.dashboard import DashboardWidget
+from utils.tracing import span, traced
+
+
+def _create_products_module():
+    from modules.products_module import ProductsModule
+    return ProductsModule()
+
+
+def _create_merchants_module():
+    from modules.merchants_module import MerchantsModule
+    return MerchantsModule()
+
+
+def _create_inventory_module():
+    from modules.inventory_module import InventoryModule
+    return InventoryModule()
+
+
+def _create_analysis_module():
+    from modules.analysis_module import AnalysisModule
+    return AnalysisModule()
 
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    # 页面：(属性名, 创建函数)，顺序与导航按钮和堆栈索引一致。
+    # 除首页外的页面在第一次打开时才创建（连同模块导入），缩短启动时间。
+    PAGES = [
+        ("dashboard", DashboardWidget),
+        ("products_module", _create_products_module),
+        ("merchants_module", _create_merchants_module),
+        ("inventory_module", _create_inventory_module),
+        ("analysis_module", _create_analysis_module),
+    ]
+    # 首次显示后等待多久开始预建页面（毫秒），让首屏先完成绘制
+    PREWARM_DELAY_MS = 500
+    
+    def __init__(self, prewarm=True):
         try:
-            print("MainWindow: 开始初始化...")
             super().__init__()
-            print("MainWindow: 父类初始化完成")
             
-            # 初始化主题管理器
-            print("MainWindow: 创建主题管理器...")
-            self.theme_manager = ThemeManager()
-            print("MainWindow: 主题管理器创建完成")
+            # 首次显示后是否在空闲时逐个预建其余页面
+            self.prewarm = prewarm
+            self._prewarm_started = False
             
+            # 初始化主题管理器
+            with span("main_window.theme_manager"):
+                self.theme_manager = get_theme_manager()
             self.theme_manager.theme_changed.connect(self.on_theme_changed)
-            print("MainWindow: 主题信号连接完成")
             
-            print("MainWindow: 开始初始化UI...")
             self.init_ui()
-            print("MainWindow: UI初始化完成")
             
         except Exception as e:
             print(f"MainWindow初始化失败: {e}")
@@ -38,40 +64,31 @@ class MainWindow(QMainWindow):
             traceback.print_exc()
             raise
     
+    @traced("main_window.init_ui")
     def init_ui(self):
         try:
-            print("init_ui: 开始设置窗口属性...")
             # 设置窗口标题和大小
             self.setWindowTitle("Mini CRM - 客户关系管理系统")
             self.setGeometry(100, 100, 1200, 800)
-            print("init_ui: 窗口属性设置完成")
             
             # 创建中央widget
-            print("init_ui: 创建中央widget...")
             central_widget = QWidget()
             self.setCentralWidget(central_widget)
-            print("init_ui: 中央widget创建完成")
             
             # 创建主布局
-            print("init_ui: 创建主布局...")
             main_layout = QHBoxLayout()
             central_widget.setLayout(main_layout)
-            print("init_ui: 主布局创建完成")
             
             # 创建左侧导航栏
-            print("init_ui: 创建导航面板...")
-            self.create_navigation_panel(main_layout)
-            print("init_ui: 导航面板创建完成")
+            with span("main_window.navigation_panel"):
+                self.create_navigation_panel(main_layout)
             
             # 创建右侧内容区域
-            print("init_ui: 创建内容区域...")
-            self.create_content_area(main_layout)
-            print("init_ui: 内容区域创建完成")
+            with span("main_window.content_area"):
+                self.create_content_area(main_layout)
             
             # 应用初始主题
-            print("init_ui: 应用初始主题...")
             self.apply_theme()
-            print("init_ui: 初始主题应用完成")
             
         except Exception as e:
             print(f"init_ui失败: {e}")
@@ -82,6 +99,7 @@ class MainWindow(QMainWindow):
     def create_navigation_panel(self, parent_layout):
         """创建左侧导航面板"""
         nav_frame = QFrame()
+        nav_frame.setObjectName("navigation")  # 主题样式按 objectName 限定范围
         nav_frame.setFrameStyle(QFrame.StyledPanel)
         nav_frame.setFixedWidth(200)
         # 导航面板样式将在主题中设置
@@ -117,6 +135,7 @@ class MainWindow(QMainWindow):
         
         # 主题切换按钮
         self.theme_button = QPushButton("☀️ 浅色模式" if self.theme_manager.get_current_theme() == "dark" else "🌙 深色模式")
+        self.theme_button.setObjectName("theme_button")
         self.theme_button.setFont(QFont("Microsoft YaHei", 10))
         self.theme_button.setMinimumHeight(40)
         self.theme_button.clicked.connect(self.toggle_theme)
@@ -127,45 +146,16 @@ class MainWindow(QMainWindow):
     def create_content_area(self, parent_layout):
         """创建右侧内容区域"""
         try:
-            print("create_content_area: 创建内容堆栈...")
             self.content_stack = QStackedWidget()
+            self.content_stack.setObjectName("content")
             parent_layout.addWidget(self.content_stack)
-            print("create_content_area: 内容堆栈创建完成")
-            
-            # 创建各个页面
-            print("create_content_area: 创建Dashboard...")
-            self.dashboard = DashboardWidget()
-            print("create_content_area: Dashboard创建完成")
-            
-            print("create_content_area: 创建产品模块...")
-            self.products_module = ProductsModule()
-            print("create_content_area: 产品模块创建完成")
-            
-            print("create_content_area: 创建商家模块...")
-            self.merchants_module = MerchantsModule()
-            print("create_content_area: 商家模块创建完成")
-            
-            print("create_content_area: 创建库存模块...")
-            self.inventory_module = InventoryModule()
-            print("create_content_area: 库存模块创建完成")
             
-            print("create_content_area: 创建分析模块...")
-            self.analysis_module = AnalysisModule()
-            print("create_content_area: 分析模块创建完成")
+            # 每个页面先放一个空占位，第一次打开时再替换为真正的模块
+            for _ in self.PAGES:
+                self.content_stack.addWidget(QWidget())
             
-            # 添加到堆栈
-            print("create_content_area: 添加模块到堆栈...")
-            self.content_stack.addWidget(self.dashboard)
-            self.content_stack.addWidget(self.products_module)
-            self.content_stack.addWidget(self.merchants_module)
-            self.content_stack.addWidget(self.inventory_module)
-            self.content_stack.addWidget(self.analysis_module)
-            print("create_content_area: 模块添加到堆栈完成")
-            
-            # 默认显示首页
-            print("create_content_area: 显示首页...")
+            # 默认显示首页（其余页面按需创建）
             self.show_dashboard()
-            print("create_content_area: 首页显示完成")
             
         except Exception as e:
             print(f"create_content_area失败: {e}")
@@ -173,21 +163,59 @@ class MainWindow(QMainWindow):
             traceback.print_exc()
             raise
     
+    def ensure_page(self, index):
+        """返回第 index 个页面，尚未创建时创建并替换占位"""
+        name, factory = self.PAGES[index]
+        page = getattr(self, name, None)
+        if page is not None:
+            return page
+        
+        with span("main_window.create_page", page=name):
+            page = factory()
+            page.setObjectName(name)
+            setattr(self, name, page)
+            placeholder = self.content_stack.widget(index)
+            current = self.content_stack.currentIndex()
+            self.content_stack.insertWidget(index, page)
+            self.content_stack.removeWidget(placeholder)
+            placeholder.deleteLater()
+            self.content_stack.setCurrentIndex(current)
+        return page
+    
+    def show_page(self, index):
+        self.ensure_page(index)
+        self.content_stack.setCurrentIndex(index)
+    
+    def showEvent(self, event):
+        """首次显示后，在空闲时逐个预建其余页面"""
+        super().showEvent(event)
+        if self.prewarm and not self._prewarm_started:
+            self._prewarm_started = True
+            QTimer.singleShot(self.PREWARM_DELAY_MS, self._prewarm_next_page)
+    
+    def _prewarm_next_page(self):
+        # 每次事件循环只建一个页面，期间仍可响应用户操作
+        for index, (name, _) in enumerate(self.PAGES):
+            if getattr(self, name, None) is None:
+                self.ensure_page(index)
+                QTimer.singleShot(0, self._prewarm_next_page)
+                return
+    
     # 导航方法
     def show_dashboard(self):
-        self.content_stack.setCurrentIndex(0)
+        self.show_page(0)
     
     def show_products(self):
-        self.content_stack.setCurrentIndex(1)
+        self.show_page(1)
     
     def show_merchants(self):
-        self.content_stack.setCurrentIndex(2)
+        self.show_page(2)
     
     def show_inventory(self):
-        self.content_stack.setCurrentIndex(3)
+        self.show_page(3)
     
     def show_analysis(self):
-        self.content_stack.setCurrentIndex(4)
+        self.show_page(4)
     
     def toggle_theme(self):
         """切换主题"""
@@ -204,54 +232,11 @@ class MainWindow(QMainWindow):
         # 应用新主题
         self.apply_theme()
     
+    @traced("theme.apply")
     def apply_theme(self):
-        """应用当前主题"""
-        styles = self.theme_manager.get_theme_styles()
-        
-        # 应用主窗口样式
-        self.setStyleSheet(styles["main_window"])
+        """应用当前主题
         
-        # 应用导航面板样式
-        # 查找导航面板（第一个QFrame）
-        frames = self.findChildren(QFrame)
-        if frames:
-            frames[0].setStyleSheet(styles["navigation"])
-        
-        # 应用内容区域样式
-        self.content_stack.setStyleSheet(styles["content"])
-        
-        # 应用主题切换按钮样式
-        self.theme_button.setStyleSheet(self.theme_manager.get_theme_button_style())
-        
-        # 通知所有模块更新主题
-        self.update_modules_theme()
-    
-    def update_modules_theme(self):
-        """更新所有模块的主题"""
-        styles = self.theme_manager.get_theme_styles()
-        
-        # 更新各个模块
-        if hasattr(self, 'dashboard'):
-            self.dashboard.setStyleSheet(styles["content"] + styles["cards"])
-        if hasattr(self, 'products_module'):
-            self.products_module.setStyleSheet(styles["content"])
-        if hasattr(self, 'merchants_module'):
-            self.merchants_module.setStyleSheet(styles["content"])
-        if hasattr(self, 'inventory_module'):
-            self.inventory_module.setStyleSheet(styles["content"])
-        if hasattr(self, 'analysis_module'):
-            self.analysis_module.setStyleSheet(styles["content"])
-            # 为分析模块的统计卡片应用主题
-            if hasattr(self.analysis_module, 'apply_stat_cards_theme'):
-                self.analysis_module.apply_stat_cards_theme()
-        
-        # 强制刷新所有子组件
-        self.force_refresh_components()
-    
-    def force_refresh_components(self):
-        """强制刷新所有子组件的样式"""
-        # 强制更新所有子组件
-        for widget in self.findChildren(QWidget):
-            if widget != self:
-                widget.update()
-                widget.repaint()
+        主题以一份应用级样式表整体生效，包括之后按需创建的页面；
+        Qt 会自行重新计算样式并只重绘可见区域。
+        """
+        self.theme_manager.apply_theme_to_app(QApplication.instance())
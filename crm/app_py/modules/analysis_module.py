@@ -1,9 +1,23 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-                             QLabel, QComboBox, QGroupBox, QFormLayout, QMessageBox)
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QFont, QPainter, QPen, QColor, QBrush
-from datetime import datetime, timedelta
-import random
+                             QLabel, QComboBox, QGroupBox, QFormLayout, QMessageBox,
+                             QTableView, QHeaderView)
+from PyQt5.QtCore import Qt, QPointF, QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QFont, QPainter, QPainterPath, QPen, QColor, QBrush, QPixmap
+from datetime import datetime
+
+import numpy as np
+
+from components.large_combo import LargeComboBox
+from components.table_model import ColumnarTableModel, ObjectColumn, IntColumn
+from database.analytics import MonthlyReport, HIGH_DEMAND_RATIO, get_analytics_engine
+from database.db_manager import get_database
+from database.forecasting import get_demand_forecaster, month_label
+from database.report_cache import get_report_cache
+from database.repositories import MerchantRepository, ProductRepository, AnalysisRepository
+from dialogs.compare_dialog import MerchantCompareDialog
+from modules.theme_manager import get_theme_manager
+from utils.downsample import lttb
+from utils.tracing import span, traced
 
 # 暂时禁用matplotlib的Qt组件，避免启动时冲突
 MATPLOTLIB_AVAILABLE = False
@@ -11,7 +25,21 @@ print("警告: 暂时禁用matplotlib图表功能，使用PyQt5原生折线图")
 
 
 class LineChartWidget(QWidget):
-    """自定义折线图组件"""
+    """自定义折线图组件
+
+    标题、网格和坐标轴标签绘制在缓存的 QPixmap 上，折线缓存为 QPainterPath，
+    点数超过绘图区像素宽度时先用 LTTB 降采样。抗锯齿描粗线的开销较大，
+    因此折线也和静态图层一起合成到缓存图像中：只有数据或尺寸变化时才重新
+    绘制，普通重绘（遮挡、悬停等）只需贴一张图。
+    
+    可以在实际数据之后接一段预测：虚线为预测值，半透明色带为预测区间。
+    """
+    
+    MARGIN = 60
+    # 数据点不超过该数量时才绘制圆点标记
+    MAX_MARKERS = 60
+    # X 轴最多显示的标签数量
+    MAX_X_LABELS = 12
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -25,112 +53,322 @@ class LineChartWidget(QWidget):
                 border-radius: 8px;
             }
         """)
+        
+        # 绘图资源只创建一次
+        self.title_font = QFont("Microsoft YaHei", 14, QFont.Bold)
+        self.label_font = QFont("Microsoft YaHei", 10)
+        self.peak_font = QFont("Microsoft YaHei", 10, QFont.Bold)
+        self.background_color = QColor("#2d2d2d")
+        self.text_color = QColor("#ffffff")
+        self.grid_pen = QPen(QColor("#404040"), 1, Qt.DashLine)
+        self.line_pen = QPen(QColor("#007bff"), 3)
+        self.line_pen.setJoinStyle(Qt.RoundJoin)
+        self.marker_pen = QPen(QColor("#ffffff"), 2)
+        self.marker_brush = QBrush(QColor("#007bff"))
+        self.peak_pen = QPen(QColor("#ffffff"), 3)
+        self.peak_brush = QBrush(QColor("#ff4444"))
+        self.peak_color = QColor("#ff4444")
+        self.highlight_pen = QPen(QColor("#ffffff"), 2)
+        self.highlight_brush = QBrush(QColor("#ffc107"))
+        self.forecast_pen = QPen(QColor("#17a2b8"), 2, Qt.DashLine)
+        self.forecast_band_brush = QBrush(QColor(23, 162, 184, 60))
+        
+        self._labels = []
+        self._highlights = ()
+        self._values = []
+        self._forecast = []      # [(X轴标签, 预测值, 下限, 上限)]
+        self._background = None  # 标题、网格、坐标轴标签
+        self._line_path = None   # 折线
+        self._marker_path = None # 数据点标记
+        self._highlight_path = None  # 高亮的数据点
+        self._forecast_path = None   # 预测折线
+        self._band_path = None       # 预测区间色带
+        self._peak = None        # (x, y, 最高值)
+        self._frame = None       # 静态图层 + 折线合成后的整幅图
     
-    def set_data(self, title, data):
-        """设置图表数据"""
+    def set_data(self, title, data, highlights=(), forecast=None, frame=None):
+        """设置图表数据，data 为 {X轴标签: 数值} 的有序字典，highlights 为需要高亮的点的下标，
+        forecast 为接在实际数据之后的预测 [(X轴标签, 预测值, 下限, 上限)]，
+        frame 为之前 rendered_frame() 取出的整幅图，与当前状态一致时直接使用"""
         self.title = title
         self.data = data
+        self._forecast = list(forecast or []) if data else []
+        self._labels = list(data.keys()) + [point[0] for point in self._forecast]
+        self._values = list(data.values())
+        self._highlights = tuple(highlights)
+        self._invalidate()
+        if frame is not None and frame[0] == self._state():
+            self._frame = frame[1]
         self.update()
     
+    def rendered_frame(self):
+        """已绘制的 (图表状态, 整幅图)，尚未绘制时为 None"""
+        if self._frame is None:
+            return None
+        return self._state(), self._frame
+    
+    def _state(self):
+        """决定整幅图内容的全部状态：尺寸、标题、数据、高亮和预测"""
+        return (self.width(), self.height(), self.devicePixelRatioF(), self.title,
+                tuple(self._labels), tuple(self._values), self._highlights, tuple(self._forecast))
+    
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._invalidate()
+    
+    def _invalidate(self):
+        self._background = None
+        self._line_path = None
+        self._frame = None
+    
+    def _chart_rect(self):
+        margin = self.MARGIN
+        return self.rect().adjusted(margin, margin, -margin, -margin)
+    
     def paintEvent(self, event):
-        """绘制折线图"""
-        painter = QPainter(self)
+        """绘制折线图（使用缓存的整幅图）"""
+        with span("chart.paint"):
+            if self._frame is None:
+                self._frame = self._render_frame()
+            painter = QPainter(self)
+            painter.drawPixmap(0, 0, self._frame)
+    
+    @traced("chart.render_frame")
+    def _render_frame(self):
+        """在静态图层上叠加折线、数据点和最高点标注"""
+        if self._background is None:
+            self._background = self._render_background()
+        frame = QPixmap(self._background)
+        if len(self._labels) < 2:
+            return frame
+        if self._line_path is None:
+            self._build_paths()
+        
+        painter = QPainter(frame)
         painter.setRenderHint(QPainter.Antialiasing)
-        
-        # 设置背景
-        painter.fillRect(self.rect(), QColor("#2d2d2d"))
-        
-        if not self.data:
-            return
-        
-        # 获取数据
-        months = list(self.data.keys())
-        values = list(self.data.values())
-        
+        if self._band_path is not None:
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(self.forecast_band_brush)
+            painter.drawPath(self._band_path)
+            painter.setBrush(Qt.NoBrush)
+            painter.setPen(self.forecast_pen)
+            painter.drawPath(self._forecast_path)
+        painter.setBrush(Qt.NoBrush)
+        painter.setPen(self.line_pen)
+        painter.drawPath(self._line_path)
+        
+        if self._marker_path is not None:
+            painter.setBrush(self.marker_brush)
+            painter.setPen(self.marker_pen)
+            painter.drawPath(self._marker_path)
+        
+        if self._highlight_path is not None:
+            painter.setBrush(self.highlight_brush)
+            painter.setPen(self.highlight_pen)
+            painter.drawPath(self._highlight_path)
+        
+        # 高亮并标注最高点
+        max_x, max_y, max_value = self._peak
+        painter.setBrush(self.peak_brush)
+        painter.setPen(self.peak_pen)
+        painter.drawEllipse(QPointF(max_x, max_y), 6, 6)
+        painter.setPen(self.peak_color)
+        painter.setFont(self.peak_font)
+        painter.drawText(QPointF(max_x + 10, max_y - 10), f"最高: {max_value}箱")
+        painter.end()
+        return frame
+    
+    def _value_range(self):
+        max_value = max(self._values + [point[3] for point in self._forecast])
+        min_value = min(self._values + [point[2] for point in self._forecast])
+        value_range = max_value - min_value if max_value != min_value else 1
+        return min_value, max_value, value_range
+    
+    def _render_background(self):
+        """绘制静态图层：背景、标题、网格线和坐标轴标签"""
+        ratio = self.devicePixelRatioF()
+        pixmap = QPixmap(self.size() * ratio)
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(self.background_color)
+        
+        values = self._values
         if not values:
-            return
+            return pixmap
         
-        # 计算绘图区域
-        margin = 60
-        chart_rect = self.rect().adjusted(margin, margin, -margin, -margin)
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.Antialiasing)
+        chart_rect = self._chart_rect()
         
-        # 绘制标题
-        painter.setPen(QColor("#ffffff"))
-        painter.setFont(QFont("Microsoft YaHei", 14, QFont.Bold))
+        # 标题
+        painter.setPen(self.text_color)
+        painter.setFont(self.title_font)
         painter.drawText(self.rect().adjusted(0, 10, 0, 0), Qt.AlignCenter, self.title)
         
-        # 计算坐标轴
-        max_value = max(values)
-        min_value = min(values)
-        value_range = max_value - min_value if max_value != min_value else 1
+        min_value, max_value, value_range = self._value_range()
         
-        # 绘制网格线
-        painter.setPen(QPen(QColor("#404040"), 1, Qt.DashLine))
+        # 网格线
+        painter.setPen(self.grid_pen)
         for i in range(6):
             y = int(chart_rect.top() + (chart_rect.height() * i / 5))
             painter.drawLine(chart_rect.left(), y, chart_rect.right(), y)
         
-        # 绘制Y轴标签
-        painter.setPen(QColor("#ffffff"))
-        painter.setFont(QFont("Microsoft YaHei", 10))
+        # Y轴标签
+        painter.setPen(self.text_color)
+        painter.setFont(self.label_font)
         for i in range(6):
             value = max_value - (value_range * i / 5)
             y = int(chart_rect.top() + (chart_rect.height() * i / 5))
             painter.drawText(chart_rect.left() - 50, y + 5, f"{int(value)}")
         
-        # 绘制X轴标签
-        for i, month in enumerate(months):
-            x = int(chart_rect.left() + (chart_rect.width() * i / (len(months) - 1)))
-            painter.drawText(x - 15, chart_rect.bottom() + 20, month)
+        # X轴标签：点数较多时均匀抽取，避免重叠
+        count = len(self._labels)
+        if count > 1:
+            step = max(1, -(-(count - 1) // (self.MAX_X_LABELS - 1)))
+            for i in range(0, count, step):
+                x = int(chart_rect.left() + (chart_rect.width() * i / (count - 1)))
+                painter.drawText(x - 15, chart_rect.bottom() + 20, str(self._labels[i]))
+        
+        painter.end()
+        return pixmap
+    
+    def _build_paths(self):
+        """把数据换算成坐标并生成折线路径，点数多于像素宽度时先降采样"""
+        values = self._values
+        chart_rect = self._chart_rect()
+        min_value, max_value, value_range = self._value_range()
+        
+        left = chart_rect.left()
+        bottom = chart_rect.bottom()
+        x_scale = chart_rect.width() / (len(self._labels) - 1)
+        y_scale = chart_rect.height() / value_range
+        
+        indices = lttb(values, max(chart_rect.width(), 3))
+        line_path = QPainterPath()
+        line_path.moveTo(left, bottom - (values[0] - min_value) * y_scale)
+        for i in indices[1:]:
+            line_path.lineTo(left + i * x_scale, bottom - (values[i] - min_value) * y_scale)
+        self._line_path = line_path
+        
+        if self._forecast:
+            # 预测线和区间都从最后一个实际点出发
+            last = len(values) - 1
+            start = QPointF(left + last * x_scale, bottom - (values[last] - min_value) * y_scale)
+            forecast_path = QPainterPath(start)
+            upper, lower = [start], [start]
+            for i, (_, value, low, high) in enumerate(self._forecast, last + 1):
+                x = left + i * x_scale
+                forecast_path.lineTo(x, bottom - (value - min_value) * y_scale)
+                upper.append(QPointF(x, bottom - (high - min_value) * y_scale))
+                lower.append(QPointF(x, bottom - (low - min_value) * y_scale))
+            band_path = QPainterPath(start)
+            for point in upper[1:] + lower[:0:-1]:
+                band_path.lineTo(point)
+            band_path.closeSubpath()
+            self._forecast_path = forecast_path
+            self._band_path = band_path
+        else:
+            self._forecast_path = None
+            self._band_path = None
         
-        # 绘制折线
-        if len(values) > 1:
-            painter.setPen(QPen(QColor("#007bff"), 3))
-            points = []
+        if len(values) <= self.MAX_MARKERS:
+            marker_path = QPainterPath()
             for i, value in enumerate(values):
-                x = int(chart_rect.left() + (chart_rect.width() * i / (len(values) - 1)))
-                y = int(chart_rect.bottom() - ((value - min_value) / value_range * chart_rect.height()))
-                points.append((x, y))
-            
-            # 绘制线条
-            for i in range(len(points) - 1):
-                painter.drawLine(points[i][0], points[i][1], points[i+1][0], points[i+1][1])
-            
-            # 绘制数据点
-            painter.setBrush(QBrush(QColor("#007bff")))
-            painter.setPen(QPen(QColor("#ffffff"), 2))
-            for x, y in points:
-                painter.drawEllipse(x - 4, y - 4, 8, 8)
-            
-            # 高亮最高点
-            max_index = values.index(max_value)
-            max_x, max_y = points[max_index]
-            painter.setBrush(QBrush(QColor("#ff4444")))
-            painter.setPen(QPen(QColor("#ffffff"), 3))
-            painter.drawEllipse(max_x - 6, max_y - 6, 12, 12)
-            
-            # 标注最高点
-            painter.setPen(QColor("#ff4444"))
-            painter.setFont(QFont("Microsoft YaHei", 10, QFont.Bold))
-            painter.drawText(max_x + 10, max_y - 10, f"最高: {max_value}箱")
+                marker_path.addEllipse(
+                    QPointF(left + i * x_scale, bottom - (value - min_value) * y_scale), 4, 4)
+            self._marker_path = marker_path
+        else:
+            self._marker_path = None
+        
+        if self._highlights:
+            highlight_path = QPainterPath()
+            for i in self._highlights:
+                highlight_path.addEllipse(
+                    QPointF(left + i * x_scale, bottom - (values[i] - min_value) * y_scale), 6, 6)
+            self._highlight_path = highlight_path
+        else:
+            self._highlight_path = None
+        
+        # 最高点只在实际数据中找
+        peak = max(values)
+        max_index = values.index(peak)
+        self._peak = (left + max_index * x_scale,
+                      bottom - (peak - min_value) * y_scale,
+                      peak)
+
+
+MONTH_NAMES = [f"{month}月" for month in range(1, 13)]
+
+
+class _ReportView:
+    """单个商家某年的视图，存入报告缓存，随该商家该年的数据版本一同失效
+
+    chart 为叠加预测后的折线图参数 (数据, 高亮, 预测点)，results 为生成它时的
+    预测结果；frame 为最近绘制的 (图表状态, 整幅图)。数据和预测都未变化时
+    再次查看直接使用，不再读取预测和重新绘制。
+    """
+
+    def __init__(self, version, report):
+        self.version = version
+        self.report = report
+        self.results = None
+        self.chart = None
+        self.frame = None
+
+    @property
+    def nbytes(self):
+        size = self.report.nbytes
+        if self.frame is not None:
+            image = self.frame[1]
+            size += image.width() * image.height() * image.depth() // 8
+        return size
+
+
+class _RefreshSignals(QObject):
+    done = pyqtSignal(str)  # 错误信息，成功时为空
+
+
+class _RefreshJob(QRunnable):
+    """在线程池中把分析引擎与数据库同步（首次需要读取全部出库流水），
+    并为有新出库的序列重新拟合需求预测"""
+
+    def __init__(self, engine, forecaster, signals):
+        super().__init__()
+        self.engine = engine
+        self.forecaster = forecaster
+        self.signals = signals
+
+    def run(self):
+        error = ""
+        try:
+            self.engine.refresh()
+            self.forecaster.update()
+        except Exception as e:
+            error = str(e)
+        self.signals.done.emit(error)
 
 
 class AnalysisModule(QWidget):
     def __init__(self):
         try:
-            print("AnalysisModule: 开始初始化...")
             super().__init__()
-            print("AnalysisModule: 父类初始化完成")
             
-            print("AnalysisModule: 开始初始化UI...")
-            self.init_ui()
-            print("AnalysisModule: UI初始化完成")
+            db = get_database()
+            self.merchants = MerchantRepository(db)
+            self.products = ProductRepository(db)
+            self.analysis = AnalysisRepository(db)
+            self.engine = get_analytics_engine()
+            self.forecaster = get_demand_forecaster()
+            self.report_cache = get_report_cache()
+            self._refreshing = False
+            self._company_year = None  # 引擎同步完成后要生成的全部商家报告年份
+            self._chart_request = None  # 引擎同步完成后要叠加预测的折线图
+            self._view = None  # 折线图当前显示的 (商家, 年份, _ReportView)
+            self.compare_dialog = None  # 重复使用，保留上次勾选的商家
+            self.refresh_signals = _RefreshSignals(self)
+            self.refresh_signals.done.connect(self.on_engine_refreshed)
             
-            # 延迟应用主题，确保所有组件都已创建
-            print("AnalysisModule: 设置延迟主题应用...")
-            from PyQt5.QtCore import QTimer
-            QTimer.singleShot(0, self.apply_initial_theme)
-            print("AnalysisModule: 延迟主题应用设置完成")
+            with span("analysis.init_ui"):
+                self.init_ui()
             
         except Exception as e:
             print(f"AnalysisModule初始化失败: {e}")
@@ -152,48 +390,88 @@ class AnalysisModule(QWidget):
         condition_layout = QFormLayout()
         
         # 商家选择
-        self.merchant_combo = QComboBox()
-        self.merchant_combo.addItems(["选择商家...", "超市A", "超市B", "超市C", "便利店D", "商场E"])
+        self.merchant_combo = LargeComboBox()
         condition_layout.addRow("选择商家:", self.merchant_combo)
         
         # 年份选择
         self.year_combo = QComboBox()
-        self.year_combo.addItems(["2024", "2023", "2022"])
         condition_layout.addRow("分析年份:", self.year_combo)
         
+        self.load_condition_options()
+        
         condition_group.setLayout(condition_layout)
         layout.addWidget(condition_group)
         
         # 分析按钮
+        button_layout = QHBoxLayout()
         analyze_btn = QPushButton("生成分析报告")
         # 按钮样式将在主题中设置
         analyze_btn.clicked.connect(self.generate_analysis)
-        layout.addWidget(analyze_btn)
+        button_layout.addWidget(analyze_btn, 1)
+        
+        # 全部商家报告：所有商家的月度汇总一次算出
+        company_btn = QPushButton("全部商家报告")
+        company_btn.clicked.connect(self.generate_company_report)
+        button_layout.addWidget(company_btn)
+        
+        # 多商家对比：勾选多个商家叠加趋势并排名
+        compare_btn = QPushButton("商家对比")
+        compare_btn.clicked.connect(self.open_compare_dialog)
+        button_layout.addWidget(compare_btn)
+        layout.addLayout(button_layout)
         
         # 图表区域
         self.create_chart_area(layout)
         
         # 统计信息区域
         self.create_statistics_area(layout)
+        
+        # 全部商家汇总区域
+        self.create_company_area(layout)
+        
+        # 预计大量进货区域
+        self.create_forecast_area(layout)
+    
+    def load_condition_options(self):
+        """从数据库加载商家和年份选项（商家 id 存放在 itemData 中）"""
+        current_merchant = self.merchant_combo.currentData()
+        current_year = self.year_combo.currentText()
+        
+        self.merchant_combo.clear()
+        self.merchant_combo.addItem("选择商家...")
+        for merchant_id, name in self.merchants.list_names():
+            self.merchant_combo.addItem(name, merchant_id)
+        
+        years = self.analysis.years() or [str(datetime.now().year)]
+        self.year_combo.clear()
+        self.year_combo.addItems(years)
+        
+        # 恢复之前的选择
+        if current_merchant is not None:
+            index = self.merchant_combo.findData(current_merchant)
+            if index >= 0:
+                self.merchant_combo.setCurrentIndex(index)
+        if current_year:
+            index = self.year_combo.findText(current_year)
+            if index >= 0:
+                self.year_combo.setCurrentIndex(index)
+    
+    def showEvent(self, event):
+        """页面显示时刷新选项，以包含新添加的商家"""
+        super().showEvent(event)
+        self.load_condition_options()
     
     def create_chart_area(self, parent_layout):
         """创建图表区域"""
         try:
-            print("create_chart_area: 开始创建图表区域...")
-            
             # 创建自定义折线图组件
-            print("create_chart_area: 创建PyQt5原生折线图...")
             self.line_chart = LineChartWidget()
-            print("create_chart_area: 折线图组件创建完成")
             
             # 添加到布局
-            print("create_chart_area: 添加折线图到布局...")
             parent_layout.addWidget(self.line_chart)
-            print("create_chart_area: 折线图添加到布局完成")
             
             # 初始显示空图表
             self.show_empty_chart()
-            print("create_chart_area: 图表区域创建完成")
             
         except Exception as e:
             print(f"create_chart_area失败: {e}")
@@ -216,6 +494,10 @@ class AnalysisModule(QWidget):
         """)
         parent_layout.addWidget(self.chart_label)
         
+        # 文本图表的样式随主题切换
+        self.apply_chart_theme()
+        get_theme_manager().theme_changed.connect(self.apply_chart_theme)
+        
         # 初始显示空图表
         self.show_empty_chart()
     
@@ -253,17 +535,65 @@ class AnalysisModule(QWidget):
         stats_layout.addLayout(cards_layout)
         parent_layout.addWidget(stats_group)
     
+    def create_company_area(self, parent_layout):
+        """创建全部商家汇总表格（生成报告后才显示）"""
+        self.company_group = QGroupBox("全部商家汇总")
+        company_layout = QVBoxLayout()
+        self.company_group.setLayout(company_layout)
+        
+        self.company_status = QLabel()
+        company_layout.addWidget(self.company_status)
+        
+        self.company_model = ColumnarTableModel(
+            ["商家", "总采购量", "平均月采购", "最高月采购", "采购高峰月", "大量进货月份"],
+            [ObjectColumn(), IntColumn(), ObjectColumn(lambda value: f"{value:.1f}"),
+             IntColumn(), ObjectColumn(), ObjectColumn()],
+            self,
+        )
+        self.company_table = QTableView()
+        self.company_table.setModel(self.company_model)
+        self.company_table.setAlternatingRowColors(True)
+        self.company_table.setSelectionBehavior(QTableView.SelectRows)
+        self.company_table.horizontalHeader().setStretchLastSection(True)
+        self.company_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.company_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.company_table.setMinimumHeight(240)
+        company_layout.addWidget(self.company_table)
+        
+        self.company_group.hide()
+        parent_layout.addWidget(self.company_group)
+    
+    def create_forecast_area(self, parent_layout):
+        """创建预计大量进货表格（生成报告后才显示）"""
+        self.forecast_group = QGroupBox("预计大量进货")
+        forecast_layout = QVBoxLayout()
+        self.forecast_group.setLayout(forecast_layout)
+        
+        self.forecast_status = QLabel()
+        self.forecast_status.setWordWrap(True)
+        forecast_layout.addWidget(self.forecast_status)
+        
+        self.forecast_model = ColumnarTableModel(
+            ["商家", "货品", "预计月份", "预计数量"],
+            [ObjectColumn(), ObjectColumn(), ObjectColumn(), IntColumn()],
+            self,
+        )
+        self.forecast_table = QTableView()
+        self.forecast_table.setModel(self.forecast_model)
+        self.forecast_table.setAlternatingRowColors(True)
+        self.forecast_table.setSelectionBehavior(QTableView.SelectRows)
+        self.forecast_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.forecast_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.forecast_table.setMinimumHeight(200)
+        forecast_layout.addWidget(self.forecast_table)
+        
+        self.forecast_group.hide()
+        parent_layout.addWidget(self.forecast_group)
+    
     def create_stat_card(self, title, value, unit, color):
         """创建统计卡片"""
         card = QWidget()
-        card.setObjectName("stat_card")  # 设置对象名称用于样式选择
-        # 卡片样式将在主题中设置，这里只设置基本样式
-        card.setStyleSheet("""
-            QWidget {
-                border-radius: 8px;
-                padding: 15px;
-            }
-        """)
+        card.setObjectName("stat_card")  # 卡片样式由主题的 stat_cards 按对象名称设置
         
         layout = QVBoxLayout()
         card.setLayout(layout)
@@ -289,77 +619,193 @@ class AnalysisModule(QWidget):
         merchant = self.merchant_combo.currentText()
         year = self.year_combo.currentText()
         
-        if merchant == "选择商家...":
+        if self.merchant_combo.currentIndex() == 0:
             QMessageBox.warning(self, "警告", "请选择商家！")
             return
         
-        # 生成12个月的采购数据
-        monthly_data = self.generate_monthly_data(merchant, year)
-        
-        # 计算统计数据
-        total_purchases = sum(monthly_data.values())
-        avg_monthly = total_purchases / 12
-        max_monthly = max(monthly_data.values())
-        peak_month = max(monthly_data, key=monthly_data.get)
+        merchant_id = self.merchant_combo.currentData()
+        self.remember_chart()
+        view = self.load_view(merchant_id, year)
+        self._view = (merchant_id, year, view)
+        report = view.report
+        monthly_data = dict(zip(MONTH_NAMES, report.monthly[0].tolist()))
+        total_purchases = int(report.total[0])
+        avg_monthly = float(report.average[0])
+        max_monthly = int(report.peak[0])
+        peak_month = MONTH_NAMES[report.peak_month[0]]
+        high_demand = np.flatnonzero(report.high_demand[0]).tolist()
         
         # 更新统计卡片
         self.update_statistics_cards(total_purchases, avg_monthly, max_monthly, peak_month)
         
-        # 生成折线图
-        self.create_line_chart(merchant, year, monthly_data)
+        # 生成折线图（大量进货需求月份高亮显示），预测在后台同步完成后叠加；
+        # 数据和预测都未变化时直接显示上次叠加了预测的图
+        if view.chart is not None and view.results is self.forecaster.results:
+            self.create_line_chart(merchant, year, *view.chart, frame=view.frame)
+            self.show_bulk_orders(merchant_id)
+        else:
+            self.create_line_chart(merchant, year, monthly_data, high_demand, frame=view.frame)
+        self._chart_request = (view, merchant_id, merchant, year, monthly_data, high_demand)
+        self.start_engine_refresh()
         
+        high_demand_text = "、".join(MONTH_NAMES[i] for i in high_demand) or "无"
         QMessageBox.information(self, "分析完成", 
             f"商家：{merchant}\n年份：{year}\n\n"
             f"总采购量：{total_purchases} 箱\n"
             f"平均月采购：{avg_monthly:.1f} 箱\n"
             f"最高月采购：{max_monthly} 箱\n"
-            f"采购高峰月：{peak_month}\n\n"
+            f"采购高峰月：{peak_month}\n"
+            f"大量进货需求月份：{high_demand_text}\n\n"
             f"12个月趋势图表已生成！")
     
-    def generate_monthly_data(self, merchant, year):
-        """生成12个月的采购数据"""
-        # 获取当前日期
-        current_date = datetime.now()
-        
-        # 生成过去12个月的数据
-        monthly_data = {}
-        month_names = ['1月', '2月', '3月', '4月', '5月', '6月', 
-                      '7月', '8月', '9月', '10月', '11月', '12月']
-        
-        # 根据商家和年份生成不同的数据模式
-        base_values = {
-            "超市A": [120, 95, 180, 160, 140, 110, 130, 150, 125, 135, 145, 100],
-            "超市B": [80, 70, 140, 120, 100, 90, 110, 130, 105, 115, 125, 85],
-            "超市C": [100, 85, 160, 140, 120, 100, 120, 140, 115, 125, 135, 95],
-            "便利店D": [60, 50, 100, 80, 70, 60, 80, 90, 75, 85, 95, 65],
-            "商场E": [150, 120, 200, 180, 160, 130, 150, 170, 145, 155, 165, 125]
-        }
-        
-        # 获取基础数据
-        if merchant in base_values:
-            base_data = base_values[merchant]
+    def load_view(self, merchant_id, year):
+        """某商家某年的视图：数据未变化时直接使用缓存，否则读取出库汇总表并计算统计量"""
+        view = self.report_cache.get(merchant_id, year)
+        if view is not None:
+            return view
+        # 先取数据版本再读取，读取期间有新的出库提交时缓存项随即失效
+        version = self.report_cache.version(merchant_id, year)
+        with span("analysis.query", year=year):
+            monthly_data = self.load_monthly_data(merchant_id, year)
+        report = MonthlyReport([merchant_id], np.array([list(monthly_data.values())], dtype=np.int64))
+        view = _ReportView(version, report)
+        self.report_cache.put(merchant_id, year, version, view)
+        return view
+    
+    def remember_chart(self):
+        """把折线图绘制好的整幅图记入其所属的视图，再次查看时不必重新绘制"""
+        if self._view is None or not hasattr(self, 'line_chart'):
+            return
+        merchant_id, year, view = self._view
+        frame = self.line_chart.rendered_frame()
+        if frame is None or (view.frame is not None and view.frame[1] is frame[1]):
+            return
+        view.frame = frame
+        # 重新存入，按包含整幅图的大小计入缓存上限
+        self.report_cache.put(merchant_id, year, view.version, view)
+    
+    def load_monthly_data(self, merchant_id, year):
+        """从出库汇总表读取12个月的采购数据（与流水总量无关的常数级查询）"""
+        totals = self.analysis.monthly_outbound(merchant_id, year)
+        return dict(zip(MONTH_NAMES, totals))
+    
+    def generate_company_report(self):
+        """生成全部商家的年度汇总：先在后台同步分析引擎，完成后一次算出所有商家"""
+        self._company_year = self.year_combo.currentText()
+        self._chart_request = None
+        self.company_group.show()
+        if not self.engine.loaded:
+            self.company_status.setText("正在读取出库流水...")
+        self.start_engine_refresh()
+    
+    def open_compare_dialog(self):
+        """打开多商家对比对话框，默认对比当前选择的年份"""
+        years = [self.year_combo.itemText(i) for i in range(self.year_combo.count())]
+        if self.compare_dialog is None:
+            self.compare_dialog = MerchantCompareDialog(years, self)
         else:
-            # 默认数据
-            base_data = [100, 80, 150, 130, 110, 90, 110, 130, 105, 115, 125, 85]
-        
-        # 添加一些随机变化
-        for i, month in enumerate(month_names):
-            variation = random.randint(-20, 20)
-            monthly_data[month] = max(0, base_data[i] + variation)
-        
-        return monthly_data
+            self.compare_dialog.set_years(years)
+            self.compare_dialog.load_merchants()
+        self.compare_dialog.set_year(self.year_combo.currentText())
+        self.compare_dialog.show()
+        self.compare_dialog.raise_()
+    
+    def start_engine_refresh(self):
+        """在后台同步分析引擎和需求预测（已在同步时等待其完成）"""
+        if self._refreshing:
+            return
+        self._refreshing = True
+        QThreadPool.globalInstance().start(
+            _RefreshJob(self.engine, self.forecaster, self.refresh_signals))
+    
+    def on_engine_refreshed(self, error):
+        self._refreshing = False
+        year, self._company_year = self._company_year, None
+        chart, self._chart_request = self._chart_request, None
+        if error:
+            self.company_status.setText(f"读取出库流水失败：{error}")
+        elif year:
+            self.show_company_report(year)
+            self.show_bulk_orders()
+        elif chart:
+            self.show_forecast(*chart)
+    
+    def show_company_report(self, year):
+        """按总采购量从高到低列出全部商家（没有出库的商家排在最后）"""
+        with span("analysis.company_report", year=year) as s:
+            report = self.engine.merchant_report(year)
+            names = dict(self.merchants.list_names())
+            rows = []
+            for i in report.order_by_total().tolist():
+                name = names.pop(report.ids[i], None)
+                if name is None:
+                    continue  # 已删除的商家
+                months = np.flatnonzero(report.high_demand[i]).tolist()
+                rows.append((name, int(report.total[i]), float(report.average[i]),
+                             int(report.peak[i]),
+                             MONTH_NAMES[report.peak_month[i]] if report.total[i] else "-",
+                             "、".join(MONTH_NAMES[m] for m in months)))
+            rows.extend((name, 0, 0.0, 0, "-", "") for name in names.values())
+            self.company_model.set_rows(rows)
+            s.set(merchants=len(rows))
+        total = int(report.total.sum())
+        self.company_status.setText(f"{year}年 共 {len(rows)} 个商家，总采购量 {total} 箱；"
+                                    f"大量进货需求：月采购量超过该商家月均 {HIGH_DEMAND_RATIO:g} 倍的月份")
+    
+    def show_forecast(self, view, merchant_id, merchant, year, monthly_data, highlights):
+        """在折线图上接着实际数据画出预测，并列出该商家的预计大量进货（结果记入 view）"""
+        results = self.forecaster.results
+        if view.chart is not None and view.results is results:
+            return  # 显示的已是这份预测
+        self.show_bulk_orders(merchant_id)
+        view.results, view.chart = results, (monthly_data, highlights, None)
+        series = self.forecaster.series(merchant_id)
+        if series is None:
+            return
+        origin, forecast, lower, upper = series
+        # 只有预测紧接在所选年份的数据之后时才叠加：所选年份中预测开始之后的月份还没有数据
+        actual = origin - int(year) * 12
+        if not 0 < actual <= 12:
+            return
+        points = []
+        for i, values in enumerate(zip(forecast, lower, upper)):
+            month = origin + i
+            label = (MONTH_NAMES[month % 12] if month // 12 == int(year)
+                     else f"{month // 12 % 100:02d}/{month % 12 + 1}")
+            points.append((label,) + values)
+        data = dict(list(monthly_data.items())[:actual])
+        view.chart = (data, [i for i in highlights if i < actual], points)
+        self.create_line_chart(merchant, year, *view.chart, frame=view.frame)
+    
+    def show_bulk_orders(self, merchant_id=None):
+        """列出预计的下一次大量进货，merchant_id 为 None 时为全部商家"""
+        orders = self.forecaster.bulk_orders(merchant_id)
+        merchants = dict(self.merchants.list_names())
+        # 只查询预测中出现的货品名称（货品数量可能很大）
+        products = self.products.names({order[1] for order in orders})
+        rows = []
+        for order_merchant, product_id, month, quantity in orders:
+            if order_merchant in merchants and product_id in products:
+                rows.append((merchants[order_merchant], products[product_id],
+                             month_label(month), quantity))
+        self.forecast_model.set_rows(rows)
+        scope = merchants.get(merchant_id, "全部商家") if merchant_id is not None else "全部商家"
+        self.forecast_status.setText(
+            f"{scope}：预测月采购量超过该货品历史月均 {HIGH_DEMAND_RATIO:g} 倍的最近月份，"
+            f"共 {len(rows)} 项（按月份先后排列）")
+        self.forecast_group.show()
     
-    def create_line_chart(self, merchant, year, monthly_data):
-        """创建12个月折线图"""
+    def create_line_chart(self, merchant, year, monthly_data, highlights=(), forecast=None, frame=None):
+        """创建12个月折线图，forecast 为接在实际数据后的预测点，frame 为可复用的整幅图"""
         try:
-            print("create_line_chart: 开始创建折线图...")
             if hasattr(self, 'line_chart'):
                 # 使用自定义折线图组件
                 title = f"{merchant} - {year}年12个月采购趋势"
-                self.line_chart.set_data(title, monthly_data)
-                print("create_line_chart: PyQt5折线图创建成功")
+                if forecast:
+                    title += "（虚线为预测）"
+                self.line_chart.set_data(title, monthly_data, highlights, forecast, frame)
             else:
-                print("create_line_chart: 折线图组件不存在，降级到文本模式")
+                # 折线图组件不存在，降级到文本模式
                 self.show_text_chart(merchant, year, monthly_data)
                 
         except Exception as e:
@@ -376,17 +822,17 @@ class AnalysisModule(QWidget):
 
 📈 月度采购数据：
 """
-        for month, value in monthly_data.items():
-            # 创建简单的条形图表示
-            bar = "█" * (value // 10)  # 每10箱用一个方块表示
-            chart_text += f"{month:>3}: {value:>3}箱 {bar}\n"
+        report = MonthlyReport([merchant], np.array([list(monthly_data.values())], dtype=np.int64))
+        bars = report.monthly[0] // 10  # 每10箱用一个方块表示
+        for month, value, bar in zip(monthly_data, report.monthly[0].tolist(), bars.tolist()):
+            chart_text += f"{month:>3}: {value:>3}箱 {'█' * bar}\n"
         
         chart_text += f"""
 📊 数据统计：
-• 总采购量: {sum(monthly_data.values())} 箱
-• 平均月采购: {sum(monthly_data.values()) / 12:.1f} 箱
-• 最高月采购: {max(monthly_data.values())} 箱
-• 采购高峰月: {max(monthly_data, key=monthly_data.get)}
+• 总采购量: {report.total[0]} 箱
+• 平均月采购: {report.average[0]:.1f} 箱
+• 最高月采购: {report.peak[0]} 箱
+• 采购高峰月: {MONTH_NAMES[report.peak_month[0]]}
 
 💡 趋势分析：
 • 显示12个月的采购变化趋势
@@ -433,123 +879,11 @@ class AnalysisModule(QWidget):
             if len(peak_labels) >= 2:
                 peak_labels[1].setText(f"{peak_month}")
     
-    def apply_initial_theme(self):
-        """应用初始主题"""
-        # 使用默认深色主题
-        self.setStyleSheet("""
-            QWidget {
-                background-color: #1a1a1a;
-                color: #ffffff;
-            }
-            QLabel {
-                color: #ffffff;
-            }
-            QPushButton {
-                background-color: #007bff;
-                color: white;
-                border: none;
-                padding: 8px 16px;
-                border-radius: 4px;
-            }
-            QPushButton:hover {
-                background-color: #0056b3;
-            }
-            QComboBox {
-                border: 1px solid #404040;
-                padding: 8px;
-                background-color: #2d2d2d;
-                color: #ffffff;
-            }
-            QGroupBox {
-                color: #ffffff;
-                border: 1px solid #404040;
-                border-radius: 4px;
-                margin-top: 10px;
-                padding-top: 10px;
-            }
-            QGroupBox::title {
-                subcontrol-origin: margin;
-                left: 10px;
-                padding: 0 5px 0 5px;
-            }
-            /* 统计卡片样式 */
-            QWidget[objectName="stat_card"] {
-                background-color: #2d2d2d;
-                border: 1px solid #404040;
-                border-radius: 8px;
-                padding: 15px;
-            }
-            QWidget[objectName="stat_card"]:hover {
-                border-color: #007bff;
-                background-color: #404040;
-            }
-        """)
-        
-        # 为统计卡片应用特殊样式
-        self.apply_stat_cards_theme()
-        
-        # 为图表区域应用主题
-        self.apply_chart_theme()
-    
-    def apply_stat_cards_theme(self):
-        """为统计卡片应用主题样式"""
-        # 查找所有统计卡片并应用样式
-        stat_cards = self.findChildren(QWidget, "stat_card")
-        
-        # 获取当前主题
-        try:
-            from modules.theme_manager import ThemeManager
-            theme_manager = ThemeManager()
-            current_theme = theme_manager.get_current_theme()
-        except:
-            current_theme = "dark"  # 默认深色主题
-        
-        for card in stat_cards:
-            if current_theme == "dark":
-                # 深色主题样式
-                card.setStyleSheet("""
-                    QWidget {
-                        background-color: #2d2d2d;
-                        border: 1px solid #404040;
-                        border-radius: 8px;
-                        padding: 15px;
-                    }
-                    QWidget:hover {
-                        border-color: #007bff;
-                        background-color: #404040;
-                    }
-                    QLabel {
-                        color: #ffffff;
-                    }
-                """)
-            else:
-                # 浅色主题样式
-                card.setStyleSheet("""
-                    QWidget {
-                        background-color: white;
-                        border: 1px solid #dee2e6;
-                        border-radius: 8px;
-                        padding: 15px;
-                    }
-                    QWidget:hover {
-                        border-color: #007bff;
-                        background-color: #f8f9fa;
-                    }
-                    QLabel {
-                        color: #333333;
-                    }
-                """)
-    
     def apply_chart_theme(self):
         """为图表区域应用主题样式"""
         if not MATPLOTLIB_AVAILABLE and hasattr(self, 'chart_label'):
             # 获取当前主题
-            try:
-                from modules.theme_manager import ThemeManager
-                theme_manager = ThemeManager()
-                current_theme = theme_manager.get_current_theme()
-            except:
-                current_theme = "dark"  # 默认深色主题
+            current_theme = get_theme_manager().get_current_theme()
             
             if current_theme == "dark":
                 # 深色主题样式
@@ -1,27 +1,128 @@
+import os
+
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-                             QLabel, QTableWidget, QTableWidgetItem, QHeaderView,
+                             QLabel, QTableView, QHeaderView,
                              QTabWidget, QGroupBox, QFormLayout, QComboBox, 
-                             QSpinBox, QDateEdit, QTextEdit, QMessageBox)
-from PyQt5.QtCore import Qt, QDate
+                             QSpinBox, QDateEdit, QTextEdit, QMessageBox, QFileDialog)
+from PyQt5.QtCore import Qt, QDate, QTimer, QObject, QRunnable, QThreadPool, pyqtSignal
 from PyQt5.QtGui import QFont
 
+from components.large_combo import LargeComboBox
+from components.record_loader import RecordQueryLoader
+from components.table_model import (ColumnarTableModel, ObjectColumn, IntColumn, DictColumn,
+                                    RowViewTableModel)
+from dialogs.import_dialog import ImportDialog
+from dialogs.export_dialog import ExportProgressDialog
+from database.db_manager import get_database
+from database.importer import KIND_TRANSACTIONS
+from database.exporter import OPENPYXL_AVAILABLE
+from database.repositories import (ProductRepository, MerchantRepository,
+                                   TransactionRepository, StockError,
+                                   TYPE_LABELS, LABEL_TYPES)
+from database.stock_history import StockHistory
+from database.transaction_store import get_transaction_store
+from database.transaction_writer import get_transaction_writer
+from utils.tracing import span, instant
+
+
+class _CheckpointSignals(QObject):
+    done = pyqtSignal(str)  # 错误信息，成功时为空
+
+
+class _CheckpointJob(QRunnable):
+    """在线程池中补齐月度库存快照（首次需要读取全部流水，之后每月只读上个月的）"""
+
+    def __init__(self, history, signals):
+        super().__init__()
+        self.history = history
+        self.signals = signals
+
+    def run(self):
+        error = ""
+        try:
+            self.history.checkpoint()
+        except Exception as e:
+            error = str(e)
+        self.signals.done.emit(error)
+
+
+class _StoreSignals(QObject):
+    done = pyqtSignal(bool, str)  # 是否有变化，错误信息（成功时为空）
+
+
+class _StoreRefreshJob(QRunnable):
+    """在线程池中把常驻内存的流水与数据库同步（首次需要读取全部流水）"""
+
+    def __init__(self, store, signals):
+        super().__init__()
+        self.store = store
+        self.signals = signals
+
+    def run(self):
+        changed = False
+        error = ""
+        try:
+            changed = self.store.refresh()
+        except Exception as e:
+            error = str(e)
+        self.signals.done.emit(changed, error)
+
 
 class InventoryModule(QWidget):
+    # 后台写入完成信号（从写入线程发出，在界面线程处理）
+    operation_finished = pyqtSignal(object, str, str, int)
+    
     def __init__(self):
         super().__init__()
+        db = get_database()
+        self.products = ProductRepository(db)
+        self.merchants = MerchantRepository(db)
+        self.transactions = TransactionRepository(db)
+        self.stock_history = StockHistory(db)
+        self.writer = get_transaction_writer()
+        self.operation_finished.connect(self.on_operation_finished)
+        
+        # 记录查询在线程池中分页读取，筛选条件变化时取消旧查询
+        self.records_loader = RecordQueryLoader(self)
+        self.records_loader.page_loaded.connect(self.on_records_page)
+        self.records_loader.finished.connect(self.on_records_finished)
+        self.records_loader.failed.connect(self.on_records_failed)
+        self._records_pending_reset = False
+        self._records_count = 0
+        
+        # 全部流水读入内存后，记录查询改为直接在内存中筛选；读完之前按页查询数据库
+        self.store = get_transaction_store()
+        self._store_refreshing = False
+        self._store_stale = False  # 同步期间又有变化，完成后需再同步一次
+        self.store_signals = _StoreSignals(self)
+        self.store_signals.done.connect(self.on_store_refreshed)
+        
+        # 后台任务的错误附在记录状态之后显示，任务再次成功时清除
+        self._background_errors = {}
+        self._records_total = None  # 状态栏上显示的记录条数
+        self.checkpoint_signals = _CheckpointSignals(self)
+        self.checkpoint_signals.done.connect(self.on_checkpoint_finished)
+        
         self.init_ui()
-        # 延迟应用主题，确保所有组件都已创建
-        from PyQt5.QtCore import QTimer
-        QTimer.singleShot(0, self.apply_initial_theme)
+        QThreadPool.globalInstance().start(_CheckpointJob(self.stock_history, self.checkpoint_signals))
+        self.start_store_refresh()
     
     def init_ui(self):
         layout = QVBoxLayout()
         self.setLayout(layout)
         
-        # 标题
+        # 标题栏
+        title_layout = QHBoxLayout()
         title = QLabel("出入库管理")
         title.setFont(QFont("Microsoft YaHei", 16, QFont.Bold))
-        layout.addWidget(title)
+        title_layout.addWidget(title)
+        title_layout.addStretch()
+        
+        # 批量导入出入库流水
+        import_btn = QPushButton("导入")
+        import_btn.clicked.connect(self.show_import_dialog)
+        title_layout.addWidget(import_btn)
+        layout.addLayout(title_layout)
         
         # 创建标签页
         tab_widget = QTabWidget()
@@ -52,8 +153,7 @@ class InventoryModule(QWidget):
         form_layout.addRow("操作类型:", self.operation_type)
         
         # 货品选择
-        self.product_combo = QComboBox()
-        self.product_combo.addItems(["选择货品...", "苹果", "香蕉", "橙子", "葡萄", "草莓"])
+        self.product_combo = LargeComboBox()
         form_layout.addRow("选择货品:", self.product_combo)
         
         # 数量
@@ -62,10 +162,11 @@ class InventoryModule(QWidget):
         form_layout.addRow("数量:", self.quantity_spin)
         
         # 商家选择（出库时）
-        self.merchant_combo = QComboBox()
-        self.merchant_combo.addItems(["选择商家...", "超市A", "超市B", "超市C", "便利店D", "商场E"])
+        self.merchant_combo = LargeComboBox()
         form_layout.addRow("商家:", self.merchant_combo)
         
+        self.load_combo_options()
+        
         # 日期
         self.date_edit = QDateEdit()
         self.date_edit.setDate(QDate.currentDate())
@@ -120,9 +221,34 @@ class InventoryModule(QWidget):
         self.end_date.setDate(QDate.currentDate())
         query_layout.addRow("结束日期:", self.end_date)
         
+        self.filter_product_combo = LargeComboBox()
+        query_layout.addRow("货品:", self.filter_product_combo)
+        
+        self.filter_merchant_combo = LargeComboBox()
+        query_layout.addRow("商家:", self.filter_merchant_combo)
+        
+        self.filter_type_combo = QComboBox()
+        self.filter_type_combo.addItem("全部类型")
+        for tx_type, label in TYPE_LABELS.items():
+            self.filter_type_combo.addItem(label, tx_type)
+        query_layout.addRow("类型:", self.filter_type_combo)
+        
+        self.load_filter_options()
+        
         query_group.setLayout(query_layout)
         records_layout.addWidget(query_group)
         
+        # 条件变化后稍作等待再查询，连续修改只执行最后一次
+        self.query_timer = QTimer(self)
+        self.query_timer.setSingleShot(True)
+        self.query_timer.setInterval(250)
+        self.query_timer.timeout.connect(self.populate_records_table)
+        self.start_date.dateChanged.connect(self.query_timer.start)
+        self.end_date.dateChanged.connect(self.query_timer.start)
+        self.filter_product_combo.currentIndexChanged.connect(self.query_timer.start)
+        self.filter_merchant_combo.currentIndexChanged.connect(self.query_timer.start)
+        self.filter_type_combo.currentIndexChanged.connect(self.query_timer.start)
+        
         # 查询按钮
         query_btn = QPushButton("查询记录")
         query_btn.setStyleSheet("""
@@ -138,40 +264,207 @@ class InventoryModule(QWidget):
             }
         """)
         query_btn.clicked.connect(self.query_records)
-        records_layout.addWidget(query_btn)
+        
+        # 按当前查询条件导出全部记录（后台流式写出，不经过表格）
+        export_btn = QPushButton("导出记录")
+        export_btn.clicked.connect(self.export_records)
+        
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(query_btn, 1)
+        button_layout.addWidget(export_btn)
+        records_layout.addLayout(button_layout)
+        
+        self.records_status = QLabel()
+        records_layout.addWidget(self.records_status)
         
         # 记录表格
-        self.records_table = QTableWidget()
-        self.records_table.setColumnCount(6)
-        self.records_table.setHorizontalHeaderLabels(["日期", "货品", "类型", "数量", "商家", "备注"])
+        self.records_model = ColumnarTableModel(
+            ["日期", "货品", "类型", "数量", "商家", "备注"],
+            [DictColumn(lambda value: value[:10]), DictColumn(),
+             DictColumn(lambda value: TYPE_LABELS.get(value, value)), IntColumn(),
+             DictColumn(), ObjectColumn()],
+            self,
+        )
+        # 内存中的流水：只保存筛选出的行号，显示时从列式存储取值
+        self.store_model = RowViewTableModel(
+            ["日期", "货品", "类型", "数量", "商家", "备注"],
+            [lambda row: row.date, lambda row: row.product_name,
+             lambda row: TYPE_LABELS.get(row.type, row.type), lambda row: str(row.quantity),
+             lambda row: row.merchant_name, lambda row: row.notes or ""],
+            self,
+        )
+        self.records_table = QTableView()
+        self.records_table.setModel(self.records_model)
         
         self.records_table.setAlternatingRowColors(True)
-        self.records_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.records_table.setSelectionBehavior(QTableView.SelectRows)
         self.records_table.horizontalHeader().setStretchLastSection(True)
         self.records_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        # 固定行高，避免大数据量时逐行计算尺寸
+        self.records_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         
-        # 添加示例数据
+        # 加载查询范围内的记录
         self.populate_records_table()
         
         records_layout.addWidget(self.records_table)
         
         return records_tab
     
+    def load_combo_options(self):
+        """从数据库加载货品和商家下拉选项（id 存放在 itemData 中）"""
+        self.product_combo.clear()
+        self.product_combo.addItem("选择货品...")
+        for product_id, name in self.products.list_names():
+            self.product_combo.addItem(name, product_id)
+        
+        self.merchant_combo.clear()
+        self.merchant_combo.addItem("选择商家...")
+        for merchant_id, name in self.merchants.list_names():
+            self.merchant_combo.addItem(name, merchant_id)
+    
+    def load_filter_options(self):
+        """加载记录查询的货品/商家筛选选项，保留当前选择且不触发查询"""
+        for combo, placeholder, names in (
+                (self.filter_product_combo, "全部货品", self.products.list_names()),
+                (self.filter_merchant_combo, "全部商家", self.merchants.list_names())):
+            selected = combo.currentData()
+            combo.blockSignals(True)
+            combo.clear()
+            combo.addItem(placeholder)
+            for item_id, name in names:
+                combo.addItem(name, item_id)
+            index = combo.findData(selected) if selected is not None else 0
+            combo.setCurrentIndex(max(index, 0))
+            combo.blockSignals(False)
+    
+    def showEvent(self, event):
+        """页面显示时刷新下拉选项，以包含新添加的货品和商家"""
+        super().showEvent(event)
+        self.load_combo_options()
+        self.load_filter_options()
+    
     def populate_records_table(self):
-        """填充记录表格示例数据"""
-        sample_data = [
-            ["2024-01-15", "苹果", "出库", "10", "超市A", "正常销售"],
-            ["2024-01-14", "香蕉", "入库", "20", "", "新到货"],
-            ["2024-01-13", "橙子", "出库", "5", "超市B", "促销活动"],
-            ["2024-01-12", "葡萄", "入库", "15", "", "补货"],
-            ["2024-01-11", "草莓", "出库", "3", "便利店D", "日常销售"],
-        ]
-        
-        self.records_table.setRowCount(len(sample_data))
-        for i, row_data in enumerate(sample_data):
-            for j, cell_data in enumerate(row_data):
-                item = QTableWidgetItem(str(cell_data))
-                self.records_table.setItem(i, j, item)
+        """按查询条件显示记录
+        
+        全部流水已读入内存时直接筛选；否则在后台分页查询数据库，结果逐页
+        追加到表格，首页较小以尽快显示，进行中的旧查询会被取消。
+        """
+        self.query_timer.stop()
+        if self.start_date.date() > self.end_date.date():
+            self.records_loader.cancel()
+            self.records_status.setText("开始日期不能晚于结束日期")
+            return
+        
+        if self.store.loaded:
+            self.show_store_records()
+            # 其他页面或批量导入写入的新流水在同步完成后补上
+            self.start_store_refresh()
+            return
+        
+        pages = self.transactions.iter_pages(
+            self.start_date.date().toString("yyyy-MM-dd"),
+            self.end_date.date().toString("yyyy-MM-dd"),
+            page_size=2000,
+            first_page_size=200,
+            product_id=self.filter_product_combo.currentData(),
+            merchant_id=self.filter_merchant_combo.currentData(),
+            tx_type=self.filter_type_combo.currentData(),
+        )
+        # 旧结果保留到新查询的首页到达，避免表格闪烁
+        self._records_pending_reset = True
+        self._records_count = 0
+        self.records_status.setText("正在查询...")
+        instant("records.query")
+        self.records_loader.start(pages)
+    
+    def show_store_records(self):
+        """在内存中的流水上按查询条件筛选并显示"""
+        self.records_loader.cancel()
+        self._records_pending_reset = False
+        snapshot = self.store.snapshot()
+        with span("records.store_select") as s:
+            rows = snapshot.select(
+                self.start_date.date().toString("yyyy-MM-dd"),
+                self.end_date.date().toString("yyyy-MM-dd"),
+                product_id=self.filter_product_combo.currentData(),
+                merchant_id=self.filter_merchant_combo.currentData(),
+                tx_type=self.filter_type_combo.currentData(),
+            )
+            s.set(rows=len(rows))
+        if self.records_table.model() is not self.store_model:
+            self.records_table.setModel(self.store_model)
+            self.records_model.set_rows([])
+        self.store_model.set_source(snapshot, rows)
+        self.show_records_status(len(rows))
+    
+    def start_store_refresh(self):
+        """在后台把内存中的流水与数据库同步（正在同步时，完成后再同步一次）"""
+        if self._store_refreshing:
+            self._store_stale = True
+            return
+        self._store_refreshing = True
+        QThreadPool.globalInstance().start(_StoreRefreshJob(self.store, self.store_signals))
+    
+    def on_store_refreshed(self, changed, error):
+        self._store_refreshing = False
+        self.set_background_error("store", f"读取出入库流水失败：{error}" if error else "")
+        if self._store_stale:
+            self._store_stale = False
+            self.start_store_refresh()
+        if changed and self.start_date.date() <= self.end_date.date():
+            self.show_store_records()
+    
+    def on_checkpoint_finished(self, error):
+        self.set_background_error("checkpoint", f"生成库存快照失败：{error}" if error else "")
+    
+    def set_background_error(self, source, message):
+        """记下（message 为空时清除）某个后台任务的错误，并刷新状态栏"""
+        if message:
+            self._background_errors[source] = message
+        elif self._background_errors.pop(source, None) is None:
+            return
+        if self._records_total is not None:
+            self.show_records_status(self._records_total)
+        else:
+            self.records_status.setText("；".join(self._background_errors.values()))
+    
+    def on_records_page(self, rows):
+        """后台查询送回一页记录"""
+        with span("records.show_page", rows=len(rows)):
+            if self._records_pending_reset:
+                self._records_pending_reset = False
+                self.records_model.set_rows(rows)
+            else:
+                self.records_model.append_rows(rows)
+        self._records_count += len(rows)
+        self.records_status.setText(f"正在查询... 已加载 {self._records_count} 条")
+    
+    def on_records_finished(self, total):
+        instant("records.query_finished", rows=total)
+        if self._records_pending_reset:
+            self._records_pending_reset = False
+            self.records_model.set_rows([])
+        self.show_records_status(total)
+    
+    def show_records_status(self, total):
+        """显示记录条数；选择了货品时附上期初、期末库存，后台任务出错时附上原因"""
+        self._records_total = total
+        status = f"共 {total} 条记录"
+        product_id = self.filter_product_combo.currentData()
+        if product_id is not None:
+            # 从最近的月度快照重放，不扫描该货品的全部流水
+            start = self.start_date.date().toString("yyyy-MM-dd")
+            end = self.end_date.date().toString("yyyy-MM-dd")
+            opening = self.stock_history.stock_before(product_id, start)
+            closing = self.stock_history.stock_on(product_id, end)
+            if opening is not None and closing is not None:
+                status += f"，期初库存 {opening}，期末库存 {closing}"
+        if self._background_errors:
+            status += "（" + "；".join(self._background_errors.values()) + "）"
+        self.records_status.setText(status)
+    
+    def on_records_failed(self, error):
+        self.records_status.setText(f"查询失败：{error}")
     
     def submit_operation(self):
         """提交出入库操作"""
@@ -189,101 +482,76 @@ class InventoryModule(QWidget):
             QMessageBox.warning(self, "警告", "出库操作需要选择商家！")
             return
         
-        # 这里可以添加保存逻辑
         operation_type = self.operation_type.currentText()
         product = self.product_combo.currentText()
         quantity = self.quantity_spin.value()
-        merchant = self.merchant_combo.currentText() if self.operation_type.currentText() == "出库" else ""
-        
-        QMessageBox.information(self, "成功", f"{operation_type}操作提交成功！\n货品：{product}\n数量：{quantity}")
+        merchant_id = self.merchant_combo.currentData() if operation_type == "出库" else None
+        date = self.date_edit.date().toString("yyyy-MM-dd") + " 00:00:00"
+        
+        # 交给后台写入器排队组提交，界面不等待落盘
+        future = self.writer.submit(
+            self.product_combo.currentData(),
+            LABEL_TYPES[operation_type],
+            quantity,
+            merchant_id=merchant_id,
+            tx_date=date,
+            notes=self.notes_edit.toPlainText().strip(),
+        )
+        future.add_done_callback(
+            lambda f: self.operation_finished.emit(f, operation_type, product, quantity))
         
         # 重置表单
         self.quantity_spin.setValue(1)
         self.notes_edit.clear()
     
+    def on_operation_finished(self, future, operation_type, product, quantity):
+        """后台写入完成后提示结果并刷新记录"""
+        error = future.exception()
+        if isinstance(error, StockError):
+            QMessageBox.warning(self, "警告", f"{operation_type}操作失败：{error}\n货品：{product}")
+            return
+        if error is not None:
+            QMessageBox.critical(self, "错误", f"{operation_type}操作提交失败：{error}")
+            return
+        
+        QMessageBox.information(self, "成功", f"{operation_type}操作提交成功！\n货品：{product}\n数量：{quantity}")
+        self.populate_records_table()
+    
+    def show_import_dialog(self):
+        """从 CSV / XLSX 批量导入出入库记录，完成后刷新记录"""
+        dialog = ImportDialog(KIND_TRANSACTIONS, self)
+        if dialog.exec_() == ImportDialog.Accepted:
+            self.populate_records_table()
+    
+    def export_records(self):
+        """把当前查询条件下的全部记录导出为 CSV / XLSX"""
+        if self.start_date.date() > self.end_date.date():
+            QMessageBox.warning(self, "警告", "开始日期不能晚于结束日期！")
+            return
+        start = self.start_date.date().toString("yyyy-MM-dd")
+        end = self.end_date.date().toString("yyyy-MM-dd")
+        filters = "CSV 文件 (*.csv)"
+        if OPENPYXL_AVAILABLE:
+            filters += ";;Excel 文件 (*.xlsx)"
+        path, selected = QFileDialog.getSaveFileName(
+            self, "导出记录", f"出入库记录_{start}_{end}.csv", filters)
+        if not path:
+            return
+        if not os.path.splitext(path)[1]:
+            path += ".xlsx" if selected.startswith("Excel") else ".csv"
+        query = {
+            "start_date": start,
+            "end_date": end,
+            "product_id": self.filter_product_combo.currentData(),
+            "merchant_id": self.filter_merchant_combo.currentData(),
+            "tx_type": self.filter_type_combo.currentData(),
+        }
+        ExportProgressDialog(path, query, self).exec_()
+    
     def query_records(self):
         """查询记录"""
-        start_date = self.start_date.date().toString("yyyy-MM-dd")
-        end_date = self.end_date.date().toString("yyyy-MM-dd")
+        if self.start_date.date() > self.end_date.date():
+            QMessageBox.warning(self, "警告", "开始日期不能晚于结束日期！")
+            return
         
-        QMessageBox.information(self, "查询", f"查询日期范围：{start_date} 到 {end_date}\n\n这里将显示查询结果")
-    
-    def apply_initial_theme(self):
-        """应用初始主题"""
-        # 使用默认深色主题
-        self.setStyleSheet("""
-            QWidget {
-                background-color: #1a1a1a;
-                color: #ffffff;
-            }
-            QLabel {
-                color: #ffffff;
-            }
-            QPushButton {
-                background-color: #007bff;
-                color: white;
-                border: none;
-                padding: 8px 16px;
-                border-radius: 4px;
-            }
-            QPushButton:hover {
-                background-color: #0056b3;
-            }
-            QLineEdit, QSpinBox, QDateEdit, QTextEdit {
-                border: 1px solid #404040;
-                padding: 8px;
-                background-color: #2d2d2d;
-                color: #ffffff;
-            }
-            QComboBox {
-                border: 1px solid #404040;
-                padding: 8px;
-                background-color: #2d2d2d;
-                color: #ffffff;
-            }
-            QTableWidget {
-                background-color: #2d2d2d;
-                alternate-background-color: #404040;
-                gridline-color: #404040;
-                color: #ffffff;
-            }
-            QTableWidget::item {
-                padding: 8px;
-            }
-            QTableWidget::item:selected {
-                background-color: #007bff;
-                color: white;
-            }
-            QHeaderView::section {
-                background-color: #404040;
-                color: #ffffff;
-                padding: 8px;
-                border: none;
-            }
-            QGroupBox {
-                color: #ffffff;
-                border: 1px solid #404040;
-                border-radius: 4px;
-                margin-top: 10px;
-                padding-top: 10px;
-            }
-            QGroupBox::title {
-                subcontrol-origin: margin;
-                left: 10px;
-                padding: 0 5px 0 5px;
-            }
-            QTabWidget::pane {
-                border: 1px solid #404040;
-                background-color: #2d2d2d;
-            }
-            QTabBar::tab {
-                background-color: #404040;
-                color: #ffffff;
-                padding: 8px 16px;
-                margin-right: 2px;
-            }
-            QTabBar::tab:selected {
-                background-color: #007bff;
-            }
-        """)
-        self.populate_records_table()  # 刷新表格
+        self.populate_records_table()
@@ -1,19 +1,24 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-                             QLabel, QTableWidget, QTableWidgetItem, QHeaderView,
+                             QLabel, QTableView, QHeaderView,
                              QLineEdit, QMessageBox)
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont
 
 from dialogs.merchant_dialog import MerchantDialog
+from dialogs.import_dialog import ImportDialog
+from components.table_model import ColumnarTableModel, ObjectColumn, ConstantColumn
+from components.search_controller import TableSearchController
+from database.db_manager import get_database
+from database.importer import KIND_MERCHANTS
+from database.repositories import MerchantRepository
+from utils.tracing import span
 
 
 class MerchantsModule(QWidget):
     def __init__(self):
         super().__init__()
+        self.repository = MerchantRepository(get_database())
         self.init_ui()
-        # 延迟应用主题，确保所有组件都已创建
-        from PyQt5.QtCore import QTimer
-        QTimer.singleShot(0, self.apply_initial_theme)
     
     def init_ui(self):
         layout = QVBoxLayout()
@@ -32,114 +37,85 @@ class MerchantsModule(QWidget):
         add_btn.clicked.connect(self.show_add_merchant_dialog)
         title_layout.addWidget(add_btn)
         
+        # 批量导入按钮
+        import_btn = QPushButton("导入")
+        import_btn.clicked.connect(self.show_import_dialog)
+        title_layout.addWidget(import_btn)
+        
         layout.addLayout(title_layout)
         
         # 搜索栏
         search_layout = QHBoxLayout()
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("搜索商家...")
-        # 输入框样式将在主题中设置
-        self.search_input.textChanged.connect(self.filter_merchants)
+        # 输入框样式将在主题中设置（输入防抖由搜索控制器处理）
         search_layout.addWidget(self.search_input)
         search_layout.addStretch()
         layout.addLayout(search_layout)
         
         # 商家列表表格
-        self.merchants_table = QTableWidget()
-        self.merchants_table.setColumnCount(5)
-        self.merchants_table.setHorizontalHeaderLabels(["ID", "商家名称", "联系人", "电话", "操作"])
+        self.merchants_model = ColumnarTableModel(
+            ["ID", "商家名称", "联系人", "电话", "操作"],
+            [ObjectColumn(), ObjectColumn(), ObjectColumn(), ObjectColumn(),
+             ConstantColumn("编辑 | 删除")],
+            self,
+        )
+        self.merchants_table = QTableView()
+        self.merchants_table.setModel(self.merchants_model)
         
         # 设置表格样式
         self.merchants_table.setAlternatingRowColors(True)
-        self.merchants_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.merchants_table.setSelectionBehavior(QTableView.SelectRows)
         self.merchants_table.horizontalHeader().setStretchLastSection(True)
         self.merchants_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        # 固定行高，避免大数据量时逐行计算尺寸
+        self.merchants_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        
+        # 按名称、联系人和电话建立搜索索引
+        self.search = TableSearchController(
+            self.search_input, self.merchants_model,
+            lambda values: (values[1], values[2], values[3]), self)
         
-        # 添加示例数据
+        # 加载商家数据
         self.populate_merchants_table()
         
         layout.addWidget(self.merchants_table)
     
     def populate_merchants_table(self):
-        """填充商家表格示例数据"""
-        sample_data = [
-            ["1", "超市A", "张三", "13800138001", "编辑 | 删除"],
-            ["2", "超市B", "李四", "13800138002", "编辑 | 删除"],
-            ["3", "超市C", "王五", "13800138003", "编辑 | 删除"],
-            ["4", "便利店D", "赵六", "13800138004", "编辑 | 删除"],
-            ["5", "商场E", "钱七", "13800138005", "编辑 | 删除"],
-        ]
-        
-        self.merchants_table.setRowCount(len(sample_data))
-        for i, row_data in enumerate(sample_data):
-            for j, cell_data in enumerate(row_data):
-                item = QTableWidgetItem(str(cell_data))
-                self.merchants_table.setItem(i, j, item)
+        """从数据库填充商家表格"""
+        with span("merchants.populate") as s:
+            rows = self.repository.list_all()
+            self.merchants_model.set_rows(rows)
+            self._row_of_id = {row[0]: i for i, row in enumerate(rows)}
+            self.search.rebuild(rows)
+            s.set(rows=len(rows))
+    
+    def refresh_merchant(self, merchant_id):
+        """新增或修改商家后，只更新该行和搜索索引"""
+        row_data = self.repository.list_row(merchant_id)
+        if row_data is None:
+            return
+        source_row = self._row_of_id.get(merchant_id)
+        if source_row is None:
+            source_row = self.merchants_model.source_row_count()
+            self._row_of_id[merchant_id] = source_row
+            self.merchants_model.append_rows([row_data])
+        else:
+            self.merchants_model.update_row(source_row, row_data)
+        self.search.row_changed(source_row)
     
     def filter_merchants(self):
-        """根据搜索条件过滤商家"""
-        search_text = self.search_input.text().lower()
-        for row in range(self.merchants_table.rowCount()):
-            should_show = False
-            for col in range(self.merchants_table.columnCount()):
-                item = self.merchants_table.item(row, col)
-                if item and search_text in item.text().lower():
-                    should_show = True
-                    break
-            self.merchants_table.setRowHidden(row, not should_show)
+        """根据搜索条件过滤商家（通过索引查询，不逐行扫描）"""
+        self.search.apply_filter()
     
     def show_add_merchant_dialog(self):
         """显示添加商家对话框"""
         dialog = MerchantDialog(self)
         if dialog.exec_() == MerchantDialog.Accepted:
-            # 这里可以添加保存逻辑
-            QMessageBox.information(self, "成功", "商家添加成功！")
-            self.populate_merchants_table()  # 刷新表格
+            self.refresh_merchant(dialog.saved_id)
     
-    def apply_initial_theme(self):
-        """应用初始主题"""
-        # 使用默认深色主题
-        self.setStyleSheet("""
-            QWidget {
-                background-color: #1a1a1a;
-                color: #ffffff;
-            }
-            QLabel {
-                color: #ffffff;
-            }
-            QPushButton {
-                background-color: #007bff;
-                color: white;
-                border: none;
-                padding: 8px 16px;
-                border-radius: 4px;
-            }
-            QPushButton:hover {
-                background-color: #0056b3;
-            }
-            QLineEdit {
-                border: 1px solid #404040;
-                padding: 8px;
-                background-color: #2d2d2d;
-                color: #ffffff;
-            }
-            QTableWidget {
-                background-color: #2d2d2d;
-                alternate-background-color: #404040;
-                gridline-color: #404040;
-                color: #ffffff;
-            }
-            QTableWidget::item {
-                padding: 8px;
-            }
-            QTableWidget::item:selected {
-                background-color: #007bff;
-                color: white;
-            }
-            QHeaderView::section {
-                background-color: #404040;
-                color: #ffffff;
-                padding: 8px;
-                border: none;
-            }
-        """)
+    def show_import_dialog(self):
+        """从 CSV / XLSX 批量导入商家，完成后重新加载表格"""
+        dialog = ImportDialog(KIND_MERCHANTS, self)
+        if dialog.exec_() == ImportDialog.Accepted:
+            self.populate_merchants_table()
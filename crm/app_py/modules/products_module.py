@@ -1,19 +1,27 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-                             QLabel, QTableWidget, QTableWidgetItem, QHeaderView,
+                             QLabel, QTableView, QHeaderView,
                              QLineEdit, QMessageBox)
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont
 
 from dialogs.product_dialog import ProductDialog
+from dialogs.import_dialog import ImportDialog
+from dialogs.stock_alert_dialog import StockAlertDialog
+from components.table_model import (ColumnarTableModel, ObjectColumn, IntColumn,
+                                    DictColumn, ConstantColumn)
+from components.search_controller import TableSearchController
+from database.db_manager import get_database
+from database.importer import KIND_PRODUCTS
+from database.repositories import ProductRepository
+from database.stock_alerts import get_stock_alerts
+from utils.tracing import span
 
 
 class ProductsModule(QWidget):
     def __init__(self):
         super().__init__()
+        self.repository = ProductRepository(get_database())
         self.init_ui()
-        # 延迟应用主题，确保所有组件都已创建
-        from PyQt5.QtCore import QTimer
-        QTimer.singleShot(0, self.apply_initial_theme)
     
     def init_ui(self):
         layout = QVBoxLayout()
@@ -32,121 +40,95 @@ class ProductsModule(QWidget):
         add_btn.clicked.connect(self.show_add_product_dialog)
         title_layout.addWidget(add_btn)
         
+        # 批量导入按钮
+        import_btn = QPushButton("导入")
+        import_btn.clicked.connect(self.show_import_dialog)
+        title_layout.addWidget(import_btn)
+        
+        # 库存预警按钮
+        alert_btn = QPushButton("库存预警")
+        alert_btn.clicked.connect(self.show_stock_alert_dialog)
+        title_layout.addWidget(alert_btn)
+        
         layout.addLayout(title_layout)
         
         # 搜索栏
         search_layout = QHBoxLayout()
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("搜索货品...")
-        # 输入框样式将在主题中设置
-        self.search_input.textChanged.connect(self.filter_products)
+        # 输入框样式将在主题中设置（输入防抖由搜索控制器处理）
         search_layout.addWidget(self.search_input)
         search_layout.addStretch()
         layout.addLayout(search_layout)
         
         # 货品列表表格
-        self.products_table = QTableWidget()
-        self.products_table.setColumnCount(6)
-        self.products_table.setHorizontalHeaderLabels(["ID", "货品名称", "SKU", "当前库存", "单位", "操作"])
+        self.products_model = ColumnarTableModel(
+            ["ID", "货品名称", "SKU", "当前库存", "单位", "操作"],
+            [ObjectColumn(), ObjectColumn(), ObjectColumn(), IntColumn(), DictColumn(),
+             ConstantColumn("编辑 | 删除")],
+            self,
+        )
+        self.products_table = QTableView()
+        self.products_table.setModel(self.products_model)
         
         # 设置表格样式
         self.products_table.setAlternatingRowColors(True)
-        self.products_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.products_table.setSelectionBehavior(QTableView.SelectRows)
         self.products_table.horizontalHeader().setStretchLastSection(True)
         self.products_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        # 固定行高，避免大数据量时逐行计算尺寸
+        self.products_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        
+        # 按名称和SKU建立搜索索引
+        self.search = TableSearchController(
+            self.search_input, self.products_model,
+            lambda values: (values[1], values[2]), self)
         
-        # 添加示例数据
+        # 加载货品数据
         self.populate_products_table()
         
         layout.addWidget(self.products_table)
     
     def populate_products_table(self):
-        """填充货品表格示例数据"""
-        sample_data = [
-            ["1", "苹果", "APP001", "100", "箱", "编辑 | 删除"],
-            ["2", "香蕉", "BAN001", "50", "箱", "编辑 | 删除"],
-            ["3", "橙子", "ORA001", "80", "箱", "编辑 | 删除"],
-            ["4", "葡萄", "GRA001", "30", "箱", "编辑 | 删除"],
-            ["5", "草莓", "STR001", "20", "盒", "编辑 | 删除"],
-        ]
-        
-        self.products_table.setRowCount(len(sample_data))
-        for i, row_data in enumerate(sample_data):
-            for j, cell_data in enumerate(row_data):
-                item = QTableWidgetItem(str(cell_data))
-                self.products_table.setItem(i, j, item)
+        """从数据库填充货品表格"""
+        with span("products.populate") as s:
+            rows = self.repository.list_all()
+            self.products_model.set_rows(rows)
+            self._row_of_id = {row[0]: i for i, row in enumerate(rows)}
+            self.search.rebuild(rows)
+            s.set(rows=len(rows))
+    
+    def refresh_product(self, product_id):
+        """新增或修改货品后，只更新该行和搜索索引"""
+        row_data = self.repository.list_row(product_id)
+        if row_data is None:
+            return
+        source_row = self._row_of_id.get(product_id)
+        if source_row is None:
+            source_row = self.products_model.source_row_count()
+            self._row_of_id[product_id] = source_row
+            self.products_model.append_rows([row_data])
+        else:
+            self.products_model.update_row(source_row, row_data)
+        self.search.row_changed(source_row)
     
     def filter_products(self):
-        """根据搜索条件过滤货品"""
-        search_text = self.search_input.text().lower()
-        for row in range(self.products_table.rowCount()):
-            should_show = False
-            for col in range(self.products_table.columnCount()):
-                item = self.products_table.item(row, col)
-                if item and search_text in item.text().lower():
-                    should_show = True
-                    break
-            self.products_table.setRowHidden(row, not should_show)
+        """根据搜索条件过滤货品（通过索引查询，不逐行扫描）"""
+        self.search.apply_filter()
     
     def show_add_product_dialog(self):
         """显示添加货品对话框"""
         dialog = ProductDialog(self)
         if dialog.exec_() == ProductDialog.Accepted:
-            # 这里可以添加保存逻辑
-            QMessageBox.information(self, "成功", "货品添加成功！")
-            self.populate_products_table()  # 刷新表格
+            self.refresh_product(dialog.saved_id)
+            get_stock_alerts().touch([dialog.saved_id])
+    
+    def show_import_dialog(self):
+        """从 CSV / XLSX 批量导入货品，完成后重新加载表格"""
+        dialog = ImportDialog(KIND_PRODUCTS, self)
+        if dialog.exec_() == ImportDialog.Accepted:
+            self.populate_products_table()
     
-    def apply_initial_theme(self):
-        """应用初始主题"""
-        # 获取主题管理器（如果存在）
-        try:
-            from modules.theme_manager import ThemeManager
-            theme_manager = ThemeManager()
-            styles = theme_manager.get_theme_styles()
-            self.setStyleSheet(styles["content"])
-        except:
-            # 如果无法获取主题管理器，使用默认深色主题
-            self.setStyleSheet("""
-                QWidget {
-                    background-color: #1a1a1a;
-                    color: #ffffff;
-                }
-                QLabel {
-                    color: #ffffff;
-                }
-                QPushButton {
-                    background-color: #007bff;
-                    color: white;
-                    border: none;
-                    padding: 8px 16px;
-                    border-radius: 4px;
-                }
-                QPushButton:hover {
-                    background-color: #0056b3;
-                }
-                QLineEdit {
-                    border: 1px solid #404040;
-                    padding: 8px;
-                    background-color: #2d2d2d;
-                    color: #ffffff;
-                }
-                QTableWidget {
-                    background-color: #2d2d2d;
-                    alternate-background-color: #404040;
-                    gridline-color: #404040;
-                    color: #ffffff;
-                }
-                QTableWidget::item {
-                    padding: 8px;
-                }
-                QTableWidget::item:selected {
-                    background-color: #007bff;
-                    color: white;
-                }
-                QHeaderView::section {
-                    background-color: #404040;
-                    color: #ffffff;
-                    padding: 8px;
-                    border: none;
-                }
-            """)
+    def show_stock_alert_dialog(self):
+        """查看库存预警，设置补货点"""
+        StockAlertDialog(self).exec_()
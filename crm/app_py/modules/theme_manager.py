@@ -1,20 +1,54 @@
+import re
+
 from PyQt5.QtCore import QObject, pyqtSignal
 from PyQt5.QtWidgets import QApplication
 
 
+# 一条 QSS 规则：选择器 { 声明 }
+_RULE_RE = re.compile(r"([^{}]+)\{([^{}]*)\}")
+
+
+def _scope(css, object_name):
+    """把样式限定到 objectName 为 object_name 的容器：
+    每个选择器同时作用于容器本身（sel#name）和其中的子组件（#name sel）"""
+    rules = []
+    for selectors, body in _RULE_RE.findall(css):
+        scoped = []
+        for selector in selectors.split(","):
+            selector = selector.strip()
+            if not selector:
+                continue
+            # 伪状态/子控件之前插入 #name，如 QPushButton:hover -> QPushButton#name:hover
+            head, sep, tail = selector.partition(":")
+            scoped.append(f"{head}#{object_name}{sep}{tail}")
+            scoped.append(f"#{object_name} {selector}")
+        rules.append(f"{', '.join(scoped)} {{{body}}}")
+    return "\n".join(rules)
+
+
 class ThemeManager(QObject):
-    """主题管理器"""
+    """主题管理器
+    
+    两套主题的样式在首次使用时生成一次并在所有实例间共享；每套主题预先
+    合成一份应用级样式表（各区域按 objectName 限定范围），切换主题只需一次
+    QApplication.setStyleSheet，已创建和之后按需创建的页面都会自动套用。
+    """
     
     # 主题切换信号
     theme_changed = pyqtSignal(str)
     
+    _themes = None
+    _app_stylesheets = None
+    
     def __init__(self):
         super().__init__()
         self.current_theme = "dark"  # 默认深色主题
-        self.themes = {
-            "light": self.get_light_theme(),
-            "dark": self.get_dark_theme()
-        }
+        if ThemeManager._themes is None:
+            ThemeManager._themes = {
+                "light": self.get_light_theme(),
+                "dark": self.get_dark_theme()
+            }
+        self.themes = ThemeManager._themes
     
     def get_light_theme(self):
         """获取浅色主题样式"""
@@ -71,16 +105,16 @@ class ThemeManager(QObject):
                     background-color: white;
                     color: #333333;
                 }
-                QTableWidget {
+                QTableView {
                     background-color: white;
                     alternate-background-color: #f8f9fa;
                     gridline-color: #dee2e6;
                     color: #333333;
                 }
-                QTableWidget::item {
+                QTableView::item {
                     padding: 8px;
                 }
-                QTableWidget::item:selected {
+                QTableView::item:selected {
                     background-color: #007bff;
                     color: white;
                 }
@@ -94,6 +128,55 @@ class ThemeManager(QObject):
                     background-color: white;
                     border: 1px solid #dee2e6;
                 }
+                QSpinBox, QDateEdit, QTextEdit, QComboBox {
+                    border: 1px solid #ced4da;
+                    padding: 8px;
+                    background-color: white;
+                    color: #333333;
+                }
+                QGroupBox {
+                    color: #333333;
+                    border: 1px solid #dee2e6;
+                    border-radius: 4px;
+                    margin-top: 10px;
+                    padding-top: 10px;
+                }
+                QGroupBox::title {
+                    subcontrol-origin: margin;
+                    left: 10px;
+                    padding: 0 5px 0 5px;
+                }
+                QTabWidget::pane {
+                    border: 1px solid #dee2e6;
+                    background-color: white;
+                }
+                QTabBar::tab {
+                    background-color: #e9ecef;
+                    color: #495057;
+                    padding: 8px 16px;
+                    margin-right: 2px;
+                }
+                QTabBar::tab:selected {
+                    background-color: #007bff;
+                    color: white;
+                }
+            """,
+            "stat_cards": """
+                QWidget#stat_card {
+                    background-color: white;
+                    border: 1px solid #dee2e6;
+                    border-radius: 8px;
+                    padding: 15px;
+                }
+                QWidget#stat_card:hover {
+                    border-color: #007bff;
+                    background-color: #f8f9fa;
+                }
+                QWidget#stat_card QLabel {
+                    background-color: transparent;
+                    border: none;
+                    color: #333333;
+                }
             """,
             "cards": """
                 QFrame {
@@ -166,16 +249,16 @@ class ThemeManager(QObject):
                     background-color: #2d2d2d;
                     color: #ffffff;
                 }
-                QTableWidget {
+                QTableView {
                     background-color: #2d2d2d;
                     alternate-background-color: #404040;
                     gridline-color: #404040;
                     color: #ffffff;
                 }
-                QTableWidget::item {
+                QTableView::item {
                     padding: 8px;
                 }
-                QTableWidget::item:selected {
+                QTableView::item:selected {
                     background-color: #007bff;
                     color: white;
                 }
@@ -189,6 +272,54 @@ class ThemeManager(QObject):
                     background-color: #2d2d2d;
                     border: 1px solid #404040;
                 }
+                QSpinBox, QDateEdit, QTextEdit, QComboBox {
+                    border: 1px solid #404040;
+                    padding: 8px;
+                    background-color: #2d2d2d;
+                    color: #ffffff;
+                }
+                QGroupBox {
+                    color: #ffffff;
+                    border: 1px solid #404040;
+                    border-radius: 4px;
+                    margin-top: 10px;
+                    padding-top: 10px;
+                }
+                QGroupBox::title {
+                    subcontrol-origin: margin;
+                    left: 10px;
+                    padding: 0 5px 0 5px;
+                }
+                QTabWidget::pane {
+                    border: 1px solid #404040;
+                    background-color: #2d2d2d;
+                }
+                QTabBar::tab {
+                    background-color: #404040;
+                    color: #ffffff;
+                    padding: 8px 16px;
+                    margin-right: 2px;
+                }
+                QTabBar::tab:selected {
+                    background-color: #007bff;
+                }
+            """,
+            "stat_cards": """
+                QWidget#stat_card {
+                    background-color: #2d2d2d;
+                    border: 1px solid #404040;
+                    border-radius: 8px;
+                    padding: 15px;
+                }
+                QWidget#stat_card:hover {
+                    border-color: #007bff;
+                    background-color: #404040;
+                }
+                QWidget#stat_card QLabel {
+                    background-color: transparent;
+                    border: none;
+                    color: #ffffff;
+                }
             """,
             "cards": """
                 QFrame {
@@ -227,14 +358,38 @@ class ThemeManager(QObject):
         new_theme = "dark" if self.current_theme == "light" else "light"
         return self.set_theme(new_theme)
     
-    def apply_theme_to_app(self, app):
-        """将主题应用到整个应用"""
-        styles = self.get_theme_styles()
-        app.setStyleSheet(styles["main_window"])
+    def get_app_stylesheet(self):
+        """当前主题的应用级样式表（每套主题只合成一次）"""
+        if ThemeManager._app_stylesheets is None:
+            ThemeManager._app_stylesheets = {
+                name: self._build_app_stylesheet(name) for name in self.themes
+            }
+        return ThemeManager._app_stylesheets[self.current_theme]
+    
+    def _build_app_stylesheet(self, theme_name):
+        """把各区域样式合成为一份应用级样式表
+        
+        主窗口使用的 objectName：导航面板 navigation、内容区 content、
+        首页 dashboard、主题按钮 theme_button；后出现的规则优先级更高。
+        """
+        styles = self.themes[theme_name]
+        return "\n".join([
+            styles["main_window"],
+            _scope(styles["navigation"], "navigation"),
+            _scope(styles["content"], "content"),
+            styles["stat_cards"],
+            _scope(styles["cards"], "dashboard"),
+            _scope(self.get_theme_button_style(theme_name), "theme_button"),
+        ])
+    
+    def apply_theme_to_app(self, app=None):
+        """将当前主题应用到整个应用（一次 setStyleSheet，不逐个组件设置）"""
+        app = app or QApplication.instance()
+        app.setStyleSheet(self.get_app_stylesheet())
     
-    def get_theme_button_style(self):
+    def get_theme_button_style(self, theme_name=None):
         """获取主题切换按钮的样式"""
-        if self.current_theme == "light":
+        if (theme_name or self.current_theme) == "light":
             return """
                 QPushButton {
                     background-color: #343a40;
@@ -260,3 +415,14 @@ class ThemeManager(QObject):
                     background-color: #e9ecef;
                 }
             """
+
+
+_theme_manager = None
+
+
+def get_theme_manager():
+    """获取全局共享的主题管理器"""
+    global _theme_manager
+    if _theme_manager is None:
+        _theme_manager = ThemeManager()
+    return _theme_manager
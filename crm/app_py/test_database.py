@@ -0,0 +1,816 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试数据层（WAL + 连接池 + 仓储）
+
+每个测试使用独立的临时数据库，HOME、MINICRM_DB 指向临时目录，不读写用户的数据库。
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from database.db_manager import Database, seed_sample_data, LOW_STOCK_THRESHOLD, DATE_FORMAT
+from database.repositories import (ProductRepository, MerchantRepository,
+                                   TransactionRepository, AnalysisRepository, DashboardRepository,
+                                   StockError, TYPE_INBOUND, TYPE_OUTBOUND)
+from database.transaction_writer import TransactionWriter
+from database.synthetic_data import generate
+from database.importer import BulkImporter, KIND_PRODUCTS, KIND_TRANSACTIONS
+from database.exporter import RecordExporter
+from database.analytics import AnalyticsEngine
+from database.forecasting import DemandForecaster, fit_forecast
+from database.stock_history import StockHistory
+from database.report_cache import ReportCache
+from database.comparison import MerchantComparison
+from database.transaction_store import TransactionStore
+from database.transaction_log import TransactionLog
+from database.sync import HttpSession, SyncEngine, SyncError, WIRE_TIME_FORMAT
+from database.sync_mock_server import MockSyncServer
+from database.outbox import Outbox, OutboxReplayer
+from database.stock_alerts import (StockAlertEngine, LEVEL_OUT_OF_STOCK, LEVEL_REORDER,
+                                   LEVEL_LOW_COVER)
+from utils.downsample import lttb
+from utils.search_index import NGramIndex
+
+
+# 测试期间改写的环境变量（用户目录、默认数据库、同步服务器）
+ISOLATED_ENV = ("HOME", "USERPROFILE", "MINICRM_DB", "MINICRM_SYNC_URL", "MINICRM_SYNC_TOKEN")
+
+
+@contextmanager
+def isolated():
+    """临时目录，用户目录和默认数据库指向其中；返回临时目录的路径
+
+    结束时确认测试没有在用户目录下写入文件（如打开了全局数据库）。
+    """
+    saved = {name: os.environ.get(name) for name in ISOLATED_ENV}
+    with tempfile.TemporaryDirectory() as tmp:
+        home = os.path.join(tmp, "home")
+        os.mkdir(home)
+        os.environ["HOME"] = os.environ["USERPROFILE"] = home
+        os.environ["MINICRM_DB"] = os.path.join(home, "minicrm.db")
+        os.environ.pop("MINICRM_SYNC_URL", None)
+        os.environ.pop("MINICRM_SYNC_TOKEN", None)
+        try:
+            yield tmp
+            assert os.listdir(home) == [], os.listdir(home)
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+
+def synthetic(tmp):
+    """在临时目录中按固定种子生成合成数据库，返回路径"""
+    path = os.path.join(tmp, "synthetic.db")
+    generate(path, products=50, merchants=5, transactions=5000, years=2, seed=7)
+    return path
+
+
+def counters_consistent(db):
+    """首页指标的计数表与按货品、流水、月度汇总重新统计的结果一致"""
+    with db.reader() as conn:
+        counters = [conn.execute(sql).fetchall() for sql in (
+            'SELECT "productCount", "totalStock", "lowStockCount" FROM "inventory_totals"',
+            'SELECT * FROM "daily_totals" WHERE "count" > 0 ORDER BY 1, 2',
+            'SELECT * FROM "merchant_month_totals" WHERE "quantity" > 0 ORDER BY 1, 2')]
+        expected = [
+            conn.execute('SELECT COUNT(*), IFNULL(SUM(p."currentStock"), 0), '
+                         'IFNULL(SUM(p."currentStock" <= IFNULL(r."reorderPoint", ?)), 0) '
+                         'FROM "products" AS p LEFT JOIN "reorder_points" AS r '
+                         'ON r."productId" = p."id"',
+                         (LOW_STOCK_THRESHOLD,)).fetchall(),
+            conn.execute('SELECT substr("date", 1, 10), "type", SUM("quantity"), COUNT(*) '
+                         'FROM "transactions" GROUP BY 1, 2 ORDER BY 1, 2').fetchall(),
+            conn.execute('SELECT "yearMonth", "merchantId", SUM("quantity") '
+                         'FROM "merchant_monthly_outbound" GROUP BY 1, 2 '
+                         'HAVING SUM("quantity") > 0 ORDER BY 1, 2').fetchall()]
+    return counters == expected
+
+
+def test_repositories():
+    with isolated() as tmp:
+        db = Database(os.path.join(tmp, "test.db"))
+        try:
+            with db.reader() as conn:
+                mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+            assert mode == "wal", mode
+            print("OK WAL模式已启用")
+
+            seed_sample_data(db)
+            products = ProductRepository(db)
+            merchants = MerchantRepository(db)
+            transactions = TransactionRepository(db)
+            assert len(products.list_all()) == 5
+            assert len(merchants.list_all()) == 5
+            print("OK 示例数据写入成功")
+
+            product_id = products.create("西瓜", sku="WAT001", stock=10, unit="个")
+            merchant_id = merchants.create("超市F", contact="孙八")
+            transactions.record(product_id, TYPE_INBOUND, 5, tx_date="2024-03-01 00:00:00")
+            transactions.record(product_id, TYPE_OUTBOUND, 3, merchant_id=merchant_id,
+                                tx_date="2024-03-02 00:00:00")
+            assert products.get(product_id)[4] == 12
+            assert products.names([product_id, "missing"]) == {product_id: "西瓜"}
+            print("OK 出入库记录与库存更新成功")
+
+            rows = transactions.query_range("2024-03-01", "2024-03-02")
+            assert [row[2] for row in rows] == [TYPE_OUTBOUND, TYPE_INBOUND]
+            print("OK 日期范围查询成功")
+
+            analysis = AnalysisRepository(db)
+            transactions.record(product_id, TYPE_OUTBOUND, 4, merchant_id=merchant_id,
+                                tx_date="2024-03-20 00:00:00")
+            monthly = analysis.monthly_outbound(merchant_id, 2024)
+            assert monthly[2] == 7 and sum(monthly) == 7, monthly
+            print("OK 出库月度汇总增量更新成功")
+        finally:
+            db.close()
+
+
+def test_transaction_writer():
+    with isolated() as tmp:
+        db = Database(os.path.join(tmp, "writer.db"))
+        try:
+            products = ProductRepository(db)
+            product_id = products.create("西瓜", stock=10)
+            merchant_id = MerchantRepository(db).create("超市F")
+            writer = TransactionWriter(db)
+            futures = [writer.submit(product_id, TYPE_INBOUND, 1) for _ in range(20)]
+            refused = writer.submit(product_id, TYPE_OUTBOUND, 10000, merchant_id=merchant_id)
+            for future in futures:
+                future.result()
+            assert isinstance(refused.exception(), StockError)
+            writer.close()
+            assert products.get(product_id)[4] == 10 + 20
+        finally:
+            db.close()
+    print("OK 组提交写入成功，超量出库被拒绝")
+
+
+def test_transaction_rollback():
+    with isolated() as tmp:
+        db = Database(os.path.join(tmp, "rollback.db"))
+        try:
+            products = ProductRepository(db)
+            product_id = products.create("西瓜", stock=10)
+            # 延迟外键检查：违反外键的流水在 COMMIT 时才报错，此前的修改一并回滚
+            try:
+                with db.transaction() as conn:
+                    conn.execute("PRAGMA defer_foreign_keys = ON")
+                    conn.execute('UPDATE "products" SET "currentStock" = 0 WHERE "id" = ?',
+                                 (product_id,))
+                    conn.execute('INSERT INTO "transactions" ("id", "productId", "type", "quantity") '
+                                 'VALUES (?, ?, ?, ?)', ("orphan", "missing", TYPE_INBOUND, 1))
+                assert False, "提交时应当违反外键约束"
+            except sqlite3.IntegrityError:
+                pass
+            # 没有留下部分写入：库存未变，孤立流水不存在
+            assert products.get(product_id)[4] == 10
+            with db.reader() as conn:
+                assert conn.execute('SELECT COUNT(*) FROM "transactions" '
+                                    'WHERE "id" = ?', ("orphan",)).fetchone()[0] == 0
+            # 写连接没有留在事务中，之后的写入正常提交
+            assert not db._writer.in_transaction
+            TransactionRepository(db).record(product_id, TYPE_INBOUND, 5)
+            assert products.get(product_id)[4] == 15
+            assert counters_consistent(db)
+        finally:
+            db.close()
+    print("OK 提交失败时回滚，写连接可继续使用")
+
+
+def test_dashboard_counters():
+    with isolated() as tmp:
+        db = Database(os.path.join(tmp, "dashboard.db"))
+        try:
+            seed_sample_data(db)
+            products = ProductRepository(db)
+            merchants = MerchantRepository(db)
+            transactions = TransactionRepository(db)
+            product_id = products.create("西瓜", stock=10)
+            merchant_id = merchants.create("超市F")
+            for _ in range(3):
+                transactions.record(product_id, TYPE_INBOUND, 1)
+            day = time.strftime("%Y-%m-%d")
+            transactions.record(product_id, TYPE_OUTBOUND, 2, merchant_id=merchant_id)
+            kpis = DashboardRepository(db).kpis(day)
+            assert kpis.product_count == 6 and kpis.inbound_count == 3
+            assert (kpis.outbound, kpis.outbound_count) == (2, 1)
+            assert kpis.top_merchants == [("超市F", 2)], kpis.top_merchants
+            assert counters_consistent(db)
+            products.delete(products.list_all()[0][0])
+            merchants.delete(merchant_id)
+            assert counters_consistent(db)
+            assert DashboardRepository(db).kpis(day).top_merchants == []
+        finally:
+            db.close()
+    print("OK 首页指标由计数表增量维护，与重新统计一致")
+
+
+def test_import_export():
+    with isolated() as tmp:
+        db = Database(os.path.join(tmp, "import.db"))
+        try:
+            products_csv = os.path.join(tmp, "products.csv")
+            with open(products_csv, "w", encoding="gb18030") as f:
+                f.write("货品名称,SKU,单位,当前库存\n梨,PEA001,个,10\n桃,,箱,x\n梨,,个,1\n")
+            result = BulkImporter(db).import_file(KIND_PRODUCTS, products_csv)
+            assert (result.imported, result.skipped) == (1, 2), result.errors
+            transactions_csv = os.path.join(tmp, "transactions.csv")
+            with open(transactions_csv, "w", encoding="utf-8") as f:
+                f.write("日期,货品,类型,数量,备注\n"
+                        "2024-05-01 08:00:00,梨,出库,4,\n"
+                        "2024/05/02,PEA001,入库,3,补货\n"
+                        "2024-05-03 08:00:00,梨,出库,100,\n"
+                        "五月,梨,出库,1,\n")
+            result = BulkImporter(db, batch_size=2).import_file(KIND_TRANSACTIONS, transactions_csv)
+            assert (result.imported, result.skipped) == (2, 2), result.errors
+            with db.reader() as conn:
+                stock = conn.execute('SELECT "currentStock" FROM "products"').fetchone()[0]
+                dates = [row[0] for row in conn.execute(
+                    'SELECT "date" FROM "transactions" ORDER BY "date"')]
+            assert stock == 9, stock
+            assert dates == ["2024-05-01 08:00:00", "2024-05-02 00:00:00"], dates
+            assert counters_consistent(db)
+            # 导入期间界面出库：写入时按实际库存重新校验，库存不足的出库被拒绝，不会出现负库存
+            pear = ProductRepository(db).list_names()[0][0]
+            with open(transactions_csv, "w", encoding="utf-8") as f:
+                f.write("日期,货品,类型,数量\n"
+                        "2024-06-01,梨,出库,2\n2024-06-02,梨,出库,2\n2024-06-03,梨,出库,3\n")
+            concurrent = []
+
+            def outbound_during_import(handled, fraction):
+                if not concurrent:
+                    concurrent.append(TransactionRepository(db).record(pear, TYPE_OUTBOUND, 4))
+
+            result = BulkImporter(db, batch_size=2, progress=outbound_during_import).import_file(
+                KIND_TRANSACTIONS, transactions_csv)
+            assert (result.imported, result.skipped) == (2, 1), result.errors
+            assert result.errors[0][0] == 4 and "库存不足" in result.errors[0][1], result.errors
+            assert ProductRepository(db).get(pear)[4] == 9 - 2 - 2 - 4
+            assert counters_consistent(db)
+            print("OK 批量导入成功，出错行被跳过")
+
+            exported_csv = os.path.join(tmp, "exported.csv")
+            count = RecordExporter(db).export(exported_csv, "2024-05-01", "2024-05-31")
+            with open(exported_csv, encoding="utf-8-sig") as f:
+                lines = f.read().splitlines()
+            assert count == 2 and lines[0] == "日期,货品,类型,数量,商家,备注", lines
+            assert lines[1] == "2024-05-02 00:00:00,梨,入库,3,,补货", lines
+            print("OK 记录导出成功")
+
+            assert db.drop_indexes("transactions") > 0
+        finally:
+            db.close()
+        # 导入中途退出时删除的索引在下次打开时重建
+        db = Database(os.path.join(tmp, "import.db"))
+        try:
+            with db.reader() as conn:
+                indexes = conn.execute(
+                    "SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' "
+                    "AND tbl_name = 'transactions' AND sql IS NOT NULL").fetchone()[0]
+                pending = conn.execute('SELECT COUNT(*) FROM "deferred_indexes"').fetchone()[0]
+            assert indexes > 0 and pending == 0
+        finally:
+            db.close()
+    print("OK 延迟重建的索引已恢复")
+
+
+def test_synthetic_data():
+    with isolated() as tmp:
+        paths = [os.path.join(tmp, f"synthetic{i}.db") for i in range(2)]
+        for path in paths:
+            generate(path, products=50, merchants=5, transactions=5000, years=2, seed=7)
+        dumps = []
+        for path in paths:
+            db = Database(path)
+            try:
+                with db.reader() as conn:
+                    dumps.append(conn.execute(
+                        'SELECT * FROM "transactions" ORDER BY "id"').fetchall())
+                    # 期初库存 = 当前库存 - 期间净变化，不能为负
+                    opening = conn.execute(
+                        'SELECT MIN(p."currentStock" - COALESCE(('
+                        '  SELECT SUM(CASE t."type" WHEN ? THEN t."quantity" ELSE -t."quantity" END)'
+                        '  FROM "transactions" t WHERE t."productId" = p."id"), 0)) '
+                        'FROM "products" p', (TYPE_INBOUND,)).fetchone()[0]
+                    rollup = conn.execute(
+                        'SELECT SUM("quantity") FROM "merchant_monthly_outbound"').fetchone()[0]
+                    outbound = conn.execute(
+                        'SELECT SUM("quantity") FROM "transactions" WHERE "type" = ?',
+                        (TYPE_OUTBOUND,)).fetchone()[0]
+                assert counters_consistent(db)
+            finally:
+                db.close()
+            assert opening >= 0, opening
+            assert rollup == outbound
+        assert len(dumps[0]) == 5000 and dumps[0] == dumps[1]
+    print("OK 合成数据按种子确定生成，库存与汇总一致")
+
+
+def test_analytics():
+    with isolated() as tmp:
+        db = Database(synthetic(tmp))
+        try:
+            engine = AnalyticsEngine(db)
+            engine.refresh()
+            analysis = AnalysisRepository(db)
+            year = engine.years()[0]
+            report = engine.merchant_report(year)
+            for merchant_id, _ in MerchantRepository(db).list_names():
+                row = report.row(merchant_id)
+                expected = analysis.monthly_outbound(merchant_id, year)
+                assert (report.monthly[row].tolist() if row is not None else [0] * 12) == expected
+            merchant_id = report.ids[int(report.order_by_total()[0])]
+            product_id = ProductRepository(db).list_names()[0][0]
+            TransactionRepository(db).record(product_id, TYPE_INBOUND, 1000)
+            TransactionRepository(db).record(product_id, TYPE_OUTBOUND, 1000, merchant_id=merchant_id,
+                                             tx_date=f"{year}-06-15 00:00:00")
+            assert engine.refresh()
+            row = engine.merchant_report(year).row(merchant_id)
+            assert engine.merchant_report(year).monthly[row].tolist() == \
+                analysis.monthly_outbound(merchant_id, year)
+            # 多商家对比：进程池分段求和与本进程内计算一致
+            merchant_ids = engine.merchant_report(year).ids
+            serial = MerchantComparison(engine, workers=1).compare(merchant_ids, year)
+            pooled = MerchantComparison(engine, workers=2, parallel_min_rows=0)
+            try:
+                parallel = pooled.compare(merchant_ids, year)
+            finally:
+                pooled.close()
+            assert np.array_equal(serial.monthly, engine.merchant_report(year).monthly)
+            assert np.array_equal(parallel.monthly, serial.monthly)
+            previous = engine.merchant_report(int(year) - 1)
+            assert serial.previous_total.tolist() == [
+                int(previous.total[previous.row(item)]) if previous.row(item) is not None else 0
+                for item in merchant_ids]
+        finally:
+            db.close()
+    print("OK 列式分析引擎与出库汇总一致，增量同步成功，多商家对比并行与串行一致")
+
+
+def test_forecasting():
+    with isolated() as tmp:
+        db = Database(synthetic(tmp))
+        try:
+            engine = AnalyticsEngine(db)
+            engine.refresh()
+            forecaster = DemandForecaster(engine)
+            fitted = forecaster.update()
+            assert fitted > 0 and forecaster.update() == 0
+            year = engine.years()[0]
+            report = engine.merchant_report(year)
+            merchant_id = report.ids[int(report.order_by_total()[0])]
+            product_id = ProductRepository(db).list_names()[0][0]
+            TransactionRepository(db).record(product_id, TYPE_INBOUND, 1000)
+            TransactionRepository(db).record(product_id, TYPE_OUTBOUND, 1000, merchant_id=merchant_id,
+                                             tx_date=f"{year}-06-15 00:00:00")
+            assert engine.refresh()
+            # 只重新拟合新出库涉及的序列（该商家合计，以及出库月份足够多时的商家×货品）
+            assert 1 <= forecaster.update() <= 2
+            origin, forecast, lower, upper = forecaster.series(merchant_id)
+            assert len(forecast) == len(lower) == len(upper)
+            assert all(low <= value <= high for value, low, high in zip(forecast, lower, upper))
+        finally:
+            db.close()
+
+    # 严格按年重复的序列，预测即为下一年同月
+    pattern = np.array([10, 12, 30, 80, 40, 20, 15, 15, 18, 25, 60, 90])
+    forecast, sigma = fit_forecast(np.tile(pattern, (2, 3)))
+    assert np.allclose(forecast, pattern[:6]) and np.allclose(sigma, 0)
+    print(f"OK 需求预测：拟合 {fitted} 个序列，新出库只重新拟合涉及的序列")
+
+
+def test_stock_history():
+    with isolated() as tmp:
+        db = Database(synthetic(tmp))
+        try:
+            history = StockHistory(db)
+            assert history.checkpoint() > 0 and history.checkpoint() == 0
+            products = ProductRepository(db)
+            product_id = products.list_names()[1][0]
+            # 补记一笔历史入库（日期早于已生成快照的月份），其后各月的快照随之修正
+            TransactionRepository(db).record(product_id, TYPE_INBOUND, 7, tx_date="2023-03-10 00:00:00")
+
+            def replayed(day):
+                with db.reader() as conn:
+                    stock = conn.execute('SELECT "currentStock" FROM "products" WHERE "id" = ?',
+                                         (product_id,)).fetchone()[0]
+                    for tx_type, quantity in conn.execute(
+                            'SELECT "type", "quantity" FROM "transactions" '
+                            'WHERE "productId" = ? AND "date" >= ?', (product_id, day)):
+                        stock -= quantity if tx_type == TYPE_INBOUND else -quantity
+                return stock
+
+            for day in ("2022-12-31", "2023-01-01", "2023-03-10", "2023-03-11", "2024-02-29",
+                        "2024-07-15", "2025-01-01", "2030-01-01"):
+                assert history.stock_before(product_id, day) == replayed(day), day
+            levels = history.monthly_levels(product_id, "2023-01", "2024-12")
+            assert levels == [(month, replayed(f"{month}-01")) for month, _ in levels]
+            assert history.reconcile() == []
+            with db.transaction() as conn:
+                conn.execute('UPDATE "products" SET "currentStock" = "currentStock" + 5 WHERE "id" = ?',
+                             (product_id,))
+            [(mismatched, current, expected)] = history.reconcile(repair=True)
+            assert mismatched == product_id and current == expected + 5
+            assert history.reconcile() == []
+        finally:
+            db.close()
+    print("OK 月度库存快照：历史库存与重放流水一致，补记历史流水后快照同步修正")
+
+
+def test_report_cache():
+    with isolated() as tmp:
+        db = Database(synthetic(tmp))
+        writer = TransactionWriter(db)
+        try:
+            cache = ReportCache(max_entries=2)
+            writer.add_listener(cache.on_movements)
+            analysis = AnalysisRepository(db)
+            merchant_ids = [merchant_id for merchant_id, _ in MerchantRepository(db).list_names()]
+            product_id, product_name = ProductRepository(db).list_names()[0]
+
+            def report(merchant_id, year):
+                cached = cache.get(merchant_id, year)
+                if cached is None:
+                    version = cache.version(merchant_id, year)
+                    cached = analysis.monthly_outbound(merchant_id, year)
+                    cache.put(merchant_id, year, version, cached)
+                return cached
+
+            first = report(merchant_ids[0], 2024)
+            assert report(merchant_ids[0], 2024) is first and cache.hits == 1
+            # 入库、其他年份的出库不影响该报告；该商家该年的出库提交后失效
+            writer.submit(product_id, TYPE_INBOUND, 10, tx_date="2024-05-01 00:00:00").result()
+            writer.submit(product_id, TYPE_OUTBOUND, 1, merchant_id=merchant_ids[0],
+                          tx_date="2023-05-01 00:00:00").result()
+            assert report(merchant_ids[0], 2024) is first
+            writer.submit(product_id, TYPE_OUTBOUND, 2, merchant_id=merchant_ids[0],
+                          tx_date="2024-05-01 00:00:00").result()
+            second = report(merchant_ids[0], 2024)
+            assert second is not first and second[4] == first[4] + 2
+            # 计算期间有新的提交：存入的结果随即失效
+            version = cache.version(merchant_ids[1], 2024)
+            cache.invalidate({(merchant_ids[1], 2024)})
+            cache.put(merchant_ids[1], 2024, version, [])
+            assert cache.get(merchant_ids[1], 2024) is None
+            # 超过条目上限时淘汰最近最少使用的项
+            report(merchant_ids[1], 2024)
+            report(merchant_ids[0], 2024)
+            report(merchant_ids[2], 2024)
+            assert len(cache) == 2 and cache.get(merchant_ids[1], 2024) is None
+            # 导入的出库提交后失效
+            merchant_name = dict(MerchantRepository(db).list_names())[merchant_ids[2]]
+            transactions_csv = os.path.join(tmp, "transactions.csv")
+            with open(transactions_csv, "w", encoding="utf-8") as f:
+                f.write(f"日期,货品,类型,数量,商家\n2024-07-01,{product_name},出库,1,{merchant_name}\n")
+            result = BulkImporter(db, report_cache=cache).import_file(KIND_TRANSACTIONS, transactions_csv)
+            assert result.imported == 1, result.errors
+            assert cache.get(merchant_ids[2], 2024) is None
+            # 删除货品、商家后，其出库不再计入，缓存的报告随之失效
+            report(merchant_ids[0], 2024)
+            ProductRepository(db, report_cache=cache).delete(product_id)
+            assert cache.get(merchant_ids[0], 2024) is None
+            report(merchant_ids[2], 2024)
+            assert cache.get(merchant_ids[2], 2024) is not None
+            MerchantRepository(db, report_cache=cache).delete(merchant_ids[2])
+            assert cache.get(merchant_ids[2], 2024) is None
+        finally:
+            writer.close()
+            db.close()
+    print("OK 分析报告缓存：相关出库提交后精确失效，按 LRU 淘汰")
+
+
+def test_transaction_store():
+    with isolated() as tmp:
+        db = Database(synthetic(tmp))
+        try:
+            store = TransactionStore(db)
+            transactions = TransactionRepository(db)
+            product_id = ProductRepository(db).list_names()[0][0]
+            merchant_id = MerchantRepository(db).list_names()[0][0]
+
+            def matches(start, end, **filters):
+                snapshot = store.snapshot()
+                rows = [(view.date, view.product_name, view.type, view.quantity,
+                         view.merchant_name or None, view.notes)
+                        for view in map(snapshot.row, snapshot.select(start, end, **filters))]
+                expected = [(row[0][:10], *row[1:]) for page in transactions.iter_pages(
+                    start, end, page_size=5000, **filters) for row in page]
+                # 同一天内按写入顺序排列（数据库按 id），只比较内容和日期顺序
+                return Counter(rows) == Counter(expected) and \
+                    [row[0] for row in rows] == [row[0] for row in expected]
+
+            assert store.refresh() and not store.refresh()
+            assert store.snapshot().nbytes == 21 * len(store.snapshot())
+            assert matches("2023-01-01", "2025-12-31")
+            assert matches("2024-02-01", "2024-08-31", product_id=product_id)
+            assert matches("2024-01-01", "2024-12-31", merchant_id=merchant_id, tx_type=TYPE_OUTBOUND)
+            # 补记更早日期的流水后增量读取，按日期归并
+            transactions.record(product_id, TYPE_INBOUND, 3, tx_date="2023-02-01 00:00:00", notes="补记")
+            assert store.refresh()
+            assert matches("2023-01-01", "2023-03-31", product_id=product_id)
+            assert matches("2023-01-01", "2025-12-31")
+        finally:
+            db.close()
+    print(f"OK 常驻内存流水：{len(store.snapshot())} 条，每条 21 字节，筛选结果与数据库查询一致")
+
+
+def test_transaction_log():
+    # 流水日志：重新打开时直接读取文件，删除流水后重建
+    with isolated() as tmp:
+        db = Database(synthetic(tmp))
+        try:
+            def log_rows(log):
+                with log.view() as view:
+                    records = view.records()
+                    return view.epoch, sorted(zip(
+                        (view.product_ids[code] for code in records["product"]),
+                        records["day"].tolist(), records["quantity"].tolist()))
+
+            def db_rows():
+                with db.reader() as conn:
+                    return sorted(conn.execute(
+                        'SELECT "productId", CAST(julianday(substr("date", 1, 10)) - 2440587.5 AS INTEGER), '
+                        '"quantity" FROM "transactions"').fetchall())
+
+            product_id = ProductRepository(db).list_names()[0][0]
+            merchant_id = MerchantRepository(db).list_names()[0][0]
+            log = TransactionLog(db)
+            epoch, rows = log_rows(log)
+            assert rows == db_rows() and os.path.exists(log.path) and os.path.exists(log.dict_path)
+            assert TransactionLog(db).sync() == 0  # 冷启动：不再从数据库读取
+            transactions = TransactionRepository(db)
+            transactions.record(product_id, TYPE_INBOUND, 7, tx_date="2024-03-01 00:00:00")
+            assert log_rows(log)[0] is epoch and log_rows(TransactionLog(db))[1] == db_rows()
+            MerchantRepository(db).delete(merchant_id)
+            epoch2, rows = log_rows(log)
+            assert epoch2 is not epoch and rows == db_rows()
+            with log.view() as view:
+                codes = set(view.records()["merchant"].tolist()) - {-1}
+                assert merchant_id not in {view.merchant_ids[code] for code in codes}
+        finally:
+            db.close()
+    print("OK 流水日志：重新打开无需读库，删除流水后自动重建")
+
+
+def test_sync():
+    # 增量同步：两个桌面端通过本地模拟的同步服务器交换变化。时间精确到秒，
+    # 推送截止时间和网站端的修改时间都取下一秒，无需等待时间流逝
+    def next_second():
+        """推送截止时间：此前（含同一秒内）的本地修改都在本次推送"""
+        return (datetime.now() + timedelta(seconds=1)).strftime(DATE_FORMAT)
+
+    def website_time():
+        """网站端的修改时间：晚于此前的本地修改"""
+        return (datetime.now(timezone.utc) + timedelta(seconds=1)).strftime(WIRE_TIME_FORMAT)
+
+    with isolated() as tmp, MockSyncServer(token="secret", clock=website_time) as server:
+        first = Database(os.path.join(tmp, "first.db"))
+        second = Database(os.path.join(tmp, "second.db"))
+        try:
+            seed_sample_data(first)
+            # 第二端首次同步前已有自己的货品和出库
+            local = ProductRepository(second).create("本地货品", stock=10)
+            TransactionRepository(second).record(local, TYPE_OUTBOUND, 2)
+            alerts = StockAlertEngine(second)
+            alerts.refresh()
+            engines = [SyncEngine(first, HttpSession(server.url, token="secret"), clock=next_second),
+                       SyncEngine(second, HttpSession(server.url, token="secret"), clock=next_second,
+                                  alerts=alerts)]
+
+            def products(db):
+                with db.reader() as conn:
+                    return sorted(conn.execute('SELECT "id", "name", "currentStock" FROM "products"'))
+
+            def synced():
+                expected = sorted((item["id"], item["name"], item["currentStock"])
+                                  for item in server.items("products"))
+                return products(first) == products(second) == expected
+
+            assert sum(engines[0].sync().pushed.values()) == 15
+            result = engines[1].sync()
+            assert sum(result.pulled.values()) == 15 and sum(result.pushed.values()) == 2
+            assert sum(engines[0].sync().pulled.values()) == 2 and synced()
+            # 拉取的货品交给预警重新评估，结果与整体评估一致
+            alerts.refresh()
+            full = StockAlertEngine(second)
+            full.refresh()
+            assert alerts.evaluated == 5 and alerts.alerts() == full.alerts()
+            # 没有变化时不传输任何行，也不回传刚拉取或推送的行
+            for engine in engines:
+                result = engine.sync()
+                assert not any(result.pulled.values()) and not any(result.pushed.values())
+            # 网站端改名和入库，各自同步后一致
+            renamed = dict(server.items("products")[0], name="网站改名")
+            del renamed["currentStock"]
+            server.put("products", [renamed])
+            server.put("transactions", [{"productId": renamed["id"], "type": TYPE_INBOUND, "quantity": 6,
+                                         "date": "2024-05-01T00:00:00.000Z"}])
+            for engine in engines * 2:
+                engine.sync()
+            assert synced() and ("网站改名" in {row[1] for row in products(second)})
+            assert counters_consistent(first) and counters_consistent(second)
+            # 连接保持复用
+            assert engines[0].session.connections == 1 and engines[0].session.requests > 10
+            try:
+                SyncEngine(second, HttpSession(server.url, token="wrong")).sync()
+                assert False, "错误的令牌应当失败"
+            except SyncError:
+                pass
+        finally:
+            first.close()
+            second.close()
+    print("OK 增量同步：只传输变化的行，两端库存一致，连接复用")
+
+
+def test_outbox():
+    with isolated() as tmp:
+        db = Database(os.path.join(tmp, "outbox.db"))
+        try:
+            outbox = Outbox(db)
+            product_id = ProductRepository(db, outbox).create("离线货品", stock=5)
+            merchant_id = MerchantRepository(db, outbox).create("离线商家")
+            writer = TransactionWriter(db, outbox=outbox)
+            for _ in range(30):
+                writer.submit(product_id, TYPE_INBOUND, 2)
+            writer.submit(product_id, TYPE_OUTBOUND, 100, merchant_id=merchant_id)  # 库存不足，不记入
+            writer.submit(product_id, TYPE_OUTBOUND, 15, merchant_id=merchant_id).result()
+            writer.close()
+            assert outbox.pending() == 33
+            # 服务器不可达：记录保留在发件箱中
+            with MockSyncServer() as server:
+                url = server.url
+            replayer = OutboxReplayer(outbox, SyncEngine(db, HttpSession(url, timeout=2)))
+            try:
+                replayer.drain()
+                assert False, "服务器不可达时应当失败"
+            except SyncError:
+                pass
+            assert outbox.pending() == 33
+            port = int(url.rsplit(":", 1)[1])
+            with MockSyncServer(port=port) as server:
+                with db.reader() as conn:
+                    entries = conn.execute('SELECT * FROM "sync_outbox"').fetchall()
+                assert replayer.drain() == 33 and outbox.pending() == 0
+                # 每种数据一个请求
+                assert server.requests == 3
+                # 响应丢失后重发同一批：幂等键不重复处理
+                with db.transaction() as conn:
+                    conn.executemany('INSERT INTO "sync_outbox" VALUES (?, ?, ?, ?, ?)', entries)
+                replayer.start()
+                outbox.notify()
+                deadline = time.monotonic() + 10
+                while outbox.pending() and time.monotonic() < deadline:
+                    time.sleep(0.05)
+                replayer.close()
+                assert outbox.pending() == 0
+                stock = {item["id"]: item["currentStock"] for item in server.items("products")}
+                assert stock == {product_id: 5 + 60 - 15}, stock
+                assert len(server.items("transactions")) == 31
+        finally:
+            db.close()
+    print("OK 离线发件箱：断网时保留，恢复后批量补发，重发不重复写入")
+
+
+def test_stock_alerts():
+    with isolated() as tmp:
+        db = Database(os.path.join(tmp, "alerts.db"))
+        try:
+            products = ProductRepository(db)
+            transactions = TransactionRepository(db)
+            empty = products.create("缺货货品", stock=0)
+            selling = products.create("畅销货品", stock=150)
+            low = products.create("低库存货品", stock=8)
+            idle = products.create("滞销货品", stock=50)
+            transactions.record(selling, TYPE_OUTBOUND, 90)  # 近 30 天日均 3，可售 20 天
+            engine = StockAlertEngine(db)
+            assert engine.refresh() and engine.evaluated == 0
+            assert [(alert.product_id, alert.level) for alert in engine.alerts()] == [
+                (empty, LEVEL_OUT_OF_STOCK), (low, LEVEL_REORDER)]
+            # 提交后只重新评估涉及的货品
+            writer = TransactionWriter(db)
+            writer.add_listener(engine.on_movements)
+            writer.submit(selling, TYPE_OUTBOUND, 30).result()  # 日均 4，可售 7.5 天
+            writer.close()
+            assert engine.refresh() and engine.evaluated == 1
+            alerts = engine.alerts()
+            assert [alert.product_id for alert in alerts] == [empty, selling, low]
+            assert alerts[1].level == LEVEL_LOW_COVER and alerts[1].days == 7.5
+            assert [alert.product_id for alert in engine.alerts(2)] == [empty, selling]
+            assert not engine.refresh() and engine.evaluated == 1
+            # 导入的流水提交后同样只重新评估涉及的货品
+            transactions_csv = os.path.join(tmp, "transactions.csv")
+            with open(transactions_csv, "w", encoding="utf-8") as f:
+                f.write("日期,货品,类型,数量\n2024-01-01,缺货货品,入库,100\n")
+            result = BulkImporter(db, alerts=engine).import_file(KIND_TRANSACTIONS, transactions_csv)
+            assert result.imported == 1, result.errors
+            assert engine.refresh() and engine.evaluated == 2
+            assert [alert.product_id for alert in engine.alerts()] == [selling, low]
+            # 补货点：预警和首页低库存计数一同变化
+            engine.set_reorder_point(idle, 60)
+            assert engine.refresh() and engine.count() == 3
+            assert DashboardRepository(db).kpis().low_stock == 2 and counters_consistent(db)
+            engine.set_reorder_point(low, 5)
+            engine.set_reorder_point(idle, None)
+            assert engine.refresh()
+            assert [alert.product_id for alert in engine.alerts()] == [selling]
+            assert counters_consistent(db)
+            # 删除的货品在下次刷新时移出预警
+            ProductRepository(db, alerts=engine).delete(selling)
+            assert engine.refresh() and engine.count() == 0 and counters_consistent(db)
+        finally:
+            db.close()
+    print("OK 库存预警：按可售天数排序，只重新评估变动的货品，补货点与首页计数一致")
+
+
+def test_search_index():
+    index = NGramIndex()
+    index.build([(1, ["apple", "红色"]), (2, ["apricot", "橙色"]), (3, ["banana", "黄色"])])
+    assert index.search("") == [1, 2, 3] and index.search("AP") == [1, 2]
+    assert index.search("色") == [1, 2, 3] and index.search("cherry") == []
+    # 长于 3 字的查询先取候选再校验
+    assert index.search("apric") == [2] and index.search("apple") == [1]
+    assert index.search("apples") == []
+    # 子串不跨字段匹配
+    assert index.search("e红") == [] and index.search("cot橙色") == []
+    # 更新保留原位置，删除后重新加入排在最后
+    index.add(1, ["apple pie", "红色"])
+    assert index.search("ap") == [1, 2] and index.search("") == [1, 2, 3]
+    assert index.search("e pi") == [1] and index.search("apple") == [1]
+    index.remove(2)
+    assert index.search("ap") == [1] and len(index) == 2
+    index.add(2, ["apricot"])
+    assert index.search("ap") == [1, 2] and index.search("") == [1, 3, 2]
+    # 大量更新和删除触发墓碑压缩，结果与逐条比对一致且顺序不变
+    names = {key: f"item{key:03d}" for key in range(200)}
+    index.build((key, [name]) for key, name in names.items())
+    for key in range(0, 200, 3):
+        names[key] = f"updated{key:03d}"
+        index.add(key, [names[key]])
+    for key in range(1, 200, 5):
+        del names[key]
+        index.remove(key)
+    assert len(index._texts) < 200 + 67, "应已压缩墓碑"
+    assert len(index) == len(names)
+    for query in ("", "item", "upd", "updated01", "em0", "1", "99"):
+        assert index.search(query) == [key for key, name in names.items() if query in name], query
+    print("OK 搜索索引：增删改、墓碑压缩、长查询与跨字段不匹配，更新后保持原有顺序")
+
+
+def test_downsample():
+    # 不超过阈值时原样返回全部下标
+    assert lttb([3, 1, 4], 5) == [0, 1, 2] and lttb([3, 1, 4, 1, 5], 5) == [0, 1, 2, 3, 4]
+    assert lttb([], 10) == []
+    rng = np.random.default_rng(7)
+    values = list(rng.normal(100, 5, 10000))
+    for threshold in (3, 50, 777, 9999):
+        indices = lttb(values, threshold)
+        assert len(indices) == threshold
+        assert indices[0] == 0 and indices[-1] == len(values) - 1
+        assert all(a < b for a, b in zip(indices, indices[1:]))
+    # 尖峰的峰值点必须保留
+    spike = [0.0] * 1000
+    spike[637] = 500.0
+    spike[638] = 250.0
+    assert 637 in lttb(spike, 20)
+    dip = [10.0] * 1000
+    dip[123] = -400.0
+    assert 123 in lttb(dip, 20)
+    print("OK LTTB 降采样：保留首尾与尖峰，输出长度等于阈值，短序列原样返回")
+
+
+def main():
+    """逐个运行全部测试，失败的测试打印原因后继续，返回失败个数"""
+    print("测试数据层...")
+    failed = []
+    for name, test in list(globals().items()):
+        if not name.startswith("test_") or not callable(test):
+            continue
+        try:
+            test()
+        except Exception:
+            failed.append(name)
+            print(f"FAIL {name}")
+            traceback.print_exc()
+    if failed:
+        print(f"{len(failed)} 个测试失败：{', '.join(failed)}")
+    else:
+        print("所有测试通过！")
+    return len(failed)
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
@@ -0,0 +1,45 @@
+def lttb(values, threshold):
+    """Largest-Triangle-Three-Buckets 降采样
+
+    values 为等间距序列的 y 值，返回保留下来的下标列表（升序，包含首尾）。
+    除首尾外把数据分成 threshold - 2 个桶，每个桶选出与前一个已选点、
+    下一个桶平均点构成三角形面积最大的点，折线的形状和峰谷得以保留。
+    数据量不超过 threshold 时原样返回全部下标。
+    """
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    selected = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0  # 上一个选中点的下标
+    for i in range(threshold - 2):
+        # 当前桶 [start, end)
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+
+        # 下一个桶的平均点（最后一个桶时为终点）
+        next_start = end
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        if next_start >= next_end:
+            avg_x, avg_y = n - 1, values[n - 1]
+        else:
+            avg_x = (next_start + next_end - 1) / 2
+            avg_y = sum(values[next_start:next_end]) / (next_end - next_start)
+
+        # 三角形面积的两倍：|(ax - avg_x)(y - ay) - (ax - x)(avg_y - ay)|
+        ay = values[a]
+        dx = a - avg_x
+        dy = avg_y - ay
+        best = start
+        best_area = -1.0
+        for j in range(start, end):
+            area = abs(dx * (values[j] - ay) - (a - j) * dy)
+            if area > best_area:
+                best_area = area
+                best = j
+        selected.append(best)
+        a = best
+
+    selected.append(n - 1)
+    return selected
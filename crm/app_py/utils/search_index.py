@@ -0,0 +1,138 @@
+from array import array
+
+
+# 字段之间的分隔符，保证子串匹配不会跨字段
+FIELD_SEPARATOR = "\x00"
+# 最长的 n-gram 长度；长于此的查询先用 n-gram 取候选再逐条校验
+MAX_GRAM = 3
+_GRAM_SIZES = range(1, MAX_GRAM + 1)
+
+
+class NGramIndex:
+    """增量维护的 n-gram 倒排索引，用于搜索框子串过滤
+
+    每个文档（一行数据）的若干字段按 1~3 字 n-gram 建立倒排表，倒排表为
+    按文档序号递增的 array('i')。修改或删除时旧文档只做墓碑标记，新内容
+    追加为新文档；墓碑过多时整体压缩。查询长度不超过 3 时倒排表即为精确
+    结果，更长的查询取最短倒排表做候选后逐条校验。
+
+    每个键保留首次加入时的位置，更新不改变位置：更新过的文档追加在倒排表
+    末尾，此时查询结果按位置重新排序，压缩后恢复为按位置排列的文档序号。
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._texts = []       # 文档序号 -> 规范化后的文本（None 表示已删除）
+        self._keys = []        # 文档序号 -> 调用方的键
+        self._positions = []   # 文档序号 -> 键的位置（首次加入的顺序）
+        self._doc_of_key = {}  # 键 -> 当前文档序号（按位置排列）
+        self._next_position = 0
+        self._updated = False  # 建立索引后更新过文档，文档序号不再与位置同序
+        self._deleted = 0
+
+    def __len__(self):
+        return len(self._doc_of_key)
+
+    def build(self, items):
+        """清空并批量建立索引，items 为 (键, 字段序列) 的可迭代对象"""
+        self._postings = {}
+        self._texts = []
+        self._keys = []
+        self._positions = []
+        self._doc_of_key = {}
+        self._next_position = 0
+        self._updated = False
+        self._deleted = 0
+        for key, fields in items:
+            self._add(key, fields)
+
+    def build_incrementally(self, items, chunk_size=1000):
+        """分块建立索引的生成器：每处理 chunk_size 个文档产出一次，
+        便于在界面空闲时逐块执行而不阻塞事件循环"""
+        self.build(())
+        count = 0
+        for key, fields in items:
+            self._add(key, fields)
+            count += 1
+            if count % chunk_size == 0:
+                yield count
+
+    def add(self, key, fields):
+        """新增或更新一个文档（更新时保留原来的位置）"""
+        doc = self._doc_of_key.get(key)
+        if doc is None:
+            self._add(key, fields)
+        else:
+            self._tombstone(doc)
+            self._add(key, fields, self._positions[doc])
+            self._updated = True
+        self._maybe_compact()
+
+    def remove(self, key):
+        doc = self._doc_of_key.pop(key, None)
+        if doc is not None:
+            self._tombstone(doc)
+            self._maybe_compact()
+
+    def search(self, query):
+        """返回文本中包含 query 的所有键（按键首次加入的顺序）"""
+        query = query.lower()
+        if not query:
+            return list(self._doc_of_key)
+
+        texts = self._texts
+        keys = self._keys
+        if len(query) <= MAX_GRAM:
+            postings = self._postings.get(query)
+            if postings is None:
+                return []
+            docs = [doc for doc in postings if texts[doc] is not None]
+        else:
+            # 取最短的倒排表作为候选，再做子串校验
+            candidates = None
+            for i in range(len(query) - MAX_GRAM + 1):
+                postings = self._postings.get(query[i:i + MAX_GRAM])
+                if postings is None:
+                    return []
+                if candidates is None or len(postings) < len(candidates):
+                    candidates = postings
+            docs = [doc for doc in candidates
+                    if texts[doc] is not None and query in texts[doc]]
+        if self._updated:
+            docs.sort(key=self._positions.__getitem__)
+        return [keys[doc] for doc in docs]
+
+    def _add(self, key, fields, position=None):
+        doc = len(self._texts)
+        parts = [str(field).lower() for field in fields if field]
+        text = FIELD_SEPARATOR.join(parts)
+        if position is None:
+            position = self._next_position
+            self._next_position += 1
+        self._texts.append(text)
+        self._keys.append(key)
+        self._positions.append(position)
+        self._doc_of_key[key] = doc
+
+        postings = self._postings
+        for gram in {part[i:i + n]
+                     for part in parts
+                     for n in _GRAM_SIZES
+                     for i in range(len(part) - n + 1)}:
+            posting = postings.get(gram)
+            if posting is None:
+                posting = postings[gram] = array("i")
+            posting.append(doc)
+
+    def _tombstone(self, doc):
+        self._texts[doc] = None
+        self._deleted += 1
+
+    def _maybe_compact(self):
+        """墓碑超过四分之一时重建，回收倒排表空间"""
+        if self._deleted * 4 <= len(self._texts):
+            return
+        # _doc_of_key 按位置排列，重建后文档序号与位置同序
+        live = [(key, self._texts[doc].split(FIELD_SEPARATOR))
+                for key, doc in self._doc_of_key.items()]
+        self.build(live)
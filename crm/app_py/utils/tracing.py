@@ -0,0 +1,168 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+
+# 设置该环境变量为输出文件路径即可开启追踪，退出时写出 Chrome trace JSON
+TRACE_ENV = "MINICRM_TRACE"
+
+_enabled = False
+_events = []
+_output_path = None
+_pid = os.getpid()
+_origin = time.perf_counter()
+
+
+class _NullSpan:
+    """追踪关闭时使用的空区间，进入/退出不做任何事"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """一个计时区间，退出时记录为 Chrome trace 的完整事件（ph = "X"）"""
+
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        event = {
+            "name": self.name,
+            "ph": "X",
+            "ts": (self.start - _origin) * 1e6,
+            "dur": (end - self.start) * 1e6,
+            "pid": _pid,
+            "tid": threading.get_ident(),
+        }
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        if self.args:
+            event["args"] = self.args
+        _events.append(event)  # list.append 在 CPython 中是原子的
+        return False
+
+    def set(self, **args):
+        """在区间结束前补充参数（如结果行数）"""
+        self.args.update(args)
+
+
+def span(name, **args):
+    """计时区间：with span("products.populate", rows=n): ...
+
+    同一线程内嵌套的区间在 Chrome trace 中按时间自然嵌套显示。
+    追踪关闭时返回共享的空区间，开销只有一次函数调用。
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def traced(name=None):
+    """装饰器：把整个函数调用记为一个区间"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instant(name, **args):
+    """记录一个瞬时事件（如首帧绘制完成）"""
+    if not _enabled:
+        return
+    event = {
+        "name": name,
+        "ph": "i",
+        "s": "t",
+        "ts": (time.perf_counter() - _origin) * 1e6,
+        "pid": _pid,
+        "tid": threading.get_ident(),
+    }
+    if args:
+        event["args"] = args
+    _events.append(event)
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable(output_path=None):
+    """开启追踪；给出 output_path 时在进程退出时自动导出"""
+    global _enabled, _output_path
+    _enabled = True
+    if output_path and _output_path is None:
+        atexit.register(_export_at_exit)
+    if output_path:
+        _output_path = output_path
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def enable_from_environment():
+    """根据 MINICRM_TRACE 环境变量开启追踪"""
+    path = os.environ.get(TRACE_ENV)
+    if path:
+        enable(path)
+    return _enabled
+
+
+def export(path):
+    """把已记录的事件写成 Chrome trace-event JSON（可在 chrome://tracing 或 Perfetto 中打开）"""
+    events = list(_events)
+    thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+    metadata = [
+        {"name": "thread_name", "ph": "M", "pid": _pid, "tid": tid,
+         "args": {"name": thread_names.get(tid, str(tid))}}
+        for tid in {event["tid"] for event in events}
+    ]
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"},
+                  f, ensure_ascii=False)
+
+
+def clear():
+    _events.clear()
+
+
+def _export_at_exit():
+    if _output_path and _events:
+        try:
+            export(_output_path)
+        except OSError:
+            pass